@@ -22,6 +22,7 @@ from sqlalchemy.orm import Session
 
 from app.config import settings
 from app.core.database import get_db
+from app.core.tracing import trace_stage
 from app.dependencies import get_current_user
 from app.langchain_integration.chains import (ChatConfig, ConversationManager,
                                               get_conversation_manager)
@@ -37,6 +38,7 @@ from app.services.conversation_service import (ConversationNotFoundError,
 from app.services.knowledge_base_permission_service import \
     KnowledgeBasePermissionService
 from app.services.quota_service import InsufficientQuotaError, QuotaService
+from app.tasks.chat_persistence import ChatReply, get_chat_persistence_writer
 
 logger = logging.getLogger(__name__)
 
@@ -63,28 +65,6 @@ def _convert_chat_config(config: Optional[ChatConfigSchema]) -> ChatConfig:
     )
 
 
-def _get_message_history(
-    service: ConversationService, conversation_id: int, user_id: int, limit: int = 10
-) -> list[dict]:
-    """
-    获取对话历史消息
-
-    Args:
-        service: 对话服务
-        conversation_id: 对话ID
-        user_id: 用户ID
-        limit: 最大消息数
-
-    Returns:
-        list[dict]: 消息历史列表
-    """
-    messages = service.get_recent_messages(
-        conversation_id=conversation_id, user_id=user_id, limit=limit
-    )
-
-    return [{"role": msg.role.value, "content": msg.content} for msg in messages]
-
-
 @router.post(
     "", response_model=ChatResponse, summary="发送消息（非流式）", description="发送消息到对话，返回AI回复。"
 )
@@ -146,11 +126,7 @@ async def chat(
         )
 
         # 获取历史消息
-        history = _get_message_history(
-            service=service,
-            conversation_id=chat_request.conversation_id,
-            user_id=current_user.id,
-        )
+        history = service.get_conversation_context(chat_request.conversation_id).history
 
         # 保存用户消息
         user_message = service.add_message(
@@ -271,7 +247,10 @@ async def stream_chat(
         - conversation事件: data: {"type": "conversation", "conversation_id": 123}
         - token事件: data: {"type": "token", "content": "文本片段"}
         - 完成事件: data: {"type": "done", "message_id": 123, "tokens_used": 150}
+          （AI回复由后台批量写入时message_id为null）
         - 错误事件: data: {"type": "error", "error": "错误信息"}
+        - 耗时事件（请求头X-Debug-Timing且配置允许时）:
+          data: {"type": "timing", "request_id": "...", "total_ms": 1234.5, "stages": {...}}
 
     Args:
         chat_request: 聊天请求
@@ -334,38 +313,23 @@ async def stream_chat(
         except ConversationNotFoundError as e:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
 
-    # 获取历史消息
-    history = _get_message_history(
-        service=service, conversation_id=conversation_id, user_id=current_user.id
-    )
+    # 获取历史消息和用户消息数（缓存未命中时一次查询）
+    with trace_stage("chat.load_context"):
+        context = service.get_conversation_context(conversation_id)
+    history = context.history
 
     # 检查是否是第一条用户消息（用于自动生成标题）
-    is_first_message = is_new_conversation or service.is_first_user_message(
-        conversation_id
-    )
+    is_first_message = is_new_conversation or context.is_first_user_message
 
     # 保存用户消息
-    user_message = service.add_message(
-        conversation_id=conversation_id,
-        user_id=current_user.id,
-        role=MessageRole.USER,
-        content=chat_request.content,
-        tokens=0,
-    )
-
-    # 如果是第一条用户消息，自动生成标题
-    if is_first_message:
-        try:
-            title = service.generate_title_sync(
-                first_message=chat_request.content, max_length=20
-            )
-            service.update_conversation_title(
-                conversation_id=conversation_id, title=title
-            )
-            logger.info(f"自动生成对话标题: {title}")
-        except Exception as e:
-            logger.error(f"自动生成标题失败: {str(e)}")
-            # 标题生成失败不影响对话继续
+    with trace_stage("chat.save_user_message"):
+        user_message = service.add_message(
+            conversation_id=conversation_id,
+            user_id=current_user.id,
+            role=MessageRole.USER,
+            content=chat_request.content,
+            tokens=0,
+        )
 
     # 转换配置
     config = _convert_chat_config(chat_request.config)
@@ -374,11 +338,15 @@ async def stream_chat(
     user_id = current_user.id
     final_conversation_id = conversation_id
     request_id = getattr(request.state, "request_id", None)
+    trace = getattr(request.state, "trace", None)
+    writer = get_chat_persistence_writer()
 
     async def generate_stream() -> AsyncGenerator[str, None]:
         """生成SSE流"""
         full_response = ""
         tokens_used = 0
+        # 首条用户消息在收到首个token后于后台生成标题，不阻塞流式输出
+        title_pending = is_first_message
 
         # 如果是新对话，先发送对话ID
         if is_new_conversation:
@@ -416,44 +384,50 @@ async def stream_chat(
                     full_response += content
                     yield f"data: {json.dumps({'type': 'token', 'content': content}, ensure_ascii=False)}\n\n"
 
+                    if title_pending:
+                        title_pending = False
+                        writer.schedule_title(final_conversation_id, chat_request.content)
+
                 elif event_type == "done":
                     tokens_used = event.get("tokens_used", 0)
 
-                    # 保存AI回复到数据库并扣除配额
-                    # 注意：这里需要新的数据库会话，因为流式响应可能跨越多个请求周期
-                    try:
-                        from app.core.database import SessionLocal
-
-                        with SessionLocal() as new_db:
-                            new_service = ConversationService(new_db)
-                            new_quota_service = QuotaService(new_db)
-
-                            # 保存AI回复
-                            ai_message = new_service.add_message(
-                                conversation_id=final_conversation_id,
-                                user_id=user_id,
-                                role=MessageRole.ASSISTANT,
-                                content=full_response,
-                                tokens=tokens_used,
+                    if title_pending:
+                        title_pending = False
+                        writer.schedule_title(final_conversation_id, chat_request.content)
+
+                    # 保存AI回复并扣除配额：优先交给后台批量写入，done事件不等待数据库
+                    # （此时message_id为null）；写入器未启动或队列已满时同步写入
+                    reply = ChatReply(
+                        conversation_id=final_conversation_id,
+                        user_id=user_id,
+                        content=full_response,
+                        tokens=tokens_used,
+                        api_type="chat",
+                    )
+                    message_id = None
+                    if writer.submit(reply):
+                        # 立即追加到历史窗口缓存，下一轮对话无需等待写入
+                        service.context_service.record_message(
+                            final_conversation_id, MessageRole.ASSISTANT, full_response
+                        )
+                    else:
+                        try:
+                            with trace_stage("chat.persist"):
+                                message_id = await writer.persist(reply)
+                        except Exception as save_error:
+                            logger.error(f"保存AI回复失败: {str(save_error)}")
+                            message_id = 0
+                        else:
+                            # 历史窗口缓存中已有本轮用户消息，补上回复
+                            service.context_service.record_message(
+                                final_conversation_id, MessageRole.ASSISTANT, full_response
                             )
-                            message_id = ai_message.id
-
-                            # 扣除配额并记录API使用
-                            try:
-                                new_quota_service.consume_quota(
-                                    user_id=user_id,
-                                    tokens_used=tokens_used,
-                                    api_type="chat",
-                                )
-                            except InsufficientQuotaError:
-                                # 如果在调用后配额不足，仍然返回结果，但记录警告
-                                logger.warning(f"用户 {user_id} 配额不足，但已完成本次调用")
-                    except Exception as save_error:
-                        logger.error(f"保存AI回复失败: {str(save_error)}")
-                        message_id = 0
 
                     yield f"data: {json.dumps({'type': 'done', 'message_id': message_id, 'tokens_used': tokens_used, 'conversation_id': final_conversation_id}, ensure_ascii=False)}\n\n"
 
+                    if trace is not None and trace.expose:
+                        yield f"data: {json.dumps(trace.to_dict(), ensure_ascii=False)}\n\n"
+
                 elif event_type == "error":
                     error_message = event.get("error") or "聊天服务暂时不可用"
                     yield f"data: {json.dumps({'type': 'error', 'error': error_message, 'request_id': request_id}, ensure_ascii=False)}\n\n"
@@ -470,6 +444,11 @@ async def stream_chat(
                     error_message = msg
             yield f"data: {json.dumps({'type': 'error', 'error': error_message, 'request_id': request_id}, ensure_ascii=False)}\n\n"
 
+        finally:
+            # 流式响应结束后输出本次请求的分阶段耗时
+            if trace is not None:
+                trace.log_summary()
+
     return StreamingResponse(
         generate_stream(),
         media_type="text/event-stream",
@@ -137,42 +137,29 @@ async def upload_documents_batch(
     """
     service = RAGService(db)
 
-    # 验证知识库
     try:
-        service.get_knowledge_base(knowledge_base_id, current_user.id)
+        uploaded, errors = await service.upload_documents_batch(
+            kb_id=knowledge_base_id,
+            user_id=current_user.id,
+            files=files,
+            background_tasks=background_tasks,
+        )
     except KnowledgeBaseNotFoundError:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="知识库不存在",
         )
 
-    documents = []
-    errors = []
-
-    for file in files:
-        try:
-            document = await service.upload_document(
-                kb_id=knowledge_base_id,
-                user_id=current_user.id,
-                file=file,
-                background_tasks=background_tasks,
-            )
-            documents.append(
-                DocumentUploadResponse(
-                    id=document.id,
-                    filename=document.filename,
-                    file_size=document.file_size,
-                    status=document.status.value,
-                    created_at=document.created_at,
-                )
-            )
-        except (UnsupportedFileTypeError, FileUploadError) as e:
-            errors.append(
-                {
-                    "filename": file.filename,
-                    "error": str(e),
-                }
-            )
+    documents = [
+        DocumentUploadResponse(
+            id=document.id,
+            filename=document.filename,
+            file_size=document.file_size,
+            status=document.status.value,
+            created_at=document.created_at,
+        )
+        for document in uploaded
+    ]
 
     logger.info(
         f"用户 {current_user.id} 批量上传文档: "
@@ -305,7 +292,7 @@ def get_document_preview(
 
     # 获取预览内容
     try:
-        content = service.get_document_preview(
+        content, total_length = service.get_document_preview_with_length(
             document_id=document_id,
             user_id=current_user.id,
             max_chars=max_chars,
@@ -329,7 +316,8 @@ def get_document_preview(
         document_id=document_id,
         filename=document.filename if document else "Unknown",
         content=content,
-        total_length=len(content),  # 这里简化处理，实际应该返回完整文档长度
+        total_length=total_length,
+        truncated=total_length is None or total_length > len(content),
     )
 
 @router.get(
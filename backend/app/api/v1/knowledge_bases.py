@@ -10,7 +10,8 @@
 import logging
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import (APIRouter, BackgroundTasks, Depends, HTTPException, Query,
+                     status)
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
@@ -188,14 +189,15 @@ def update_knowledge_base(
 )
 def delete_knowledge_base(
     kb_id: int,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """删除知识库"""
+    """删除知识库（向量数据和文件在响应返回后删除）"""
     service = RAGService(db)
 
     try:
-        success = service.delete_knowledge_base(kb_id, current_user.id)
+        success = service.delete_knowledge_base(kb_id, current_user.id, background_tasks)
     except KnowledgeBaseNotFoundError:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
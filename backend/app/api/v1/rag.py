@@ -119,6 +119,7 @@ async def rag_query(
         answer=response.answer,
         sources=sources,
         tokens_used=response.tokens_used,
+        cached=response.cached,
     )
 
 
@@ -197,6 +198,7 @@ async def rag_query_stream(
                         "type": "done",
                         "content": event.get("content", ""),
                         "tokens_used": tokens_used,
+                        "cached": event.get("cached", False),
                     }
                     yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
 
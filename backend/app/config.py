@@ -118,6 +118,24 @@ class TongyiSettings(BaseSettings):
     tongyi_temperature: float = Field(default=0.7, ge=0.0, le=2.0, description="温度参数")
     tongyi_max_tokens: int = Field(default=2000, ge=1, le=4000, description="最大token数")
     embedding_model: str = Field(default="text-embedding-v1", description="嵌入模型名称")
+    dashscope_base_url: str = Field(
+        default="https://dashscope.aliyuncs.com/api/v1", description="DashScope HTTP接口根地址"
+    )
+    tongyi_native_stream_enabled: bool = Field(
+        default=True, description="流式输出是否使用原生异步HTTP客户端（关闭则在线程中迭代SDK）"
+    )
+    tongyi_stream_connect_timeout: float = Field(
+        default=10.0, gt=0, le=120, description="流式接口连接超时（秒）"
+    )
+    tongyi_stream_read_timeout: float = Field(
+        default=60.0, gt=0, le=600, description="流式接口两个数据块之间的最长等待时间（秒）"
+    )
+    tongyi_http_max_connections: int = Field(
+        default=100, ge=1, le=1000, description="DashScope连接池最大连接数"
+    )
+    tongyi_http_max_keepalive_connections: int = Field(
+        default=20, ge=0, le=1000, description="DashScope连接池最大空闲长连接数"
+    )
 
     @field_validator("dashscope_api_key")
     @classmethod
@@ -173,6 +191,160 @@ class VectorDBSettings(BaseSettings):
         default="./data/chroma", description="Chroma持久化目录"
     )
     chroma_collection_name: str = Field(default="documents", description="默认集合名称")
+    chroma_collection_cache_size: int = Field(
+        default=256, ge=1, le=100000, description="缓存的知识库集合句柄最大数量（LRU淘汰）"
+    )
+    chroma_mode: str = Field(
+        default="embedded",
+        pattern="^(embedded|http|numpy)$",
+        description=(
+            "向量库运行方式：embedded（进程内Chroma，开发环境）、http（连接Chroma服务，多worker部署）"
+            "或numpy（进程内NumPy矩阵索引，中小规模知识库）"
+        ),
+    )
+    chroma_server_host: str = Field(default="localhost", description="Chroma服务地址")
+    chroma_server_port: int = Field(default=8000, ge=1, le=65535, description="Chroma服务端口")
+    chroma_server_ssl: bool = Field(default=False, description="是否使用HTTPS连接Chroma服务")
+    chroma_server_auth_token: Optional[str] = Field(
+        default=None, description="Chroma服务认证令牌（Authorization: Bearer）"
+    )
+    chroma_http_pool_size: int = Field(
+        default=20, ge=1, le=1000, description="到Chroma服务的长连接池大小（每个worker）"
+    )
+    chroma_http_connect_timeout_seconds: float = Field(
+        default=5.0, gt=0, le=120, description="连接Chroma服务超时（秒）"
+    )
+    chroma_http_read_timeout_seconds: float = Field(
+        default=30.0, gt=0, le=600, description="Chroma服务响应超时（秒）"
+    )
+    chroma_http_max_retries: int = Field(
+        default=2, ge=0, le=10, description="连接Chroma服务失败时的重试次数"
+    )
+    numpy_index_ivf_threshold: int = Field(
+        default=50000, ge=1, description="numpy模式下启用IVF分区的存活向量数阈值（以下为精确检索）"
+    )
+    numpy_index_ivf_nprobe: int = Field(
+        default=16, ge=1, le=4096, description="numpy模式下IVF检索扫描的分区数"
+    )
+    numpy_index_quantization: str = Field(
+        default="none",
+        pattern="^(none|int8|pq)$",
+        description=(
+            "numpy模式下新集合的向量量化方式：none、int8（标量量化）或pq（乘积量化）；"
+            "只降低常驻内存，float32向量仍保留在磁盘上用于精确重排，磁盘占用略有增加"
+        ),
+    )
+    numpy_index_pq_subvector_dim: int = Field(
+        default=8, ge=1, le=256, description="乘积量化子向量维度（每个子向量编码为1字节）"
+    )
+    numpy_index_rescore_factor: int = Field(
+        default=4, ge=1, le=100, description="量化粗排候选数倍率（k×倍率个候选用float32向量精确重排）"
+    )
+    vector_compaction_enabled: bool = Field(
+        default=True, description="是否在每日清理任务中压缩墓碑较多的向量集合并删除孤立集合"
+    )
+    vector_compaction_min_tombstone_ratio: float = Field(
+        default=0.2, ge=0.0, le=1.0, description="触发压缩的墓碑行占比"
+    )
+    vector_compaction_min_tombstones: int = Field(
+        default=1000, ge=0, description="触发压缩的最少墓碑行数"
+    )
+    vector_compaction_retire_grace_seconds: float = Field(
+        default=3600.0,
+        ge=0,
+        description="Chroma集合重建切换后旧集合的保留时间（秒），仍持有旧句柄的进程在此期间可继续读取",
+    )
+    vector_alias_refresh_seconds: float = Field(
+        default=30.0, ge=0, description="知识库集合别名在进程内的缓存时间（秒）"
+    )
+    chunk_embedding_store_enabled: bool = Field(
+        default=True, description="是否启用分块向量持久化存储（重试/重复上传复用向量）"
+    )
+    chunk_embedding_store_path: Optional[str] = Field(
+        default=None, description="分块向量存储SQLite文件路径，默认位于Chroma持久化目录旁"
+    )
+    chunk_embedding_store_max_entries: int = Field(
+        default=200000,
+        ge=0,
+        description="分块向量存储的最大条目数，超过后淘汰最久未用的向量（0表示不限制）",
+    )
+    sparse_index_enabled: bool = Field(
+        default=True, description="是否在文档处理时维护知识库稀疏倒排索引（混合检索使用）"
+    )
+    sparse_index_directory: Optional[str] = Field(
+        default=None, description="稀疏倒排索引目录，默认位于Chroma持久化目录旁"
+    )
+    sparse_index_tokenizer: str = Field(
+        default="ngram", pattern="^(ngram|jieba)$", description="稀疏索引中文分词方式（ngram或jieba）"
+    )
+
+
+class EmbeddingCacheSettings(BaseSettings):
+    """查询向量缓存配置"""
+
+    model_config = SettingsConfigDict(env_prefix="", case_sensitive=False)
+
+    embedding_cache_enabled: bool = Field(default=True, description="是否启用查询向量缓存")
+    embedding_cache_max_entries: int = Field(
+        default=10000, ge=0, le=1000000, description="进程内缓存最大条目数"
+    )
+    embedding_cache_ttl_seconds: int = Field(
+        default=86400, ge=60, description="缓存有效期（秒）"
+    )
+    embedding_cache_redis_enabled: bool = Field(
+        default=False, description="是否启用Redis共享缓存层"
+    )
+
+
+class ConversationMemorySettings(BaseSettings):
+    """对话记忆存储配置"""
+
+    model_config = SettingsConfigDict(env_prefix="", case_sensitive=False)
+
+    conversation_memory_max_conversations: int = Field(
+        default=5000, ge=0, le=1000000, description="进程内记忆最多保留的对话数（LRU淘汰）"
+    )
+    conversation_memory_ttl_seconds: int = Field(
+        default=3600, ge=60, description="对话记忆空闲过期时间（秒）"
+    )
+    conversation_memory_max_tokens: int = Field(
+        default=3000, ge=100, le=100000, description="每个对话保留的历史消息token预算"
+    )
+    conversation_memory_max_messages: int = Field(
+        default=20, ge=2, le=200, description="每个对话保留的最大历史消息数"
+    )
+    conversation_memory_redis_enabled: bool = Field(
+        default=False, description="是否启用Redis共享记忆层（多worker之间共享）"
+    )
+    conversation_history_window: int = Field(
+        default=10, ge=1, le=200, description="每次对话加载的最近历史消息数"
+    )
+    conversation_history_cache_enabled: Optional[bool] = Field(
+        default=None,
+        description=(
+            "是否缓存对话历史窗口（写入消息时增量更新）；未设置时跟随conversation_memory_redis_enabled，"
+            "只有进程内缓存时多worker之间互相看不到对方写入的消息"
+        ),
+    )
+
+
+class ChatPersistenceSettings(BaseSettings):
+    """流式对话回复写入配置"""
+
+    model_config = SettingsConfigDict(env_prefix="", case_sensitive=False)
+
+    chat_write_behind_enabled: bool = Field(
+        default=True, description="是否在SSE结束后异步批量写入AI回复、API使用记录和配额"
+    )
+    chat_write_behind_batch_size: int = Field(
+        default=50, ge=1, le=1000, description="每个事务最多合并写入的回复数"
+    )
+    chat_write_behind_flush_interval_ms: int = Field(
+        default=50, ge=0, le=5000, description="凑批等待时间（毫秒）"
+    )
+    chat_write_behind_queue_size: int = Field(
+        default=10000, ge=1, description="写入队列容量，队列满时在请求内同步写入"
+    )
 
 
 class FileStorageSettings(BaseSettings):
@@ -184,6 +356,15 @@ class FileStorageSettings(BaseSettings):
     max_upload_size_mb: int = Field(
         default=10, ge=1, le=100, description="最大上传文件大小（MB）"
     )
+    upload_chunk_size_kb: int = Field(
+        default=1024, ge=64, le=16384, description="上传文件流式写入的块大小（KB）"
+    )
+    upload_batch_concurrency: int = Field(
+        default=4, ge=1, le=32, description="批量上传时同时保存的文件数"
+    )
+    extracted_text_cache_enabled: bool = Field(
+        default=True, description="是否在文档入库时保存提取文本缓存（用于预览）"
+    )
 
     @property
     def max_upload_size_bytes(self) -> int:
@@ -198,6 +379,65 @@ class DocumentProcessingSettings(BaseSettings):
 
     chunk_size: int = Field(default=1000, ge=100, le=5000, description="文档分块大小")
     chunk_overlap: int = Field(default=200, ge=0, le=1000, description="分块重叠大小")
+    embedding_batch_size: int = Field(
+        default=25, ge=1, le=500, description="向量化批大小（单次嵌入接口调用的文本数）"
+    )
+    embedding_max_concurrency: int = Field(
+        default=4, ge=1, le=32, description="向量化最大并发批次数"
+    )
+
+
+class DocumentQueueSettings(BaseSettings):
+    """文档处理队列配置"""
+
+    model_config = SettingsConfigDict(env_prefix="", case_sensitive=False)
+
+    document_queue_enabled: bool = Field(
+        default=True, description="是否使用持久化任务队列处理文档（关闭则使用请求内后台任务）"
+    )
+    document_worker_embedded: bool = Field(
+        default=True, description="是否在API进程内运行文档处理worker（生产环境建议关闭并单独部署worker）"
+    )
+    document_worker_concurrency: int = Field(
+        default=4, ge=1, le=64, description="单个worker进程同时处理的文档数"
+    )
+    document_worker_per_kb_concurrency: int = Field(
+        default=2, ge=1, le=64, description="单个知识库同时处理的文档数（全部worker合计）"
+    )
+    document_worker_poll_interval_seconds: float = Field(
+        default=2.0, gt=0, le=60, description="队列为空时的轮询间隔（秒）"
+    )
+    document_job_heartbeat_seconds: float = Field(
+        default=30.0, gt=0, le=600, description="任务心跳间隔（秒）"
+    )
+    document_job_stale_seconds: int = Field(
+        default=180, ge=30, description="心跳超过该时长未更新的任务视为worker已退出（秒）"
+    )
+    document_job_max_attempts: int = Field(
+        default=3, ge=1, le=20, description="任务最大领取次数，超过后标记为失败"
+    )
+
+
+class ExecutorSettings(BaseSettings):
+    """共享执行器配置"""
+
+    model_config = SettingsConfigDict(env_prefix="", case_sensitive=False)
+
+    executor_io_threads: int = Field(
+        default=32, ge=1, le=256, description="阻塞I/O线程池大小（文件读写等短时调用）"
+    )
+    executor_db_threads: int = Field(
+        default=8, ge=1, le=128, description="数据库调用线程池大小"
+    )
+    executor_stream_threads: int = Field(
+        default=4,
+        ge=1,
+        le=64,
+        description="流式解析线程池大小（未使用解析进程池时同时进行的流式解析数上限）",
+    )
+    executor_cpu_processes: int = Field(
+        default=2, ge=0, le=32, description="CPU密集型解析进程池大小（0表示在I/O线程池中执行）"
+    )
 
 
 class RAGSettings(BaseSettings):
@@ -207,7 +447,94 @@ class RAGSettings(BaseSettings):
 
     rag_top_k: int = Field(default=5, ge=1, le=20, description="检索文档数量")
     rag_similarity_threshold: float = Field(
-        default=0.7, ge=0.0, le=1.0, description="相似度阈值"
+        default=0.7, ge=0.0, le=1.0, description="相似度阈值（仅用于纯向量检索，混合检索和重排序时不过滤）"
+    )
+    rag_multi_kb_max_concurrency: int = Field(
+        default=8, ge=1, le=64, description="多知识库联合检索最大并发数"
+    )
+    rag_multi_kb_timeout_seconds: float = Field(
+        default=10.0, gt=0.0, le=120.0, description="多知识库联合检索单库超时（秒）"
+    )
+    rag_hybrid_search_enabled: bool = Field(
+        default=False, description="是否启用稀疏(BM25) + 稠密向量混合检索"
+    )
+    rag_hybrid_candidates: int = Field(
+        default=20, ge=1, le=200, description="混合检索中稀疏和稠密检索各自召回的候选数"
+    )
+    rag_rrf_k: int = Field(default=60, ge=1, le=1000, description="倒数排名融合（RRF）常数")
+    rag_mmr_enabled: bool = Field(
+        default=False, description="是否启用最大边际相关性（MMR）多样化选择"
+    )
+    rag_mmr_fetch_k: int = Field(
+        default=20, ge=1, le=200, description="MMR选择前召回的候选数"
+    )
+    rag_mmr_lambda: float = Field(
+        default=0.7, ge=0.0, le=1.0, description="MMR相关性权重（1.0等价于按相似度排序）"
+    )
+    rag_mmr_duplicate_threshold: float = Field(
+        default=0.95, gt=0.0, le=1.0, description="近似重复分块的余弦相似度阈值"
+    )
+    rag_rerank_enabled: bool = Field(default=False, description="是否启用检索结果重排序")
+    rag_reranker: str = Field(
+        default="bm25", pattern="^(bm25|onnx)$", description="重排序打分器（bm25 或 onnx）"
+    )
+    rag_rerank_candidate_multiplier: int = Field(
+        default=4, ge=1, le=10, description="重排序候选数为 top_k 的倍数"
+    )
+    rag_rerank_timeout_ms: int = Field(
+        default=300, ge=10, le=10000, description="重排序时间预算（毫秒），超时保留检索顺序"
+    )
+    rag_rerank_onnx_model_path: Optional[str] = Field(
+        default=None, description="ONNX交叉编码器模型文件路径"
+    )
+    rag_rerank_onnx_tokenizer_path: Optional[str] = Field(
+        default=None, description="交叉编码器tokenizer.json路径（默认与模型同目录）"
+    )
+    rag_rerank_max_length: int = Field(
+        default=512, ge=16, le=4096, description="交叉编码器句对最大token数"
+    )
+    rag_rerank_batch_size: int = Field(default=16, ge=1, le=256, description="交叉编码器推理批大小")
+
+
+class AnswerCacheSettings(BaseSettings):
+    """RAG答案语义缓存配置"""
+
+    model_config = SettingsConfigDict(env_prefix="", case_sensitive=False)
+
+    answer_cache_enabled: bool = Field(default=False, description="是否启用RAG答案语义缓存")
+    answer_cache_similarity_threshold: float = Field(
+        default=0.95, ge=0.0, le=1.0, description="命中缓存所需的问题向量最小余弦相似度"
+    )
+    answer_cache_max_entries: int = Field(
+        default=2000, ge=0, le=1000000, description="进程内缓存答案最大条目数"
+    )
+    answer_cache_ttl_seconds: int = Field(
+        default=3600, ge=1, description="缓存答案有效期（秒）"
+    )
+    answer_cache_redis_enabled: bool = Field(
+        default=False, description="是否将知识库内容版本号保存在Redis（多worker共享失效信号）"
+    )
+    answer_cache_replay_chunk_chars: int = Field(
+        default=8, ge=1, le=1000, description="流式接口回放缓存答案时每个片段的字符数"
+    )
+    answer_cache_replay_interval_ms: int = Field(
+        default=0, ge=0, le=1000, description="流式接口回放缓存答案时片段间隔（毫秒）"
+    )
+
+
+class PromptSettings(BaseSettings):
+    """提示词组装配置"""
+
+    model_config = SettingsConfigDict(env_prefix="", case_sensitive=False)
+
+    prompt_max_input_tokens: int = Field(
+        default=6000, ge=256, le=1000000, description="提示词（不含输出）的最大token数"
+    )
+    prompt_history_decay: float = Field(
+        default=0.7, gt=0.0, le=1.0, description="历史消息价值随轮次衰减的系数（越小越先裁剪旧历史）"
+    )
+    token_count_cache_size: int = Field(
+        default=20000, ge=0, le=1000000, description="token计数缓存最大条目数"
     )
 
 
@@ -279,6 +606,12 @@ class MonitoringSettings(BaseSettings):
 
     enable_metrics: bool = Field(default=True, description="是否启用Prometheus指标")
     metrics_port: int = Field(default=9090, ge=1024, le=65535, description="指标端口")
+    stage_timing_debug_enabled: bool = Field(
+        default=False, description="是否允许客户端通过X-Debug-Timing请求头获取分阶段耗时"
+    )
+    stage_timing_slow_request_ms: int = Field(
+        default=5000, ge=0, description="慢请求阈值（毫秒），超过时以WARNING级别输出分阶段耗时"
+    )
 
 
 class BackgroundTaskSettings(BaseSettings):
@@ -394,15 +727,36 @@ class Settings:
         # 向量数据库配置
         self.vector_db = VectorDBSettings()
 
+        # 查询向量缓存配置
+        self.embedding_cache = EmbeddingCacheSettings()
+
+        # 对话记忆存储配置
+        self.conversation_memory = ConversationMemorySettings()
+
+        # 流式对话回复写入配置
+        self.chat_persistence = ChatPersistenceSettings()
+
         # 文件存储配置
         self.file_storage = FileStorageSettings()
 
         # 文档处理配置
         self.document_processing = DocumentProcessingSettings()
 
+        # 文档处理队列配置
+        self.document_queue = DocumentQueueSettings()
+
+        # 共享执行器配置
+        self.executors = ExecutorSettings()
+
         # RAG配置
         self.rag = RAGSettings()
 
+        # RAG答案语义缓存配置
+        self.answer_cache = AnswerCacheSettings()
+
+        # 提示词组装配置
+        self.prompt = PromptSettings()
+
         # 配额配置
         self.quota = QuotaSettings()
 
@@ -469,6 +823,7 @@ class Settings:
             and self.jwt.secret_key != DEFAULT_JWT_SECRET_KEY,
             "tongyi_configured": self.tongyi.dashscope_api_key
             != DEFAULT_DASHSCOPE_API_KEY,
+            "vector_db_mode": self.vector_db.chroma_mode,
             "vector_db_path": self.vector_db.chroma_persist_directory,
             "upload_dir": self.file_storage.upload_dir,
         }
@@ -489,9 +844,16 @@ __all__ = [
     "SecuritySettings",
     "TongyiSettings",
     "VectorDBSettings",
+    "EmbeddingCacheSettings",
+    "ConversationMemorySettings",
+    "ChatPersistenceSettings",
     "FileStorageSettings",
     "DocumentProcessingSettings",
+    "DocumentQueueSettings",
+    "ExecutorSettings",
     "RAGSettings",
+    "AnswerCacheSettings",
+    "PromptSettings",
     "QuotaSettings",
     "RateLimitSettings",
     "LoggingSettings",
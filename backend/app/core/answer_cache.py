@@ -0,0 +1,434 @@
+"""
+RAG答案语义缓存模块
+
+相近的问题在相同知识库上重复提问时直接返回已生成的答案，跳过检索和LLM调用：
+- 缓存范围由(知识库ID, 知识库内容版本, 提示模板等变体)确定
+- 范围内按问题向量做最近邻查找，余弦相似度达到阈值即命中
+- 知识库中的文档新增、重试或删除时递增内容版本，旧范围的缓存自动失效
+- 内容版本可保存在Redis中，多个worker之间共享失效信号
+
+缓存条目只保存在进程内（LRU + TTL）。
+
+使用方式:
+    cache = get_answer_cache()
+    scope = await cache.ascope([1, 2], variant="template-hash:5")
+    hit = cache.lookup(scope, question_vector)
+    if hit is None:
+        ...
+        cache.store(scope, [1, 2], question, question_vector, answer, sources, 800, 200)
+
+    # 文档变更后
+    invalidate_answer_cache([1])
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.core.redis import RedisKeys, get_redis_client
+from app.middleware.prometheus_middleware import (record_answer_cache_lookup,
+                                                  record_answer_cache_size)
+
+logger = logging.getLogger(__name__)
+
+
+def _unit_vector(vector: Sequence[float]) -> Optional[np.ndarray]:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    if array.ndim != 1 or norm == 0.0:
+        return None
+    return array / norm
+
+
+def iter_replay_chunks(text: str, chunk_chars: int) -> Iterator[str]:
+    """
+    将缓存的答案切分为文本片段，用于模拟流式输出
+
+    Args:
+        text: 答案文本
+        chunk_chars: 每个片段的字符数
+
+    Yields:
+        str: 文本片段
+    """
+    step = max(1, chunk_chars)
+    for start in range(0, len(text), step):
+        yield text[start : start + step]
+
+
+class KnowledgeBaseVersions:
+    """
+    知识库内容版本号
+
+    启用Redis时版本号保存在Redis中（所有worker共享），否则保存在进程内。
+    Redis不可用时读取返回None，调用方应跳过缓存。
+    """
+
+    def __init__(self, use_redis: bool = False):
+        """
+        初始化版本号存储
+
+        Args:
+            use_redis: 是否使用Redis保存版本号
+        """
+        self.use_redis = use_redis
+        self._local: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _redis_key(kb_id: int) -> str:
+        return RedisKeys.format_key(RedisKeys.KNOWLEDGE_BASE_VERSION, kb_id=kb_id)
+
+    def get_many(self, kb_ids: Sequence[int]) -> Optional[List[int]]:
+        """
+        读取知识库内容版本号
+
+        Args:
+            kb_ids: 知识库ID列表
+
+        Returns:
+            Optional[List[int]]: 与输入顺序一致的版本号，无法读取时返回None
+        """
+        if not self.use_redis:
+            with self._lock:
+                return [self._local.get(kb_id, 0) for kb_id in kb_ids]
+
+        try:
+            values = get_redis_client().mget([self._redis_key(kb_id) for kb_id in kb_ids])
+        except RedisError as e:
+            logger.warning(f"读取知识库版本号失败，跳过答案缓存: {str(e)}")
+            return None
+        return [int(value) if value else 0 for value in values]
+
+    def bump(self, kb_ids: Sequence[int]) -> None:
+        """
+        递增知识库内容版本号
+
+        Args:
+            kb_ids: 知识库ID列表
+        """
+        with self._lock:
+            for kb_id in kb_ids:
+                self._local[kb_id] = self._local.get(kb_id, 0) + 1
+
+        if not self.use_redis:
+            return
+        try:
+            pipe = get_redis_client().pipeline()
+            for kb_id in kb_ids:
+                pipe.incr(self._redis_key(kb_id))
+            pipe.execute()
+        except RedisError as e:
+            logger.warning(f"递增知识库版本号失败: kb_ids={list(kb_ids)}, error={str(e)}")
+
+
+@dataclass
+class CachedAnswer:
+    """缓存的答案"""
+
+    question: str
+    answer: str
+    sources: List[Any]
+    prompt_tokens: int
+    completion_tokens: int
+    similarity: float = 1.0
+
+    @property
+    def tokens_saved(self) -> int:
+        """命中时节省的token数"""
+        return self.prompt_tokens + self.completion_tokens
+
+
+class _Scope:
+    """同一缓存范围内的答案及其问题向量矩阵"""
+
+    def __init__(self, kb_ids: Sequence[int]):
+        self.kb_ids = frozenset(kb_ids)
+        self.answers: List[CachedAnswer] = []
+        self.expires: List[float] = []
+        self.vectors: Optional[np.ndarray] = None
+
+    def prune(self, now: float) -> int:
+        keep = [i for i, expires_at in enumerate(self.expires) if expires_at > now]
+        removed = len(self.answers) - len(keep)
+        if removed:
+            self.answers = [self.answers[i] for i in keep]
+            self.expires = [self.expires[i] for i in keep]
+            self.vectors = self.vectors[keep] if keep else None
+        return removed
+
+    def append(self, answer: CachedAnswer, vector: np.ndarray, expires_at: float) -> None:
+        self.answers.append(answer)
+        self.expires.append(expires_at)
+        row = vector[np.newaxis, :]
+        self.vectors = row if self.vectors is None else np.vstack([self.vectors, row])
+
+    def pop_oldest(self) -> None:
+        self.answers.pop(0)
+        self.expires.pop(0)
+        self.vectors = self.vectors[1:] if self.answers else None
+
+
+class SemanticAnswerCache:
+    """
+    RAG答案语义缓存
+
+    缓存范围按最近使用顺序淘汰，总条目数超过上限时从最久未使用的范围中
+    淘汰最早的条目。线程安全。
+    """
+
+    def __init__(
+        self,
+        versions: Optional[KnowledgeBaseVersions] = None,
+        max_entries: int = 2000,
+        ttl_seconds: int = 3600,
+        similarity_threshold: float = 0.95,
+    ):
+        """
+        初始化答案缓存
+
+        Args:
+            versions: 知识库内容版本号存储
+            max_entries: 最大缓存条目数
+            ttl_seconds: 条目有效期（秒）
+            similarity_threshold: 命中所需的最小余弦相似度
+        """
+        self.versions = versions or KnowledgeBaseVersions()
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._scopes: "OrderedDict[str, _Scope]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def scope(self, kb_ids: Sequence[int], variant: str = "") -> Optional[str]:
+        """
+        计算缓存范围键
+
+        Args:
+            kb_ids: 知识库ID列表
+            variant: 影响答案的其他因素（提示模板、检索数量、模型等）
+
+        Returns:
+            Optional[str]: 范围键，版本号不可用时返回None
+        """
+        ids = sorted(set(kb_ids))
+        versions = self.versions.get_many(ids)
+        if versions is None:
+            return None
+        raw = ",".join(f"{kb_id}@{version}" for kb_id, version in zip(ids, versions))
+        return hashlib.sha256(f"{raw}|{variant}".encode("utf-8")).hexdigest()
+
+    async def ascope(self, kb_ids: Sequence[int], variant: str = "") -> Optional[str]:
+        """计算缓存范围键（异步版本，版本号保存在Redis时在线程池中读取）"""
+        if not self.versions.use_redis:
+            return self.scope(kb_ids, variant)
+        return await asyncio.to_thread(self.scope, kb_ids, variant)
+
+    def lookup(self, scope: Optional[str], vector: Sequence[float]) -> Optional[CachedAnswer]:
+        """
+        查找相近问题的缓存答案
+
+        Args:
+            scope: 范围键
+            vector: 问题向量
+
+        Returns:
+            Optional[CachedAnswer]: 命中的答案（similarity为实际相似度），未命中返回None
+        """
+        query = _unit_vector(vector)
+        hit: Optional[CachedAnswer] = None
+
+        if scope is not None and query is not None:
+            with self._lock:
+                entry = self._scopes.get(scope)
+                if entry is not None:
+                    self._size -= entry.prune(time.monotonic())
+                    if entry.vectors is not None and entry.vectors.shape[1] == query.shape[0]:
+                        scores = entry.vectors @ query
+                        best = int(np.argmax(scores))
+                        if float(scores[best]) >= self.similarity_threshold:
+                            cached = entry.answers[best]
+                            hit = CachedAnswer(
+                                question=cached.question,
+                                answer=cached.answer,
+                                sources=cached.sources,
+                                prompt_tokens=cached.prompt_tokens,
+                                completion_tokens=cached.completion_tokens,
+                                similarity=float(scores[best]),
+                            )
+                            self._scopes.move_to_end(scope)
+                    if not entry.answers:
+                        del self._scopes[scope]
+                size = self._size
+
+            record_answer_cache_size(size)
+
+        record_answer_cache_lookup(hit is not None, hit.tokens_saved if hit else 0)
+        return hit
+
+    def store(
+        self,
+        scope: Optional[str],
+        kb_ids: Sequence[int],
+        question: str,
+        vector: Sequence[float],
+        answer: str,
+        sources: List[Any],
+        prompt_tokens: int,
+        completion_tokens: int,
+    ) -> None:
+        """
+        缓存答案
+
+        Args:
+            scope: 范围键（None时不缓存）
+            kb_ids: 知识库ID列表（用于失效时清理）
+            question: 问题
+            vector: 问题向量
+            answer: 答案
+            sources: 答案引用的文档片段
+            prompt_tokens: 提示token数
+            completion_tokens: 答案token数
+        """
+        unit = _unit_vector(vector)
+        if scope is None or unit is None or not answer or self.max_entries <= 0:
+            return
+
+        cached = CachedAnswer(
+            question=question,
+            answer=answer,
+            sources=list(sources),
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+        )
+        with self._lock:
+            entry = self._scopes.get(scope)
+            if entry is None:
+                entry = self._scopes[scope] = _Scope(kb_ids)
+            elif entry.vectors is not None and entry.vectors.shape[1] != unit.shape[0]:
+                return
+            entry.append(cached, unit, time.monotonic() + self.ttl_seconds)
+            self._scopes.move_to_end(scope)
+            self._size += 1
+
+            while self._size > self.max_entries and self._scopes:
+                oldest_key, oldest = next(iter(self._scopes.items()))
+                oldest.pop_oldest()
+                self._size -= 1
+                if not oldest.answers:
+                    del self._scopes[oldest_key]
+            size = self._size
+
+        record_answer_cache_size(size)
+
+    def invalidate(self, kb_ids: Sequence[int]) -> None:
+        """
+        使知识库的缓存答案失效
+
+        递增内容版本号，并释放本进程中涉及这些知识库的缓存范围。
+
+        Args:
+            kb_ids: 知识库ID列表
+        """
+        ids = set(kb_ids)
+        if not ids:
+            return
+        self.versions.bump(sorted(ids))
+
+        with self._lock:
+            stale = [key for key, entry in self._scopes.items() if entry.kb_ids & ids]
+            for key in stale:
+                self._size -= len(self._scopes.pop(key).answers)
+            size = self._size
+
+        record_answer_cache_size(size)
+        logger.debug(f"答案缓存已失效: kb_ids={sorted(ids)}, scopes={len(stale)}")
+
+    def clear(self) -> None:
+        """清空缓存条目"""
+        with self._lock:
+            self._scopes.clear()
+            self._size = 0
+        record_answer_cache_size(0)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._size
+
+
+# 全局答案缓存实例
+_answer_cache: Optional[SemanticAnswerCache] = None
+
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """
+    获取全局答案缓存
+
+    Returns:
+        Optional[SemanticAnswerCache]: 缓存实例，未启用时返回None
+    """
+    global _answer_cache
+
+    cache_settings = settings.answer_cache
+    if not cache_settings.answer_cache_enabled:
+        return None
+
+    if _answer_cache is None:
+        _answer_cache = SemanticAnswerCache(
+            versions=KnowledgeBaseVersions(use_redis=cache_settings.answer_cache_redis_enabled),
+            max_entries=cache_settings.answer_cache_max_entries,
+            ttl_seconds=cache_settings.answer_cache_ttl_seconds,
+            similarity_threshold=cache_settings.answer_cache_similarity_threshold,
+        )
+    return _answer_cache
+
+
+def reset_answer_cache() -> None:
+    """
+    重置全局答案缓存
+
+    用于测试或重新加载配置
+    """
+    global _answer_cache
+
+    if _answer_cache is not None:
+        _answer_cache.clear()
+    _answer_cache = None
+
+
+def invalidate_answer_cache(kb_ids: Sequence[int]) -> None:
+    """
+    知识库内容变更后使缓存答案失效（未启用缓存时不做处理）
+
+    Args:
+        kb_ids: 知识库ID列表
+    """
+    cache = get_answer_cache()
+    if cache is None:
+        return
+    try:
+        cache.invalidate(kb_ids)
+    except Exception as e:
+        logger.warning(f"答案缓存失效处理失败: kb_ids={list(kb_ids)}, error={str(e)}")
+
+
+# 导出
+__all__ = [
+    "CachedAnswer",
+    "KnowledgeBaseVersions",
+    "SemanticAnswerCache",
+    "get_answer_cache",
+    "invalidate_answer_cache",
+    "iter_replay_chunks",
+    "reset_answer_cache",
+]
@@ -0,0 +1,246 @@
+"""
+Chroma后端模块
+
+提供VectorStoreManager使用的Chroma客户端后端：
+- embedded: 进程内PersistentClient，直接读写本地持久化目录（开发环境、单进程部署）
+- http: 连接独立的Chroma服务（chroma run），多个uvicorn worker和文档worker共享同一份
+  索引，向量索引内存每个节点只占用一份，不再争用同一SQLite文件
+- numpy: 进程内NumPy矩阵索引（见app.core.numpy_index），适合中小规模知识库
+
+http模式下每个进程复用一个HTTP会话：长连接池大小、连接/读取超时和连接失败重试可配置。
+
+使用方式:
+    backend = build_vector_store_backend()
+    client = backend.create_client()
+    client.heartbeat()
+"""
+
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple
+
+import chromadb
+from chromadb.config import Settings as ChromaSettings
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStoreBackend(ABC):
+    """Chroma客户端后端基类"""
+
+    name = "base"
+
+    @abstractmethod
+    def create_client(self) -> chromadb.ClientAPI:
+        """
+        创建Chroma客户端
+
+        Returns:
+            chromadb.ClientAPI: Chroma客户端
+        """
+
+    def describe(self) -> str:
+        """后端描述（用于日志）"""
+        return self.name
+
+
+class EmbeddedChromaBackend(VectorStoreBackend):
+    """进程内Chroma（本地持久化目录）"""
+
+    name = "embedded"
+
+    def __init__(self, persist_directory: str):
+        """
+        初始化进程内后端
+
+        Args:
+            persist_directory: Chroma持久化目录
+        """
+        self.persist_directory = persist_directory
+
+    def create_client(self) -> chromadb.ClientAPI:
+        return chromadb.PersistentClient(
+            path=self.persist_directory,
+            settings=ChromaSettings(anonymized_telemetry=False),
+        )
+
+    def describe(self) -> str:
+        return f"embedded({self.persist_directory})"
+
+
+def _build_pooled_adapter(pool_size: int, timeout: Tuple[float, float], max_retries: int):
+    """创建带默认超时的requests连接池适配器"""
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    class _PooledTimeoutAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            if kwargs.get("timeout") is None:
+                kwargs["timeout"] = timeout
+            return super().send(request, **kwargs)
+
+    # 只重试连接失败，不重试已发送的写请求
+    retry = Retry(total=max_retries, connect=max_retries, read=0, status=0, backoff_factor=0.2)
+    return _PooledTimeoutAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+
+def configure_http_session(
+    client: chromadb.ClientAPI,
+    pool_size: int,
+    connect_timeout: float,
+    read_timeout: float,
+    max_retries: int,
+) -> bool:
+    """
+    配置Chroma HTTP客户端的连接池和超时
+
+    Chroma客户端内部持有一个HTTP会话（requests.Session或httpx.Client），
+    这里替换其连接池适配器并设置默认超时。
+
+    Args:
+        client: Chroma HTTP客户端
+        pool_size: 长连接池大小
+        connect_timeout: 连接超时（秒）
+        read_timeout: 读取超时（秒）
+        max_retries: 连接失败重试次数
+
+    Returns:
+        bool: 是否配置成功（客户端版本不支持时返回False，使用Chroma默认设置）
+    """
+    server = getattr(client, "_server", None)
+    session = getattr(server, "_session", None)
+    if session is None:
+        return False
+
+    try:
+        import requests
+
+        if isinstance(session, requests.Session):
+            adapter = _build_pooled_adapter(
+                pool_size, (connect_timeout, read_timeout), max_retries
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            return True
+    except ImportError:
+        pass
+
+    try:
+        import httpx
+
+        if isinstance(session, httpx.Client):
+            session.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+            return True
+    except ImportError:
+        pass
+
+    return False
+
+
+class HttpChromaBackend(VectorStoreBackend):
+    """Chroma服务（HTTP）"""
+
+    name = "http"
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        ssl: bool = False,
+        auth_token: Optional[str] = None,
+        pool_size: int = 20,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        max_retries: int = 2,
+    ):
+        """
+        初始化HTTP后端
+
+        Args:
+            host: Chroma服务地址
+            port: Chroma服务端口
+            ssl: 是否使用HTTPS
+            auth_token: 认证令牌
+            pool_size: 长连接池大小
+            connect_timeout: 连接超时（秒）
+            read_timeout: 读取超时（秒）
+            max_retries: 连接失败重试次数
+        """
+        self.host = host
+        self.port = port
+        self.ssl = ssl
+        self.auth_token = auth_token
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+
+    def _headers(self) -> Dict[str, Any]:
+        if not self.auth_token:
+            return {}
+        return {"Authorization": f"Bearer {self.auth_token}"}
+
+    def create_client(self) -> chromadb.ClientAPI:
+        client = chromadb.HttpClient(
+            host=self.host,
+            port=str(self.port),
+            ssl=self.ssl,
+            headers=self._headers(),
+            settings=ChromaSettings(anonymized_telemetry=False),
+        )
+        if not configure_http_session(
+            client,
+            pool_size=self.pool_size,
+            connect_timeout=self.connect_timeout,
+            read_timeout=self.read_timeout,
+            max_retries=self.max_retries,
+        ):
+            logger.warning("当前chromadb版本不支持配置HTTP连接池和超时，使用默认设置")
+        logger.info(f"已连接Chroma服务: {self.describe()}")
+        return client
+
+    def describe(self) -> str:
+        scheme = "https" if self.ssl else "http"
+        return f"{scheme}://{self.host}:{self.port}"
+
+
+def build_vector_store_backend(persist_directory: Optional[str] = None) -> VectorStoreBackend:
+    """
+    根据配置创建Chroma后端
+
+    Args:
+        persist_directory: 进程内模式的持久化目录，默认从配置读取
+
+    Returns:
+        VectorStoreBackend: Chroma后端
+    """
+    vector_settings = settings.vector_db
+    persist_directory = persist_directory or vector_settings.chroma_persist_directory
+    if vector_settings.chroma_mode == "numpy":
+        from app.core.numpy_index import NumpyVectorBackend
+
+        return NumpyVectorBackend(persist_directory)
+    if vector_settings.chroma_mode == "http":
+        return HttpChromaBackend(
+            host=vector_settings.chroma_server_host,
+            port=vector_settings.chroma_server_port,
+            ssl=vector_settings.chroma_server_ssl,
+            auth_token=vector_settings.chroma_server_auth_token,
+            pool_size=vector_settings.chroma_http_pool_size,
+            connect_timeout=vector_settings.chroma_http_connect_timeout_seconds,
+            read_timeout=vector_settings.chroma_http_read_timeout_seconds,
+            max_retries=vector_settings.chroma_http_max_retries,
+        )
+    return EmbeddedChromaBackend(persist_directory)
+
+
+# 导出
+__all__ = [
+    "VectorStoreBackend",
+    "EmbeddedChromaBackend",
+    "HttpChromaBackend",
+    "build_vector_store_backend",
+    "configure_http_session",
+]
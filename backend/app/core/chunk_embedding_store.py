@@ -0,0 +1,420 @@
+"""
+分块向量持久化存储模块
+
+以 sha256(嵌入模型标识 + 分块文本) 为键，将已生成的分块向量保存在本地SQLite文件中
+（默认位于Chroma持久化目录旁）。文档重试、重复上传到其他知识库时，
+已向量化过的分块直接复用存储的向量，无需再次调用嵌入接口。
+
+向量以float32存储，与Chroma索引内部精度一致。
+
+容量与回收：
+- 每条向量记录引用它的 (知识库, 文档)，删除文档或知识库时删除引用，
+  不再被任何文档引用的向量随之删除
+- 条目数超过 chunk_embedding_store_max_entries 时按最近使用时间淘汰最久未用的向量
+  （命中复用时刷新使用时间），淘汰到上限的90%，避免每次写入都触发淘汰
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_EMBEDDING_STORE_FILENAME = "chunk_embeddings.sqlite3"
+
+# SQLite单条语句参数数量上限（保守值）
+_SQLITE_MAX_VARIABLES = 900
+
+# 超过容量上限时淘汰到上限的该比例
+_PRUNE_TARGET_RATIO = 0.9
+
+# 引用未关联文档（document_id为None）时使用的文档ID
+_NO_DOCUMENT = 0
+
+
+def chunk_key(model_id: str, text: str) -> str:
+    """
+    计算分块向量存储键
+
+    Args:
+        model_id: 嵌入模型标识
+        text: 分块文本
+
+    Returns:
+        str: 十六进制SHA256摘要
+    """
+    digest = hashlib.sha256()
+    digest.update(model_id.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update((text or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def default_store_path() -> str:
+    """
+    获取默认存储文件路径（Chroma持久化目录的同级目录下）
+
+    Returns:
+        str: SQLite文件路径
+    """
+    configured = settings.vector_db.chunk_embedding_store_path
+    if configured:
+        return configured
+    persist_dir = os.path.abspath(settings.vector_db.chroma_persist_directory)
+    return os.path.join(os.path.dirname(persist_dir), _CHUNK_EMBEDDING_STORE_FILENAME)
+
+
+class ChunkEmbeddingStore:
+    """
+    分块向量持久化存储
+
+    使用方式:
+        store = get_chunk_embedding_store()
+        found = store.get_many("text-embedding-v1", ["文本1", "文本2"], knowledge_base_id=1, document_id=3)
+        store.put_many("text-embedding-v1", [("文本3", [0.1, 0.2])], knowledge_base_id=1, document_id=3)
+        store.delete_document(knowledge_base_id=1, document_id=3)
+    """
+
+    def __init__(self, path: str, max_entries: int = 0):
+        """
+        初始化存储
+
+        Args:
+            path: SQLite文件路径
+            max_entries: 最大条目数（0表示不限制）
+        """
+        self.path = path
+        self.max_entries = max_entries
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL模式允许多个worker进程并发读写
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunk_embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunk_embeddings)")}
+        if "last_used_at" not in columns:
+            # 旧版本创建的存储：补充最近使用时间列
+            self._conn.execute(
+                "ALTER TABLE chunk_embeddings ADD COLUMN last_used_at REAL NOT NULL DEFAULT 0"
+            )
+            self._conn.execute("UPDATE chunk_embeddings SET last_used_at = created_at")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chunk_embeddings_last_used "
+            "ON chunk_embeddings (last_used_at)"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunk_embedding_refs (
+                key TEXT NOT NULL,
+                knowledge_base_id INTEGER NOT NULL,
+                document_id INTEGER NOT NULL,
+                PRIMARY KEY (key, knowledge_base_id, document_id)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chunk_embedding_refs_owner "
+            "ON chunk_embedding_refs (knowledge_base_id, document_id)"
+        )
+        self._conn.commit()
+        self._entries = int(
+            self._conn.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0]
+        )
+
+    @staticmethod
+    def _encode(vector: Sequence[float]) -> bytes:
+        return array("f", vector).tobytes()
+
+    @staticmethod
+    def _decode(blob: bytes) -> List[float]:
+        values = array("f")
+        values.frombytes(blob)
+        return values.tolist()
+
+    def _add_references(
+        self, keys: Sequence[str], knowledge_base_id: Optional[int], document_id: Optional[int]
+    ) -> None:
+        """记录向量被指定文档引用（调用方持有锁，由调用方提交）"""
+        if knowledge_base_id is None or not keys:
+            return
+        owner = document_id if document_id is not None else _NO_DOCUMENT
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO chunk_embedding_refs (key, knowledge_base_id, document_id) "
+            "VALUES (?, ?, ?)",
+            [(key, knowledge_base_id, owner) for key in keys],
+        )
+
+    def get_many(
+        self,
+        model_id: str,
+        texts: Iterable[str],
+        knowledge_base_id: Optional[int] = None,
+        document_id: Optional[int] = None,
+    ) -> Dict[str, List[float]]:
+        """
+        批量查询已存储的分块向量
+
+        命中的向量刷新最近使用时间；传入知识库ID时记录该文档对命中向量的引用。
+
+        Args:
+            model_id: 嵌入模型标识
+            texts: 分块文本序列
+            knowledge_base_id: 复用向量的知识库ID（可选）
+            document_id: 复用向量的文档ID（可选）
+
+        Returns:
+            Dict[str, List[float]]: 文本 -> 向量（仅包含命中的文本）
+        """
+        key_to_texts: Dict[str, List[str]] = {}
+        for text in texts:
+            key_to_texts.setdefault(chunk_key(model_id, text), []).append(text)
+
+        keys = list(key_to_texts)
+        found: Dict[str, List[float]] = {}
+        hit_keys: List[str] = []
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(keys), _SQLITE_MAX_VARIABLES):
+                part = keys[i : i + _SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" for _ in part)
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM chunk_embeddings WHERE key IN ({placeholders})",
+                    part,
+                ).fetchall()
+                for key, blob in rows:
+                    hit_keys.append(key)
+                    vector = self._decode(blob)
+                    for text in key_to_texts[key]:
+                        found[text] = vector
+            if hit_keys:
+                self._conn.executemany(
+                    "UPDATE chunk_embeddings SET last_used_at = ? WHERE key = ?",
+                    [(now, key) for key in hit_keys],
+                )
+                self._add_references(hit_keys, knowledge_base_id, document_id)
+                self._conn.commit()
+        return found
+
+    def put_many(
+        self,
+        model_id: str,
+        items: Iterable[Tuple[str, Sequence[float]]],
+        knowledge_base_id: Optional[int] = None,
+        document_id: Optional[int] = None,
+    ) -> int:
+        """
+        批量写入分块向量（已存在的键保持不变），超过容量上限时淘汰最久未用的向量
+
+        Args:
+            model_id: 嵌入模型标识
+            items: (文本, 向量) 序列
+            knowledge_base_id: 向量所属知识库ID（可选）
+            document_id: 向量所属文档ID（可选）
+
+        Returns:
+            int: 写入的条目数
+        """
+        now = time.time()
+        rows = [
+            (chunk_key(model_id, text), model_id, len(vector), self._encode(vector), now, now)
+            for text, vector in items
+        ]
+        if not rows:
+            return 0
+        with self._lock:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO chunk_embeddings "
+                "(key, model, dim, vector, created_at, last_used_at) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._entries += max(0, cursor.rowcount)
+            self._add_references([row[0] for row in rows], knowledge_base_id, document_id)
+            self._conn.commit()
+            if self.max_entries and self._entries > self.max_entries:
+                self._prune_locked(int(self.max_entries * _PRUNE_TARGET_RATIO))
+        return len(rows)
+
+    def _prune_locked(self, target: int) -> int:
+        """淘汰最久未用的向量直到条目数不超过target（调用方持有锁）"""
+        total = int(self._conn.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0])
+        excess = total - target
+        if excess <= 0:
+            self._entries = total
+            return 0
+        self._conn.execute(
+            "DELETE FROM chunk_embeddings WHERE key IN "
+            "(SELECT key FROM chunk_embeddings ORDER BY last_used_at, rowid LIMIT ?)",
+            (excess,),
+        )
+        self._conn.execute(
+            "DELETE FROM chunk_embedding_refs WHERE key NOT IN (SELECT key FROM chunk_embeddings)"
+        )
+        self._conn.commit()
+        self._entries = total - excess
+        logger.info(f"分块向量存储淘汰最久未用的向量: {excess} 条, 剩余 {self._entries} 条")
+        return excess
+
+    def prune(self, max_entries: Optional[int] = None) -> int:
+        """
+        按最近使用时间淘汰向量
+
+        Args:
+            max_entries: 保留的最大条目数，默认使用容量上限（未设置上限时不淘汰）
+
+        Returns:
+            int: 淘汰的条目数
+        """
+        limit = self.max_entries if max_entries is None else max_entries
+        if not limit:
+            return 0
+        with self._lock:
+            return self._prune_locked(limit)
+
+    def _delete_references(self, condition: str, params: Tuple) -> int:
+        """删除满足条件的引用及不再被引用的向量，返回删除的向量数"""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"""
+                DELETE FROM chunk_embeddings
+                WHERE key IN (SELECT key FROM chunk_embedding_refs WHERE {condition})
+                  AND NOT EXISTS (
+                      SELECT 1 FROM chunk_embedding_refs AS other
+                      WHERE other.key = chunk_embeddings.key AND NOT ({condition})
+                  )
+                """,
+                params + params,
+            )
+            removed = max(0, cursor.rowcount)
+            self._conn.execute(f"DELETE FROM chunk_embedding_refs WHERE {condition}", params)
+            self._conn.commit()
+            self._entries = max(0, self._entries - removed)
+        return removed
+
+    def delete_document(self, knowledge_base_id: int, document_id: int) -> int:
+        """
+        删除文档对向量的引用，并删除不再被其他文档引用的向量
+
+        Args:
+            knowledge_base_id: 知识库ID
+            document_id: 文档ID
+
+        Returns:
+            int: 删除的向量数
+        """
+        return self._delete_references(
+            "knowledge_base_id = ? AND document_id = ?", (knowledge_base_id, document_id)
+        )
+
+    def delete_knowledge_base(self, knowledge_base_id: int) -> int:
+        """
+        删除知识库全部文档对向量的引用，并删除不再被其他知识库引用的向量
+
+        Args:
+            knowledge_base_id: 知识库ID
+
+        Returns:
+            int: 删除的向量数
+        """
+        return self._delete_references("knowledge_base_id = ?", (knowledge_base_id,))
+
+    def count(self, model_id: Optional[str] = None) -> int:
+        """
+        统计存储的条目数
+
+        Args:
+            model_id: 嵌入模型标识（可选，不传则统计全部）
+
+        Returns:
+            int: 条目数
+        """
+        with self._lock:
+            if model_id is None:
+                row = self._conn.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT COUNT(*) FROM chunk_embeddings WHERE model = ?", (model_id,)
+                ).fetchone()
+        return int(row[0])
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+# 全局分块向量存储实例
+_chunk_embedding_store: Optional[ChunkEmbeddingStore] = None
+_store_lock = threading.Lock()
+
+
+def get_chunk_embedding_store() -> Optional[ChunkEmbeddingStore]:
+    """
+    获取全局分块向量存储实例
+
+    Returns:
+        Optional[ChunkEmbeddingStore]: 存储实例；未启用或初始化失败时返回None
+    """
+    global _chunk_embedding_store
+
+    if not settings.vector_db.chunk_embedding_store_enabled:
+        return None
+
+    if _chunk_embedding_store is None:
+        with _store_lock:
+            if _chunk_embedding_store is None:
+                path = default_store_path()
+                try:
+                    _chunk_embedding_store = ChunkEmbeddingStore(
+                        path, max_entries=settings.vector_db.chunk_embedding_store_max_entries
+                    )
+                    logger.info(f"分块向量存储初始化成功: {path}")
+                except sqlite3.Error as e:
+                    logger.error(f"分块向量存储初始化失败: path={path}, error={str(e)}")
+                    return None
+
+    return _chunk_embedding_store
+
+
+def reset_chunk_embedding_store() -> None:
+    """
+    重置全局分块向量存储
+
+    用于测试或配置更新后重新初始化
+    """
+    global _chunk_embedding_store
+
+    with _store_lock:
+        if _chunk_embedding_store is not None:
+            _chunk_embedding_store.close()
+        _chunk_embedding_store = None
+
+
+# 导出
+__all__ = [
+    "ChunkEmbeddingStore",
+    "chunk_key",
+    "default_store_path",
+    "get_chunk_embedding_store",
+    "reset_chunk_embedding_store",
+]
@@ -0,0 +1,247 @@
+"""
+向量集合别名模块
+
+知识库ID到实际集合名称的映射保存在向量库中的登记集合（kb_collection_aliases）里，
+每个知识库一条记录，所有进程和主机共享。单条记录的upsert是原子的，
+压缩重建时新集合写好并校验后只需一次upsert即可切换，不需要删除原集合再改名：
+
+- 集合名称: 未重建过的知识库为 kb_{id}，重建后为 kb_{id}_g{代数}
+- 解析结果在进程内缓存 vector_alias_refresh_seconds 秒，写入前强制刷新
+- 被替换的旧集合记为retired，保留 vector_compaction_retire_grace_seconds 秒后删除，
+  仍持有旧句柄的进程在此期间可以继续读取
+- 另一条计数记录累计按文档删除的向量数（Chroma不暴露HNSW墓碑数），用于判断是否需要压缩；
+  计数与别名分开保存，删除文档时的累加不会覆盖并发的别名切换
+
+使用方式:
+    aliases = CollectionAliasRegistry(lambda: manager.client)
+    name = aliases.resolve(1)                      # "kb_1" 或 "kb_1_g2"
+    aliases.switch(1, "kb_1_g3", generation=3, retired="kb_1_g2")
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import chromadb
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+ALIAS_COLLECTION_NAME = "kb_collection_aliases"
+
+
+def default_collection_name(knowledge_base_id: int) -> str:
+    """未重建过的知识库集合名称"""
+    return f"kb_{knowledge_base_id}"
+
+
+def generation_collection_name(knowledge_base_id: int, generation: int) -> str:
+    """重建后的知识库集合名称"""
+    if generation <= 0:
+        return default_collection_name(knowledge_base_id)
+    return f"kb_{knowledge_base_id}_g{generation}"
+
+
+class CollectionAliasRegistry:
+    """
+    知识库集合别名登记
+
+    登记集合只保存元数据，向量固定为一维零向量。
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], chromadb.ClientAPI],
+        refresh_seconds: Optional[float] = None,
+    ):
+        """
+        初始化别名登记
+
+        Args:
+            client_factory: 返回共享Chroma客户端的函数（客户端懒加载）
+            refresh_seconds: 解析结果缓存时间（秒），默认从配置读取
+        """
+        self._client_factory = client_factory
+        self.refresh_seconds = (
+            settings.vector_db.vector_alias_refresh_seconds
+            if refresh_seconds is None
+            else refresh_seconds
+        )
+        self._collection = None
+        self._cache: Dict[int, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _get_collection(self, create: bool):
+        """获取登记集合，不存在且create为False时返回None"""
+        if self._collection is not None:
+            return self._collection
+        client = self._client_factory()
+        if create:
+            collection = client.get_or_create_collection(
+                ALIAS_COLLECTION_NAME, embedding_function=None
+            )
+        else:
+            try:
+                collection = client.get_collection(ALIAS_COLLECTION_NAME, embedding_function=None)
+            except Exception:
+                # 从未重建或记录过删除，登记集合尚不存在
+                return None
+        self._collection = collection
+        return collection
+
+    @staticmethod
+    def _record_id(knowledge_base_id: int) -> str:
+        return default_collection_name(knowledge_base_id)
+
+    @staticmethod
+    def _counter_id(knowledge_base_id: int) -> str:
+        return f"{default_collection_name(knowledge_base_id)}_tombstones"
+
+    def get_record(self, knowledge_base_id: int) -> Dict[str, Any]:
+        """
+        读取知识库的别名记录
+
+        Args:
+            knowledge_base_id: 知识库ID
+
+        Returns:
+            dict: collection、generation、retired、retired_at、tombstones（不存在时为默认值）
+        """
+        record: Dict[str, Any] = {
+            "collection": default_collection_name(knowledge_base_id),
+            "generation": 0,
+            "retired": "",
+            "retired_at": 0.0,
+            "tombstones": 0,
+        }
+        collection = self._get_collection(create=False)
+        if collection is None:
+            return record
+        record_id = self._record_id(knowledge_base_id)
+        found = collection.get(
+            ids=[record_id, self._counter_id(knowledge_base_id)], include=["metadatas"]
+        )
+        for found_id, metadata in zip(found["ids"], found["metadatas"]):
+            metadata = metadata or {}
+            if found_id == record_id:
+                record.update(
+                    {key: value for key, value in metadata.items() if key != "tombstones"}
+                )
+            else:
+                record["tombstones"] = int(metadata.get("tombstones", 0))
+        return record
+
+    def _write(self, record_id: str, metadata: Dict[str, Any]) -> None:
+        collection = self._get_collection(create=True)
+        collection.upsert(ids=[record_id], embeddings=[[0.0]], metadatas=[metadata])
+
+    def _write_record(self, knowledge_base_id: int, record: Dict[str, Any]) -> None:
+        self._write(
+            self._record_id(knowledge_base_id),
+            {
+                "collection": record["collection"],
+                "generation": int(record["generation"]),
+                "retired": record["retired"],
+                "retired_at": float(record["retired_at"]),
+            },
+        )
+        with self._lock:
+            self._cache[knowledge_base_id] = (record["collection"], time.monotonic())
+
+    def resolve(self, knowledge_base_id: int, refresh: bool = False) -> str:
+        """
+        解析知识库当前使用的集合名称
+
+        Args:
+            knowledge_base_id: 知识库ID
+            refresh: 是否忽略进程内缓存（写入前使用）
+
+        Returns:
+            str: 集合名称
+        """
+        now = time.monotonic()
+        if not refresh:
+            with self._lock:
+                cached = self._cache.get(knowledge_base_id)
+            if cached is not None and now - cached[1] < self.refresh_seconds:
+                return cached[0]
+
+        name = self.get_record(knowledge_base_id)["collection"]
+        with self._lock:
+            self._cache[knowledge_base_id] = (name, now)
+        return name
+
+    def switch(
+        self, knowledge_base_id: int, collection_name: str, generation: int, retired: str
+    ) -> None:
+        """
+        将知识库切换到新集合（单条记录upsert，原子生效），并清零删除计数
+
+        Args:
+            knowledge_base_id: 知识库ID
+            collection_name: 新集合名称
+            generation: 新集合代数
+            retired: 被替换的旧集合名称（宽限期后删除）
+        """
+        self._write_record(
+            knowledge_base_id,
+            {
+                "collection": collection_name,
+                "generation": generation,
+                "retired": retired,
+                "retired_at": time.time(),
+            },
+        )
+        self._write(self._counter_id(knowledge_base_id), {"tombstones": 0})
+        logger.info(
+            f"知识库集合已切换: kb_id={knowledge_base_id}, {retired} -> {collection_name}"
+        )
+
+    def clear_retired(self, knowledge_base_id: int) -> None:
+        """旧集合删除后清除retired标记"""
+        record = self.get_record(knowledge_base_id)
+        if record["retired"]:
+            record.update(retired="", retired_at=0.0)
+            self._write_record(knowledge_base_id, record)
+
+    def add_tombstones(self, knowledge_base_id: int, count: int) -> None:
+        """
+        累计按文档删除的向量数
+
+        多个进程同时累加时可能丢失部分计数，只用于判断是否需要压缩。
+
+        Args:
+            knowledge_base_id: 知识库ID
+            count: 删除的向量数
+        """
+        if count <= 0:
+            return
+        tombstones = int(self.get_record(knowledge_base_id)["tombstones"]) + count
+        self._write(self._counter_id(knowledge_base_id), {"tombstones": tombstones})
+
+    def delete(self, knowledge_base_id: int) -> None:
+        """删除知识库的别名记录"""
+        with self._lock:
+            self._cache.pop(knowledge_base_id, None)
+        collection = self._get_collection(create=False)
+        if collection is not None:
+            collection.delete(
+                ids=[self._record_id(knowledge_base_id), self._counter_id(knowledge_base_id)]
+            )
+
+    def forget(self) -> None:
+        """丢弃缓存的登记集合句柄和解析结果（客户端关闭后调用）"""
+        with self._lock:
+            self._collection = None
+            self._cache.clear()
+
+
+# 导出
+__all__ = [
+    "ALIAS_COLLECTION_NAME",
+    "CollectionAliasRegistry",
+    "default_collection_name",
+    "generation_collection_name",
+]
@@ -0,0 +1,567 @@
+"""
+对话记忆存储模块
+
+替代按对话无限增长的 ConversationBufferMemory 字典，为对话管理器和RAG管理器
+提供有界的对话记忆：
+- 进程内LRU层（对话数上限 + 空闲过期时间）
+- 可选的Redis共享层（多worker之间共享同一份记忆）
+- 按token预算截取最近的历史消息窗口，单个对话占用的内存有上限
+
+消息格式与消息表一致: {"role": "USER" | "ASSISTANT", "content": "..."}。
+
+启用Redis层时，每次写入生成新的修订号；读取时先比较进程内副本与Redis中的
+修订号，一致则直接使用进程内副本，否则从Redis重新加载，避免各worker记忆不一致。
+
+使用方式:
+    from app.core.conversation_memory import get_conversation_memory_store
+
+    store = get_conversation_memory_store()
+    history = store.load("chat", conversation_id) or []
+    store.append_turn("chat", conversation_id, "你好", "你好！有什么可以帮你？")
+"""
+
+import asyncio
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.core.redis import RedisKeys, get_redis_client
+from app.core.tokenizer import count_tokens
+from app.middleware.prometheus_middleware import (
+    record_conversation_memory_eviction, record_conversation_memory_usage)
+
+logger = logging.getLogger(__name__)
+
+# 记忆中保留的消息角色
+MEMORY_ROLES = ("USER", "ASSISTANT")
+
+
+def window_messages(
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    max_messages: int,
+    token_counter: Callable[[str], int] = count_tokens,
+) -> List[Dict[str, str]]:
+    """
+    按token预算截取最近的历史消息
+
+    从最新的消息向前累加，超出token预算或消息数上限时停止；
+    窗口不以AI回复开头，保证历史从用户消息开始。
+
+    Args:
+        messages: 按时间顺序排列的消息列表
+        max_tokens: token预算
+        max_messages: 最大消息数
+        token_counter: token计数函数
+
+    Returns:
+        List[Dict[str, str]]: 截取后的消息列表（仅保留role和content）
+    """
+    window: List[Dict[str, str]] = []
+    used = 0
+    for msg in reversed(messages):
+        role = msg.get("role", "")
+        if role not in MEMORY_ROLES:
+            continue
+        if len(window) >= max_messages:
+            break
+        content = msg.get("content") or ""
+        tokens = token_counter(content)
+        if used + tokens > max_tokens:
+            break
+        used += tokens
+        window.append({"role": role, "content": content})
+
+    window.reverse()
+    while window and window[0]["role"] != "USER":
+        window.pop(0)
+    return window
+
+
+@dataclass
+class MemoryEntry:
+    """对话记忆条目"""
+
+    revision: str
+    messages: List[Dict[str, str]]
+    user_turns: int = 0
+
+    def size_bytes(self) -> int:
+        """消息文本占用的近似字节数"""
+        return sys.getsizeof(self.messages) + sum(
+            sys.getsizeof(msg["content"]) for msg in self.messages
+        )
+
+
+class ConversationMemoryTier(ABC):
+    """
+    对话记忆存储层接口
+
+    子类需实现 get/set/delete，并通过 tier 标识存储层级。
+    """
+
+    tier: str = "base"
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[MemoryEntry]:
+        """读取对话记忆，不存在时返回None"""
+
+    @abstractmethod
+    def set(self, key: str, entry: MemoryEntry) -> None:
+        """写入对话记忆"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """删除对话记忆"""
+
+    def clear(self) -> None:
+        """清空存储层（可选实现）"""
+        return None
+
+
+class InMemoryConversationTier(ConversationMemoryTier):
+    """
+    进程内LRU对话记忆层
+
+    使用OrderedDict实现LRU淘汰，每次访问刷新过期时间（空闲过期），
+    因此链表头部总是最早过期的条目，写入时顺带清理。线程安全。
+    """
+
+    tier = "memory"
+
+    def __init__(self, max_entries: int = 5000, ttl_seconds: int = 3600, name: str = "memory"):
+        """
+        初始化进程内记忆层
+
+        Args:
+            max_entries: 最多保留的对话数
+            ttl_seconds: 空闲过期时间（秒）
+            name: 存储名称（监控指标标签）
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, MemoryEntry, int]]" = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+
+    def _pop(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._size_bytes -= size
+
+    def _evict_expired(self, now: float) -> int:
+        expired = 0
+        while self._entries:
+            key, (expires_at, _, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            self._pop(key)
+            expired += 1
+        return expired
+
+    def _publish(self, expired: int = 0, evicted: int = 0) -> None:
+        record_conversation_memory_usage(self.name, len(self._entries), self._size_bytes)
+        record_conversation_memory_eviction(self.name, "ttl", expired)
+        record_conversation_memory_eviction(self.name, "lru", evicted)
+
+    def get(self, key: str) -> Optional[MemoryEntry]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, entry, size = item
+            if expires_at <= now:
+                self._pop(key)
+                self._publish(expired=1)
+                return None
+            self._entries[key] = (now + self.ttl_seconds, entry, size)
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: MemoryEntry) -> None:
+        if self.max_entries <= 0:
+            return
+        now = time.monotonic()
+        size = entry.size_bytes()
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (now + self.ttl_seconds, entry, size)
+            self._size_bytes += size
+
+            expired = self._evict_expired(now)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._pop(next(iter(self._entries)))
+                evicted += 1
+            self._publish(expired, evicted)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+                self._publish()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+            self._publish()
+
+    def stats(self) -> Dict[str, int]:
+        """返回当前对话数和近似占用字节数"""
+        with self._lock:
+            return {"entries": len(self._entries), "size_bytes": self._size_bytes}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class RedisConversationTier(ConversationMemoryTier):
+    """
+    Redis共享对话记忆层
+
+    每个对话存为一个Hash: rev（修订号）、messages（JSON）和 user_turns。
+    Redis不可用时记录警告并视为未命中，不影响主流程。
+    """
+
+    tier = "redis"
+
+    def __init__(self, ttl_seconds: int = 3600):
+        """
+        初始化Redis记忆层
+
+        Args:
+            ttl_seconds: 空闲过期时间（秒），每次写入时刷新
+        """
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _redis_key(key: str) -> str:
+        namespace, _, conversation_id = key.partition(":")
+        return RedisKeys.format_key(
+            RedisKeys.CONVERSATION_MEMORY,
+            namespace=namespace,
+            conversation_id=conversation_id,
+        )
+
+    def get_revision(self, key: str) -> Optional[str]:
+        """
+        读取对话记忆的修订号
+
+        Returns:
+            Optional[str]: 修订号，不存在或Redis不可用时返回None
+        """
+        try:
+            return get_redis_client().hget(self._redis_key(key), "rev")
+        except RedisError as e:
+            logger.warning(f"读取Redis对话记忆修订号失败: {str(e)}")
+            return None
+
+    def get(self, key: str) -> Optional[MemoryEntry]:
+        try:
+            revision, payload, user_turns = get_redis_client().hmget(
+                self._redis_key(key), "rev", "messages", "user_turns"
+            )
+        except RedisError as e:
+            logger.warning(f"读取Redis对话记忆失败: {str(e)}")
+            return None
+        if not revision or payload is None:
+            return None
+        try:
+            return MemoryEntry(
+                revision=revision,
+                messages=json.loads(payload),
+                user_turns=int(user_turns or 0),
+            )
+        except (ValueError, TypeError) as e:
+            logger.warning(f"解析Redis对话记忆失败: {str(e)}")
+            return None
+
+    def set(self, key: str, entry: MemoryEntry) -> None:
+        redis_key = self._redis_key(key)
+        try:
+            pipe = get_redis_client().pipeline()
+            pipe.hset(
+                redis_key,
+                mapping={
+                    "rev": entry.revision,
+                    "messages": json.dumps(entry.messages, ensure_ascii=False),
+                    "user_turns": entry.user_turns,
+                },
+            )
+            pipe.expire(redis_key, self.ttl_seconds)
+            pipe.execute()
+        except RedisError as e:
+            logger.warning(f"写入Redis对话记忆失败: {str(e)}")
+
+    def delete(self, key: str) -> None:
+        try:
+            get_redis_client().delete(self._redis_key(key))
+        except RedisError as e:
+            logger.warning(f"删除Redis对话记忆失败: {str(e)}")
+
+
+class ConversationMemoryStore:
+    """
+    分层对话记忆存储
+
+    写入时按token预算截取窗口后写入所有存储层；读取时优先使用进程内副本，
+    启用共享层时先校验修订号，不一致则从共享层重新加载并回填进程内层。
+    """
+
+    def __init__(
+        self,
+        local: Optional[InMemoryConversationTier] = None,
+        shared: Optional[RedisConversationTier] = None,
+        max_tokens: int = 3000,
+        max_messages: int = 20,
+        token_counter: Callable[[str], int] = count_tokens,
+    ):
+        """
+        初始化记忆存储
+
+        Args:
+            local: 进程内存储层
+            shared: 共享存储层
+            max_tokens: 每个对话保留的历史token预算
+            max_messages: 每个对话保留的最大消息数
+            token_counter: token计数函数
+        """
+        self.local = local
+        self.shared = shared
+        self.max_tokens = max_tokens
+        self.max_messages = max_messages
+        self.token_counter = token_counter
+
+    @staticmethod
+    def _key(namespace: str, conversation_id) -> str:
+        return f"{namespace}:{conversation_id}"
+
+    def window(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """按本存储的token预算截取消息窗口"""
+        return window_messages(
+            messages, self.max_tokens, self.max_messages, self.token_counter
+        )
+
+    def get_entry(self, namespace: str, conversation_id) -> Optional[MemoryEntry]:
+        """
+        读取对话记忆条目（不截取窗口）
+
+        Args:
+            namespace: 命名空间（如 "chat", "rag"）
+            conversation_id: 对话ID
+
+        Returns:
+            Optional[MemoryEntry]: 记忆条目，不存在时返回None
+        """
+        key = self._key(namespace, conversation_id)
+        entry = self.local.get(key) if self.local is not None else None
+
+        if self.shared is not None:
+            if entry is None or self.shared.get_revision(key) not in (None, entry.revision):
+                remote = self.shared.get(key)
+                if remote is not None:
+                    entry = remote
+                    if self.local is not None:
+                        self.local.set(key, remote)
+
+        return entry
+
+    def put_entry(
+        self,
+        namespace: str,
+        conversation_id,
+        messages: List[Dict[str, str]],
+        user_turns: int = 0,
+    ) -> MemoryEntry:
+        """
+        写入对话记忆条目（不截取窗口），生成新的修订号
+
+        Args:
+            namespace: 命名空间
+            conversation_id: 对话ID
+            messages: 消息列表
+            user_turns: 对话中的用户消息总数
+
+        Returns:
+            MemoryEntry: 写入的记忆条目
+        """
+        key = self._key(namespace, conversation_id)
+        entry = MemoryEntry(revision=uuid.uuid4().hex, messages=messages, user_turns=user_turns)
+        if self.local is not None:
+            self.local.set(key, entry)
+        if self.shared is not None:
+            self.shared.set(key, entry)
+        return entry
+
+    def load(self, namespace: str, conversation_id) -> Optional[List[Dict[str, str]]]:
+        """
+        读取对话记忆
+
+        Args:
+            namespace: 命名空间（如 "chat", "rag"）
+            conversation_id: 对话ID
+
+        Returns:
+            Optional[List[Dict[str, str]]]: 消息列表，记忆不存在时返回None
+        """
+        entry = self.get_entry(namespace, conversation_id)
+        return list(entry.messages) if entry is not None else None
+
+    def replace(
+        self, namespace: str, conversation_id, messages: List[Dict[str, str]]
+    ) -> List[Dict[str, str]]:
+        """
+        覆盖对话记忆
+
+        Args:
+            namespace: 命名空间
+            conversation_id: 对话ID
+            messages: 按时间顺序排列的消息列表
+
+        Returns:
+            List[Dict[str, str]]: 截取窗口后实际保存的消息
+        """
+        entry = self.put_entry(namespace, conversation_id, self.window(messages))
+        return list(entry.messages)
+
+    def append_turn(
+        self, namespace: str, conversation_id, user_message: str, ai_message: str
+    ) -> List[Dict[str, str]]:
+        """
+        追加一轮问答
+
+        Args:
+            namespace: 命名空间
+            conversation_id: 对话ID
+            user_message: 用户消息
+            ai_message: AI回复
+
+        Returns:
+            List[Dict[str, str]]: 截取窗口后实际保存的消息
+        """
+        messages = self.load(namespace, conversation_id) or []
+        messages.append({"role": "USER", "content": user_message})
+        messages.append({"role": "ASSISTANT", "content": ai_message})
+        return self.replace(namespace, conversation_id, messages)
+
+    def delete(self, namespace: str, conversation_id) -> None:
+        """删除对话记忆"""
+        key = self._key(namespace, conversation_id)
+        if self.local is not None:
+            self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    async def aload(self, namespace: str, conversation_id) -> Optional[List[Dict[str, str]]]:
+        """异步读取对话记忆（启用共享层时在线程中访问Redis）"""
+        if self.shared is None:
+            return self.load(namespace, conversation_id)
+        return await asyncio.to_thread(self.load, namespace, conversation_id)
+
+    async def areplace(
+        self, namespace: str, conversation_id, messages: List[Dict[str, str]]
+    ) -> List[Dict[str, str]]:
+        """异步覆盖对话记忆（启用共享层时在线程中访问Redis）"""
+        if self.shared is None:
+            return self.replace(namespace, conversation_id, messages)
+        return await asyncio.to_thread(self.replace, namespace, conversation_id, messages)
+
+    async def aappend_turn(
+        self, namespace: str, conversation_id, user_message: str, ai_message: str
+    ) -> List[Dict[str, str]]:
+        """异步追加一轮问答（启用共享层时在线程中访问Redis）"""
+        if self.shared is None:
+            return self.append_turn(namespace, conversation_id, user_message, ai_message)
+        return await asyncio.to_thread(
+            self.append_turn, namespace, conversation_id, user_message, ai_message
+        )
+
+
+def build_conversation_memory_store() -> ConversationMemoryStore:
+    """
+    根据配置创建对话记忆存储
+
+    Returns:
+        ConversationMemoryStore: 记忆存储实例
+    """
+    memory_settings = settings.conversation_memory
+
+    local = None
+    if memory_settings.conversation_memory_max_conversations > 0:
+        local = InMemoryConversationTier(
+            max_entries=memory_settings.conversation_memory_max_conversations,
+            ttl_seconds=memory_settings.conversation_memory_ttl_seconds,
+        )
+    shared = None
+    if memory_settings.conversation_memory_redis_enabled:
+        shared = RedisConversationTier(ttl_seconds=memory_settings.conversation_memory_ttl_seconds)
+
+    logger.info(
+        f"初始化对话记忆存储: tiers={[t.tier for t in (local, shared) if t is not None]}, "
+        f"max_tokens={memory_settings.conversation_memory_max_tokens}"
+    )
+    return ConversationMemoryStore(
+        local=local,
+        shared=shared,
+        max_tokens=memory_settings.conversation_memory_max_tokens,
+        max_messages=memory_settings.conversation_memory_max_messages,
+    )
+
+
+# 全局记忆存储实例
+_memory_store: Optional[ConversationMemoryStore] = None
+
+
+def get_conversation_memory_store() -> ConversationMemoryStore:
+    """
+    获取全局对话记忆存储
+
+    Returns:
+        ConversationMemoryStore: 记忆存储实例
+    """
+    global _memory_store
+
+    if _memory_store is None:
+        _memory_store = build_conversation_memory_store()
+    return _memory_store
+
+
+def reset_conversation_memory_store() -> None:
+    """
+    重置全局对话记忆存储
+
+    用于测试或重新加载配置
+    """
+    global _memory_store
+
+    if _memory_store is not None and _memory_store.local is not None:
+        _memory_store.local.clear()
+    _memory_store = None
+
+
+# 导出
+__all__ = [
+    "ConversationMemoryStore",
+    "ConversationMemoryTier",
+    "InMemoryConversationTier",
+    "MemoryEntry",
+    "RedisConversationTier",
+    "build_conversation_memory_store",
+    "get_conversation_memory_store",
+    "reset_conversation_memory_store",
+    "window_messages",
+]
@@ -0,0 +1,306 @@
+"""
+DashScope原生异步流式客户端模块
+
+通过httpx直接调用DashScope文本生成HTTP接口（SSE），替代在线程中逐块
+迭代同步SDK生成器的方式：
+- 每个token块不再需要一次线程池调度，流式响应期间不占用工作线程
+- 使用长连接复用的AsyncClient，避免每次请求重新建立TLS连接
+
+使用方式:
+    client = get_dashscope_stream_client()
+    async for text in client.stream_generation(
+        model="qwen-turbo", prompt="你好", api_key=api_key
+    ):
+        print(text)
+"""
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 文本生成接口路径（相对于 dashscope_base_url）
+GENERATION_PATH = "/services/aigc/text-generation/generation"
+
+
+class DashScopeAPIError(Exception):
+    """DashScope接口返回错误"""
+
+    def __init__(self, status_code: int, code: Optional[str], message: str):
+        """
+        Args:
+            status_code: HTTP状态码
+            code: DashScope错误码
+            message: 错误信息
+        """
+        self.status_code = status_code
+        self.code = code
+        self.message = message
+        super().__init__(f"DashScope错误: status={status_code}, code={code}, message={message}")
+
+
+@dataclass
+class SSEEvent:
+    """Server-Sent Events事件"""
+
+    event: str = "message"
+    data: str = ""
+    id: Optional[str] = None
+    comments: list = field(default_factory=list)
+
+
+async def iter_sse_events(lines: AsyncIterator[str]) -> AsyncIterator[SSEEvent]:
+    """
+    解析SSE文本行为事件
+
+    Args:
+        lines: 按行迭代的响应文本（不含换行符）
+
+    Yields:
+        SSEEvent: 事件（空行表示一个事件结束）
+    """
+    event = SSEEvent()
+    data_lines = []
+    has_fields = False
+
+    async for line in lines:
+        if not line:
+            if has_fields:
+                event.data = "\n".join(data_lines)
+                yield event
+            event = SSEEvent()
+            data_lines = []
+            has_fields = False
+            continue
+
+        if line.startswith(":"):
+            # 注释行，DashScope用 ":HTTP_STATUS/200" 携带状态码
+            event.comments.append(line[1:])
+            has_fields = True
+            continue
+
+        name, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        has_fields = True
+        if name == "data":
+            data_lines.append(value)
+        elif name == "event":
+            event.event = value
+        elif name == "id":
+            event.id = value
+
+    if has_fields:
+        event.data = "\n".join(data_lines)
+        yield event
+
+
+def _event_status(event: SSEEvent, default: int) -> int:
+    for comment in event.comments:
+        if comment.startswith("HTTP_STATUS/"):
+            try:
+                return int(comment[len("HTTP_STATUS/") :])
+            except ValueError:
+                break
+    return default
+
+
+def extract_output_text(output: Any) -> Optional[str]:
+    """
+    从DashScope响应的output中提取文本
+
+    兼容 text 格式（output.text）和 message 格式（output.choices[0].message.content）。
+
+    Args:
+        output: 响应中的output字段
+
+    Returns:
+        Optional[str]: 文本内容，无法提取时返回None
+    """
+    if not isinstance(output, dict):
+        return None
+    if output.get("text") is not None:
+        return output["text"]
+    choices = output.get("choices") or []
+    if choices:
+        return (choices[0].get("message") or {}).get("content")
+    return None
+
+
+class DashScopeStreamClient:
+    """
+    DashScope异步流式客户端
+
+    AsyncClient绑定创建它的事件循环，检测到事件循环变化时重新创建。
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+    ):
+        """
+        Args:
+            base_url: 接口根地址，默认从配置读取
+            connect_timeout: 连接超时（秒），默认从配置读取
+            read_timeout: 两个数据块之间的最长等待时间（秒），默认从配置读取
+            max_connections: 连接池最大连接数，默认从配置读取
+            max_keepalive_connections: 连接池最大空闲长连接数，默认从配置读取
+        """
+        tongyi = settings.tongyi
+        self.base_url = (base_url or tongyi.dashscope_base_url).rstrip("/")
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout or tongyi.tongyi_stream_connect_timeout,
+            read=read_timeout or tongyi.tongyi_stream_read_timeout,
+            write=connect_timeout or tongyi.tongyi_stream_connect_timeout,
+            pool=connect_timeout or tongyi.tongyi_stream_connect_timeout,
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_connections or tongyi.tongyi_http_max_connections,
+            max_keepalive_connections=(
+                max_keepalive_connections or tongyi.tongyi_http_max_keepalive_connections
+            ),
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def stream_generation(
+        self,
+        model: str,
+        prompt: str,
+        api_key: str,
+        parameters: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        流式调用文本生成接口
+
+        Args:
+            model: 模型名称
+            prompt: 提示词
+            api_key: DashScope API密钥
+            parameters: 生成参数（默认使用 message 格式增量输出）
+
+        Yields:
+            str: 增量文本
+
+        Raises:
+            DashScopeAPIError: 接口返回错误
+            httpx.HTTPError: 网络错误或超时
+        """
+        body = {
+            "model": model,
+            "input": {"prompt": prompt},
+            "parameters": {
+                "result_format": "message",
+                "incremental_output": True,
+                **(parameters or {}),
+            },
+        }
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Accept": "text/event-stream",
+            "X-DashScope-SSE": "enable",
+        }
+
+        client = self._get_client()
+        chunk_count = 0
+        async with client.stream("POST", GENERATION_PATH, json=body, headers=headers) as response:
+            if response.status_code != 200:
+                await response.aread()
+                try:
+                    error = response.json()
+                except ValueError:
+                    error = {"message": response.text}
+                raise DashScopeAPIError(
+                    response.status_code, error.get("code"), error.get("message", "")
+                )
+
+            async for event in iter_sse_events(response.aiter_lines()):
+                if not event.data:
+                    continue
+                try:
+                    message = json.loads(event.data)
+                except json.JSONDecodeError:
+                    logger.warning(f"DashScope流式响应无法解析: {event.data[:200]}")
+                    continue
+
+                status = _event_status(event, 200)
+                if event.event == "error" or status != 200:
+                    raise DashScopeAPIError(
+                        status, message.get("code"), message.get("message", "")
+                    )
+
+                text = extract_output_text(message.get("output"))
+                if text:
+                    chunk_count += 1
+                    yield text
+
+        logger.debug(f"DashScope流式调用完成: model={model}, chunks={chunk_count}")
+
+    async def aclose(self) -> None:
+        """关闭连接池"""
+        if self._client is not None:
+            client, self._client = self._client, None
+            if self._client_loop is asyncio.get_running_loop():
+                await client.aclose()
+
+
+# 全局客户端实例
+_stream_client: Optional[DashScopeStreamClient] = None
+
+
+def get_dashscope_stream_client() -> DashScopeStreamClient:
+    """
+    获取全局DashScope流式客户端
+
+    Returns:
+        DashScopeStreamClient: 客户端实例
+    """
+    global _stream_client
+
+    if _stream_client is None:
+        _stream_client = DashScopeStreamClient()
+    return _stream_client
+
+
+async def close_dashscope_stream_client() -> None:
+    """关闭全局DashScope流式客户端（应用关闭时调用）"""
+    global _stream_client
+
+    if _stream_client is not None:
+        await _stream_client.aclose()
+        _stream_client = None
+
+
+# 导出
+__all__ = [
+    "DashScopeAPIError",
+    "DashScopeStreamClient",
+    "GENERATION_PATH",
+    "SSEEvent",
+    "close_dashscope_stream_client",
+    "extract_output_text",
+    "get_dashscope_stream_client",
+    "iter_sse_events",
+]
@@ -0,0 +1,326 @@
+"""
+查询向量缓存模块
+
+为Embeddings对象提供可插拔的查询向量缓存，避免相同问题重复调用嵌入接口：
+- 进程内LRU缓存（带容量和TTL上限）
+- 可选的Redis共享缓存（多worker之间共享）
+
+缓存键由(嵌入模型名称, 规范化文本的SHA256)组成。
+只缓存 embed_query，文档批量向量化（embed_documents）直接透传。
+
+使用方式:
+    from app.core.embedding_cache import CachedEmbeddings, InMemoryEmbeddingCache
+
+    embeddings = CachedEmbeddings(
+        underlying=DashScopeEmbeddings(...),
+        model_name="text-embedding-v1",
+        caches=[InMemoryEmbeddingCache(max_entries=10000, ttl_seconds=86400)],
+    )
+"""
+
+import asyncio
+import base64
+import hashlib
+import logging
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+from langchain_core.embeddings import Embeddings
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.core.redis import RedisKeys, get_redis_client
+from app.middleware.prometheus_middleware import record_embedding_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """
+    规范化查询文本
+
+    统一Unicode形式并折叠空白字符，使仅在空白上不同的问题命中同一缓存。
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        str: 规范化后的文本
+    """
+    return " ".join(unicodedata.normalize("NFKC", text or "").split())
+
+
+def text_hash(text: str) -> str:
+    """
+    计算规范化文本的SHA256
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        str: 十六进制摘要
+    """
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache(ABC):
+    """
+    查询向量缓存接口
+
+    子类需实现 get/set，并通过 tier 标识缓存层级（用于监控指标）。
+    """
+
+    tier: str = "base"
+
+    @abstractmethod
+    def get(self, model: str, key: str) -> Optional[List[float]]:
+        """读取缓存的查询向量，未命中时返回None"""
+
+    @abstractmethod
+    def set(self, model: str, key: str, vector: List[float]) -> None:
+        """写入查询向量"""
+
+    def clear(self) -> None:
+        """清空缓存（可选实现）"""
+        return None
+
+
+class InMemoryEmbeddingCache(EmbeddingCache):
+    """
+    进程内LRU查询向量缓存
+
+    使用OrderedDict实现LRU淘汰，每个条目带过期时间。线程安全。
+    """
+
+    tier = "memory"
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: int = 86400):
+        """
+        初始化进程内缓存
+
+        Args:
+            max_entries: 最大条目数
+            ttl_seconds: 条目有效期（秒）
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, model: str, key: str) -> Optional[List[float]]:
+        cache_key = (model, key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            expires_at, vector = entry
+            if expires_at <= now:
+                del self._entries[cache_key]
+                return None
+            self._entries.move_to_end(cache_key)
+            return vector
+
+    def set(self, model: str, key: str, vector: List[float]) -> None:
+        if self.max_entries <= 0:
+            return
+        cache_key = (model, key)
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[cache_key] = (expires_at, list(vector))
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class RedisEmbeddingCache(EmbeddingCache):
+    """
+    Redis共享查询向量缓存
+
+    向量以float64字节串的base64编码存储，保证与原始结果完全一致。
+    Redis不可用时记录警告并视为未命中，不影响主流程。
+    """
+
+    tier = "redis"
+
+    def __init__(self, ttl_seconds: int = 86400):
+        """
+        初始化Redis缓存
+
+        Args:
+            ttl_seconds: 条目有效期（秒）
+        """
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _redis_key(model: str, key: str) -> str:
+        return RedisKeys.format_key(RedisKeys.EMBEDDING_CACHE, model=model, text_hash=key)
+
+    @staticmethod
+    def _encode(vector: List[float]) -> str:
+        return base64.b64encode(array("d", vector).tobytes()).decode("ascii")
+
+    @staticmethod
+    def _decode(payload: str) -> List[float]:
+        values = array("d")
+        values.frombytes(base64.b64decode(payload))
+        return values.tolist()
+
+    def get(self, model: str, key: str) -> Optional[List[float]]:
+        try:
+            payload = get_redis_client().get(self._redis_key(model, key))
+        except RedisError as e:
+            logger.warning(f"读取Redis向量缓存失败: {str(e)}")
+            return None
+        if not payload:
+            return None
+        try:
+            return self._decode(payload)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"解析Redis向量缓存失败: {str(e)}")
+            return None
+
+    def set(self, model: str, key: str, vector: List[float]) -> None:
+        try:
+            get_redis_client().setex(
+                self._redis_key(model, key), self.ttl_seconds, self._encode(vector)
+            )
+        except RedisError as e:
+            logger.warning(f"写入Redis向量缓存失败: {str(e)}")
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    带查询向量缓存的Embeddings包装器
+
+    按顺序查询各缓存层，命中后回填更靠前的缓存层；全部未命中时
+    调用底层Embeddings并写入所有缓存层。
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model_name: str,
+        caches: Sequence[EmbeddingCache],
+    ):
+        """
+        初始化缓存包装器
+
+        Args:
+            underlying: 底层Embeddings实例
+            model_name: 嵌入模型名称（作为缓存键的一部分）
+            caches: 缓存层列表，按查询顺序排列
+        """
+        self.underlying = underlying
+        self.model_name = model_name
+        self.caches = list(caches)
+
+    def _lookup(self, key: str) -> Optional[List[float]]:
+        for i, cache in enumerate(self.caches):
+            vector = cache.get(self.model_name, key)
+            record_embedding_cache_lookup(cache.tier, vector is not None)
+            if vector is not None:
+                for upper in self.caches[:i]:
+                    upper.set(self.model_name, key, vector)
+                return vector
+        return None
+
+    def _store(self, key: str, vector: List[float]) -> None:
+        for cache in self.caches:
+            cache.set(self.model_name, key, vector)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.underlying.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.underlying.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = text_hash(text)
+        vector = self._lookup(key)
+        if vector is not None:
+            return vector
+
+        vector = self.underlying.embed_query(text)
+        self._store(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = text_hash(text)
+
+        # 进程内缓存查询代价很低，直接在事件循环中完成
+        if self.caches and self.caches[0].tier == "memory":
+            vector = self.caches[0].get(self.model_name, key)
+            if vector is not None:
+                record_embedding_cache_lookup(self.caches[0].tier, True)
+                return vector
+
+        return await asyncio.to_thread(self.embed_query, text)
+
+    def clear(self) -> None:
+        """清空所有缓存层"""
+        for cache in self.caches:
+            cache.clear()
+
+
+def build_cached_embeddings(underlying: Embeddings, model_name: str) -> Embeddings:
+    """
+    根据配置为Embeddings实例添加缓存层
+
+    Args:
+        underlying: 底层Embeddings实例
+        model_name: 嵌入模型名称
+
+    Returns:
+        Embeddings: 缓存包装后的实例；未启用缓存时原样返回
+    """
+    cache_settings = settings.embedding_cache
+    if not cache_settings.embedding_cache_enabled:
+        return underlying
+
+    caches: List[EmbeddingCache] = []
+    if cache_settings.embedding_cache_max_entries > 0:
+        caches.append(
+            InMemoryEmbeddingCache(
+                max_entries=cache_settings.embedding_cache_max_entries,
+                ttl_seconds=cache_settings.embedding_cache_ttl_seconds,
+            )
+        )
+    if cache_settings.embedding_cache_redis_enabled:
+        caches.append(RedisEmbeddingCache(ttl_seconds=cache_settings.embedding_cache_ttl_seconds))
+
+    if not caches:
+        return underlying
+
+    logger.info(
+        f"启用查询向量缓存: model={model_name}, "
+        f"tiers={[c.tier for c in caches]}"
+    )
+    return CachedEmbeddings(underlying=underlying, model_name=model_name, caches=caches)
+
+
+# 导出
+__all__ = [
+    "EmbeddingCache",
+    "InMemoryEmbeddingCache",
+    "RedisEmbeddingCache",
+    "CachedEmbeddings",
+    "build_cached_embeddings",
+    "normalize_text",
+    "text_hash",
+]
@@ -0,0 +1,265 @@
+"""
+共享执行器模块
+
+提供应用级的命名执行器，替代每次调用时临时创建线程池：
+- io: 短时阻塞I/O（文件读写等）
+- db: 同步数据库调用
+- stream: 流式解析的生产方（单个任务可能持续整篇文档的解析时间，与io隔离避免占满I/O线程）
+- cpu: CPU密集型文档解析（进程池，首次使用时创建）
+
+每个执行器在提交和完成任务时更新Prometheus指标：
+正在执行任务的worker数和等待空闲worker的任务数。
+
+使用方式:
+    executors = get_executors()
+    documents = await executors.run_cpu(load_document, path, "pdf")
+    rows = await executors.run_db(query_rows, user_id)
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import (Executor, Future, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+from typing import Any, Callable, Dict, Optional
+
+from app.config import settings
+from app.middleware.prometheus_middleware import record_executor_state
+
+logger = logging.getLogger(__name__)
+
+
+class _InstrumentedExecutorMixin:
+    """统计在途任务数并同步到Prometheus指标"""
+
+    def _init_instrumentation(self, name: str, max_workers: int) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self._in_flight = 0
+        self._stats_lock = threading.Lock()
+        self._publish()
+
+    def _publish(self) -> None:
+        stats = self.stats()
+        record_executor_state(self.name, stats["active"], stats["queued"])
+
+    def _on_task_done(self, future: Future) -> None:
+        with self._stats_lock:
+            self._in_flight -= 1
+        self._publish()
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        with self._stats_lock:
+            self._in_flight += 1
+        try:
+            future = super().submit(fn, *args, **kwargs)
+        except BaseException:
+            with self._stats_lock:
+                self._in_flight -= 1
+            raise
+        finally:
+            self._publish()
+        future.add_done_callback(self._on_task_done)
+        return future
+
+    def stats(self) -> Dict[str, int]:
+        """
+        获取执行器状态
+
+        Returns:
+            Dict[str, int]: active（执行中）、queued（排队中）、max_workers
+        """
+        in_flight = self._in_flight
+        return {
+            "active": min(in_flight, self.max_workers),
+            "queued": max(0, in_flight - self.max_workers),
+            "max_workers": self.max_workers,
+        }
+
+
+class InstrumentedThreadPoolExecutor(_InstrumentedExecutorMixin, ThreadPoolExecutor):
+    """带指标统计的线程池"""
+
+    def __init__(self, name: str, max_workers: int):
+        super().__init__(max_workers=max_workers, thread_name_prefix=f"{name}-pool")
+        self._init_instrumentation(name, max_workers)
+
+
+class InstrumentedProcessPoolExecutor(_InstrumentedExecutorMixin, ProcessPoolExecutor):
+    """带指标统计的进程池（使用spawn，避免fork出带有事件循环和数据库连接的子进程）"""
+
+    def __init__(self, name: str, max_workers: int):
+        super().__init__(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        self._init_instrumentation(name, max_workers)
+
+
+class ExecutorRegistry:
+    """
+    应用级执行器集合
+
+    io、db、stream线程池在创建时启动；cpu进程池首次使用时创建，
+    cpu_processes为0时CPU任务在io线程池中执行。
+    不替换事件循环的默认执行器，asyncio.to_thread仍使用asyncio自带的线程池。
+    """
+
+    def __init__(
+        self, io_threads: int, db_threads: int, cpu_processes: int, stream_threads: int = 4
+    ):
+        """
+        Args:
+            io_threads: I/O线程池大小
+            db_threads: 数据库线程池大小
+            cpu_processes: 解析进程池大小（0表示不使用进程池）
+            stream_threads: 流式解析线程池大小（同时进行的流式解析数上限）
+        """
+        self.io = InstrumentedThreadPoolExecutor("io", io_threads)
+        self.db = InstrumentedThreadPoolExecutor("db", db_threads)
+        self.stream = InstrumentedThreadPoolExecutor("stream", stream_threads)
+        self.cpu_processes = cpu_processes
+        self._cpu: Optional[InstrumentedProcessPoolExecutor] = None
+        self._cpu_lock = threading.Lock()
+
+    @property
+    def cpu(self) -> Executor:
+        """CPU密集型任务执行器（进程池；未启用时为io线程池）"""
+        if self.cpu_processes <= 0:
+            return self.io
+        if self._cpu is None:
+            with self._cpu_lock:
+                if self._cpu is None:
+                    self._cpu = InstrumentedProcessPoolExecutor("cpu", self.cpu_processes)
+        return self._cpu
+
+    @staticmethod
+    async def _run(executor: Executor, fn: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        if kwargs:
+            fn = functools.partial(fn, **kwargs)
+        return await loop.run_in_executor(executor, fn, *args)
+
+    async def run_io(self, fn: Callable, *args, **kwargs) -> Any:
+        """在I/O线程池中执行阻塞调用"""
+        return await self._run(self.io, fn, *args, **kwargs)
+
+    async def run_db(self, fn: Callable, *args, **kwargs) -> Any:
+        """在数据库线程池中执行同步数据库调用"""
+        return await self._run(self.db, fn, *args, **kwargs)
+
+    async def run_cpu(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        在解析进程池中执行CPU密集型调用
+
+        使用进程池时，函数、参数和返回值必须可序列化（模块级函数）。
+        """
+        return await self._run(self.cpu, fn, *args, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """获取各执行器状态"""
+        result = {"io": self.io.stats(), "db": self.db.stats(), "stream": self.stream.stats()}
+        if self._cpu is not None:
+            result["cpu"] = self._cpu.stats()
+        return result
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        关闭所有执行器
+
+        Args:
+            wait: 是否等待已提交的任务完成
+        """
+        if self._cpu is not None:
+            self._cpu.shutdown(wait=wait, cancel_futures=not wait)
+            self._cpu = None
+        self.stream.shutdown(wait=wait, cancel_futures=not wait)
+        self.db.shutdown(wait=wait, cancel_futures=not wait)
+        self.io.shutdown(wait=wait, cancel_futures=not wait)
+
+
+# 全局执行器实例
+_executors: Optional[ExecutorRegistry] = None
+_executors_lock = threading.Lock()
+
+
+def init_executors(
+    io_threads: Optional[int] = None,
+    db_threads: Optional[int] = None,
+    cpu_processes: Optional[int] = None,
+    stream_threads: Optional[int] = None,
+) -> ExecutorRegistry:
+    """
+    创建全局执行器（应用启动时调用，已创建时直接返回）
+
+    Args:
+        io_threads: I/O线程池大小，默认从配置读取
+        db_threads: 数据库线程池大小，默认从配置读取
+        cpu_processes: 解析进程池大小，默认从配置读取
+        stream_threads: 流式解析线程池大小，默认从配置读取
+
+    Returns:
+        ExecutorRegistry: 执行器集合
+    """
+    global _executors
+
+    with _executors_lock:
+        if _executors is None:
+            executor_settings = settings.executors
+            _executors = ExecutorRegistry(
+                io_threads=io_threads or executor_settings.executor_io_threads,
+                db_threads=db_threads or executor_settings.executor_db_threads,
+                cpu_processes=(
+                    executor_settings.executor_cpu_processes
+                    if cpu_processes is None
+                    else cpu_processes
+                ),
+                stream_threads=stream_threads or executor_settings.executor_stream_threads,
+            )
+            logger.info(
+                f"共享执行器已创建: io={_executors.io.max_workers}, "
+                f"db={_executors.db.max_workers}, stream={_executors.stream.max_workers}, "
+                f"cpu={_executors.cpu_processes}"
+            )
+    return _executors
+
+
+def get_executors() -> ExecutorRegistry:
+    """
+    获取全局执行器（未通过应用启动创建时按配置创建，如脚本和测试）
+
+    Returns:
+        ExecutorRegistry: 执行器集合
+    """
+    if _executors is None:
+        return init_executors()
+    return _executors
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    """
+    关闭全局执行器（应用关闭时调用）
+
+    Args:
+        wait: 是否等待已提交的任务完成
+    """
+    global _executors
+
+    with _executors_lock:
+        if _executors is not None:
+            _executors.shutdown(wait=wait)
+            _executors = None
+            logger.info("共享执行器已关闭")
+
+
+# 导出
+__all__ = [
+    "ExecutorRegistry",
+    "InstrumentedProcessPoolExecutor",
+    "InstrumentedThreadPoolExecutor",
+    "get_executors",
+    "init_executors",
+    "shutdown_executors",
+]
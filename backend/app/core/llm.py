@@ -9,7 +9,8 @@ import logging
 import re
 from typing import Any, AsyncGenerator, Dict, Iterator, List, Optional
 
-from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.callbacks import (AsyncCallbackManagerForLLMRun,
+                                      CallbackManagerForLLMRun)
 from langchain_community.llms import Tongyi as OriginalTongyi
 
 class PatchedTongyi(OriginalTongyi):
@@ -146,11 +147,68 @@ class PatchedTongyi(OriginalTongyi):
 
         logger.info(f"[_stream] 同步流式调用完成, 共生成 {chunk_count} 个chunks")
 
+    def _stream_parameters(self, stop: Optional[List[str]], **kwargs: Any) -> Dict[str, Any]:
+        """流式调用使用的最小参数集（与同步 _stream 一致）"""
+        params = self._invocation_params(stop=stop, **kwargs)
+        return {key: params[key] for key in ("temperature", "top_p", "seed") if key in params}
+
     async def _astream(
         self,
         prompt: str,
         stop: Optional[List[str]] = None,
-        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncGenerator[Any, None]:
+        """
+        异步流式调用
+
+        默认使用原生异步HTTP客户端（SSE）；关闭 tongyi_native_stream_enabled
+        时在线程中迭代同步的 _stream。
+        """
+        if settings.tongyi.tongyi_native_stream_enabled:
+            stream = self._astream_native(prompt, stop, run_manager, **kwargs)
+        else:
+            stream = self._astream_threaded(prompt, stop, run_manager, **kwargs)
+        async for chunk in stream:
+            yield chunk
+
+    async def _astream_native(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncGenerator[Any, None]:
+        """通过长连接复用的httpx客户端直接消费DashScope SSE流"""
+        from langchain_core.outputs import GenerationChunk
+
+        from app.core.dashscope_client import get_dashscope_stream_client
+
+        if not self.dashscope_api_key:
+            raise ValueError("DASHSCOPE_API_KEY 未配置，请在环境变量中设置")
+
+        logger.info(f"[_astream] 开始原生异步流式调用, prompt长度={len(prompt)}")
+
+        chunk_count = 0
+        async for text in get_dashscope_stream_client().stream_generation(
+            model=self.model_name,
+            prompt=prompt,
+            api_key=self.dashscope_api_key,
+            parameters=self._stream_parameters(stop, **kwargs),
+        ):
+            chunk = GenerationChunk(text=text)
+            chunk_count += 1
+            if run_manager:
+                await run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+        logger.info(f"[_astream] 流式调用完成, 共生成 {chunk_count} 个chunks")
+
+    async def _astream_threaded(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
         **kwargs: Any,
     ) -> AsyncGenerator[Any, None]:
         """
@@ -172,7 +230,7 @@ class PatchedTongyi(OriginalTongyi):
         # 在线程中创建迭代器
         logger.info("[_astream] 在线程中创建迭代器")
         iterator = await asyncio.to_thread(
-            self._stream, prompt, stop, run_manager, **kwargs
+            self._stream, prompt, stop, None, **kwargs
         )
 
         # 使用哨兵值来检测迭代结束
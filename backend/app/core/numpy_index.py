@@ -0,0 +1,1185 @@
+"""
+NumPy向量索引模块
+
+为中小规模知识库（数万分块以内）提供进程内向量索引，
+省去Chroma的SQLite持久化、JSON元数据和逐条Python对象转换开销：
+- 向量：每个集合一个连续的float32矩阵文件（vectors.f32），按行追加，检索时内存映射
+- 元数据：紧凑的SQLite旁表（行号、向量ID、文档ID、墓碑标记、IVF分区、文本、元数据JSON），
+  检索时只读取top-k行
+- 检索：向量化的平方L2距离（与Chroma默认度量一致）+ argpartition取top-k；
+  存活向量数超过阈值后训练IVF分区（k-means），只扫描距离最近的nprobe个分区
+- 写入：增量追加；更新和按向量ID/document_id删除只打墓碑，不改写矩阵
+- 压缩：墓碑较多时（cleanup定时任务）将存活行重写为新一代数据文件，
+  旁表在同一事务内重新编号并切换代号，其他进程提交后自动加载新文件
+- 量化（可选，见app.core.vector_quantization）：int8或PQ编码常驻内存用于粗排，
+  float32矩阵只在精确重排候选列表时按行读取。量化只降低常驻内存，不降低磁盘占用：
+  float32矩阵仍完整保留（精确重排、get返回向量、压缩和PQ码本训练都依赖它），
+  编码、范数和缩放系数另外写入，磁盘占用比不量化时多约1/4（int8）或1/32（PQ）
+
+NumpyIndexClient实现了VectorStoreManager（及LangChain Chroma封装）用到的
+Chroma客户端/集合接口子集，通过NumpyVectorBackend（chroma_mode=numpy）接入。
+其他进程（如文档worker）写入后，通过SQLite的data_version检测变更并重新加载。
+"""
+
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import chromadb
+import numpy as np
+from chromadb.errors import InvalidDimensionException
+
+from app.config import settings
+from app.core.chroma_backend import VectorStoreBackend
+from app.core.vector_quantization import (BLOCK_ROWS, PQ_CENTROIDS,
+                                          int8_distances, kmeans,
+                                          nearest_centroids, pq_distances,
+                                          pq_encode, pq_subvector_count,
+                                          quantize_int8, squared_norms,
+                                          train_pq_codebooks)
+
+logger = logging.getLogger(__name__)
+
+_VECTORS_FILENAME = "vectors.f32"
+_NORMS_FILENAME = "norms.f32"
+_CODES_FILENAME = "codes.bin"
+_SCALES_FILENAME = "scales.f32"
+# 按行存储、压缩时整体重写的数据文件
+_DATA_FILENAMES = (_VECTORS_FILENAME, _NORMS_FILENAME, _CODES_FILENAME, _SCALES_FILENAME)
+_META_FILENAME = "meta.sqlite3"
+_INDEX_DIRNAME = "numpy_index"
+
+# SQLite单条语句参数数量上限（保守值）
+_SQLITE_MAX_VARIABLES = 900
+
+# 总行数增长到上次训练时的该倍数后重新训练IVF
+_IVF_RETRAIN_GROWTH = 2.0
+_IVF_TRAIN_ITERATIONS = 10
+# 每个分区的训练采样点数
+_IVF_TRAIN_POINTS_PER_LIST = 40
+# 乘积量化：存活向量数达到该值后训练码本（之前的行按float32精确扫描）
+_PQ_TRAIN_MIN_ROWS = PQ_CENTROIDS * 16
+_PQ_TRAIN_SAMPLE_ROWS = PQ_CENTROIDS * 16
+# 加载时数据文件已被压缩删除（其他进程切换了代号）的重试次数
+_LOAD_ATTEMPTS = 3
+
+_DEFAULT_QUERY_INCLUDE = ("documents", "metadatas", "distances")
+_DEFAULT_GET_INCLUDE = ("documents", "metadatas")
+
+_WHERE_OPERATORS = {
+    "$eq": "=",
+    "$ne": "!=",
+    "$gt": ">",
+    "$gte": ">=",
+    "$lt": "<",
+    "$lte": "<=",
+}
+
+
+def _where_to_sql(where: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """
+    将Chroma风格的where过滤条件转换为SQL条件
+
+    支持字段等值、$eq/$ne/$gt/$gte/$lt/$lte/$in/$nin 以及 $and/$or 组合。
+    """
+    clauses: List[str] = []
+    params: List[Any] = []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [_where_to_sql(sub) for sub in condition]
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append("(" + joiner.join(part[0] for part in parts) + ")")
+            for part in parts:
+                params.extend(part[1])
+            continue
+
+        if key == "document_id":
+            column, column_params = "document_id", []
+        else:
+            column, column_params = "json_extract(metadata, ?)", [f'$."{key}"']
+
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            if operator in _WHERE_OPERATORS:
+                clauses.append(f"{column} {_WHERE_OPERATORS[operator]} ?")
+                params.extend(column_params + [value])
+            elif operator in ("$in", "$nin"):
+                values = list(value)
+                if not values:
+                    clauses.append("0" if operator == "$in" else "1")
+                    continue
+                placeholders = ",".join("?" for _ in values)
+                negate = "NOT " if operator == "$nin" else ""
+                clauses.append(f"{column} {negate}IN ({placeholders})")
+                params.extend(column_params + values)
+            else:
+                raise ValueError(f"不支持的过滤操作符: {operator}")
+    return " AND ".join(clauses) or "1", params
+
+
+def train_ivf_centroids(
+    sample: np.ndarray, nlist: int, iterations: int = _IVF_TRAIN_ITERATIONS, seed: int = 0
+) -> np.ndarray:
+    """
+    使用k-means训练IVF聚类中心
+
+    Args:
+        sample: 训练样本矩阵
+        nlist: 分区数量
+        iterations: 迭代次数
+        seed: 随机种子
+
+    Returns:
+        np.ndarray: 聚类中心矩阵 (nlist, dim)
+    """
+    return kmeans(sample, nlist, iterations, seed)
+
+
+def _generation_filename(filename: str, generation: int) -> str:
+    """数据文件按代号命名（第0代沿用原文件名）"""
+    if not generation:
+        return filename
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}-{generation}{ext}"
+
+
+@dataclass
+class _IndexState:
+    """索引内存快照（加载后整体替换，检索时无需加锁）"""
+
+    dim: Optional[int] = None
+    generation: int = 0
+    vectors: np.ndarray = field(default_factory=lambda: np.zeros((0, 0), dtype=np.float32))
+    norms: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.float32))
+    alive: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
+    list_ids: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int32))
+    ivf_version: int = 0
+    ivf_rows: int = 0
+    centroids: Optional[np.ndarray] = None
+    centroid_norms: Optional[np.ndarray] = None
+    list_rows: List[np.ndarray] = field(default_factory=list)
+    unassigned_rows: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    quantization: str = "none"
+    # 已编码的行数（行号小于该值的行有量化编码）
+    code_rows: int = 0
+    codes: Optional[np.ndarray] = None
+    scales: Optional[np.ndarray] = None
+    pq_version: int = 0
+    codebooks: Optional[np.ndarray] = None
+
+    @property
+    def rows(self) -> int:
+        return len(self.alive)
+
+    @property
+    def live_count(self) -> int:
+        return int(self.alive.sum())
+
+    @property
+    def resident_bytes(self) -> int:
+        """检索时全量扫描的数据量（编码、范数、缩放系数及未编码行的float32向量）"""
+        total = self.norms.nbytes + self.alive.nbytes
+        if self.codes is not None:
+            total += self.codes.nbytes
+        if self.scales is not None:
+            total += self.scales.nbytes
+        return total + (self.rows - self.code_rows) * (self.dim or 0) * 4
+
+
+class NumpyIndexCollection:
+    """
+    单个集合的NumPy向量索引（接口兼容Chroma Collection的常用方法）
+
+    使用方式:
+        collection = NumpyIndexCollection("kb_1", "/data/chroma/numpy_index/kb_1")
+        collection.upsert(ids=["a"], embeddings=[[0.1, 0.2]], documents=["文本"], metadatas=[{}])
+        result = collection.query(query_embeddings=[[0.1, 0.2]], n_results=5)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        directory: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        ivf_threshold: Optional[int] = None,
+        ivf_nprobe: Optional[int] = None,
+        quantization: Optional[str] = None,
+        pq_subvector_dim: Optional[int] = None,
+        rescore_factor: Optional[int] = None,
+    ):
+        """
+        初始化集合索引
+
+        Args:
+            name: 集合名称
+            directory: 集合数据目录
+            metadata: 集合元数据
+            ivf_threshold: 启用IVF分区的存活向量数阈值，默认从配置读取
+            ivf_nprobe: IVF检索扫描的分区数，默认从配置读取
+            quantization: 新集合的量化方式（none/int8/pq），默认从配置读取；
+                已有集合沿用创建时的量化方式，转换需使用迁移脚本
+            pq_subvector_dim: 乘积量化子向量维度，默认从配置读取
+            rescore_factor: 量化粗排候选数为 k * rescore_factor，默认从配置读取
+        """
+        vector_settings = settings.vector_db
+        self.name = name
+        self.directory = directory
+        self.metadata = metadata
+        self.ivf_threshold = ivf_threshold or vector_settings.numpy_index_ivf_threshold
+        self.ivf_nprobe = ivf_nprobe or vector_settings.numpy_index_ivf_nprobe
+        self._quantization = quantization or vector_settings.numpy_index_quantization
+        self.pq_subvector_dim = pq_subvector_dim or vector_settings.numpy_index_pq_subvector_dim
+        self.rescore_factor = rescore_factor or vector_settings.numpy_index_rescore_factor
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            os.path.join(directory, _META_FILENAME),
+            check_same_thread=False,
+            timeout=30,
+            isolation_level=None,
+        )
+        # WAL模式允许检索进程与写入进程并发访问
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS info (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL,
+                document_id INTEGER,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                list_id INTEGER NOT NULL DEFAULT -1,
+                document TEXT,
+                metadata TEXT
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_rows_live_id ON rows(id) WHERE deleted = 0;
+            CREATE INDEX IF NOT EXISTS idx_rows_document_id ON rows(document_id) WHERE deleted = 0;
+            """
+        )
+        self._data_version: Optional[int] = None
+        self._state = _IndexState()
+        self._refresh()
+
+    # ========== 加载 ==========
+
+    def _info(self) -> Dict[str, str]:
+        return dict(self._conn.execute("SELECT key, value FROM info").fetchall())
+
+    def _set_info(self, **values: Any) -> None:
+        self._conn.executemany(
+            "INSERT INTO info (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            [(key, str(value)) for key, value in values.items()],
+        )
+
+    def _centroids_path(self, version: int) -> str:
+        return os.path.join(self.directory, f"centroids-{version}.npy")
+
+    def _codebooks_path(self, version: int) -> str:
+        return os.path.join(self.directory, f"pq-{version}.npy")
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    @property
+    def quantization(self) -> str:
+        """集合的量化方式（已写入过数据的集合以存储的设置为准）"""
+        return self._state.quantization if self._state.dim is not None else self._quantization
+
+    def _remove_stale_files(self, prefix: str, keep: str) -> None:
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name != os.path.basename(keep):
+                os.remove(self._path(name))
+
+    def _refresh(self) -> None:
+        """其他连接提交过写入时重新加载"""
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._data_version:
+                self._data_version = version
+                self._load()
+
+    def _load(self) -> None:
+        """从旁表和矩阵文件加载索引快照（旧代文件已被其他进程压缩删除时重新读取）"""
+        with self._lock:
+            for attempt in range(_LOAD_ATTEMPTS):
+                try:
+                    self._state = self._read_state()
+                    return
+                except FileNotFoundError:
+                    if attempt == _LOAD_ATTEMPTS - 1:
+                        raise
+
+    def _read_state(self) -> _IndexState:
+        """读取索引快照（行不可变，未变更的行复用已计算的范数）"""
+        own_transaction = not self._conn.in_transaction
+        if own_transaction:
+            # 压缩在同一事务内切换代号并重新编号，info与rows需读取同一快照
+            self._conn.execute("BEGIN")
+        try:
+            info = self._info()
+            table = np.array(
+                self._conn.execute("SELECT row, deleted, list_id FROM rows ORDER BY row").fetchall(),
+                dtype=np.int64,
+            ).reshape(-1, 3)
+        finally:
+            if own_transaction:
+                self._conn.execute("COMMIT")
+
+        previous = self._state
+        state = _IndexState()
+        state.dim = int(info["dim"]) if "dim" in info else None
+        state.generation = int(info.get("generation", 0))
+        n = int(table[-1, 0]) + 1 if len(table) else 0
+        state.alive = np.zeros(n, dtype=bool)
+        state.list_ids = np.full(n, -1, dtype=np.int32)
+        if len(table):
+            state.alive[table[:, 0]] = table[:, 1] == 0
+            state.list_ids[table[:, 0]] = table[:, 2]
+
+        if state.dim is None or n == 0:
+            state.vectors = np.zeros((0, state.dim or 0), dtype=np.float32)
+        else:
+            state.vectors = self._map(_VECTORS_FILENAME, state.generation, np.float32, n, state.dim)
+
+        reuse = (
+            previous.generation == state.generation
+            and previous.dim == state.dim
+            and previous.rows <= n
+        )
+        state.quantization = info.get("quantization", "none")
+        if state.quantization != "none":
+            # 量化集合的范数在写入时保存，加载时不读取float32矩阵
+            state.norms = self._map(_NORMS_FILENAME, state.generation, np.float32, n)
+        elif reuse and previous.rows:
+            state.norms = np.concatenate(
+                [previous.norms, squared_norms(state.vectors[previous.rows :])]
+            )
+        else:
+            state.norms = squared_norms(state.vectors)
+
+        if state.quantization == "int8":
+            state.code_rows = n
+            state.codes = self._map(_CODES_FILENAME, state.generation, np.int8, n, state.dim)
+            state.scales = self._map(_SCALES_FILENAME, state.generation, np.float32, n)
+        elif state.quantization == "pq":
+            state.pq_version = int(info.get("pq_version", 0))
+            if state.pq_version:
+                if reuse and previous.pq_version == state.pq_version:
+                    state.codebooks = previous.codebooks
+                else:
+                    state.codebooks = np.load(self._codebooks_path(state.pq_version))
+                state.code_rows = min(int(info.get("pq_rows", 0)), n)
+                state.codes = self._map(
+                    _CODES_FILENAME,
+                    state.generation,
+                    np.uint8,
+                    state.code_rows,
+                    len(state.codebooks),
+                )
+
+        state.ivf_version = int(info.get("ivf_version", 0))
+        state.ivf_rows = int(info.get("ivf_rows", 0))
+        if state.ivf_version:
+            if reuse and previous.ivf_version == state.ivf_version:
+                state.centroids = previous.centroids
+            else:
+                state.centroids = np.load(self._centroids_path(state.ivf_version))
+            state.centroid_norms = squared_norms(state.centroids)
+            assigned = np.nonzero(state.list_ids >= 0)[0]
+            order = assigned[np.argsort(state.list_ids[assigned], kind="stable")]
+            bounds = np.searchsorted(
+                state.list_ids[order], np.arange(len(state.centroids) + 1)
+            )
+            state.list_rows = [
+                order[bounds[i] : bounds[i + 1]] for i in range(len(state.centroids))
+            ]
+            state.unassigned_rows = np.nonzero(state.list_ids < 0)[0]
+
+        return state
+
+    # ========== 写入 ==========
+
+    def _data_path(self, filename: str, generation: int) -> str:
+        return self._path(_generation_filename(filename, generation))
+
+    def _map(
+        self,
+        filename: str,
+        generation: int,
+        dtype: Any,
+        rows: int,
+        width: Optional[int] = None,
+    ) -> np.ndarray:
+        """内存映射按行存储的数据文件"""
+        shape = (rows,) if width is None else (rows, width)
+        if rows == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self._data_path(filename, generation), dtype=dtype, mode="r", shape=shape)
+
+    def _write_rows(self, filename: str, generation: int, start_row: int, values: np.ndarray) -> None:
+        """从指定行开始写入按行存储的数据文件"""
+        values = np.ascontiguousarray(values)
+        path = self._data_path(filename, generation)
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        with open(path, mode) as f:
+            f.seek(start_row * (values.nbytes // max(1, len(values))))
+            f.write(values.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _tombstone(self, condition: str, params: Sequence[Any]) -> int:
+        return self._conn.execute(
+            f"UPDATE rows SET deleted = 1 WHERE deleted = 0 AND ({condition})", params
+        ).rowcount
+
+    def _tombstone_ids(self, ids: Sequence[str]) -> int:
+        deleted = 0
+        for i in range(0, len(ids), _SQLITE_MAX_VARIABLES):
+            part = list(ids[i : i + _SQLITE_MAX_VARIABLES])
+            placeholders = ",".join("?" for _ in part)
+            deleted += self._tombstone(f"id IN ({placeholders})", part)
+        return deleted
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Optional[Sequence[Sequence[float]]] = None,
+        metadatas: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+        documents: Optional[Sequence[Optional[str]]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """
+        写入向量（已存在的ID打墓碑后追加新行）
+
+        Args:
+            ids: 向量ID列表
+            embeddings: 向量列表
+            metadatas: 元数据列表
+            documents: 文本列表
+        """
+        if embeddings is None:
+            raise ValueError("NumPy向量索引只接受已生成的向量")
+        ids = list(ids)
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError(f"向量数量与ID数量不一致: ids={len(ids)}, embeddings={len(vectors)}")
+        if not ids:
+            return
+        metadatas = list(metadatas) if metadatas is not None else [None] * len(ids)
+        documents = list(documents) if documents is not None else [None] * len(ids)
+
+        # 同一批次内重复的ID保留最后一条
+        last = {vector_id: i for i, vector_id in enumerate(ids)}
+        if len(last) != len(ids):
+            keep = sorted(last.values())
+            ids = [ids[i] for i in keep]
+            vectors = vectors[keep]
+            metadatas = [metadatas[i] for i in keep]
+            documents = [documents[i] for i in keep]
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 持有写锁后加载其他进程的最新写入
+                self._refresh()
+                info = self._info()
+                dim = int(info["dim"]) if "dim" in info else None
+                if dim is None:
+                    dim = vectors.shape[1]
+                    info["quantization"] = info.get("quantization", self._quantization)
+                    self._set_info(dim=dim, quantization=info["quantization"])
+                elif dim != vectors.shape[1]:
+                    raise InvalidDimensionException(
+                        f"Embedding dimension {vectors.shape[1]} does not match "
+                        f"collection dimensionality {dim}"
+                    )
+
+                start = self._conn.execute(
+                    "SELECT COALESCE(MAX(row) + 1, 0) FROM rows"
+                ).fetchone()[0]
+                self._tombstone_ids(ids)
+
+                state = self._state
+                if state.centroids is not None:
+                    list_ids = nearest_centroids(vectors, state.centroids, state.centroid_norms)
+                else:
+                    list_ids = np.full(len(ids), -1, dtype=np.int32)
+
+                quantization = info.get("quantization", "none")
+                self._write_rows(_VECTORS_FILENAME, state.generation, start, vectors)
+                if quantization != "none":
+                    self._write_rows(_NORMS_FILENAME, state.generation, start, squared_norms(vectors))
+                if quantization == "int8":
+                    codes, scales = quantize_int8(vectors)
+                    self._write_rows(_CODES_FILENAME, state.generation, start, codes)
+                    self._write_rows(_SCALES_FILENAME, state.generation, start, scales)
+                elif quantization == "pq" and state.codebooks is not None and state.code_rows == start:
+                    self._write_rows(
+                        _CODES_FILENAME, state.generation, start, pq_encode(state.codebooks, vectors)
+                    )
+                    self._set_info(pq_rows=start + len(vectors))
+                self._conn.executemany(
+                    "INSERT INTO rows (row, id, document_id, list_id, document, metadata) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            start + i,
+                            vector_id,
+                            (metadata or {}).get("document_id"),
+                            int(list_ids[i]),
+                            document,
+                            json.dumps(metadata or {}, ensure_ascii=False),
+                        )
+                        for i, (vector_id, metadata, document) in enumerate(
+                            zip(ids, metadatas, documents)
+                        )
+                    ],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._load()
+        self._maybe_train_pq()
+        self._maybe_train_ivf()
+
+    add = upsert
+
+    def delete(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> int:
+        """
+        删除向量（打墓碑，矩阵行保留到压缩时回收）
+
+        Args:
+            ids: 向量ID列表
+            where: 元数据过滤条件（如 {"document_id": 1}）
+
+        Returns:
+            int: 删除的向量数
+        """
+        if not ids and not where:
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if ids:
+                    deleted = self._tombstone_ids(list(ids))
+                else:
+                    deleted = self._tombstone(*_where_to_sql(where))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._load()
+        return deleted
+
+    # ========== 乘积量化 ==========
+
+    def _maybe_train_pq(self) -> None:
+        state = self._state
+        if state.quantization != "pq" or state.codebooks is not None:
+            return
+        live = state.live_count
+        if live < _PQ_TRAIN_MIN_ROWS:
+            return
+
+        live_rows = np.nonzero(state.alive)[0]
+        rng = np.random.default_rng(state.rows)
+        sample_rows = np.sort(
+            rng.choice(live_rows, min(live, _PQ_TRAIN_SAMPLE_ROWS), replace=False)
+        )
+        subvectors = pq_subvector_count(state.dim, self.pq_subvector_dim)
+        codebooks = train_pq_codebooks(np.asarray(state.vectors[sample_rows]), subvectors)
+        logger.info(f"训练PQ码本: collection={self.name}, live={live}, subvectors={subvectors}")
+        self.install_pq(codebooks)
+
+    def install_pq(self, codebooks: np.ndarray) -> None:
+        """
+        使用给定的码本重新编码全部行
+
+        编码写入新文件后原子替换，正在检索的进程继续使用旧文件直到重新加载。
+
+        Args:
+            codebooks: 乘积量化码本 (m, 256, dsub)
+        """
+        codebooks = np.ascontiguousarray(codebooks, dtype=np.float32)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                state = self._state
+                version = state.pq_version + 1
+                np.save(self._codebooks_path(version), codebooks)
+                codes_path = self._data_path(_CODES_FILENAME, state.generation)
+                staging = codes_path + ".tmp"
+                with open(staging, "wb") as f:
+                    for start in range(0, state.rows, BLOCK_ROWS):
+                        block = np.asarray(state.vectors[start : start + BLOCK_ROWS])
+                        f.write(pq_encode(codebooks, block).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(staging, codes_path)
+                self._set_info(pq_version=version, pq_rows=state.rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._load()
+            self._remove_stale_files("pq-", self._codebooks_path(version))
+
+    # ========== IVF ==========
+
+    def _maybe_train_ivf(self) -> None:
+        state = self._state
+        live = state.live_count
+        if live < self.ivf_threshold:
+            return
+        if state.centroids is not None and state.rows < state.ivf_rows * _IVF_RETRAIN_GROWTH:
+            return
+
+        nlist = max(1, int(round(np.sqrt(live))))
+        live_rows = np.nonzero(state.alive)[0]
+        rng = np.random.default_rng(state.rows)
+        sample_rows = np.sort(
+            rng.choice(live_rows, min(live, nlist * _IVF_TRAIN_POINTS_PER_LIST), replace=False)
+        )
+        centroids = train_ivf_centroids(np.asarray(state.vectors[sample_rows]), nlist)
+        logger.info(f"训练IVF分区: collection={self.name}, live={live}, nlist={len(centroids)}")
+        self.install_ivf(centroids)
+
+    def install_ivf(self, centroids: np.ndarray) -> None:
+        """
+        使用给定的聚类中心重新划分全部行的IVF分区
+
+        Args:
+            centroids: 聚类中心矩阵 (nlist, dim)
+        """
+        centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        centroid_norms = squared_norms(centroids)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                state = self._state
+                version = state.ivf_version + 1
+                np.save(self._centroids_path(version), centroids)
+                assignments = nearest_centroids(state.vectors, centroids, centroid_norms)
+                self._conn.executemany(
+                    "UPDATE rows SET list_id = ? WHERE row = ?",
+                    zip(assignments.tolist(), range(state.rows)),
+                )
+                self._set_info(ivf_version=version, ivf_rows=state.rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._load()
+            self._remove_stale_files("centroids-", self._centroids_path(version))
+
+    # ========== 压缩 ==========
+
+    def _copy_live_rows(
+        self, filename: str, generation: int, source: np.ndarray, live_rows: np.ndarray
+    ) -> None:
+        """将存活行按原顺序分块复制到新一代数据文件"""
+        with open(self._data_path(filename, generation), "wb") as f:
+            for start in range(0, len(live_rows), BLOCK_ROWS):
+                block = np.asarray(source[live_rows[start : start + BLOCK_ROWS]])
+                f.write(np.ascontiguousarray(block).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _remove_generation_files(self, keep_generation: int) -> None:
+        """删除其他代的数据文件（已映射旧文件的进程在重新加载前不受影响）"""
+        current = {_generation_filename(name, keep_generation) for name in _DATA_FILENAMES}
+        prefixes = [os.path.splitext(name) for name in _DATA_FILENAMES]
+        for name in os.listdir(self.directory):
+            if name in current:
+                continue
+            if any(
+                name == stem + ext or (name.startswith(stem + "-") and name.endswith(ext))
+                for stem, ext in prefixes
+            ):
+                try:
+                    os.remove(self._path(name))
+                except OSError as e:
+                    logger.warning(f"删除旧数据文件失败: {self._path(name)}, error={str(e)}")
+
+    def compact(self) -> Dict[str, int]:
+        """
+        压缩集合，回收墓碑行
+
+        存活行按原顺序写入新一代数据文件，旁表在同一事务内删除墓碑行、重新编号并切换代号；
+        IVF聚类中心和PQ码本保持不变。提交前其他进程继续使用旧文件，
+        提交后通过data_version检测到变更并加载新一代文件。
+
+        Returns:
+            dict: 压缩前行数（rows_before）、压缩后行数（rows_after）和回收的墓碑数（reclaimed）
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            generation = None
+            try:
+                self._refresh()
+                state = self._state
+                live_rows = np.nonzero(state.alive)[0]
+                generation = state.generation + 1
+
+                if state.dim is not None:
+                    self._copy_live_rows(_VECTORS_FILENAME, generation, state.vectors, live_rows)
+                    if state.quantization != "none":
+                        self._copy_live_rows(_NORMS_FILENAME, generation, state.norms, live_rows)
+                    if state.codes is not None:
+                        encoded = live_rows[live_rows < state.code_rows]
+                        self._copy_live_rows(_CODES_FILENAME, generation, state.codes, encoded)
+                    if state.scales is not None:
+                        self._copy_live_rows(_SCALES_FILENAME, generation, state.scales, live_rows)
+
+                self._conn.execute("DELETE FROM rows WHERE deleted = 1")
+                # 按行号升序重新编号，目标行号总是已空出
+                self._conn.executemany(
+                    "UPDATE rows SET row = ? WHERE row = ?",
+                    [
+                        (new_row, old_row)
+                        for new_row, old_row in enumerate(live_rows.tolist())
+                        if new_row != old_row
+                    ],
+                )
+                values: Dict[str, Any] = {
+                    "generation": generation,
+                    "ivf_rows": min(state.ivf_rows, len(live_rows)),
+                }
+                if state.pq_version:
+                    values["pq_rows"] = int(np.searchsorted(live_rows, state.code_rows))
+                self._set_info(**values)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                if generation is not None:
+                    self._remove_generation_files(generation - 1)
+                raise
+            self._load()
+            self._remove_generation_files(generation)
+            try:
+                # 回收旁表中墓碑行（含文本和元数据）占用的页
+                self._conn.execute("VACUUM")
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error as e:
+                logger.warning(f"整理旁表失败: collection={self.name}, error={str(e)}")
+
+        logger.info(
+            f"压缩向量集合: collection={self.name}, rows={state.rows}, "
+            f"live={len(live_rows)}, generation={generation}"
+        )
+        return {
+            "rows_before": state.rows,
+            "rows_after": len(live_rows),
+            "reclaimed": state.rows - len(live_rows),
+        }
+
+    # ========== 读取 ==========
+
+    def _where_mask(self, where: Dict[str, Any], rows: int) -> np.ndarray:
+        condition, params = _where_to_sql(where)
+        with self._lock:
+            matched = np.array(
+                self._conn.execute(
+                    f"SELECT row FROM rows WHERE deleted = 0 AND ({condition})", params
+                ).fetchall(),
+                dtype=np.int64,
+            ).reshape(-1)
+        mask = np.zeros(rows, dtype=bool)
+        matched = matched[matched < rows]
+        mask[matched] = True
+        return mask
+
+    def _fetch_rows(self, rows: Sequence[int]) -> Dict[int, Tuple[str, Optional[str], Dict[str, Any]]]:
+        found = {}
+        with self._lock:
+            for i in range(0, len(rows), _SQLITE_MAX_VARIABLES):
+                part = [int(row) for row in rows[i : i + _SQLITE_MAX_VARIABLES]]
+                placeholders = ",".join("?" for _ in part)
+                records = self._conn.execute(
+                    f"SELECT row, id, document, metadata FROM rows WHERE row IN ({placeholders})",
+                    part,
+                ).fetchall()
+                for row, vector_id, document, metadata in records:
+                    found[row] = (vector_id, document, json.loads(metadata) if metadata else {})
+        return found
+
+    def _search(
+        self, state: _IndexState, query: np.ndarray, k: int, mask: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (行号, 平方L2距离)，按距离升序"""
+        if state.rows == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query_norm = float(query @ query)
+
+        candidates: Optional[np.ndarray] = None
+        if state.centroids is not None:
+            centroid_distances = state.centroid_norms - 2.0 * (state.centroids @ query)
+            nprobe = min(self.ivf_nprobe, len(state.centroids))
+            probes = np.argpartition(centroid_distances, nprobe - 1)[:nprobe]
+            candidates = np.sort(
+                np.concatenate([state.list_rows[p] for p in probes] + [state.unassigned_rows])
+            )
+            candidates = candidates[mask[candidates]]
+            # 过滤条件过严、候选不足k个时退回全量扫描
+            if len(candidates) < k:
+                candidates = None
+
+        if state.code_rows == 0:
+            if candidates is None:
+                distances = state.norms - 2.0 * (state.vectors @ query) + query_norm
+                candidates = np.nonzero(mask)[0]
+                return self._top_k(candidates, distances[candidates], k)
+            return self._top_k(
+                candidates, self._exact_distances(state, candidates, query, query_norm), k
+            )
+
+        # 量化编码粗排取 k * rescore_factor 个候选，未编码的行直接参与精排
+        if candidates is None:
+            candidates = np.nonzero(mask)[0]
+            encoded = candidates[candidates < state.code_rows]
+            approx = self._approx_distances(state, None, query, query_norm)[encoded]
+        else:
+            encoded = candidates[candidates < state.code_rows]
+            approx = self._approx_distances(state, encoded, query, query_norm)
+        shortlist, _ = self._top_k(encoded, approx, k * self.rescore_factor)
+        shortlist = np.sort(np.concatenate([shortlist, candidates[candidates >= state.code_rows]]))
+        return self._top_k(shortlist, self._exact_distances(state, shortlist, query, query_norm), k)
+
+    @staticmethod
+    def _exact_distances(
+        state: _IndexState, rows: np.ndarray, query: np.ndarray, query_norm: float
+    ) -> np.ndarray:
+        """使用float32向量计算指定行的平方L2距离"""
+        return state.norms[rows] - 2.0 * (state.vectors[rows] @ query) + query_norm
+
+    @staticmethod
+    def _approx_distances(
+        state: _IndexState, rows: Optional[np.ndarray], query: np.ndarray, query_norm: float
+    ) -> np.ndarray:
+        """使用量化编码计算近似平方L2距离（rows为None时计算全部已编码行）"""
+        if rows is None:
+            rows = slice(0, state.code_rows)
+        if state.quantization == "int8":
+            return int8_distances(
+                state.codes[rows], state.scales[rows], state.norms[rows], query, query_norm
+            )
+        return pq_distances(state.codebooks, state.codes[rows], query)
+
+    @staticmethod
+    def _top_k(rows: np.ndarray, distances: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, len(rows))
+        if k <= 0:
+            return rows[:0], distances[:0]
+        if k < len(rows):
+            selected = np.argpartition(distances, k - 1)[:k]
+        else:
+            selected = np.arange(len(rows))
+        order = selected[np.argsort(distances[selected], kind="stable")]
+        return rows[order], np.maximum(distances[order], 0.0)
+
+    def query(
+        self,
+        query_embeddings: Optional[Sequence[Any]] = None,
+        query_texts: Optional[Sequence[str]] = None,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = _DEFAULT_QUERY_INCLUDE,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        按向量检索top-k（返回结构与Chroma Collection.query一致）
+
+        Args:
+            query_embeddings: 查询向量（单个或多个）
+            query_texts: 不支持，索引不持有嵌入模型
+            n_results: 每个查询返回的结果数
+            where: 元数据过滤条件
+            where_document: 不支持
+            include: 返回字段（documents/metadatas/distances/embeddings）
+
+        Returns:
+            Dict[str, Any]: ids/documents/metadatas/distances/embeddings，每个查询一个列表
+        """
+        if query_embeddings is None:
+            raise ValueError("NumPy向量索引只支持按向量检索")
+        if where_document:
+            raise ValueError("NumPy向量索引不支持where_document过滤")
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+
+        self._refresh()
+        state = self._state
+        if state.dim is not None and queries.shape[1] != state.dim:
+            raise InvalidDimensionException(
+                f"Embedding dimension {queries.shape[1]} does not match "
+                f"collection dimensionality {state.dim}"
+            )
+
+        mask = state.alive
+        if where:
+            mask = mask & self._where_mask(where, state.rows)
+
+        result: Dict[str, Any] = {key: [] for key in ("ids", *include)}
+        for query in queries:
+            rows, distances = self._search(state, query, n_results, mask)
+            found = self._fetch_rows(rows.tolist())
+            hits = [(row, d) for row, d in zip(rows.tolist(), distances.tolist()) if row in found]
+            rows = [row for row, _ in hits]
+            result["ids"].append([found[row][0] for row in rows])
+            if "documents" in include:
+                result["documents"].append([found[row][1] for row in rows])
+            if "metadatas" in include:
+                result["metadatas"].append([found[row][2] for row in rows])
+            if "distances" in include:
+                result["distances"].append([float(d) for _, d in hits])
+            if "embeddings" in include:
+                result["embeddings"].append([state.vectors[row].tolist() for row in rows])
+        return result
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Sequence[str] = _DEFAULT_GET_INCLUDE,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        按ID或过滤条件读取向量记录（返回结构与Chroma Collection.get一致）
+
+        Args:
+            ids: 向量ID列表
+            where: 元数据过滤条件
+            limit: 最大返回数量
+            offset: 跳过数量
+            include: 返回字段（documents/metadatas/embeddings）
+
+        Returns:
+            Dict[str, Any]: ids/documents/metadatas/embeddings
+        """
+        self._refresh()
+        state = self._state
+        condition, params = _where_to_sql(where) if where else ("1", [])
+
+        records: List[Tuple[int, str, Optional[str], Optional[str]]] = []
+        base = f"SELECT row, id, document, metadata FROM rows WHERE deleted = 0 AND ({condition})"
+        with self._lock:
+            if ids is None:
+                records = self._conn.execute(base + " ORDER BY row", params).fetchall()
+            else:
+                ids = list(ids)
+                for i in range(0, len(ids), _SQLITE_MAX_VARIABLES):
+                    part = ids[i : i + _SQLITE_MAX_VARIABLES]
+                    placeholders = ",".join("?" for _ in part)
+                    records.extend(
+                        self._conn.execute(
+                            base + f" AND id IN ({placeholders}) ORDER BY row", params + part
+                        ).fetchall()
+                    )
+        records = [record for record in records if record[0] < state.rows]
+        start = offset or 0
+        records = records[start : start + limit if limit is not None else None]
+
+        result: Dict[str, Any] = {"ids": [record[1] for record in records]}
+        if "documents" in include:
+            result["documents"] = [record[2] for record in records]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(record[3]) if record[3] else {} for record in records]
+        if "embeddings" in include:
+            result["embeddings"] = [state.vectors[record[0]].tolist() for record in records]
+        return result
+
+    def count(self) -> int:
+        """存活向量数"""
+        self._refresh()
+        return self._state.live_count
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        索引统计信息
+
+        Returns:
+            dict: 行数、存活数、墓碑数、维度、IVF分区数、量化信息、数据文件代号和磁盘占用
+            （disk_bytes为目录总大小，其中vector_disk_bytes为float32矩阵，
+            quantized_disk_bytes为量化额外写入的编码、范数、缩放系数和码本）
+        """
+        self._refresh()
+        state = self._state
+        vector_file = _generation_filename(_VECTORS_FILENAME, state.generation)
+        quantized_prefixes = tuple(
+            os.path.splitext(name)[0] for name in (_NORMS_FILENAME, _CODES_FILENAME, _SCALES_FILENAME)
+        ) + ("pq-",)
+        disk_bytes = vector_disk_bytes = quantized_disk_bytes = 0
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            size = entry.stat().st_size
+            disk_bytes += size
+            if entry.name == vector_file:
+                vector_disk_bytes += size
+            elif entry.name.startswith(quantized_prefixes):
+                quantized_disk_bytes += size
+        return {
+            "rows": state.rows,
+            "live": state.live_count,
+            "tombstones": state.rows - state.live_count,
+            "dim": state.dim,
+            "generation": state.generation,
+            "disk_bytes": disk_bytes,
+            "vector_disk_bytes": vector_disk_bytes,
+            "quantized_disk_bytes": quantized_disk_bytes,
+            "ivf_lists": 0 if state.centroids is None else len(state.centroids),
+            "quantization": self.quantization,
+            "encoded_rows": state.code_rows,
+            "resident_bytes": state.resident_bytes,
+        }
+
+    def close(self) -> None:
+        """关闭旁表连接并释放内存映射"""
+        with self._lock:
+            self._state = _IndexState()
+            self._conn.close()
+
+
+class NumpyIndexClient:
+    """
+    NumPy向量索引客户端（接口兼容Chroma客户端的常用方法）
+
+    每个集合一个子目录，集合实例在客户端内缓存复用。
+    """
+
+    def __init__(self, root: str, **collection_options: Any):
+        """
+        初始化客户端
+
+        Args:
+            root: 索引根目录
+            collection_options: 传给NumpyIndexCollection的选项
+                （ivf_threshold、ivf_nprobe、quantization、pq_subvector_dim、rescore_factor）
+        """
+        self.root = root
+        self.collection_options = collection_options
+        os.makedirs(root, exist_ok=True)
+        self._collections: Dict[str, NumpyIndexCollection] = {}
+        self._lock = threading.Lock()
+
+    def _directory(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def get_or_create_collection(
+        self,
+        name: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        embedding_function: Any = None,
+        **kwargs: Any,
+    ) -> NumpyIndexCollection:
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = NumpyIndexCollection(
+                    name, self._directory(name), metadata=metadata, **self.collection_options
+                )
+                self._collections[name] = collection
+            return collection
+
+    create_collection = get_or_create_collection
+
+    def get_collection(self, name: str, **kwargs: Any) -> NumpyIndexCollection:
+        if name not in self._collections and not os.path.isdir(self._directory(name)):
+            raise ValueError(f"Collection {name} does not exist.")
+        return self.get_or_create_collection(name)
+
+    def list_collections(self) -> List[NumpyIndexCollection]:
+        names = sorted(
+            name for name in os.listdir(self.root) if os.path.isdir(self._directory(name))
+        )
+        return [self.get_or_create_collection(name) for name in names]
+
+    def delete_collection(self, name: str) -> None:
+        with self._lock:
+            collection = self._collections.pop(name, None)
+            if collection is not None:
+                collection.close()
+            if not os.path.isdir(self._directory(name)):
+                raise ValueError(f"Collection {name} does not exist.")
+            shutil.rmtree(self._directory(name))
+
+    def heartbeat(self) -> int:
+        return 0
+
+    def close(self) -> None:
+        """关闭所有集合"""
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections.clear()
+
+
+class NumpyVectorBackend(VectorStoreBackend):
+    """进程内NumPy向量索引（中小规模知识库）"""
+
+    name = "numpy"
+
+    def __init__(self, persist_directory: str, **collection_options: Any):
+        """
+        初始化NumPy后端
+
+        Args:
+            persist_directory: 持久化目录（索引位于其下的numpy_index子目录）
+            collection_options: 集合选项（ivf_threshold、ivf_nprobe、quantization等），
+                未指定的从配置读取
+        """
+        self.root = numpy_index_root(persist_directory)
+        self.collection_options = collection_options
+
+    def create_client(self) -> chromadb.ClientAPI:
+        return NumpyIndexClient(self.root, **self.collection_options)
+
+    def describe(self) -> str:
+        return f"numpy({self.root})"
+
+
+def numpy_index_root(persist_directory: str) -> str:
+    """
+    获取NumPy向量索引根目录
+
+    Args:
+        persist_directory: 向量库持久化目录
+
+    Returns:
+        str: 索引根目录
+    """
+    return os.path.join(persist_directory, _INDEX_DIRNAME)
+
+
+# 导出
+__all__ = [
+    "NumpyIndexCollection",
+    "NumpyIndexClient",
+    "NumpyVectorBackend",
+    "numpy_index_root",
+    "train_ivf_centroids",
+]
@@ -137,6 +137,11 @@ class RedisKeys:
     CONVERSATION_LIST = "cache:conversations:{user_id}"
     KNOWLEDGE_BASE_LIST = "cache:knowledge_bases:{user_id}"
     SYSTEM_CONFIG = "cache:system:config"
+    EMBEDDING_CACHE = "cache:embedding:{model}:{text_hash}"
+    KNOWLEDGE_BASE_VERSION = "cache:knowledge_base:{kb_id}:version"
+
+    # 对话记忆
+    CONVERSATION_MEMORY = "memory:conversation:{namespace}:{conversation_id}"
 
     # 文档处理进度
     DOCUMENT_PROGRESS = "document:{document_id}:progress"
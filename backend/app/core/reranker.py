@@ -0,0 +1,314 @@
+"""
+检索结果重排序模块
+
+向量检索（尤其是多知识库联合检索）合并后的顺序来自各集合的原始距离，
+不同时间、不同嵌入模型生成的集合之间距离不可比。重排序阶段对多召回的候选
+在CPU上重新打分：
+- bm25: 内置默认实现，在候选集合内计算BM25得分（得分在集合间可比），完全离线
+- onnx: 可选的ONNX交叉编码器（需提供模型文件和HuggingFace tokenizer.json），
+  依赖 onnxruntime 和 tokenizers（随chromadb安装）
+
+重排序有硬性时间预算，超时或出错时保留原检索顺序。
+
+使用方式:
+    reranker = get_reranker()
+    order = await rerank_candidates(reranker, "E1042 是什么错误", passages, timeout=0.3)
+    if order is not None:
+        passages = [passages[i] for i in order]
+"""
+
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+from app.config import settings
+from app.core.executors import get_executors
+from app.core.sparse_index import tokenize
+from app.middleware.prometheus_middleware import record_rerank
+
+logger = logging.getLogger(__name__)
+
+
+class Reranker(ABC):
+    """
+    重排序打分器基类
+
+    子类实现 score()，返回每个候选与查询的相关性得分（越大越相关）。
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def score(self, query: str, passages: Sequence[str]) -> List[float]:
+        """
+        计算候选得分
+
+        Args:
+            query: 查询文本
+            passages: 候选分块文本
+
+        Returns:
+            List[float]: 得分列表，与passages一一对应
+        """
+
+
+class BM25Reranker(Reranker):
+    """
+    候选集合内的BM25打分器（离线默认实现）
+
+    IDF按候选集合统计，分词与稀疏倒排索引一致。
+    """
+
+    name = "bm25"
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, tokenizer: Optional[str] = None):
+        """
+        初始化打分器
+
+        Args:
+            k1: 词频饱和参数
+            b: 长度归一化参数
+            tokenizer: 中文分词方式，默认从配置读取
+        """
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = tokenizer
+
+    def score(self, query: str, passages: Sequence[str]) -> List[float]:
+        query_terms = set(tokenize(query, self.tokenizer))
+        if not passages or not query_terms:
+            return [0.0] * len(passages)
+
+        term_counts = [Counter(tokenize(p, self.tokenizer)) for p in passages]
+        lengths = [sum(c.values()) for c in term_counts]
+        avg_length = (sum(lengths) / len(lengths)) or 1.0
+        n = len(passages)
+
+        scores = [0.0] * n
+        for term in query_terms:
+            df = sum(1 for c in term_counts if term in c)
+            if df == 0:
+                continue
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            for i, counts in enumerate(term_counts):
+                tf = counts.get(term, 0)
+                if tf:
+                    norm = self.k1 * (1.0 - self.b + self.b * lengths[i] / avg_length)
+                    scores[i] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+        return scores
+
+
+class ONNXCrossEncoderReranker(Reranker):
+    """
+    ONNX交叉编码器打分器
+
+    模型输入为 (查询, 候选) 句对，输出每个句对的相关性logit。
+    模型和分词器在首次打分时加载。
+    """
+
+    name = "onnx"
+
+    def __init__(
+        self,
+        model_path: str,
+        tokenizer_path: Optional[str] = None,
+        max_length: int = 512,
+        batch_size: int = 16,
+    ):
+        """
+        初始化打分器
+
+        Args:
+            model_path: ONNX模型文件路径
+            tokenizer_path: tokenizer.json路径，默认为模型同目录下的tokenizer.json
+            max_length: 句对最大token数
+            batch_size: 推理批大小
+        """
+        self.model_path = model_path
+        self.tokenizer_path = tokenizer_path or os.path.join(
+            os.path.dirname(os.path.abspath(model_path)), "tokenizer.json"
+        )
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self._session: Optional[Any] = None
+        self._tokenizer: Optional[Any] = None
+        self._input_names: List[str] = []
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """加载ONNX模型和分词器（已加载时跳过）"""
+        if self._session is not None:
+            return
+        with self._lock:
+            if self._session is not None:
+                return
+            import onnxruntime
+            from tokenizers import Tokenizer
+
+            tokenizer = Tokenizer.from_file(self.tokenizer_path)
+            tokenizer.enable_truncation(max_length=self.max_length)
+            tokenizer.enable_padding()
+            session = onnxruntime.InferenceSession(
+                self.model_path, providers=["CPUExecutionProvider"]
+            )
+            self._tokenizer = tokenizer
+            self._input_names = [i.name for i in session.get_inputs()]
+            self._session = session
+            logger.info(f"ONNX重排序模型已加载: {self.model_path}")
+
+    def score(self, query: str, passages: Sequence[str]) -> List[float]:
+        self.load()
+        scores: List[float] = []
+        for start in range(0, len(passages), self.batch_size):
+            batch = passages[start : start + self.batch_size]
+            encodings = self._tokenizer.encode_batch([(query, p) for p in batch])
+            inputs = {
+                "input_ids": np.asarray([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.asarray([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.asarray([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            outputs = self._session.run(
+                None, {name: inputs[name] for name in self._input_names if name in inputs}
+            )
+            logits = np.asarray(outputs[0], dtype=np.float32).reshape(len(batch), -1)
+            # 单列输出为相关性logit；两列输出（不相关/相关）取相关列
+            scores.extend(logits[:, -1].tolist())
+        return scores
+
+
+def create_reranker(name: Optional[str] = None) -> Reranker:
+    """
+    按名称创建打分器
+
+    ONNX模型未配置或加载失败时退化为BM25打分器。
+
+    Args:
+        name: 打分器名称（"bm25" 或 "onnx"），默认从配置读取
+
+    Returns:
+        Reranker: 打分器
+    """
+    rag_settings = settings.rag
+    name = name or rag_settings.rag_reranker
+    if name == "onnx":
+        if not rag_settings.rag_rerank_onnx_model_path:
+            logger.warning("未配置RAG_RERANK_ONNX_MODEL_PATH，重排序改用BM25")
+            return BM25Reranker()
+        reranker = ONNXCrossEncoderReranker(
+            model_path=rag_settings.rag_rerank_onnx_model_path,
+            tokenizer_path=rag_settings.rag_rerank_onnx_tokenizer_path,
+            max_length=rag_settings.rag_rerank_max_length,
+            batch_size=rag_settings.rag_rerank_batch_size,
+        )
+        try:
+            reranker.load()
+        except Exception as e:
+            logger.error(f"ONNX重排序模型加载失败，改用BM25: {str(e)}")
+            return BM25Reranker()
+        return reranker
+    return BM25Reranker()
+
+
+async def rerank_candidates(
+    reranker: Reranker,
+    query: str,
+    passages: Sequence[str],
+    timeout: Optional[float] = None,
+) -> Optional[List[int]]:
+    """
+    在时间预算内对候选重排序
+
+    打分在共享I/O线程池中执行；超时后不再等待打分结果（已开始的打分在后台完成后丢弃）。
+
+    Args:
+        reranker: 打分器
+        query: 查询文本
+        passages: 按检索顺序排列的候选分块文本
+        timeout: 时间预算（秒），默认从配置读取
+
+    Returns:
+        Optional[List[int]]: 重排序后的候选下标，超时或出错时返回None（保留原顺序）
+    """
+    if len(passages) < 2:
+        return None
+    if timeout is None:
+        timeout = settings.rag.rag_rerank_timeout_ms / 1000.0
+
+    start = time.perf_counter()
+    try:
+        scores = await asyncio.wait_for(
+            get_executors().run_io(reranker.score, query, list(passages)),
+            timeout=timeout,
+        )
+    except asyncio.TimeoutError:
+        record_rerank(reranker.name, "timeout", time.perf_counter() - start)
+        logger.warning(
+            f"重排序超时，保留检索顺序: reranker={reranker.name}, "
+            f"candidates={len(passages)}, timeout={timeout}s"
+        )
+        return None
+    except Exception as e:
+        record_rerank(reranker.name, "error", time.perf_counter() - start)
+        logger.warning(f"重排序失败，保留检索顺序: reranker={reranker.name}, error={str(e)}")
+        return None
+
+    # 得分相同时保留检索顺序
+    order = sorted(range(len(passages)), key=lambda i: (-scores[i], i))
+    record_rerank(reranker.name, "ok", time.perf_counter() - start)
+    return order
+
+
+# 全局打分器实例
+_reranker: Optional[Reranker] = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Optional[Reranker]:
+    """
+    获取全局打分器
+
+    Returns:
+        Optional[Reranker]: 打分器，未启用重排序时返回None
+    """
+    global _reranker
+
+    if not settings.rag.rag_rerank_enabled:
+        return None
+
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = create_reranker()
+    return _reranker
+
+
+def reset_reranker() -> None:
+    """
+    重置全局打分器
+
+    用于测试或配置更新后重新初始化
+    """
+    global _reranker
+
+    with _reranker_lock:
+        _reranker = None
+
+
+# 导出
+__all__ = [
+    "BM25Reranker",
+    "ONNXCrossEncoderReranker",
+    "Reranker",
+    "create_reranker",
+    "get_reranker",
+    "rerank_candidates",
+    "reset_reranker",
+]
@@ -0,0 +1,149 @@
+"""
+检索结果后处理模块
+
+在向量检索之后、组装提示之前对候选分块做筛选：
+- 相似度阈值: 丢弃相似度低于阈值的分块，避免无关内容进入提示（缺少相似度的分块不过滤）
+- 最大边际相关性（MMR）: 在相关性和多样性之间权衡选出 top-k，
+  同一文档重叠切分产生的近似重复分块不会占满结果
+- 近似重复剔除: 与已选分块的相似度超过上限的候选直接丢弃
+
+MMR只使用检索时一并取回的分块向量（NumPy向量化计算），不再调用嵌入模型。
+
+使用方式:
+    indices = select_candidates(
+        similarities=[0.91, 0.90, 0.62],
+        embeddings=[v1, v2, v3],
+        k=2,
+        similarity_threshold=0.7,
+        mmr_lambda=0.7,
+    )
+"""
+
+import logging
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def maximal_marginal_relevance(
+    relevance: Sequence[float],
+    embeddings: Sequence[Optional[Sequence[float]]],
+    k: int,
+    lambda_mult: float = 0.7,
+    duplicate_threshold: Optional[float] = None,
+) -> List[int]:
+    """
+    最大边际相关性选择
+
+    每一步选择 lambda * 相关性 - (1 - lambda) * 与已选分块的最大余弦相似度 最大的候选。
+    缺少向量的候选不参与冗余度计算（冗余度视为0）。
+
+    Args:
+        relevance: 候选与查询的相关性（越大越相关）
+        embeddings: 候选分块向量，与relevance一一对应
+        k: 选择数量
+        lambda_mult: 相关性权重，1.0等价于按相关性排序
+        duplicate_threshold: 与已选分块的余弦相似度不低于该值的候选直接丢弃（None表示不丢弃）
+
+    Returns:
+        List[int]: 被选中候选的下标，按选择顺序排列
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+
+    scores = np.asarray(relevance, dtype=np.float32)
+    has_vector = np.array([e is not None and len(e) > 0 for e in embeddings], dtype=bool)
+    dims = {len(e) for e in embeddings if e is not None and len(e) > 0}
+    if len(dims) > 1:
+        # 向量维度不一致（例如来自不同嵌入模型的知识库），退化为按相关性排序
+        logger.warning(f"候选向量维度不一致，跳过多样性计算: dims={sorted(dims)}")
+        has_vector[:] = False
+
+    matrix = np.zeros((n, dims.pop() if len(dims) == 1 else 1), dtype=np.float32)
+    if has_vector.any():
+        matrix[has_vector] = np.asarray(
+            [embeddings[i] for i in np.flatnonzero(has_vector)], dtype=np.float32
+        )
+        matrix = _normalize_rows(matrix)
+
+    # 每个候选与已选集合的最大相似度，随选择增量更新
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected: List[int] = []
+
+    while len(selected) < k and available.any():
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+        mmr = lambda_mult * scores - (1.0 - lambda_mult) * penalty
+        mmr[~available] = -np.inf
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        available[best] = False
+
+        if has_vector[best]:
+            similarity = matrix @ matrix[best]
+            similarity[~has_vector] = -np.inf
+            redundancy = np.maximum(redundancy, similarity)
+            if duplicate_threshold is not None:
+                available &= ~(similarity >= duplicate_threshold)
+
+    return selected
+
+
+def select_candidates(
+    similarities: Sequence[Optional[float]],
+    embeddings: Optional[Sequence[Optional[Sequence[float]]]],
+    k: int,
+    similarity_threshold: float = 0.0,
+    mmr_lambda: Optional[float] = None,
+    duplicate_threshold: Optional[float] = None,
+    relevance: Optional[Sequence[float]] = None,
+) -> List[int]:
+    """
+    按相似度阈值过滤候选，再按MMR（或原有顺序）选出前k个
+
+    Args:
+        similarities: 候选与查询的相似度（0~1，None表示缺少距离，不按阈值过滤）
+        embeddings: 候选分块向量（None表示不做多样性选择）
+        k: 选择数量
+        similarity_threshold: 相似度阈值
+        mmr_lambda: MMR相关性权重（None表示不做多样性选择）
+        duplicate_threshold: 近似重复的余弦相似度上限
+        relevance: MMR使用的相关性（例如混合检索的融合排名），
+            默认使用相似度（存在缺少相似度的候选时按原有顺序）
+
+    Returns:
+        List[int]: 被选中候选的下标
+    """
+    kept = [i for i, s in enumerate(similarities) if s is None or s >= similarity_threshold]
+    if mmr_lambda is None or embeddings is None:
+        return kept[:k]
+
+    if relevance is None:
+        if any(s is None for s in similarities):
+            relevance = [1.0 - i / len(similarities) for i in range(len(similarities))]
+        else:
+            relevance = similarities
+    chosen = maximal_marginal_relevance(
+        relevance=[relevance[i] for i in kept],
+        embeddings=[embeddings[i] for i in kept],
+        k=k,
+        lambda_mult=mmr_lambda,
+        duplicate_threshold=duplicate_threshold,
+    )
+    return [kept[i] for i in chosen]
+
+
+# 导出
+__all__ = [
+    "maximal_marginal_relevance",
+    "select_candidates",
+]
@@ -0,0 +1,411 @@
+"""
+知识库稀疏倒排索引模块
+
+为每个知识库在本地维护一个BM25倒排索引（SQLite FTS5，默认位于Chroma持久化目录旁），
+弥补稠密向量检索对错误码、标识符、产品名等精确词项召回不足的问题：
+- 分词: 英文/数字按标识符整体切分（保留 - _ . 连接的整体及其组成部分），
+  中文按单字 + 二元组切分；安装jieba时可改用jieba搜索模式分词
+- 文档处理时按批增量写入，删除文档向量时同步删除，删除知识库时删除索引文件
+- 检索结果按BM25评分排序
+
+使用方式:
+    index = get_sparse_index_store().get(knowledge_base_id=1)
+    index.add_chunks([SparseChunk("doc_1_chunk_0", 1, "错误码 E1042 ...", {...})])
+    hits = index.search("E1042 是什么错误", k=20)
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_SPARSE_INDEX_DIRNAME = "sparse_index"
+
+# 标识符（字母数字及 - _ . 连接）或连续中文
+_TOKEN_PATTERN = re.compile("[a-z0-9]+(?:[-_.][a-z0-9]+)*|[\u4e00-\u9fff]+")
+_IDENTIFIER_PARTS = re.compile("[-_.]")
+
+# 单次检索最多使用的查询词项数
+_MAX_QUERY_TERMS = 64
+
+_jieba = None
+
+
+def _load_jieba() -> Optional[Any]:
+    global _jieba
+    if _jieba is None:
+        try:
+            import jieba
+
+            jieba.setLogLevel(logging.WARNING)
+            _jieba = jieba
+        except ImportError:
+            logger.warning("未安装jieba，稀疏索引改用二元组分词")
+            _jieba = False
+    return _jieba or None
+
+
+def _cjk_ngrams(run: str, use_jieba: bool) -> List[str]:
+    if use_jieba:
+        jieba = _load_jieba()
+        if jieba is not None:
+            return [w for w in jieba.cut_for_search(run) if w.strip()]
+    tokens = list(run)
+    tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def tokenize(text: str, tokenizer: Optional[str] = None) -> List[str]:
+    """
+    将文本切分为索引词项
+
+    Args:
+        text: 文本
+        tokenizer: 中文分词方式（"ngram" 或 "jieba"），默认从配置读取
+
+    Returns:
+        List[str]: 词项列表（保留重复，用于词频统计）
+    """
+    use_jieba = (tokenizer or settings.vector_db.sparse_index_tokenizer) == "jieba"
+    normalized = unicodedata.normalize("NFKC", text or "").lower()
+
+    tokens: List[str] = []
+    for match in _TOKEN_PATTERN.finditer(normalized):
+        token = match.group()
+        if "\u4e00" <= token[0] <= "\u9fff":
+            tokens.extend(_cjk_ngrams(token, use_jieba))
+            continue
+        tokens.append(token)
+        parts = [p for p in _IDENTIFIER_PARTS.split(token) if p]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def _match_expression(query: str, tokenizer: Optional[str] = None) -> Optional[str]:
+    terms = list(dict.fromkeys(tokenize(query, tokenizer)))[:_MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+@dataclass
+class SparseChunk:
+    """稀疏索引中的分块"""
+
+    chunk_id: str
+    document_id: Optional[int]
+    content: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class SparseHit:
+    """稀疏检索结果"""
+
+    chunk_id: str
+    content: str
+    metadata: Dict[str, Any]
+    score: float
+
+
+class SparseIndex:
+    """
+    单个知识库的BM25倒排索引
+
+    分块元数据保存在普通表中（按文档ID建索引），词项保存在FTS5表中，两者以rowid关联。
+    线程安全。
+    """
+
+    def __init__(self, path: str, tokenizer: Optional[str] = None):
+        """
+        初始化索引
+
+        Args:
+            path: SQLite文件路径
+            tokenizer: 中文分词方式，默认从配置读取
+        """
+        self.path = path
+        self.tokenizer = tokenizer or settings.vector_db.sparse_index_tokenizer
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL模式允许文档处理worker写入的同时API进程读取
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                rowid INTEGER PRIMARY KEY,
+                chunk_id TEXT NOT NULL UNIQUE,
+                document_id INTEGER,
+                content TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON chunks (document_id)"
+        )
+        # 词项由应用层切分后以空格连接写入，FTS5只按空白切分
+        self._conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunk_terms USING fts5(
+                terms, tokenize = "unicode61 tokenchars '-_.'"
+            )
+            """
+        )
+        self._conn.commit()
+
+    def _delete_rowids(self, rowids: Sequence[int]) -> None:
+        for rowid in rowids:
+            self._conn.execute("DELETE FROM chunk_terms WHERE rowid = ?", (rowid,))
+            self._conn.execute("DELETE FROM chunks WHERE rowid = ?", (rowid,))
+
+    def add_chunks(self, chunks: Sequence[SparseChunk]) -> int:
+        """
+        写入分块（相同chunk_id的分块被覆盖）
+
+        Args:
+            chunks: 分块列表
+
+        Returns:
+            int: 写入的分块数
+        """
+        if not chunks:
+            return 0
+        rows = [
+            (
+                chunk,
+                " ".join(tokenize(chunk.content, self.tokenizer)),
+                json.dumps(chunk.metadata, ensure_ascii=False, default=str),
+            )
+            for chunk in chunks
+        ]
+        with self._lock:
+            placeholders = ",".join("?" for _ in chunks)
+            existing = self._conn.execute(
+                f"SELECT rowid FROM chunks WHERE chunk_id IN ({placeholders})",
+                [chunk.chunk_id for chunk in chunks],
+            ).fetchall()
+            self._delete_rowids([row[0] for row in existing])
+            for chunk, terms, metadata in rows:
+                cursor = self._conn.execute(
+                    "INSERT INTO chunks (chunk_id, document_id, content, metadata) "
+                    "VALUES (?, ?, ?, ?)",
+                    (chunk.chunk_id, chunk.document_id, chunk.content, metadata),
+                )
+                self._conn.execute(
+                    "INSERT INTO chunk_terms (rowid, terms) VALUES (?, ?)",
+                    (cursor.lastrowid, terms),
+                )
+            self._conn.commit()
+        return len(rows)
+
+    def delete_document(self, document_id: int) -> int:
+        """
+        删除文档的所有分块
+
+        Args:
+            document_id: 文档ID
+
+        Returns:
+            int: 删除的分块数
+        """
+        with self._lock:
+            rowids = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT rowid FROM chunks WHERE document_id = ?", (document_id,)
+                ).fetchall()
+            ]
+            self._delete_rowids(rowids)
+            self._conn.commit()
+        return len(rowids)
+
+    def search(self, query: str, k: int = 20) -> List[SparseHit]:
+        """
+        BM25检索
+
+        Args:
+            query: 查询文本
+            k: 返回结果数量
+
+        Returns:
+            List[SparseHit]: 按BM25评分降序排列的结果
+        """
+        expression = _match_expression(query, self.tokenizer)
+        if expression is None or k <= 0:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT c.chunk_id, c.content, c.metadata, bm25(chunk_terms) AS score
+                FROM chunk_terms JOIN chunks c ON c.rowid = chunk_terms.rowid
+                WHERE chunk_terms MATCH ?
+                ORDER BY score
+                LIMIT ?
+                """,
+                (expression, k),
+            ).fetchall()
+        # FTS5的bm25()越小越相关，取负值使评分越大越相关
+        return [
+            SparseHit(chunk_id=chunk_id, content=content, metadata=json.loads(metadata), score=-score)
+            for chunk_id, content, metadata, score in rows
+        ]
+
+    def count(self) -> int:
+        """统计索引中的分块数"""
+        with self._lock:
+            return int(self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0])
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+class SparseIndexStore:
+    """
+    按知识库管理稀疏索引文件
+
+    使用方式:
+        store = SparseIndexStore("/data/sparse_index")
+        index = store.get(1)
+        store.delete_knowledge_base(1)
+    """
+
+    def __init__(self, directory: str):
+        """
+        初始化索引存储
+
+        Args:
+            directory: 索引文件目录
+        """
+        self.directory = directory
+        self._indexes: Dict[int, SparseIndex] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, knowledge_base_id: int) -> str:
+        return os.path.join(self.directory, f"kb_{knowledge_base_id}.sqlite3")
+
+    def get(self, knowledge_base_id: int) -> SparseIndex:
+        """
+        获取知识库的索引（不存在时创建）
+
+        Args:
+            knowledge_base_id: 知识库ID
+
+        Returns:
+            SparseIndex: 索引实例
+        """
+        with self._lock:
+            index = self._indexes.get(knowledge_base_id)
+            if index is None:
+                index = SparseIndex(self._path(knowledge_base_id))
+                self._indexes[knowledge_base_id] = index
+            return index
+
+    def exists(self, knowledge_base_id: int) -> bool:
+        """知识库是否已有索引文件"""
+        return os.path.exists(self._path(knowledge_base_id))
+
+    def delete_knowledge_base(self, knowledge_base_id: int) -> None:
+        """
+        删除知识库的索引文件
+
+        Args:
+            knowledge_base_id: 知识库ID
+        """
+        with self._lock:
+            index = self._indexes.pop(knowledge_base_id, None)
+            if index is not None:
+                index.close()
+            path = self._path(knowledge_base_id)
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    def close(self) -> None:
+        """关闭所有索引连接"""
+        with self._lock:
+            for index in self._indexes.values():
+                index.close()
+            self._indexes.clear()
+
+
+def default_index_directory() -> str:
+    """
+    获取默认索引目录（Chroma持久化目录的同级目录下）
+
+    Returns:
+        str: 索引目录
+    """
+    configured = settings.vector_db.sparse_index_directory
+    if configured:
+        return configured
+    persist_dir = os.path.abspath(settings.vector_db.chroma_persist_directory)
+    return os.path.join(os.path.dirname(persist_dir), _SPARSE_INDEX_DIRNAME)
+
+
+# 全局稀疏索引存储实例
+_sparse_index_store: Optional[SparseIndexStore] = None
+_store_lock = threading.Lock()
+
+
+def get_sparse_index_store() -> Optional[SparseIndexStore]:
+    """
+    获取全局稀疏索引存储
+
+    Returns:
+        Optional[SparseIndexStore]: 存储实例，未启用时返回None
+    """
+    global _sparse_index_store
+
+    if not settings.vector_db.sparse_index_enabled:
+        return None
+
+    if _sparse_index_store is None:
+        with _store_lock:
+            if _sparse_index_store is None:
+                _sparse_index_store = SparseIndexStore(default_index_directory())
+    return _sparse_index_store
+
+
+def reset_sparse_index_store() -> None:
+    """
+    重置全局稀疏索引存储
+
+    用于测试或配置更新后重新初始化
+    """
+    global _sparse_index_store
+
+    with _store_lock:
+        if _sparse_index_store is not None:
+            _sparse_index_store.close()
+        _sparse_index_store = None
+
+
+# 导出
+__all__ = [
+    "SparseChunk",
+    "SparseHit",
+    "SparseIndex",
+    "SparseIndexStore",
+    "default_index_directory",
+    "get_sparse_index_store",
+    "reset_sparse_index_store",
+    "tokenize",
+]
@@ -0,0 +1,287 @@
+"""
+文档提取文本缓存模块
+
+文档入库时将提取出的纯文本保存为上传文件旁的压缩缓存文件（{file_path}.txtz），
+预览时只读取并解压覆盖目标字符区间的数据块，无需重新解析PDF/DOCX。
+
+文件格式:
+    MAGIC(8字节) + 压缩数据块 + 索引(JSON) + 索引长度(4字节，大端)
+
+    索引记录总字符数、每块字符数以及每个数据块的
+    [起始字符偏移, 数据区字节偏移, 压缩后字节数]。
+    除最后一块外，每块都包含 block_chars 个字符，每块独立使用zlib压缩。
+    索引位于文件末尾，写入方可以边解析边追加数据块，无需在内存中保留全文。
+"""
+
+import json
+import logging
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"RAGTXT2\n"
+_HEADER_LEN = struct.Struct(">I")
+
+# 默认每块字符数
+DEFAULT_BLOCK_CHARS = 64 * 1024
+
+# 缓存文件后缀
+ARTIFACT_SUFFIX = ".txtz"
+
+
+@dataclass
+class TextArtifactIndex:
+    """提取文本缓存索引"""
+
+    total_chars: int
+    block_chars: int
+    blocks: List[Tuple[int, int, int]]
+    data_offset: int
+
+
+def artifact_path_for(file_path: str) -> str:
+    """
+    获取上传文件对应的提取文本缓存路径
+
+    Args:
+        file_path: 上传文件路径
+
+    Returns:
+        str: 缓存文件路径
+    """
+    return f"{file_path}{ARTIFACT_SUFFIX}"
+
+
+class TextArtifactWriter:
+    """
+    提取文本缓存流式写入器
+
+    文本按页追加，攒满一块即压缩写入临时文件，内存中最多保留一块文本；
+    commit() 写入索引并替换目标文件，读取方不会看到半成品。
+
+    使用方式:
+        with TextArtifactWriter(path) as writer:
+            for page in pages:
+                writer.write(page.page_content)
+    """
+
+    def __init__(self, path: str, block_chars: int = DEFAULT_BLOCK_CHARS):
+        """
+        Args:
+            path: 缓存文件路径
+            block_chars: 每块字符数
+        """
+        self.path = path
+        self.block_chars = block_chars
+        self._tmp_path = f"{path}.tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(_MAGIC)
+        self._pending = ""
+        self._blocks: List[Tuple[int, int, int]] = []
+        self._total_chars = 0
+        self._byte_offset = 0
+
+    def write(self, text: str) -> None:
+        """
+        追加文本
+
+        Args:
+            text: 文本内容
+        """
+        buffer = self._pending + text
+        start = 0
+        while len(buffer) - start >= self.block_chars:
+            self._write_block(buffer[start : start + self.block_chars])
+            start += self.block_chars
+        self._pending = buffer[start:]
+
+    def _write_block(self, text: str) -> None:
+        payload = zlib.compress(text.encode("utf-8"), 6)
+        self._file.write(payload)
+        self._blocks.append((self._total_chars, self._byte_offset, len(payload)))
+        self._total_chars += len(text)
+        self._byte_offset += len(payload)
+
+    def commit(self) -> int:
+        """
+        写入剩余文本和索引，并替换目标文件
+
+        Returns:
+            int: 写入的字节数
+        """
+        if self._pending:
+            self._write_block(self._pending)
+            self._pending = ""
+
+        header = json.dumps(
+            {
+                "total_chars": self._total_chars,
+                "block_chars": self.block_chars,
+                "blocks": self._blocks,
+            },
+            separators=(",", ":"),
+        ).encode("utf-8")
+        self._file.write(header)
+        self._file.write(_HEADER_LEN.pack(len(header)))
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+        return len(_MAGIC) + self._byte_offset + len(header) + _HEADER_LEN.size
+
+    def abort(self) -> None:
+        """放弃写入并删除临时文件"""
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+    @property
+    def total_chars(self) -> int:
+        """已写入的字符数"""
+        return self._total_chars + len(self._pending)
+
+    def __enter__(self) -> "TextArtifactWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+def write_text_artifact(
+    path: str,
+    text: str,
+    block_chars: int = DEFAULT_BLOCK_CHARS,
+) -> int:
+    """
+    写入提取文本缓存（先写临时文件再替换，读取方不会看到半成品）
+
+    Args:
+        path: 缓存文件路径
+        text: 提取出的纯文本
+        block_chars: 每块字符数
+
+    Returns:
+        int: 写入的字节数
+    """
+    writer = TextArtifactWriter(path, block_chars)
+    try:
+        writer.write(text)
+        return writer.commit()
+    except BaseException:
+        writer.abort()
+        raise
+
+
+def read_text_index(path: str) -> Optional[TextArtifactIndex]:
+    """
+    读取提取文本缓存索引
+
+    Args:
+        path: 缓存文件路径
+
+    Returns:
+        Optional[TextArtifactIndex]: 索引；文件不存在或格式不正确时返回None
+    """
+    try:
+        with open(path, "rb") as f:
+            return _read_index(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, struct.error) as e:
+        logger.warning(f"读取提取文本缓存失败: path={path}, error={str(e)}")
+        return None
+
+
+def _read_index(f) -> TextArtifactIndex:
+    if f.read(len(_MAGIC)) != _MAGIC:
+        raise ValueError("缓存文件格式不正确")
+    f.seek(-_HEADER_LEN.size, os.SEEK_END)
+    (header_len,) = _HEADER_LEN.unpack(f.read(_HEADER_LEN.size))
+    f.seek(-(_HEADER_LEN.size + header_len), os.SEEK_END)
+    header = json.loads(f.read(header_len).decode("utf-8"))
+    return TextArtifactIndex(
+        total_chars=header["total_chars"],
+        block_chars=header["block_chars"],
+        blocks=[tuple(block) for block in header["blocks"]],
+        data_offset=len(_MAGIC),
+    )
+
+
+def read_text_slice(
+    path: str,
+    start: int = 0,
+    length: Optional[int] = None,
+) -> Optional[Tuple[str, int]]:
+    """
+    读取提取文本缓存中的字符区间
+
+    只读取并解压与区间重叠的数据块。
+
+    Args:
+        path: 缓存文件路径
+        start: 起始字符偏移
+        length: 字符数（None表示读取到末尾）
+
+    Returns:
+        Optional[Tuple[str, int]]: (区间文本, 全文字符数)；缓存不可用时返回None
+    """
+    try:
+        with open(path, "rb") as f:
+            index = _read_index(f)
+            end = index.total_chars if length is None else min(start + length, index.total_chars)
+            if start >= end:
+                return "", index.total_chars
+
+            first = start // index.block_chars
+            last = (end - 1) // index.block_chars
+            parts = []
+            for char_start, byte_offset, byte_length in index.blocks[first : last + 1]:
+                f.seek(index.data_offset + byte_offset)
+                parts.append(zlib.decompress(f.read(byte_length)).decode("utf-8"))
+
+            block_start = index.blocks[first][0]
+            text = "".join(parts)[start - block_start : end - block_start]
+            return text, index.total_chars
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, struct.error, zlib.error, IndexError, KeyError) as e:
+        logger.warning(f"读取提取文本缓存失败: path={path}, error={str(e)}")
+        return None
+
+
+def remove_text_artifact(file_path: str) -> None:
+    """
+    删除上传文件对应的提取文本缓存
+
+    Args:
+        file_path: 上传文件路径
+    """
+    path = artifact_path_for(file_path)
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except OSError as e:
+        logger.warning(f"删除提取文本缓存失败: {path}, error={str(e)}")
+
+
+# 导出
+__all__ = [
+    "ARTIFACT_SUFFIX",
+    "DEFAULT_BLOCK_CHARS",
+    "TextArtifactIndex",
+    "TextArtifactWriter",
+    "artifact_path_for",
+    "read_text_index",
+    "read_text_slice",
+    "remove_text_artifact",
+    "write_text_artifact",
+]
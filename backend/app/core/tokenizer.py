@@ -0,0 +1,209 @@
+"""
+Token计数模块
+
+使用DashScope SDK自带的通义千问BPE词表（离线文件，通过tiktoken编码）精确计数，
+替代逐字符遍历的估算方法：
+- 计数结果按文本摘要缓存（LRU），历史消息和检索分块在多轮对话中重复出现时无需重新编码
+- tiktoken不可用或模型不受支持时退化为字符估算（中文约2字符/token，其他约4字符/token）
+
+使用方式:
+    from app.core.tokenizer import count_tokens, get_token_counter
+
+    tokens = count_tokens("你好")
+    counts = get_token_counter().count_many(["问题", "回答"])
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, List, Optional, Sequence
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_NON_CJK_PATTERN = re.compile("[^\u4e00-\u9fff]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的token数量
+
+    中文字符约2字符/token，其他字符约4字符/token。
+
+    Args:
+        text: 文本内容
+
+    Returns:
+        int: 估算的token数量
+    """
+    chinese_chars = len(_NON_CJK_PATTERN.sub("", text))
+    other_chars = len(text) - chinese_chars
+    return int((chinese_chars / 2) + (other_chars / 4))
+
+
+def _load_encoding(model_name: str) -> Optional[Any]:
+    """加载模型对应的tiktoken编码，不可用时返回None"""
+    try:
+        from dashscope.tokenizers import get_tokenizer
+
+        return get_tokenizer(model_name)._tokenizer
+    except ImportError as e:
+        logger.warning(f"tiktoken未安装，token数量将使用字符估算: {str(e)}")
+    except Exception as e:
+        logger.warning(f"加载分词器失败，token数量将使用字符估算: model={model_name}, error={str(e)}")
+    return None
+
+
+class TokenCounter:
+    """
+    带缓存的token计数器
+
+    分词器在首次计数时加载（约1秒），可在应用启动时调用 warm_up() 预加载。线程安全。
+    """
+
+    # 短文本直接作为缓存键，长文本使用摘要，避免缓存持有大段原文
+    _INLINE_KEY_CHARS = 64
+
+    def __init__(self, model_name: Optional[str] = None, cache_size: int = 20000):
+        """
+        初始化token计数器
+
+        Args:
+            model_name: 模型名称，默认从配置读取
+            cache_size: 计数缓存最大条目数
+        """
+        self.model_name = model_name or settings.tongyi.tongyi_model_name
+        self.cache_size = cache_size
+        self._encoding: Optional[Any] = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._cache: "OrderedDict[Any, int]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def warm_up(self) -> None:
+        """加载分词器"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self._encoding = _load_encoding(self.model_name)
+                self._loaded = True
+                if self._encoding is not None:
+                    logger.info(f"分词器已加载: model={self.model_name}")
+
+    @property
+    def exact(self) -> bool:
+        """是否使用真实分词器计数"""
+        self.warm_up()
+        return self._encoding is not None
+
+    def _encode_count(self, text: str) -> int:
+        if self._encoding is None:
+            return estimate_tokens(text)
+        return len(self._encoding.encode_ordinary(unicodedata.normalize("NFC", text)))
+
+    def _cache_key(self, text: str) -> Any:
+        if len(text) <= self._INLINE_KEY_CHARS:
+            return text
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def count(self, text: str) -> int:
+        """
+        计算文本的token数量
+
+        Args:
+            text: 文本内容
+
+        Returns:
+            int: token数量
+        """
+        if not text:
+            return 0
+        self.warm_up()
+
+        key = self._cache_key(text)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        tokens = self._encode_count(text)
+        if self.cache_size > 0:
+            with self._cache_lock:
+                self._cache[key] = tokens
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return tokens
+
+    def count_many(self, texts: Sequence[str]) -> List[int]:
+        """
+        批量计算token数量
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            List[int]: 与输入顺序一致的token数量
+        """
+        return [self.count(text) for text in texts]
+
+    def clear_cache(self) -> None:
+        """清空计数缓存"""
+        with self._cache_lock:
+            self._cache.clear()
+
+
+# 全局token计数器实例
+_token_counter: Optional[TokenCounter] = None
+
+
+def get_token_counter() -> TokenCounter:
+    """
+    获取全局token计数器
+
+    Returns:
+        TokenCounter: 计数器实例
+    """
+    global _token_counter
+
+    if _token_counter is None:
+        _token_counter = TokenCounter(cache_size=settings.prompt.token_count_cache_size)
+    return _token_counter
+
+
+def reset_token_counter() -> None:
+    """
+    重置全局token计数器
+
+    用于测试或切换模型
+    """
+    global _token_counter
+    _token_counter = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    使用全局计数器计算文本的token数量
+
+    Args:
+        text: 文本内容
+
+    Returns:
+        int: token数量
+    """
+    return get_token_counter().count(text)
+
+
+# 导出
+__all__ = [
+    "TokenCounter",
+    "count_tokens",
+    "estimate_tokens",
+    "get_token_counter",
+    "reset_token_counter",
+]
@@ -0,0 +1,226 @@
+"""
+分阶段耗时追踪模块
+
+记录请求处理各阶段（查询向量化、向量检索、提示组装、首字延迟、数据库写入等）的耗时：
+- 每个阶段的耗时写入Prometheus直方图 pipeline_stage_duration_seconds{stage}，
+  存在请求ID时附带为exemplar
+- 同一请求的各阶段耗时汇总到当前请求的追踪对象（contextvars，跨 asyncio.to_thread 传递），
+  请求结束时按请求ID输出日志，调试模式下可通过响应头或SSE timing事件返回给客户端
+
+使用方式:
+    trace = start_trace(request_id, expose=True)
+
+    with trace_stage("rag.retrieve"):
+        results = await vector_store.search(...)
+
+    record_stage("llm.first_token", time.perf_counter() - start)
+    trace.stages()  # {"rag.retrieve": 12.3, "llm.first_token": 820.5}
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from app.config import settings
+from app.middleware.prometheus_middleware import record_pipeline_stage
+
+logger = logging.getLogger(__name__)
+
+# 调试请求头：值为1/true时（且配置允许）返回分阶段耗时
+DEBUG_TIMING_HEADER = "X-Debug-Timing"
+# 非流式响应中返回分阶段耗时的响应头
+STAGE_TIMINGS_HEADER = "X-Stage-Timings"
+
+
+class RequestTrace:
+    """
+    单个请求的分阶段耗时
+
+    同一阶段多次执行（如多知识库并发检索）时耗时累加并计数。线程安全。
+    """
+
+    def __init__(self, request_id: Optional[str] = None, expose: bool = False):
+        """
+        初始化追踪对象
+
+        Args:
+            request_id: 请求ID
+            expose: 是否将耗时返回给客户端
+        """
+        self.request_id = request_id
+        self.expose = expose
+        self.started_at = time.perf_counter()
+        self._totals: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        """
+        记录阶段耗时
+
+        Args:
+            stage: 阶段名称
+            seconds: 耗时（秒）
+        """
+        with self._lock:
+            self._totals[stage] = self._totals.get(stage, 0.0) + seconds
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+
+    def elapsed_ms(self) -> float:
+        """请求开始至今的耗时（毫秒）"""
+        return round((time.perf_counter() - self.started_at) * 1000, 1)
+
+    def stages(self) -> Dict[str, float]:
+        """
+        获取各阶段累计耗时
+
+        Returns:
+            Dict[str, float]: 阶段名称 -> 累计耗时（毫秒），按记录顺序排列
+        """
+        with self._lock:
+            return {stage: round(total * 1000, 1) for stage, total in self._totals.items()}
+
+    def to_dict(self) -> Dict[str, object]:
+        """转换为SSE timing事件"""
+        return {
+            "type": "timing",
+            "request_id": self.request_id,
+            "total_ms": self.elapsed_ms(),
+            "stages": self.stages(),
+        }
+
+    def header_value(self) -> str:
+        """转换为响应头的值（stage=毫秒, 以分号分隔）"""
+        return ";".join(f"{stage}={ms}" for stage, ms in self.stages().items())
+
+    def summary(self) -> str:
+        """日志摘要"""
+        with self._lock:
+            parts = [
+                f"{stage}={round(total * 1000, 1)}ms" + (f"x{self._counts[stage]}" if self._counts[stage] > 1 else "")
+                for stage, total in self._totals.items()
+            ]
+        return ", ".join(parts)
+
+    def log_summary(self) -> None:
+        """按请求ID输出各阶段耗时（超过慢请求阈值时为WARNING级别）"""
+        if not self._totals:
+            return
+        total_ms = self.elapsed_ms()
+        level = (
+            logging.WARNING
+            if total_ms >= settings.monitoring.stage_timing_slow_request_ms
+            else logging.DEBUG
+        )
+        logger.log(
+            level,
+            f"分阶段耗时 [request_id={self.request_id}]: total={total_ms}ms, {self.summary()}",
+        )
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar(
+    "request_trace", default=None
+)
+
+
+def start_trace(request_id: Optional[str] = None, expose: bool = False) -> RequestTrace:
+    """
+    为当前上下文（请求、后台任务）开始追踪
+
+    Args:
+        request_id: 请求ID（后台任务可使用任务标识）
+        expose: 是否将耗时返回给客户端
+
+    Returns:
+        RequestTrace: 追踪对象
+    """
+    trace = RequestTrace(request_id=request_id, expose=expose)
+    _current_trace.set(trace)
+    return trace
+
+
+@contextmanager
+def traced(request_id: Optional[str] = None) -> Iterator[RequestTrace]:
+    """
+    在代码块内使用独立的追踪对象（如后台任务），结束时输出耗时摘要并恢复外层追踪
+
+    Args:
+        request_id: 追踪标识
+
+    Yields:
+        RequestTrace: 追踪对象
+    """
+    trace = RequestTrace(request_id=request_id)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.log_summary()
+
+
+def get_current_trace() -> Optional[RequestTrace]:
+    """获取当前上下文的追踪对象（未开始追踪时返回None）"""
+    return _current_trace.get()
+
+
+def timing_requested(header_value: Optional[str]) -> bool:
+    """
+    判断请求是否要求返回分阶段耗时
+
+    Args:
+        header_value: X-Debug-Timing请求头的值
+
+    Returns:
+        bool: 配置允许且请求头为1/true时返回True
+    """
+    if not settings.monitoring.stage_timing_debug_enabled or not header_value:
+        return False
+    return header_value.strip().lower() in ("1", "true", "yes")
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """
+    记录阶段耗时到Prometheus和当前追踪对象
+
+    Args:
+        stage: 阶段名称
+        seconds: 耗时（秒）
+    """
+    trace = _current_trace.get()
+    request_id = trace.request_id if trace is not None else None
+    record_pipeline_stage(stage, seconds, request_id)
+    if trace is not None:
+        trace.record(stage, seconds)
+
+
+@contextmanager
+def trace_stage(stage: str) -> Iterator[None]:
+    """
+    记录代码块耗时（异常时同样记录）
+
+    Args:
+        stage: 阶段名称
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+# 导出
+__all__ = [
+    "DEBUG_TIMING_HEADER",
+    "STAGE_TIMINGS_HEADER",
+    "RequestTrace",
+    "get_current_trace",
+    "record_stage",
+    "start_trace",
+    "timing_requested",
+    "trace_stage",
+    "traced",
+]
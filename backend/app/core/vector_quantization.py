@@ -0,0 +1,330 @@
+"""
+向量量化模块
+
+为NumPy向量索引提供压缩编码，降低常驻内存（检索时全量扫描的是编码而不是float32矩阵）：
+- int8: 逐向量对称标量量化，每维1字节 + 每向量一个缩放系数，无需训练，写入即可编码
+- pq: 乘积量化，向量切分为m个子向量，每个子向量用256个聚类中心之一的编号（1字节）表示，
+  检索时用查询向量与各子空间聚类中心的距离查表（ADC）累加得到近似距离；需要先训练码本
+
+量化距离只用于粗排，粗排得到的候选列表再用磁盘上的float32向量精确重排，
+最终返回的距离与未量化时一致。
+
+距离均为平方L2（与Chroma默认度量一致）。
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+# 批量计算时每块的行数（限制临时矩阵内存）
+BLOCK_ROWS = 4096
+
+# 乘积量化每个子空间的聚类中心数（编码为uint8）
+PQ_CENTROIDS = 256
+
+KMEANS_ITERATIONS = 10
+
+QUANTIZATION_MODES = ("none", "int8", "pq")
+
+
+def squared_norms(vectors: np.ndarray) -> np.ndarray:
+    """逐行平方L2范数"""
+    if len(vectors) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.einsum("ij,ij->i", vectors, vectors).astype(np.float32)
+
+
+def nearest_centroids(
+    vectors: np.ndarray, centroids: np.ndarray, centroid_norms: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    分块计算每个向量最近的聚类中心
+
+    Args:
+        vectors: 向量矩阵 (n, dim)
+        centroids: 聚类中心矩阵 (k, dim)
+        centroid_norms: 聚类中心平方范数（可选）
+
+    Returns:
+        np.ndarray: 每个向量最近的聚类中心编号 (n,)
+    """
+    if centroid_norms is None:
+        centroid_norms = squared_norms(centroids)
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), BLOCK_ROWS):
+        block = np.asarray(vectors[start : start + BLOCK_ROWS], dtype=np.float32)
+        distances = centroid_norms[None, :] - 2.0 * (block @ centroids.T)
+        assignments[start : start + len(block)] = np.argmin(distances, axis=1)
+    return assignments
+
+
+def kmeans(
+    sample: np.ndarray, k: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0
+) -> np.ndarray:
+    """
+    k-means聚类（Lloyd算法）
+
+    Args:
+        sample: 训练样本矩阵
+        k: 聚类中心数
+        iterations: 迭代次数
+        seed: 随机种子
+
+    Returns:
+        np.ndarray: 聚类中心矩阵 (k, dim)；样本数少于k时为样本数
+    """
+    sample = np.asarray(sample, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    k = max(1, min(k, len(sample)))
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = nearest_centroids(sample, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        order = np.argsort(assignments, kind="stable")
+        non_empty = np.nonzero(counts)[0]
+        starts = np.concatenate(([0], np.cumsum(counts[non_empty])[:-1]))
+        sums = np.add.reduceat(sample[order], starts, axis=0)
+        centroids[non_empty] = sums / counts[non_empty, None]
+        empty = np.nonzero(counts == 0)[0]
+        if len(empty):
+            # 空簇重新从样本中随机取点
+            centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+    return centroids
+
+
+# ========== int8标量量化 ==========
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    逐向量对称int8量化
+
+    Args:
+        vectors: 向量矩阵 (n, dim)
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (int8编码 (n, dim), float32缩放系数 (n,))
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.zeros(0)
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def int8_distances(
+    codes: np.ndarray,
+    scales: np.ndarray,
+    norms: np.ndarray,
+    query: np.ndarray,
+    query_norm: float,
+) -> np.ndarray:
+    """
+    int8编码的近似平方L2距离（向量范数使用精确值）
+
+    Args:
+        codes: int8编码 (n, dim)
+        scales: 缩放系数 (n,)
+        norms: 原始向量平方范数 (n,)
+        query: 查询向量
+        query_norm: 查询向量平方范数
+
+    Returns:
+        np.ndarray: 近似距离 (n,)
+    """
+    dots = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), BLOCK_ROWS):
+        block = np.asarray(codes[start : start + BLOCK_ROWS], dtype=np.float32)
+        dots[start : start + len(block)] = block @ query
+    return norms - 2.0 * np.asarray(scales, dtype=np.float32) * dots + query_norm
+
+
+# ========== 乘积量化 ==========
+
+
+def pq_subvector_count(dim: int, subvector_dim: int) -> int:
+    """
+    计算子向量数量（子向量维度不能整除向量维度时向下取最近的约数）
+
+    Args:
+        dim: 向量维度
+        subvector_dim: 期望的子向量维度
+
+    Returns:
+        int: 子向量数量
+    """
+    subvector_dim = max(1, min(subvector_dim, dim))
+    while dim % subvector_dim:
+        subvector_dim -= 1
+    return dim // subvector_dim
+
+
+def _pq_assign(parts: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+    """
+    批量计算各子空间最近的聚类中心
+
+    Args:
+        parts: 子向量 (m, n, dsub)
+        codebooks: 码本 (m, k, dsub)
+
+    Returns:
+        np.ndarray: 编号 (m, n)
+    """
+    subvectors, n, _ = parts.shape
+    codebook_norms = np.einsum("mkd,mkd->mk", codebooks, codebooks)
+    assignments = np.empty((subvectors, n), dtype=np.int64)
+    # 按子空间分组，临时距离矩阵约 group * BLOCK_ROWS * k 个元素
+    group = max(1, 64 * PQ_CENTROIDS // codebooks.shape[1])
+    for start in range(0, n, BLOCK_ROWS):
+        stop = min(n, start + BLOCK_ROWS)
+        for m in range(0, subvectors, group):
+            block = parts[m : m + group, start:stop]
+            distances = codebook_norms[m : m + group, None, :] - 2.0 * (
+                block @ codebooks[m : m + group].transpose(0, 2, 1)
+            )
+            assignments[m : m + group, start:stop] = np.argmin(distances, axis=2)
+    return assignments
+
+
+def _split_subvectors(vectors: np.ndarray, subvectors: int) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    return np.ascontiguousarray(
+        vectors.reshape(n, subvectors, dim // subvectors).transpose(1, 0, 2)
+    )
+
+
+def train_pq_codebooks(
+    sample: np.ndarray, subvectors: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0
+) -> np.ndarray:
+    """
+    训练乘积量化码本（各子空间的k-means批量并行迭代）
+
+    Args:
+        sample: 训练样本矩阵 (n, dim)
+        subvectors: 子向量数量（需整除dim）
+        iterations: k-means迭代次数
+        seed: 随机种子
+
+    Returns:
+        np.ndarray: 码本 (subvectors, 256, dim // subvectors)
+    """
+    parts = _split_subvectors(sample, subvectors)
+    _, n, dsub = parts.shape
+    k = min(PQ_CENTROIDS, n)
+    rng = np.random.default_rng(seed)
+    subvector_index = np.arange(subvectors)[:, None]
+    init = np.stack([rng.choice(n, k, replace=False) for _ in range(subvectors)])
+    codebooks = parts[subvector_index, init]
+
+    for _ in range(iterations):
+        assignments = _pq_assign(parts, codebooks)
+        flat = (subvector_index * k + assignments).ravel()
+        counts = np.bincount(flat, minlength=subvectors * k).reshape(subvectors, k)
+        sums = np.stack(
+            [
+                np.bincount(flat, weights=parts[:, :, d].ravel(), minlength=subvectors * k)
+                for d in range(dsub)
+            ],
+            axis=-1,
+        ).reshape(subvectors, k, dsub)
+        non_empty = counts > 0
+        codebooks[non_empty] = (sums[non_empty] / counts[non_empty][:, None]).astype(np.float32)
+        # 空簇重新从样本中随机取点
+        empty_m, empty_c = np.nonzero(~non_empty)
+        if len(empty_m):
+            codebooks[empty_m, empty_c] = parts[empty_m, rng.integers(0, n, len(empty_m))]
+
+    if k < PQ_CENTROIDS:
+        # 样本不足256个时多余的中心重复第一个，编码时不会被选中
+        padding = np.repeat(codebooks[:, :1], PQ_CENTROIDS - k, axis=1)
+        codebooks = np.concatenate([codebooks, padding], axis=1)
+    return codebooks
+
+
+def pq_encode(codebooks: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """
+    乘积量化编码
+
+    Args:
+        codebooks: 码本 (m, 256, dsub)
+        vectors: 向量矩阵 (n, m * dsub)
+
+    Returns:
+        np.ndarray: uint8编码 (n, m)
+    """
+    parts = _split_subvectors(vectors, codebooks.shape[0])
+    return np.ascontiguousarray(_pq_assign(parts, codebooks).T.astype(np.uint8))
+
+
+def pq_distance_table(codebooks: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """
+    计算查询向量到各子空间聚类中心的平方距离表
+
+    Args:
+        codebooks: 码本 (m, 256, dsub)
+        query: 查询向量
+
+    Returns:
+        np.ndarray: 距离表 (m, 256)
+    """
+    subvectors, _, dsub = codebooks.shape
+    diff = codebooks - np.asarray(query, dtype=np.float32).reshape(subvectors, 1, dsub)
+    return np.einsum("mcd,mcd->mc", diff, diff)
+
+
+def pq_distances(codebooks: np.ndarray, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """
+    乘积量化编码的近似平方L2距离（非对称距离计算，ADC）
+
+    Args:
+        codebooks: 码本 (m, 256, dsub)
+        codes: uint8编码 (n, m)
+        query: 查询向量
+
+    Returns:
+        np.ndarray: 近似距离 (n,)
+    """
+    table = pq_distance_table(codebooks, query)
+    subvector_index = np.arange(table.shape[0])
+    distances = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), BLOCK_ROWS):
+        block = np.asarray(codes[start : start + BLOCK_ROWS])
+        distances[start : start + len(block)] = table[subvector_index, block].sum(axis=1)
+    return distances
+
+
+def code_bytes_per_vector(quantization: str, dim: int, subvector_dim: int = 8) -> int:
+    """
+    每个向量常驻内存的编码字节数（含范数等辅助数据）
+
+    Args:
+        quantization: 量化方式（none/int8/pq）
+        dim: 向量维度
+        subvector_dim: 乘积量化子向量维度
+
+    Returns:
+        int: 字节数
+    """
+    if quantization == "int8":
+        return dim + 8  # 编码 + 缩放系数 + 范数
+    if quantization == "pq":
+        return pq_subvector_count(dim, subvector_dim) + 4  # 编码 + 范数
+    return dim * 4 + 4
+
+
+# 导出
+__all__ = [
+    "QUANTIZATION_MODES",
+    "squared_norms",
+    "nearest_centroids",
+    "kmeans",
+    "quantize_int8",
+    "int8_distances",
+    "pq_subvector_count",
+    "train_pq_codebooks",
+    "pq_encode",
+    "pq_distance_table",
+    "pq_distances",
+    "code_bytes_per_vector",
+]
@@ -3,16 +3,35 @@
 
 提供Chroma向量数据库的初始化、管理和访问功能。
 支持按知识库ID创建独立的向量存储集合。
+
+每个管理器只创建一个Chroma客户端，各知识库的集合句柄共享该客户端，
+并按LRU缓存（chroma_collection_cache_size），超出容量时淘汰最久未使用的句柄。
+客户端由后端创建（chroma_mode）：embedded为进程内持久化目录，http为共享的Chroma服务，
+numpy为进程内NumPy矩阵索引（接口兼容Chroma集合）。
+
+知识库对应的实际集合名称通过集合别名解析（见collection_aliases），
+Chroma集合压缩重建后切换别名即可生效，其他进程无需重启。
 """
 
+import asyncio
+import heapq
+import itertools
 import logging
 import os
 import hashlib
+import json
 import re
-from typing import Any, Dict, List, Optional
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Optional, Sequence
 
 os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
 
+import chromadb
+import numpy as np
 from chromadb.errors import InvalidDimensionException
 from langchain_community.embeddings.dashscope import DashScopeEmbeddings
 from langchain_community.vectorstores.chroma import Chroma
@@ -20,7 +39,15 @@ from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 
 from app.config import settings
+from app.core.chroma_backend import VectorStoreBackend, build_vector_store_backend
+from app.core.collection_aliases import (CollectionAliasRegistry,
+                                         generation_collection_name)
+from app.core.embedding_cache import build_cached_embeddings
 from app.core.llm import _is_placeholder_dashscope_api_key
+from app.core.sparse_index import SparseHit, get_sparse_index_store
+from app.core.tracing import trace_stage
+from app.middleware.prometheus_middleware import (
+    record_vector_store_collection_event, record_vector_store_collections)
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +57,70 @@ _DIMENSION_MISMATCH_RE = re.compile(
 )
 
 
+# kb_{id}（未重建）或 kb_{id}_g{代数}（重建后）
+_COLLECTION_NAME_RE = re.compile(r"^kb_(\d+)(?:_g(\d+))?$")
+
+# 重建集合时每次读取的分块数
+_REBUILD_PAGE_SIZE = 1000
+
+# 重建集合时复制完成后比对原集合的最多轮数（仍有变更则放弃本次重建）
+_REBUILD_SYNC_ROUNDS = 3
+
+
+def _row_fingerprint(document: Optional[str], metadata: Optional[Dict[str, Any]]) -> int:
+    """分块内容指纹（向量由文本决定，只比对文本和元数据）"""
+    return hash((document, json.dumps(metadata or {}, sort_keys=True, ensure_ascii=False)))
+
+
+def _collection_fingerprints(collection: Any) -> Dict[str, int]:
+    """读取集合全部分块的 ID -> 内容指纹"""
+    fingerprints: Dict[str, int] = {}
+    offset = 0
+    while True:
+        page = collection.get(
+            include=["documents", "metadatas"], limit=_REBUILD_PAGE_SIZE, offset=offset
+        )
+        if not page["ids"]:
+            return fingerprints
+        for row_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+            fingerprints[row_id] = _row_fingerprint(document, metadata)
+        offset += len(page["ids"])
+
+
+def _copy_rows(source: Any, target: Any, ids: Sequence[str]) -> None:
+    """按ID将分块（含向量）从source复制到target"""
+    ids = list(ids)
+    for i in range(0, len(ids), _REBUILD_PAGE_SIZE):
+        page = source.get(
+            ids=ids[i : i + _REBUILD_PAGE_SIZE],
+            include=["embeddings", "documents", "metadatas"],
+        )
+        if page["ids"]:
+            target.upsert(
+                ids=page["ids"],
+                embeddings=page["embeddings"],
+                documents=page["documents"],
+                metadatas=page["metadatas"],
+            )
+
+
+def _sync_rows(source: Any, target: Any, copied: Dict[str, int]) -> Dict[str, int]:
+    """
+    将source相对上次复制（copied）的变更同步到target
+
+    Returns:
+        Dict[str, int]: 本次比对得到的 ID -> 内容指纹；与copied相同时表示没有变更
+    """
+    current = _collection_fingerprints(source)
+    changed = [row_id for row_id, value in current.items() if copied.get(row_id) != value]
+    removed = [row_id for row_id in copied if row_id not in current]
+    if removed:
+        target.delete(ids=removed)
+    if changed:
+        _copy_rows(source, target, changed)
+    return current
+
+
 class VectorStoreDimensionMismatchError(RuntimeError):
     def __init__(
         self,
@@ -94,6 +185,78 @@ class VectorStoreDimensionMismatchError(RuntimeError):
         }
 
 
+@dataclass
+class MultiKnowledgeBaseSearchResult:
+    """
+    多知识库联合检索结果
+
+    除合并后的 top-k 结果外，还记录检索失败和超时的知识库，
+    便于调用方判断结果是否完整。
+    """
+
+    results: List[tuple] = field(default_factory=list)
+    failed_knowledge_base_ids: List[int] = field(default_factory=list)
+    timed_out_knowledge_base_ids: List[int] = field(default_factory=list)
+
+    @property
+    def is_partial(self) -> bool:
+        """是否为部分结果（存在失败或超时的知识库）"""
+        return bool(self.failed_knowledge_base_ids or self.timed_out_knowledge_base_ids)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "result_count": len(self.results),
+            "failed_knowledge_base_ids": self.failed_knowledge_base_ids,
+            "timed_out_knowledge_base_ids": self.timed_out_knowledge_base_ids,
+            "is_partial": self.is_partial,
+        }
+
+
+def chunk_identity(doc: Document) -> Hashable:
+    """
+    分块的唯一标识（用于合并不同检索方式的结果）
+
+    优先使用(知识库ID, 文档ID, 分块序号)，缺失时退化为分块文本。
+
+    Args:
+        doc: 分块文档
+
+    Returns:
+        Hashable: 标识
+    """
+    metadata = doc.metadata or {}
+    if metadata.get("document_id") is not None and metadata.get("chunk_index") is not None:
+        return (
+            metadata.get("knowledge_base_id"),
+            metadata["document_id"],
+            metadata["chunk_index"],
+        )
+    return doc.page_content
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[Sequence[Hashable]],
+    rrf_k: int = 60,
+) -> List[tuple]:
+    """
+    倒数排名融合（RRF）
+
+    每个结果的融合得分为其在各列表中 1 / (rrf_k + 排名) 之和，排名从1开始。
+
+    Args:
+        ranked_lists: 多个按相关性降序排列的结果标识列表
+        rrf_k: 融合常数，越大越削弱头部排名的优势
+
+    Returns:
+        List[tuple]: (标识, 融合得分) 列表，按得分降序
+    """
+    scores: Dict[Hashable, float] = {}
+    for ranked in ranked_lists:
+        for rank, key in enumerate(ranked, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
 class DevMockEmbeddings(Embeddings):
     def __init__(self, dim: int = 256):
         self.dim = dim
@@ -144,6 +307,8 @@ class VectorStoreManager:
         persist_directory: Optional[str] = None,
         api_key: Optional[str] = None,
         embedding_model: Optional[str] = None,
+        collection_cache_size: Optional[int] = None,
+        backend: Optional[VectorStoreBackend] = None,
     ):
         """
         初始化向量数据库管理器
@@ -152,12 +317,15 @@ class VectorStoreManager:
             persist_directory: Chroma持久化目录，默认从配置读取
             api_key: DashScope API密钥，默认从配置读取
             embedding_model: 嵌入模型名称，默认从配置读取
+            collection_cache_size: 缓存的集合句柄最大数量，默认从配置读取
+            backend: Chroma客户端后端，默认按配置（chroma_mode）创建
         """
         self.persist_directory = (
             persist_directory or settings.vector_db.chroma_persist_directory
         )
         self.api_key = api_key or settings.tongyi.dashscope_api_key
         self.embedding_model = embedding_model or settings.tongyi.embedding_model
+        self.backend = backend or build_vector_store_backend(self.persist_directory)
 
         # 确保持久化目录存在
         self._ensure_directory_exists()
@@ -165,8 +333,19 @@ class VectorStoreManager:
         # 嵌入模型实例（懒加载）
         self._embeddings: Optional[Embeddings] = None
 
-        # 向量存储实例缓存
-        self._vector_stores: Dict[int, Chroma] = {}
+        # 共享的Chroma客户端（懒加载）
+        self._client: Optional[chromadb.ClientAPI] = None
+
+        # 向量存储实例缓存（LRU）
+        self.collection_cache_size = (
+            collection_cache_size or settings.vector_db.chroma_collection_cache_size
+        )
+        self._vector_stores: "OrderedDict[int, Chroma]" = OrderedDict()
+        self._store_collection_names: Dict[int, str] = {}
+        self._lock = threading.RLock()
+
+        # 知识库 -> 实际集合名称（Chroma集合重建后切换）
+        self.aliases = CollectionAliasRegistry(lambda: self.client)
 
     def _ensure_directory_exists(self) -> None:
         """确保持久化目录存在"""
@@ -186,12 +365,29 @@ class VectorStoreManager:
             self._embeddings = self._create_embeddings()
         return self._embeddings
 
+    @property
+    def embedding_model_id(self) -> str:
+        """
+        当前嵌入模型标识
+
+        Mock Embeddings 与真实模型向量不可混用，使用独立标识区分。
+
+        Returns:
+            str: 嵌入模型标识
+        """
+        embeddings = self.embeddings
+        if isinstance(embeddings, DevMockEmbeddings):
+            return f"dev-mock-{embeddings.dim}"
+        return self.embedding_model
+
     def _create_embeddings(self) -> Embeddings:
         """
         创建DashScope嵌入模型实例
 
+        启用查询向量缓存时返回带缓存的包装实例。
+
         Returns:
-            DashScopeEmbeddings: 嵌入模型实例
+            Embeddings: 嵌入模型实例
         """
         if _is_placeholder_dashscope_api_key(self.api_key) and (
             settings.debug or settings.environment.lower() == "development"
@@ -201,63 +397,177 @@ class VectorStoreManager:
 
         logger.info(f"创建DashScope嵌入模型: model={self.embedding_model}")
 
-        return DashScopeEmbeddings(
-            dashscope_api_key=self.api_key,
-            model=self.embedding_model,
+        # Mock Embeddings 为本地计算，无需缓存；真实嵌入接口包装查询向量缓存
+        return build_cached_embeddings(
+            DashScopeEmbeddings(
+                dashscope_api_key=self.api_key,
+                model=self.embedding_model,
+            ),
+            model_name=self.embedding_model,
         )
 
-    def _get_collection_name(self, knowledge_base_id: int) -> str:
+    def _get_collection_name(self, knowledge_base_id: int, refresh: bool = False) -> str:
         """
-        根据知识库ID生成集合名称
+        解析知识库当前使用的集合名称
 
         Args:
             knowledge_base_id: 知识库ID
+            refresh: 是否忽略别名缓存（写入前使用，避免写入已被替换的旧集合）
 
         Returns:
             str: 集合名称
         """
-        return f"kb_{knowledge_base_id}"
+        return self.aliases.resolve(knowledge_base_id, refresh=refresh)
 
-    def get_vector_store(self, knowledge_base_id: int) -> Chroma:
+    @property
+    def client(self) -> chromadb.ClientAPI:
+        """
+        获取共享的Chroma客户端（懒加载，线程安全）
+
+        Returns:
+            chromadb.ClientAPI: Chroma客户端
+        """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self.backend.create_client()
+        return self._client
+
+    def get_vector_store(self, knowledge_base_id: int, refresh: bool = False) -> Chroma:
         """
         获取指定知识库的向量存储实例
 
+        并发首次访问同一知识库时只创建一个实例；缓存超出容量时淘汰最久未使用的实例。
+        集合别名已切换（压缩重建）时重新创建实例。
+
         Args:
             knowledge_base_id: 知识库ID
+            refresh: 是否重新读取集合别名（写入前使用）
 
         Returns:
             Chroma: 向量存储实例
         """
-        if knowledge_base_id not in self._vector_stores:
-            self._vector_stores[knowledge_base_id] = self._create_vector_store(
-                knowledge_base_id
-            )
+        collection_name = self._get_collection_name(knowledge_base_id, refresh=refresh)
+        with self._lock:
+            vector_store = self._vector_stores.get(knowledge_base_id)
+            if vector_store is not None and (
+                self._store_collection_names.get(knowledge_base_id) == collection_name
+            ):
+                self._vector_stores.move_to_end(knowledge_base_id)
+                record_vector_store_collection_event("hit")
+                return vector_store
+
+            vector_store = self._create_vector_store(knowledge_base_id, collection_name)
+            self._vector_stores[knowledge_base_id] = vector_store
+            self._vector_stores.move_to_end(knowledge_base_id)
+            self._store_collection_names[knowledge_base_id] = collection_name
+            record_vector_store_collection_event("miss")
+
+            evicted = 0
+            while len(self._vector_stores) > self.collection_cache_size:
+                evicted_id, _ = self._vector_stores.popitem(last=False)
+                self._store_collection_names.pop(evicted_id, None)
+                evicted += 1
+            record_vector_store_collection_event("evict", evicted)
+            record_vector_store_collections(len(self._vector_stores))
+
+        return vector_store
+
+    async def aget_vector_store(self, knowledge_base_id: int, refresh: bool = False) -> Chroma:
+        """
+        异步获取向量存储实例
 
-        return self._vector_stores[knowledge_base_id]
+        别名解析和创建集合句柄可能访问向量库（http模式为网络请求），放到线程中执行，避免阻塞事件循环。
 
-    def _create_vector_store(self, knowledge_base_id: int) -> Chroma:
+        Args:
+            knowledge_base_id: 知识库ID
+            refresh: 是否重新读取集合别名（写入前使用）
+
+        Returns:
+            Chroma: 向量存储实例
+        """
+        return await asyncio.to_thread(self.get_vector_store, knowledge_base_id, refresh)
+
+    def _replay_if_switched(
+        self,
+        knowledge_base_id: int,
+        written_name: str,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> None:
         """
-        创建向量存储实例
+        写入完成后重新解析别名，写入期间集合已被压缩重建替换时把本次写入补到当前集合
+
+        压缩重建在切换前后都会比对原集合，这里覆盖切换之后才落到旧集合的写入。
 
         Args:
             knowledge_base_id: 知识库ID
+            written_name: 本次写入的集合名称
+            ids: 写入的向量ID（按ID从旧集合复制）
+            where: 删除条件（在当前集合重复删除）
+        """
+        current = self.get_vector_store(knowledge_base_id, refresh=True)._collection
+        if current.name == written_name:
+            return
+        logger.info(
+            f"写入期间集合已切换，补写到当前集合: kb_id={knowledge_base_id}, "
+            f"{written_name} -> {current.name}"
+        )
+        if where is not None:
+            current.delete(where=where)
+        if ids:
+            source = self.client.get_collection(written_name, embedding_function=None)
+            _copy_rows(source, current, ids)
+
+    def _create_vector_store(
+        self, knowledge_base_id: int, collection_name: Optional[str] = None
+    ) -> Chroma:
+        """
+        创建向量存储实例（使用共享客户端）
+
+        Args:
+            knowledge_base_id: 知识库ID
+            collection_name: 集合名称（默认解析别名）
 
         Returns:
             Chroma: 新创建的向量存储实例
         """
-        collection_name = self._get_collection_name(knowledge_base_id)
+        if collection_name is None:
+            collection_name = self._get_collection_name(knowledge_base_id)
 
-        logger.info(
+        logger.debug(
             f"创建向量存储: collection={collection_name}, "
-            f"persist_directory={self.persist_directory}"
+            f"backend={self.backend.describe()}"
         )
 
         return Chroma(
+            client=self.client,
             collection_name=collection_name,
             embedding_function=self.embeddings,
-            persist_directory=self.persist_directory,
         )
 
+    def evict(self, knowledge_base_id: int) -> bool:
+        """
+        从缓存中移除指定知识库的向量存储实例
+
+        Args:
+            knowledge_base_id: 知识库ID
+
+        Returns:
+            bool: 缓存中存在该实例时返回True
+        """
+        with self._lock:
+            removed = self._vector_stores.pop(knowledge_base_id, None) is not None
+            self._store_collection_names.pop(knowledge_base_id, None)
+            if removed:
+                record_vector_store_collection_event("evict")
+                record_vector_store_collections(len(self._vector_stores))
+        return removed
+
+    def open_collections(self) -> int:
+        """缓存中的集合句柄数量"""
+        return len(self._vector_stores)
+
     async def add_documents(
         self,
         knowledge_base_id: int,
@@ -275,7 +585,8 @@ class VectorStoreManager:
         Returns:
             List[str]: 添加的文档ID列表
         """
-        vector_store = self.get_vector_store(knowledge_base_id)
+        vector_store = await self.aget_vector_store(knowledge_base_id, refresh=True)
+        collection_name = vector_store._collection.name
 
         # 添加元数据
         for doc in documents:
@@ -292,13 +603,15 @@ class VectorStoreManager:
         try:
             ids = await vector_store.aadd_documents(documents)
         except InvalidDimensionException as e:
-            collection_name = self._get_collection_name(knowledge_base_id)
             raise VectorStoreDimensionMismatchError.from_chroma(
                 knowledge_base_id=knowledge_base_id,
                 collection_name=collection_name,
                 exc=e,
             ) from e
 
+        await asyncio.to_thread(
+            self._replay_if_switched, knowledge_base_id, collection_name, ids=ids
+        )
         return ids
 
     def add_documents_sync(
@@ -318,7 +631,7 @@ class VectorStoreManager:
         Returns:
             List[str]: 添加的文档ID列表
         """
-        vector_store = self.get_vector_store(knowledge_base_id)
+        vector_store = self.get_vector_store(knowledge_base_id, refresh=True)
 
         # 添加元数据
         for doc in documents:
@@ -333,9 +646,94 @@ class VectorStoreManager:
 
         # 使用同步方法添加文档
         ids = vector_store.add_documents(documents)
+        self._replay_if_switched(knowledge_base_id, vector_store._collection.name, ids=ids)
 
         return ids
 
+    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        批量生成文档向量
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            List[List[float]]: 向量列表
+        """
+        with trace_stage("vector.embed_documents"):
+            return await self.embeddings.aembed_documents(texts)
+
+    def _upsert_embedded_documents_sync(
+        self,
+        knowledge_base_id: int,
+        documents: List[Document],
+        embeddings: List[List[float]],
+        ids: List[str],
+    ) -> None:
+        vector_store = self.get_vector_store(knowledge_base_id, refresh=True)
+        collection_name = vector_store._collection.name
+        try:
+            vector_store._collection.upsert(
+                ids=ids,
+                embeddings=embeddings,
+                metadatas=[doc.metadata for doc in documents],
+                documents=[doc.page_content for doc in documents],
+            )
+        except InvalidDimensionException as e:
+            raise VectorStoreDimensionMismatchError.from_chroma(
+                knowledge_base_id=knowledge_base_id,
+                collection_name=collection_name,
+                exc=e,
+            ) from e
+        self._replay_if_switched(knowledge_base_id, collection_name, ids=ids)
+
+    async def upsert_embedded_documents(
+        self,
+        knowledge_base_id: int,
+        documents: List[Document],
+        embeddings: List[List[float]],
+        document_id: Optional[int] = None,
+        ids: Optional[List[str]] = None,
+    ) -> List[str]:
+        """
+        写入已生成向量的文档（不再调用嵌入模型）
+
+        Args:
+            knowledge_base_id: 知识库ID
+            documents: 文档列表
+            embeddings: 与文档一一对应的向量列表
+            document_id: 文档ID（可选，用于添加元数据）
+            ids: 向量ID列表（可选，默认自动生成）
+
+        Returns:
+            List[str]: 写入的向量ID列表
+        """
+        if len(documents) != len(embeddings):
+            raise ValueError(
+                f"文档数量与向量数量不一致: documents={len(documents)}, "
+                f"embeddings={len(embeddings)}"
+            )
+        if not documents:
+            return []
+
+        for doc in documents:
+            doc.metadata["knowledge_base_id"] = knowledge_base_id
+            if document_id is not None:
+                doc.metadata["document_id"] = document_id
+
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in documents]
+
+        with trace_stage("vector.upsert"):
+            await asyncio.to_thread(
+                self._upsert_embedded_documents_sync,
+                knowledge_base_id,
+                documents,
+                embeddings,
+                ids,
+            )
+        return ids
+
     async def similarity_search(
         self,
         knowledge_base_id: int,
@@ -355,7 +753,7 @@ class VectorStoreManager:
         Returns:
             List[Document]: 相似文档列表
         """
-        vector_store = self.get_vector_store(knowledge_base_id)
+        vector_store = await self.aget_vector_store(knowledge_base_id)
 
         logger.debug(
             f"相似度搜索: kb_id={knowledge_base_id}, " f"query长度={len(query)}, k={k}"
@@ -368,7 +766,7 @@ class VectorStoreManager:
                 filter=filter_dict,
             )
         except InvalidDimensionException as e:
-            collection_name = self._get_collection_name(knowledge_base_id)
+            collection_name = vector_store._collection.name
             raise VectorStoreDimensionMismatchError.from_chroma(
                 knowledge_base_id=knowledge_base_id,
                 collection_name=collection_name,
@@ -397,20 +795,21 @@ class VectorStoreManager:
         Returns:
             List[tuple]: (文档, 相似度评分) 元组列表
         """
-        vector_store = self.get_vector_store(knowledge_base_id)
+        vector_store = await self.aget_vector_store(knowledge_base_id)
 
         logger.debug(
             f"带评分相似度搜索: kb_id={knowledge_base_id}, " f"query长度={len(query)}, k={k}"
         )
 
         try:
-            results = await vector_store.asimilarity_search_with_score(
-                query=query,
-                k=k,
-                filter=filter_dict,
-            )
+            with trace_stage("vector.search"):
+                results = await vector_store.asimilarity_search_with_score(
+                    query=query,
+                    k=k,
+                    filter=filter_dict,
+                )
         except InvalidDimensionException as e:
-            collection_name = self._get_collection_name(knowledge_base_id)
+            collection_name = vector_store._collection.name
             raise VectorStoreDimensionMismatchError.from_chroma(
                 knowledge_base_id=knowledge_base_id,
                 collection_name=collection_name,
@@ -420,6 +819,193 @@ class VectorStoreManager:
         logger.debug(f"搜索结果数量: {len(results)}")
         return results
 
+    async def embed_query(self, query: str) -> List[float]:
+        """
+        生成查询向量
+
+        Args:
+            query: 查询文本
+
+        Returns:
+            List[float]: 查询向量
+        """
+        with trace_stage("vector.embed_query"):
+            return await self.embeddings.aembed_query(query)
+
+    def _query_with_embeddings_sync(
+        self,
+        knowledge_base_id: int,
+        embedding: List[float],
+        k: int,
+        filter_dict: Optional[Dict[str, Any]] = None,
+    ) -> List[tuple]:
+        vector_store = self.get_vector_store(knowledge_base_id)
+        result = vector_store._collection.query(
+            query_embeddings=[embedding],
+            n_results=k,
+            where=filter_dict,
+            include=["documents", "metadatas", "distances", "embeddings"],
+        )
+        return [
+            (Document(page_content=content or "", metadata=metadata or {}), distance, vector)
+            for content, metadata, distance, vector in zip(
+                result["documents"][0],
+                result["metadatas"][0],
+                result["distances"][0],
+                result["embeddings"][0],
+            )
+        ]
+
+    async def similarity_search_by_vector_with_score(
+        self,
+        knowledge_base_id: int,
+        embedding: List[float],
+        k: int = 5,
+        filter_dict: Optional[Dict[str, Any]] = None,
+        include_embeddings: bool = False,
+    ) -> List[tuple]:
+        """
+        使用已生成的查询向量进行相似度搜索（带评分）
+
+        Chroma查询为同步调用，这里放到线程中执行，避免阻塞事件循环。
+
+        Args:
+            knowledge_base_id: 知识库ID
+            embedding: 查询向量
+            k: 返回结果数量
+            filter_dict: 过滤条件
+            include_embeddings: 是否同时返回已存储的分块向量
+
+        Returns:
+            List[tuple]: (文档, 距离评分) 元组列表，按距离升序；
+                include_embeddings为True时为 (文档, 距离评分, 分块向量) 元组列表
+        """
+        vector_store = await self.aget_vector_store(knowledge_base_id)
+
+        try:
+            with trace_stage("vector.search"):
+                if include_embeddings:
+                    return await asyncio.to_thread(
+                        self._query_with_embeddings_sync,
+                        knowledge_base_id,
+                        embedding,
+                        k,
+                        filter_dict,
+                    )
+                return await asyncio.to_thread(
+                    vector_store.similarity_search_by_vector_with_relevance_scores,
+                    embedding=embedding,
+                    k=k,
+                    filter=filter_dict,
+                )
+        except InvalidDimensionException as e:
+            collection_name = vector_store._collection.name
+            raise VectorStoreDimensionMismatchError.from_chroma(
+                knowledge_base_id=knowledge_base_id,
+                collection_name=collection_name,
+                exc=e,
+            ) from e
+
+    async def multi_knowledge_base_search_detailed(
+        self,
+        knowledge_base_ids: List[int],
+        query: str,
+        k: int = 5,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        query_embedding: Optional[List[float]] = None,
+        include_embeddings: bool = False,
+    ) -> MultiKnowledgeBaseSearchResult:
+        """
+        在多个知识库中并发进行联合搜索，并报告失败/超时的知识库
+
+        查询文本只向量化一次，随后以受限并发度查询各知识库集合，
+        每个知识库独立计时超时（含等待并发名额的时间），最后对各库有序结果做堆归并取 top-k。
+        超时的查询线程结束前继续占用并发名额。
+
+        Args:
+            knowledge_base_ids: 知识库ID列表
+            query: 查询文本
+            k: 返回结果数量
+            max_concurrency: 最大并发数，默认从配置读取
+            timeout: 单个知识库检索超时（秒），默认从配置读取
+            query_embedding: 已生成的查询向量（可选）
+            include_embeddings: 结果中是否附带已存储的分块向量（第三个元素）
+
+        Returns:
+            MultiKnowledgeBaseSearchResult: 联合检索结果
+        """
+        if max_concurrency is None:
+            max_concurrency = settings.rag.rag_multi_kb_max_concurrency
+        if timeout is None:
+            timeout = settings.rag.rag_multi_kb_timeout_seconds
+
+        kb_ids = list(dict.fromkeys(knowledge_base_ids))
+        outcome = MultiKnowledgeBaseSearchResult()
+        if not kb_ids or k <= 0:
+            return outcome
+
+        if query_embedding is None:
+            query_embedding = await self.embed_query(query)
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        search_kwargs = {"include_embeddings": True} if include_embeddings else {}
+
+        loop = asyncio.get_running_loop()
+
+        def _release(query: asyncio.Future) -> None:
+            semaphore.release()
+            # 超时后无人等待的查询，取出异常避免"exception was never retrieved"
+            if not query.cancelled():
+                query.exception()
+
+        async def _search_one(kb_id: int) -> List[tuple]:
+            # 超时包含等待并发名额的时间
+            deadline = loop.time() + timeout
+            await asyncio.wait_for(semaphore.acquire(), timeout=timeout)
+            query = asyncio.ensure_future(
+                self.similarity_search_by_vector_with_score(
+                    knowledge_base_id=kb_id,
+                    embedding=query_embedding,
+                    k=k,
+                    **search_kwargs,
+                )
+            )
+            # 超时只放弃等待结果，查询线程无法中断：线程结束后才归还名额，
+            # 避免慢查询堆积时实际并发超过上限
+            query.add_done_callback(_release)
+            return await asyncio.wait_for(
+                asyncio.shield(query), timeout=max(0.0, deadline - loop.time())
+            )
+
+        per_kb_results = await asyncio.gather(
+            *(_search_one(kb_id) for kb_id in kb_ids),
+            return_exceptions=True,
+        )
+
+        sorted_lists = []
+        for kb_id, result in zip(kb_ids, per_kb_results):
+            if isinstance(result, asyncio.TimeoutError):
+                logger.warning(f"知识库 {kb_id} 搜索超时: timeout={timeout}s")
+                outcome.timed_out_knowledge_base_ids.append(kb_id)
+            elif isinstance(result, BaseException):
+                logger.warning(f"知识库 {kb_id} 搜索失败: {str(result)}")
+                outcome.failed_knowledge_base_ids.append(kb_id)
+            else:
+                sorted_lists.append(sorted(result, key=lambda x: x[1]))
+
+        # 各库结果已按距离升序（评分越低越相似），堆归并后取前k个
+        merged = heapq.merge(*sorted_lists, key=lambda x: x[1])
+        outcome.results = list(itertools.islice(merged, k))
+
+        if outcome.is_partial:
+            logger.warning(
+                f"多知识库联合检索返回部分结果: kb_ids={kb_ids}, "
+                f"failed={outcome.failed_knowledge_base_ids}, "
+                f"timed_out={outcome.timed_out_knowledge_base_ids}"
+            )
+
+        return outcome
+
     async def multi_knowledge_base_search(
         self,
         knowledge_base_ids: List[int],
@@ -432,30 +1018,161 @@ class VectorStoreManager:
         Args:
             knowledge_base_ids: 知识库ID列表
             query: 查询文本
-            k: 每个知识库返回的结果数量
+            k: 返回结果数量
 
         Returns:
             List[tuple]: (文档, 相似度评分) 元组列表，按相似度排序
         """
-        all_results = []
+        outcome = await self.multi_knowledge_base_search_detailed(
+            knowledge_base_ids=knowledge_base_ids,
+            query=query,
+            k=k,
+        )
+        return outcome.results
 
-        for kb_id in knowledge_base_ids:
-            try:
-                results = await self.similarity_search_with_score(
-                    knowledge_base_id=kb_id,
-                    query=query,
-                    k=k,
-                )
-                all_results.extend(results)
-            except Exception as e:
-                logger.warning(f"知识库 {kb_id} 搜索失败: {str(e)}")
-                continue
+    def _sparse_search_sync(
+        self,
+        knowledge_base_ids: List[int],
+        query: str,
+        k: int,
+    ) -> List[SparseHit]:
+        store = get_sparse_index_store()
+        if store is None:
+            return []
+        hits: List[SparseHit] = []
+        with trace_stage("vector.sparse_search"):
+            for kb_id in knowledge_base_ids:
+                if not store.exists(kb_id):
+                    continue
+                try:
+                    hits.extend(store.get(kb_id).search(query, k))
+                except Exception as e:
+                    logger.warning(f"知识库 {kb_id} 稀疏检索失败: {str(e)}")
+        hits.sort(key=lambda hit: hit.score, reverse=True)
+        return hits[:k]
+
+    def _get_embeddings_sync(self, knowledge_base_id: int, ids: List[str]) -> Dict[str, List[float]]:
+        vector_store = self.get_vector_store(knowledge_base_id)
+        result = vector_store._collection.get(ids=ids, include=["embeddings"])
+        return dict(zip(result["ids"], result["embeddings"]))
+
+    async def get_embeddings_by_ids(
+        self,
+        knowledge_base_id: int,
+        ids: List[str],
+    ) -> Dict[str, List[float]]:
+        """
+        读取已存储的分块向量（不调用嵌入模型）
+
+        Args:
+            knowledge_base_id: 知识库ID
+            ids: 向量ID列表
+
+        Returns:
+            Dict[str, List[float]]: 向量ID -> 向量（仅包含存在的ID）
+        """
+        if not ids:
+            return {}
+        return await asyncio.to_thread(self._get_embeddings_sync, knowledge_base_id, ids)
 
-        # 按相似度评分排序（评分越低越相似）
-        all_results.sort(key=lambda x: x[1])
+    async def hybrid_search(
+        self,
+        knowledge_base_ids: List[int],
+        query: str,
+        k: int = 5,
+        candidates: Optional[int] = None,
+        rrf_k: Optional[int] = None,
+        query_embedding: Optional[List[float]] = None,
+        include_embeddings: bool = False,
+    ) -> List[tuple]:
+        """
+        稀疏(BM25) + 稠密向量混合检索
+
+        两种方式各召回 candidates 个候选，按倒数排名融合后取前k个。
+        只被稀疏检索召回的分块，使用向量库中已存储的分块向量计算与查询向量的距离，
+        使返回的评分与稠密检索一致。
 
-        # 返回前k个结果
-        return all_results[:k]
+        Args:
+            knowledge_base_ids: 知识库ID列表
+            query: 查询文本
+            k: 返回结果数量
+            candidates: 每种检索方式的候选数，默认从配置读取
+            rrf_k: 倒数排名融合常数，默认从配置读取
+            query_embedding: 已生成的查询向量（可选）
+            include_embeddings: 结果中是否附带已存储的分块向量（第三个元素）
+
+        Returns:
+            List[tuple]: (文档, 距离评分) 元组列表，按融合得分排序；
+                include_embeddings为True时为 (文档, 距离评分, 分块向量) 元组列表
+        """
+        kb_ids = list(dict.fromkeys(knowledge_base_ids))
+        if not kb_ids or k <= 0:
+            return []
+        candidates = max(k, candidates or settings.rag.rag_hybrid_candidates)
+        rrf_k = rrf_k or settings.rag.rag_rrf_k
+
+        if query_embedding is None:
+            query_embedding = await self.embed_query(query)
+        dense_outcome, sparse_hits = await asyncio.gather(
+            self.multi_knowledge_base_search_detailed(
+                knowledge_base_ids=kb_ids,
+                query=query,
+                k=candidates,
+                query_embedding=query_embedding,
+                include_embeddings=include_embeddings,
+            ),
+            asyncio.to_thread(self._sparse_search_sync, kb_ids, query, candidates),
+        )
+
+        # 标识 -> [文档, 距离, 稀疏索引中的分块ID, 分块向量]
+        entries: Dict[Hashable, list] = {}
+        dense_keys = []
+        for result in dense_outcome.results:
+            key = chunk_identity(result[0])
+            dense_keys.append(key)
+            vector = result[2] if include_embeddings else None
+            entries.setdefault(key, [result[0], result[1], None, vector])
+        sparse_keys = []
+        for hit in sparse_hits:
+            doc = Document(page_content=hit.content, metadata=hit.metadata)
+            key = chunk_identity(doc)
+            sparse_keys.append(key)
+            entries.setdefault(key, [doc, None, hit.chunk_id, None])
+
+        fused = reciprocal_rank_fusion([dense_keys, sparse_keys], rrf_k=rrf_k)[:k]
+
+        # 只被稀疏检索召回的分块：读取已存储向量计算距离（平方L2，与Chroma默认度量一致）
+        missing: Dict[int, List[list]] = {}
+        for key, _ in fused:
+            entry = entries[key]
+            if entry[1] is None:
+                missing.setdefault(entry[0].metadata.get("knowledge_base_id"), []).append(entry)
+        if missing:
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            for kb_id, kb_entries in missing.items():
+                if kb_id is None:
+                    continue
+                try:
+                    vectors = await self.get_embeddings_by_ids(
+                        kb_id, [entry[2] for entry in kb_entries]
+                    )
+                except Exception as e:
+                    logger.warning(f"读取分块向量失败: kb_id={kb_id}, error={str(e)}")
+                    continue
+                for entry in kb_entries:
+                    vector = vectors.get(entry[2])
+                    if vector is not None and len(vector) == len(query_vector):
+                        diff = np.asarray(vector, dtype=np.float32) - query_vector
+                        entry[1] = float(np.dot(diff, diff))
+                        entry[3] = vector
+
+        logger.debug(
+            f"混合检索: kb_ids={kb_ids}, dense={len(dense_outcome.results)}, "
+            f"sparse={len(sparse_hits)}, fused={len(fused)}"
+        )
+        if include_embeddings:
+            return [(entries[key][0], entries[key][1], entries[key][3]) for key, _ in fused]
+        return [(entries[key][0], entries[key][1]) for key, _ in fused]
 
     async def delete_by_document_id(
         self,
@@ -472,18 +1189,47 @@ class VectorStoreManager:
         Returns:
             bool: 是否删除成功
         """
-        vector_store = self.get_vector_store(knowledge_base_id)
+        vector_store = await self.aget_vector_store(knowledge_base_id, refresh=True)
 
         logger.info(f"删除文档向量: kb_id={knowledge_base_id}, " f"document_id={document_id}")
 
+        sparse_store = get_sparse_index_store()
+        if sparse_store is not None and sparse_store.exists(knowledge_base_id):
+            try:
+                await asyncio.to_thread(
+                    sparse_store.get(knowledge_base_id).delete_document, document_id
+                )
+            except Exception as e:
+                logger.warning(f"删除文档稀疏索引失败: {str(e)}")
+
+        collection = vector_store._collection
         try:
-            # 使用过滤条件删除
-            vector_store._collection.delete(where={"document_id": document_id})
-            return True
+            # Chroma不暴露墓碑数，先统计待删除行数记入别名登记
+            deleted = 0
+            if getattr(collection, "compact", None) is None:
+                found = await asyncio.to_thread(
+                    collection.get, where={"document_id": document_id}, include=[]
+                )
+                deleted = len(found["ids"])
+
+            # 使用过滤条件删除（墓碑由定时压缩任务回收，见compact_collection）
+            await asyncio.to_thread(collection.delete, where={"document_id": document_id})
+            await asyncio.to_thread(
+                self._replay_if_switched,
+                knowledge_base_id,
+                collection.name,
+                where={"document_id": document_id},
+            )
         except Exception as e:
             logger.error(f"删除文档向量失败: {str(e)}")
             return False
 
+        try:
+            await asyncio.to_thread(self.aliases.add_tombstones, knowledge_base_id, deleted)
+        except Exception as e:
+            logger.warning(f"记录删除向量数失败: {str(e)}")
+        return True
+
     def delete_collection(self, knowledge_base_id: int) -> bool:
         """
         删除整个知识库的向量集合
@@ -494,26 +1240,236 @@ class VectorStoreManager:
         Returns:
             bool: 是否删除成功
         """
-        collection_name = self._get_collection_name(knowledge_base_id)
-
-        logger.info(f"删除向量集合: {collection_name}")
+        logger.info(f"删除知识库向量集合: kb_id={knowledge_base_id}")
 
         try:
             # 从缓存中移除
-            if knowledge_base_id in self._vector_stores:
-                del self._vector_stores[knowledge_base_id]
+            self.evict(knowledge_base_id)
 
-            # 删除集合
-            import chromadb
+            sparse_store = get_sparse_index_store()
+            if sparse_store is not None:
+                sparse_store.delete_knowledge_base(knowledge_base_id)
 
-            client = chromadb.PersistentClient(path=self.persist_directory)
-            client.delete_collection(collection_name)
+            # 删除当前集合及压缩留下的各代集合，最后删除别名记录
+            for collection_name in self._list_collection_names(knowledge_base_id):
+                self.client.delete_collection(collection_name)
+            self.aliases.delete(knowledge_base_id)
 
             return True
         except Exception as e:
             logger.error(f"删除向量集合失败: {str(e)}")
             return False
 
+    def _list_collection_names(self, knowledge_base_id: Optional[int] = None) -> List[str]:
+        """
+        列出知识库集合名称（含各代集合）
+
+        Args:
+            knowledge_base_id: 知识库ID（默认全部知识库）
+
+        Returns:
+            List[str]: 集合名称列表
+        """
+        names = []
+        for collection in self.client.list_collections():
+            # Chroma 0.4返回集合对象，更高版本返回集合名称
+            name = getattr(collection, "name", collection)
+            match = _COLLECTION_NAME_RE.match(name)
+            if match and (knowledge_base_id is None or int(match.group(1)) == knowledge_base_id):
+                names.append(name)
+        return names
+
+    def list_knowledge_base_ids(self) -> List[int]:
+        """
+        列出向量库中已有集合的知识库ID
+
+        Returns:
+            List[int]: 知识库ID列表（升序）
+        """
+        return sorted(
+            {int(_COLLECTION_NAME_RE.match(name).group(1)) for name in self._list_collection_names()}
+        )
+
+    def compact_collection(
+        self,
+        knowledge_base_id: int,
+        min_tombstone_ratio: Optional[float] = None,
+        min_tombstones: Optional[int] = None,
+        force: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        压缩知识库集合，回收已删除向量占用的空间
+
+        numpy后端在线重写为新一代数据文件后原子切换，其他进程自动加载新文件。
+        Chroma集合的HNSW索引无法原地压缩，改为重建（见_rebuild_collection）：
+        存活行复制到新一代集合，校验后切换集合别名，其他进程在别名缓存过期后读取新集合。
+
+        Args:
+            knowledge_base_id: 知识库ID
+            min_tombstone_ratio: 触发压缩的墓碑行占比，默认从配置读取
+            min_tombstones: 触发压缩的最少墓碑行数，默认从配置读取
+            force: 忽略触发阈值（Chroma集合会无条件重建）
+
+        Returns:
+            dict: status（compacted/skipped）及压缩前后的行数；numpy后端另含压缩前后的磁盘占用
+        """
+        vector_settings = settings.vector_db
+        if min_tombstone_ratio is None:
+            min_tombstone_ratio = vector_settings.vector_compaction_min_tombstone_ratio
+        if min_tombstones is None:
+            min_tombstones = vector_settings.vector_compaction_min_tombstones
+
+        collection_name = self._get_collection_name(knowledge_base_id, refresh=True)
+        collection = self.client.get_collection(collection_name)
+        compact = getattr(collection, "compact", None)
+        if compact is None:
+            return self._rebuild_collection(
+                knowledge_base_id, collection, min_tombstone_ratio, min_tombstones, force
+            )
+
+        result: Dict[str, Any] = {"collection_name": collection_name}
+        stats = collection.stats()
+        tombstones = stats["tombstones"]
+        ratio = tombstones / stats["rows"] if stats["rows"] else 0.0
+        result.update(tombstones=tombstones, tombstone_ratio=round(ratio, 4))
+        if tombstones == 0 or (
+            not force and (tombstones < min_tombstones or ratio < min_tombstone_ratio)
+        ):
+            result["status"] = "skipped"
+            return result
+
+        result.update(compact())
+        result["disk_bytes_before"] = stats["disk_bytes"]
+        result["disk_bytes_after"] = collection.stats()["disk_bytes"]
+        result["status"] = "compacted"
+        return result
+
+    def _rebuild_collection(
+        self,
+        knowledge_base_id: int,
+        source: Any,
+        min_tombstone_ratio: float,
+        min_tombstones: int,
+        force: bool,
+    ) -> Dict[str, Any]:
+        """
+        重建Chroma集合并原子切换别名
+
+        重建期间原集合保持可读写。分页复制完成后按ID和内容指纹比对原集合，补齐期间的
+        写入、删除和改写，直到一整轮比对没有变更才切换（持续变更时放弃本次重建）；
+        切换后再比对一次，覆盖切换前已解析到旧集合的写入。被替换的集合保留
+        vector_compaction_retire_grace_seconds 秒，供别名缓存尚未过期的进程继续读取。
+        Chroma不按集合统计磁盘占用，结果中不含disk_bytes字段。
+
+        Args:
+            knowledge_base_id: 知识库ID
+            source: 当前集合
+            min_tombstone_ratio: 触发重建的墓碑行占比
+            min_tombstones: 触发重建的最少墓碑行数
+            force: 忽略触发阈值
+
+        Returns:
+            dict: status（compacted/skipped）及重建前后的行数
+        """
+        result: Dict[str, Any] = {"collection_name": source.name}
+        record = self.aliases.get_record(knowledge_base_id)
+        grace_seconds = settings.vector_db.vector_compaction_retire_grace_seconds
+
+        # 上一轮被替换的集合过了宽限期才删除，宽限期内不再重建
+        if record["retired"]:
+            if time.time() - float(record["retired_at"]) < grace_seconds:
+                result.update(status="skipped", reason="retiring")
+                return result
+            self._drop_collection(record["retired"])
+            self.aliases.clear_retired(knowledge_base_id)
+
+        # 清理中断的重建留下的集合（仍在宽限期内的视为其他进程正在重建）
+        generation = int(record["generation"])
+        for name in self._list_collection_names(knowledge_base_id):
+            if name == source.name:
+                continue
+            if int(_COLLECTION_NAME_RE.match(name).group(2) or 0) > generation:
+                metadata = self.client.get_collection(name).metadata or {}
+                if time.time() - float(metadata.get("compacted_at", 0.0)) < grace_seconds:
+                    result.update(status="skipped", reason="in_progress")
+                    return result
+            self._drop_collection(name)
+
+        rows = source.count()
+        tombstones = int(record["tombstones"])
+        ratio = tombstones / (rows + tombstones) if rows + tombstones else 0.0
+        result.update(tombstones=tombstones, tombstone_ratio=round(ratio, 4))
+        if not force and (
+            tombstones == 0 or tombstones < min_tombstones or ratio < min_tombstone_ratio
+        ):
+            result["status"] = "skipped"
+            return result
+
+        target_name = generation_collection_name(knowledge_base_id, generation + 1)
+        metadata = dict(source.metadata or {})
+        metadata["compacted_at"] = time.time()
+        staging = self.client.create_collection(
+            target_name, metadata=metadata, embedding_function=None
+        )
+        copied: Dict[str, int] = {}
+        offset = 0
+        while True:
+            page = source.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=_REBUILD_PAGE_SIZE,
+                offset=offset,
+            )
+            if not page["ids"]:
+                break
+            staging.upsert(
+                ids=page["ids"],
+                embeddings=page["embeddings"],
+                documents=page["documents"],
+                metadatas=page["metadatas"],
+            )
+            for row_id, document, row_metadata in zip(
+                page["ids"], page["documents"], page["metadatas"]
+            ):
+                copied[row_id] = _row_fingerprint(document, row_metadata)
+            offset += len(page["ids"])
+
+        # 分页复制期间的写入、删除和改写按ID与内容指纹比对补齐，直到一整轮比对没有变更
+        for _ in range(_REBUILD_SYNC_ROUNDS):
+            current = _sync_rows(source, staging, copied)
+            if current == copied:
+                break
+            copied = current
+        else:
+            logger.warning(f"重建期间集合持续变更，放弃本次重建: {source.name}")
+            self._drop_collection(target_name)
+            result.update(status="skipped", reason="changed")
+            return result
+
+        self.aliases.switch(knowledge_base_id, target_name, generation + 1, retired=source.name)
+        self.evict(knowledge_base_id)
+
+        # 切换前已解析到旧集合的写入可能在比对之后落到旧集合，切换后再同步一次；
+        # 切换之后才完成的写入由写入方自行补写（见_replay_if_switched）
+        copied = _sync_rows(source, staging, copied)
+
+        rows = len(copied)
+        result.update(
+            status="compacted",
+            collection_name=target_name,
+            rows_before=rows + tombstones,
+            rows_after=rows,
+            reclaimed=tombstones,
+        )
+        return result
+
+    def _drop_collection(self, collection_name: str) -> None:
+        """删除集合（不存在时忽略）"""
+        try:
+            self.client.delete_collection(collection_name)
+            logger.info(f"已删除旧集合: {collection_name}")
+        except Exception as e:
+            logger.warning(f"删除旧集合失败: {collection_name}, {str(e)}")
+
     def get_collection_stats(self, knowledge_base_id: int) -> Dict[str, Any]:
         """
         获取集合统计信息
@@ -545,12 +1501,28 @@ class VectorStoreManager:
 
     def clear_cache(self) -> None:
         """清除向量存储缓存"""
-        self._vector_stores.clear()
+        with self._lock:
+            closed = len(self._vector_stores)
+            self._vector_stores.clear()
+            self._store_collection_names.clear()
+            record_vector_store_collection_event("close", closed)
+            record_vector_store_collections(0)
         logger.info("向量存储缓存已清除")
 
+    def close(self) -> None:
+        """清除向量存储缓存并释放共享客户端"""
+        with self._lock:
+            self.clear_cache()
+            close_client = getattr(self._client, "close", None)
+            if close_client is not None:
+                close_client()
+            self._client = None
+            self.aliases.forget()
+
 
 # 全局向量数据库管理器实例
 _vector_store_manager: Optional[VectorStoreManager] = None
+_vector_store_manager_lock = threading.Lock()
 
 
 def get_vector_store_manager() -> VectorStoreManager:
@@ -563,7 +1535,9 @@ def get_vector_store_manager() -> VectorStoreManager:
     global _vector_store_manager
 
     if _vector_store_manager is None:
-        _vector_store_manager = VectorStoreManager()
+        with _vector_store_manager_lock:
+            if _vector_store_manager is None:
+                _vector_store_manager = VectorStoreManager()
 
     return _vector_store_manager
 
@@ -662,7 +1636,7 @@ def reset_vector_store_manager() -> None:
     global _vector_store_manager
 
     if _vector_store_manager is not None:
-        _vector_store_manager.clear_cache()
+        _vector_store_manager.close()
 
     _vector_store_manager = None
     logger.info("向量数据库管理器已重置")
@@ -671,6 +1645,9 @@ def reset_vector_store_manager() -> None:
 # 导出
 __all__ = [
     "VectorStoreManager",
+    "MultiKnowledgeBaseSearchResult",
+    "chunk_identity",
+    "reciprocal_rank_fusion",
     "get_vector_store_manager",
     "get_vector_store",
     "get_embeddings",
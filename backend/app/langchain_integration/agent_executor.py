@@ -3,12 +3,19 @@ Agent执行器模块
 
 实现基于LangChain的Agent执行器，使用ReAct模式进行任务推理和执行。
 支持工具调用、步骤记录和异步执行。
+
+AgentManager为进程级实例（get_agent_manager），LLM客户端、内置工具、提示词模板
+和按工具集合及模型参数编译的AgentExecutor在请求之间复用；
+每次执行只创建步骤记录回调，通过运行配置传入。
 """
 
 import json
 import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import Any, AsyncGenerator, Dict, List, Optional
+from functools import lru_cache
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
 
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain.callbacks.base import BaseCallbackHandler
@@ -29,6 +36,44 @@ from app.langchain_integration.tools import (
 
 logger = logging.getLogger(__name__)
 
+# 缓存的AgentExecutor最大数量（按工具集合、模型参数、最大迭代次数区分）
+AGENT_EXECUTOR_CACHE_SIZE = 32
+
+REACT_PROMPT_TEMPLATE = """你是一个智能助手，可以使用工具来完成任务。请按照以下格式进行推理和行动：
+
+可用工具:
+{tools}
+
+工具名称: {tool_names}
+
+使用以下格式:
+
+Question: 你需要回答的问题或完成的任务
+Thought: 你应该思考接下来要做什么
+Action: 要采取的行动，必须是以下工具之一 [{tool_names}]
+Action Input: 行动的输入参数
+Observation: 行动的结果
+... (这个 Thought/Action/Action Input/Observation 可以重复N次)
+Thought: 我现在知道最终答案了
+Final Answer: 对原始问题的最终答案
+
+重要提示:
+1. 每次只能使用一个工具
+2. Action必须是可用工具列表中的一个
+3. Action Input必须符合工具的输入要求
+4. 如果遇到错误，请尝试其他方法或工具
+5. 当你有足够信息回答问题时，给出Final Answer
+
+开始!
+
+Question: {input}
+Thought: {agent_scratchpad}"""
+
+
+@lru_cache(maxsize=1)
+def _react_prompt() -> PromptTemplate:
+    return PromptTemplate.from_template(REACT_PROMPT_TEMPLATE)
+
 
 class StepRecordingCallback(BaseCallbackHandler):
     """
@@ -108,6 +153,10 @@ class AgentManager:
         # 加载内置工具
         self.builtin_tools = self._load_builtin_tools()
 
+        # 按工具集合、模型参数和迭代次数缓存的AgentExecutor
+        self._executors: "OrderedDict[Tuple, AgentExecutor]" = OrderedDict()
+        self._executors_lock = threading.Lock()
+
         logger.info(f"AgentManager初始化完成，加载了 {len(self.builtin_tools)} 个内置工具")
 
     def _load_builtin_tools(self) -> List[BaseTool]:
@@ -129,42 +178,12 @@ class AgentManager:
 
     def _create_react_prompt(self) -> PromptTemplate:
         """
-        创建ReAct模式的提示词模板
+        获取ReAct模式的提示词模板（进程内共享）
 
         Returns:
             提示词模板
         """
-        template = """你是一个智能助手，可以使用工具来完成任务。请按照以下格式进行推理和行动：
-
-可用工具:
-{tools}
-
-工具名称: {tool_names}
-
-使用以下格式:
-
-Question: 你需要回答的问题或完成的任务
-Thought: 你应该思考接下来要做什么
-Action: 要采取的行动，必须是以下工具之一 [{tool_names}]
-Action Input: 行动的输入参数
-Observation: 行动的结果
-... (这个 Thought/Action/Action Input/Observation 可以重复N次)
-Thought: 我现在知道最终答案了
-Final Answer: 对原始问题的最终答案
-
-重要提示:
-1. 每次只能使用一个工具
-2. Action必须是可用工具列表中的一个
-3. Action Input必须符合工具的输入要求
-4. 如果遇到错误，请尝试其他方法或工具
-5. 当你有足够信息回答问题时，给出Final Answer
-
-开始!
-
-Question: {input}
-Thought: {agent_scratchpad}"""
-
-        return PromptTemplate.from_template(template)
+        return _react_prompt()
 
     def _select_tools(
         self,
@@ -197,6 +216,70 @@ Thought: {agent_scratchpad}"""
 
         return selected_tools
 
+    def _model_params(self) -> Tuple:
+        return (
+            getattr(self.llm, "model_name", None),
+            getattr(self.llm, "temperature", None),
+            getattr(self.llm, "max_tokens", None),
+        )
+
+    def _get_agent_executor(
+        self,
+        tools: List[BaseTool],
+        max_iterations: int,
+        verbose: bool,
+        cacheable: bool = True,
+    ) -> AgentExecutor:
+        """
+        获取AgentExecutor
+
+        只包含共享工具实例（内置工具）时按工具集合、模型参数和迭代次数复用已编译的执行器；
+        执行器本身不保存运行状态，回调通过每次运行的config传入。
+
+        Args:
+            tools: 工具列表
+            max_iterations: 最大迭代次数
+            verbose: 是否输出详细日志
+            cacheable: 是否可以缓存（包含按请求创建的自定义工具时为False）
+
+        Returns:
+            AgentExecutor: Agent执行器
+        """
+        key = (
+            tuple(tool.name for tool in tools),
+            self._model_params(),
+            max_iterations,
+            verbose,
+        )
+        if cacheable:
+            with self._executors_lock:
+                executor = self._executors.get(key)
+                if executor is not None:
+                    self._executors.move_to_end(key)
+                    return executor
+
+        agent = create_react_agent(llm=self.llm, tools=tools, prompt=self._create_react_prompt())
+        executor = AgentExecutor(
+            agent=agent,
+            tools=tools,
+            verbose=verbose,
+            max_iterations=max_iterations,
+            handle_parsing_errors=True,
+        )
+
+        if cacheable:
+            with self._executors_lock:
+                executor = self._executors.setdefault(key, executor)
+                self._executors.move_to_end(key)
+                while len(self._executors) > AGENT_EXECUTOR_CACHE_SIZE:
+                    self._executors.popitem(last=False)
+        return executor
+
+    def clear_cache(self) -> None:
+        """清空缓存的AgentExecutor（工具或模型配置变化后调用）"""
+        with self._executors_lock:
+            self._executors.clear()
+
     async def execute_task(
         self,
         task: str,
@@ -238,27 +321,18 @@ Thought: {agent_scratchpad}"""
 
             logger.info(f"使用 {len(tools)} 个工具: {[t.name for t in tools]}")
 
-            # 创建提示词模板
-            prompt = self._create_react_prompt()
-
-            # 创建Agent
-            agent = create_react_agent(llm=self.llm, tools=tools, prompt=prompt)
-
-            # 创建步骤记录回调
+            # 创建步骤记录回调（每次执行独立）
             callback = StepRecordingCallback()
 
-            # 创建Agent执行器
-            agent_executor = AgentExecutor(
-                agent=agent,
-                tools=tools,
-                verbose=verbose,
-                max_iterations=max_iterations,
-                handle_parsing_errors=True,
-                callbacks=[callback],
+            # 获取Agent执行器（内置工具时复用已编译的执行器）
+            agent_executor = self._get_agent_executor(
+                tools, max_iterations, verbose, cacheable=not custom_tools
             )
 
             # 执行任务
-            result = await agent_executor.ainvoke({"input": task})
+            result = await agent_executor.ainvoke(
+                {"input": task}, config={"callbacks": [callback]}
+            )
 
             # 获取执行步骤
             steps = callback.get_steps()
@@ -312,27 +386,18 @@ Thought: {agent_scratchpad}"""
                 yield {"type": "error", "data": {"message": "没有可用的工具"}}
                 return
 
-            # 创建提示词模板
-            prompt = self._create_react_prompt()
-
-            # 创建Agent
-            agent = create_react_agent(llm=self.llm, tools=tools, prompt=prompt)
-
-            # 创建步骤记录回调
+            # 创建步骤记录回调（每次执行独立）
             callback = StepRecordingCallback()
 
-            # 创建Agent执行器
-            agent_executor = AgentExecutor(
-                agent=agent,
-                tools=tools,
-                verbose=True,
-                max_iterations=max_iterations,
-                handle_parsing_errors=True,
-                callbacks=[callback],
+            # 获取Agent执行器（内置工具时复用已编译的执行器）
+            agent_executor = self._get_agent_executor(
+                tools, max_iterations, True, cacheable=not custom_tools
             )
 
             last_emitted_step_index = 0
-            async for _ in agent_executor.astream({"input": task}):
+            async for _ in agent_executor.astream(
+                {"input": task}, config={"callbacks": [callback]}
+            ):
                 while last_emitted_step_index < len(callback.steps):
                     step = callback.steps[last_emitted_step_index]
                     last_emitted_step_index += 1
@@ -387,3 +452,45 @@ Thought: {agent_scratchpad}"""
                 }
             )
         return tools_info
+
+
+# 全局Agent管理器实例
+_agent_manager: Optional[AgentManager] = None
+_agent_manager_lock = threading.Lock()
+
+
+def get_agent_manager() -> AgentManager:
+    """
+    获取全局Agent管理器实例
+
+    Returns:
+        AgentManager: Agent管理器实例
+    """
+    global _agent_manager
+
+    if _agent_manager is None:
+        with _agent_manager_lock:
+            if _agent_manager is None:
+                _agent_manager = AgentManager()
+
+    return _agent_manager
+
+
+def clear_agent_manager() -> None:
+    """
+    清除全局Agent管理器实例
+
+    用于测试或重新加载配置。
+    """
+    global _agent_manager
+    _agent_manager = None
+
+
+# 导出
+__all__ = [
+    "AgentManager",
+    "StepRecordingCallback",
+    "get_agent_manager",
+    "clear_agent_manager",
+    "REACT_PROMPT_TEMPLATE",
+]
@@ -1,7 +1,7 @@
 """
 LangChain对话链模块
 
-实现对话管理器，使用ConversationBufferMemory维护上下文，
+实现对话管理器，使用有界的对话记忆存储维护上下文，
 支持流式和非流式对话响应。
 
 需求引用:
@@ -10,18 +10,25 @@ LangChain对话链模块
 """
 
 import logging
+import time
 from typing import Any, AsyncGenerator, Dict, List, Optional
 
-from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
 from langchain.prompts import PromptTemplate
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 
 from app.config import settings
+from app.core.conversation_memory import (ConversationMemoryStore,
+                                          get_conversation_memory_store)
 from app.core.llm import TongyiLLM, get_llm, get_streaming_llm
+from app.core.tokenizer import count_tokens
+from app.core.tracing import record_stage, trace_stage
+from app.langchain_integration.prompt_assembler import (AssembledPrompt,
+                                                        PromptAssembler)
 
 logger = logging.getLogger(__name__)
 
+# 对话记忆命名空间
+CHAT_MEMORY_NAMESPACE = "chat"
+
 
 # 默认对话提示模板
 DEFAULT_CONVERSATION_TEMPLATE = """你是一个智能AI助手，能够帮助用户解答各种问题。请用中文回答用户的问题，保持友好、专业的态度。
@@ -67,7 +74,7 @@ class ConversationManager:
     对话管理器类
 
     管理对话上下文，提供流式和非流式对话功能。
-    使用ConversationBufferMemory维护对话历史。
+    对话历史保存在有界的对话记忆存储中（LRU/TTL淘汰，按token预算截取窗口）。
 
     使用方式:
         manager = ConversationManager()
@@ -88,70 +95,63 @@ class ConversationManager:
             print(chunk, end="")
     """
 
-    def __init__(self):
-        """初始化对话管理器"""
-        # 对话记忆存储: conversation_id -> ConversationBufferMemory
-        self._memories: Dict[int, ConversationBufferMemory] = {}
+    def __init__(self, memory_store: Optional[ConversationMemoryStore] = None):
+        """
+        初始化对话管理器
+
+        Args:
+            memory_store: 对话记忆存储，默认使用全局实例
+        """
+        self._memory_store = memory_store or get_conversation_memory_store()
 
         # 对话提示模板
         self._prompt_template = PromptTemplate(
             input_variables=["history", "input"], template=DEFAULT_CONVERSATION_TEMPLATE
         )
+        self._prompt_assembler = PromptAssembler(
+            template=self._prompt_template, question_key="input", history_key="history"
+        )
 
     def get_or_create_memory(
         self, conversation_id: int, history: Optional[List[Dict[str, str]]] = None
-    ) -> ConversationBufferMemory:
+    ) -> List[Dict[str, str]]:
         """
         获取或创建对话记忆
 
         Args:
             conversation_id: 对话ID
-            history: 历史消息列表，用于初始化记忆
+            history: 历史消息列表，记忆不存在时用于初始化
 
         Returns:
-            ConversationBufferMemory: 对话记忆对象
+            List[Dict[str, str]]: 记忆中的消息（已按token预算截取）
         """
-        if conversation_id not in self._memories:
-            memory = ConversationBufferMemory(
-                return_messages=True, human_prefix="用户", ai_prefix="AI助手"
+        messages = self._memory_store.load(CHAT_MEMORY_NAMESPACE, conversation_id)
+        if messages is None:
+            messages = self._memory_store.replace(
+                CHAT_MEMORY_NAMESPACE, conversation_id, history or []
             )
+        return messages
 
-            # 如果提供了历史消息，加载到记忆中
-            if history:
-                for msg in history:
-                    if msg.get("role") == "USER":
-                        memory.chat_memory.add_user_message(msg.get("content", ""))
-                    elif msg.get("role") == "ASSISTANT":
-                        memory.chat_memory.add_ai_message(msg.get("content", ""))
-
-            self._memories[conversation_id] = memory
-
-        return self._memories[conversation_id]
+    async def _aget_or_create_memory(
+        self, conversation_id: int, history: Optional[List[Dict[str, str]]] = None
+    ) -> List[Dict[str, str]]:
+        """异步获取或创建对话记忆（启用Redis共享层时不阻塞事件循环）"""
+        messages = await self._memory_store.aload(CHAT_MEMORY_NAMESPACE, conversation_id)
+        if messages is None:
+            messages = self._memory_store.window(history or [])
+        return messages
 
     def load_history(
         self, conversation_id: int, messages: List[Dict[str, str]]
     ) -> None:
         """
-        加载对话历史到记忆
+        加载对话历史到记忆（覆盖现有记忆）
 
         Args:
             conversation_id: 对话ID
             messages: 消息列表，每个消息包含role和content
         """
-        memory = self.get_or_create_memory(conversation_id)
-
-        # 清除现有记忆
-        memory.clear()
-
-        # 加载新的历史
-        for msg in messages:
-            role = msg.get("role", "")
-            content = msg.get("content", "")
-
-            if role == "USER":
-                memory.chat_memory.add_user_message(content)
-            elif role == "ASSISTANT":
-                memory.chat_memory.add_ai_message(content)
+        self._memory_store.replace(CHAT_MEMORY_NAMESPACE, conversation_id, messages)
 
     def clear_memory(self, conversation_id: int) -> None:
         """
@@ -160,9 +160,7 @@ class ConversationManager:
         Args:
             conversation_id: 对话ID
         """
-        if conversation_id in self._memories:
-            self._memories[conversation_id].clear()
-            del self._memories[conversation_id]
+        self._memory_store.delete(CHAT_MEMORY_NAMESPACE, conversation_id)
 
     def _get_llm(self, config: ChatConfig, streaming: bool = False) -> TongyiLLM:
         """
@@ -181,30 +179,20 @@ class ConversationManager:
             )
         return get_llm(temperature=config.temperature, max_tokens=config.max_tokens)
 
-    def _build_prompt(self, message: str, memory: ConversationBufferMemory) -> str:
+    def _build_prompt(self, message: str, memory: List[Dict[str, str]]) -> AssembledPrompt:
         """
         构建对话提示
 
+        历史消息按token预算裁剪，优先保留最近的对话。
+
         Args:
             message: 用户消息
-            memory: 对话记忆
+            memory: 记忆中的历史消息
 
         Returns:
-            str: 完整的提示文本
+            AssembledPrompt: 组装后的提示（含精确的提示token数）
         """
-        # 获取历史对话
-        history = memory.load_memory_variables({})
-        history_str = ""
-
-        if "history" in history:
-            messages = history["history"]
-            for msg in messages:
-                if isinstance(msg, HumanMessage):
-                    history_str += f"用户: {msg.content}\n"
-                elif isinstance(msg, AIMessage):
-                    history_str += f"AI助手: {msg.content}\n"
-
-        return self._prompt_template.format(history=history_str.strip(), input=message)
+        return self._prompt_assembler.assemble(question=message, history=memory)
 
     async def chat(
         self,
@@ -223,7 +211,7 @@ class ConversationManager:
             history: 历史消息列表（可选，用于初始化记忆）
 
         Returns:
-            tuple[str, int]: (AI回复内容, 估算的token数量)
+            tuple[str, int]: (AI回复内容, 消耗的token数量（提示 + 回复）)
 
         需求引用:
             - 需求2.2: 调用通义千问API生成回复
@@ -232,32 +220,42 @@ class ConversationManager:
             config = ChatConfig()
 
         # 获取或创建记忆
-        memory = self.get_or_create_memory(conversation_id, history)
+        memory = await self._aget_or_create_memory(conversation_id, history)
 
         # 获取LLM实例
         llm = self._get_llm(config, streaming=False)
 
         # 构建提示
-        prompt = self._build_prompt(message, memory)
+        assembled = self._build_prompt(message, memory)
+        prompt = assembled.text
 
-        logger.debug(f"对话 {conversation_id}: 发送消息，prompt长度={len(prompt)}")
+        logger.debug(
+            f"对话 {conversation_id}: 发送消息，prompt_tokens={assembled.prompt_tokens}"
+        )
 
         try:
             # 调用LLM
             response = await llm.llm.ainvoke(prompt)
 
             # 更新记忆
-            memory.chat_memory.add_user_message(message)
-            memory.chat_memory.add_ai_message(response)
+            await self._memory_store.areplace(
+                CHAT_MEMORY_NAMESPACE,
+                conversation_id,
+                memory
+                + [
+                    {"role": "USER", "content": message},
+                    {"role": "ASSISTANT", "content": response},
+                ],
+            )
 
-            # 估算token数量（简单估算：中文约2字符/token，英文约4字符/token）
-            estimated_tokens = self._estimate_tokens(prompt + response)
+            # 提示token数 + 回复token数
+            tokens_used = assembled.prompt_tokens + count_tokens(response)
 
             logger.debug(
-                f"对话 {conversation_id}: 收到回复，长度={len(response)}, tokens≈{estimated_tokens}"
+                f"对话 {conversation_id}: 收到回复，长度={len(response)}, tokens={tokens_used}"
             )
 
-            return response, estimated_tokens
+            return response, tokens_used
 
         except Exception as e:
             logger.error(f"对话 {conversation_id}: LLM调用失败 - {str(e)}")
@@ -295,17 +293,23 @@ class ConversationManager:
             config = ChatConfig()
 
         # 获取或创建记忆
-        memory = self.get_or_create_memory(conversation_id, history)
+        with trace_stage("chat.history"):
+            memory = await self._aget_or_create_memory(conversation_id, history)
 
         # 获取流式LLM实例
         llm = self._get_llm(config, streaming=True)
 
         # 构建提示
-        prompt = self._build_prompt(message, memory)
+        with trace_stage("chat.prompt"):
+            assembled = self._build_prompt(message, memory)
+        prompt = assembled.text
 
-        logger.debug(f"对话 {conversation_id}: 开始流式对话，prompt长度={len(prompt)}")
+        logger.debug(
+            f"对话 {conversation_id}: 开始流式对话，prompt_tokens={assembled.prompt_tokens}"
+        )
 
         full_response = ""
+        llm_started = time.perf_counter()
 
         try:
             yielded_any = False
@@ -317,6 +321,8 @@ class ConversationManager:
                 content = text if isinstance(text, str) else str(text)
                 if not content:
                     return
+                if not yielded_any:
+                    record_stage("llm.first_token", time.perf_counter() - llm_started)
                 full_response += content
                 yielded_any = True
                 yield {"type": "token", "content": content}
@@ -362,22 +368,34 @@ class ConversationManager:
                     raise
                 async for event in _stream_via_invoke():
                     yield event
+            record_stage("llm.generate", time.perf_counter() - llm_started)
 
             # 更新记忆
-            memory.chat_memory.add_user_message(message)
-            memory.chat_memory.add_ai_message(full_response)
-
-            # 估算token数量
-            estimated_tokens = self._estimate_tokens(prompt + full_response)
+            with trace_stage("chat.memory"):
+                await self._memory_store.areplace(
+                    CHAT_MEMORY_NAMESPACE,
+                    conversation_id,
+                    memory
+                    + [
+                        {"role": "USER", "content": message},
+                        {"role": "ASSISTANT", "content": full_response},
+                    ],
+                )
+
+            # 提示token数 + 回复token数
+            completion_tokens = count_tokens(full_response)
+            tokens_used = assembled.prompt_tokens + completion_tokens
 
             logger.debug(
-                f"对话 {conversation_id}: 流式对话完成，总长度={len(full_response)}, tokens≈{estimated_tokens}"
+                f"对话 {conversation_id}: 流式对话完成，总长度={len(full_response)}, tokens={tokens_used}"
             )
 
             yield {
                 "type": "done",
                 "content": full_response,
-                "tokens_used": estimated_tokens,
+                "tokens_used": tokens_used,
+                "prompt_tokens": assembled.prompt_tokens,
+                "completion_tokens": completion_tokens,
             }
 
         except Exception as e:
@@ -392,29 +410,6 @@ class ConversationManager:
                     error_message = msg
             yield {"type": "error", "error": error_message}
 
-    def _estimate_tokens(self, text: str) -> int:
-        """
-        估算文本的token数量
-
-        简单估算方法：
-        - 中文字符约2字符/token
-        - 英文字符约4字符/token
-
-        Args:
-            text: 文本内容
-
-        Returns:
-            int: 估算的token数量
-        """
-        # 统计中文字符数
-        chinese_chars = sum(1 for c in text if "\u4e00" <= c <= "\u9fff")
-        # 统计其他字符数
-        other_chars = len(text) - chinese_chars
-
-        # 估算token数
-        estimated = (chinese_chars / 2) + (other_chars / 4)
-        return int(estimated)
-
     def get_memory_messages(self, conversation_id: int) -> List[Dict[str, str]]:
         """
         获取对话记忆中的消息
@@ -425,21 +420,7 @@ class ConversationManager:
         Returns:
             List[Dict[str, str]]: 消息列表
         """
-        if conversation_id not in self._memories:
-            return []
-
-        memory = self._memories[conversation_id]
-        history = memory.load_memory_variables({})
-
-        messages = []
-        if "history" in history:
-            for msg in history["history"]:
-                if isinstance(msg, HumanMessage):
-                    messages.append({"role": "USER", "content": msg.content})
-                elif isinstance(msg, AIMessage):
-                    messages.append({"role": "ASSISTANT", "content": msg.content})
-
-        return messages
+        return self._memory_store.load(CHAT_MEMORY_NAMESPACE, conversation_id) or []
 
 
 # 全局对话管理器实例
@@ -476,4 +457,5 @@ __all__ = [
     "get_conversation_manager",
     "clear_conversation_manager",
     "DEFAULT_CONVERSATION_TEMPLATE",
+    "CHAT_MEMORY_NAMESPACE",
 ]
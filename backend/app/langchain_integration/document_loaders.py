@@ -8,20 +8,33 @@
     - 需求3.3: 用户上传文档且文件类型为PDF、Word、TXT或Markdown
 """
 
+import codecs
 import logging
 import os
+import zipfile
 from datetime import datetime
-from typing import List, Optional, Type
+from typing import Iterable, Iterator, List, Optional
+from xml.etree import ElementTree
 
 from langchain_community.document_loaders.base import BaseLoader
 from langchain_community.document_loaders.markdown import \
     UnstructuredMarkdownLoader
-from langchain_community.document_loaders.pdf import PyPDFLoader
-from langchain_community.document_loaders.text import TextLoader
 from langchain_core.documents import Document
 
 logger = logging.getLogger(__name__)
 
+# 文本文件每次读取的字节数
+TEXT_READ_BYTES = 256 * 1024
+
+# 连续文本（TXT、DOCX）逐段返回时每段的目标字符数
+TEXT_SEGMENT_CHARS = 64 * 1024
+
+# 文本文件尝试的编码（按顺序）
+TEXT_ENCODINGS = ["utf-8", "utf-8-sig", "gb18030", "gbk", "latin-1"]
+
+# DOCX正文XML命名空间
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
 
 class DocumentProcessingError(Exception):
     """文档处理异常"""
@@ -35,21 +48,173 @@ class UnsupportedFileTypeError(DocumentProcessingError):
     pass
 
 
-class DocxLoader(BaseLoader):
+def _find_segment_cut(text: str, limit: int) -> int:
+    """在limit之前最后一个段落（或换行）边界处断开，找不到时在limit处断开"""
+    for separator in ("\n\n", "\n"):
+        position = text.rfind(separator, 0, limit)
+        if position > 0:
+            return position + len(separator)
+    return limit
+
+
+def iter_text_segments(pieces: Iterable[str], segment_chars: int = TEXT_SEGMENT_CHARS) -> Iterator[str]:
+    """
+    将连续文本片段重新切分为大小受限的文本段
+
+    尽量在段落边界处断开，所有文本段按顺序拼接后与原文完全一致。
+
+    Args:
+        pieces: 连续的文本片段
+        segment_chars: 每段的目标字符数
+
+    Yields:
+        str: 文本段
+    """
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        while len(buffer) >= segment_chars:
+            cut = _find_segment_cut(buffer, segment_chars)
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    if buffer:
+        yield buffer
+
+
+def _segment_documents(segments: Iterable[str], metadata: dict) -> Iterator[Document]:
+    """
+    将连续文本段包装为文档对象
+
+    metadata中的segment为文本段序号，大于0表示与上一段是连续文本（不是新页面）。
+    """
+    for index, segment in enumerate(segments):
+        yield Document(page_content=segment, metadata={**metadata, "segment": index})
+
+
+class LazyPDFLoader(BaseLoader):
+    """PDF加载器，逐页解析，内存中只保留当前页"""
+
     def __init__(self, file_path: str):
         self.file_path = file_path
 
+    def page_count(self) -> int:
+        """获取页数（只读取页面目录，不解析页面内容）"""
+        import pypdf
+
+        with open(self.file_path, "rb") as f:
+            return len(pypdf.PdfReader(f).pages)
+
+    def lazy_load(self) -> Iterator[Document]:
+        import pypdf
+
+        with open(self.file_path, "rb") as f:
+            reader = pypdf.PdfReader(f)
+            for page_number, page in enumerate(reader.pages):
+                yield Document(
+                    page_content=page.extract_text(),
+                    metadata={"source": self.file_path, "page": page_number},
+                )
+
     def load(self) -> List[Document]:
-        try:
-            from langchain_community.document_loaders.word_document import Docx2txtLoader
+        return list(self.lazy_load())
+
+
+def _docx_part_order(name: str) -> int:
+    """header1.xml、header2.xml、header10.xml 按编号排序"""
+    digits = "".join(c for c in os.path.basename(name) if c.isdigit())
+    return int(digits) if digits else 0
 
-            return Docx2txtLoader(self.file_path).load()
-        except ModuleNotFoundError as e:
-            if e.name == "docx2txt":
-                raise DocumentProcessingError(
-                    "DOCX解析依赖缺失：docx2txt。请安装 docx2txt 后重试。"
-                ) from e
-            raise
+
+def _iter_docx_part(xml_file) -> Iterator[str]:
+    """流式解析DOCX中的一个XML部件，逐段落返回文本，已读取的段落元素随即清空"""
+    parts: List[str] = []
+    for _, element in ElementTree.iterparse(xml_file, events=("end",)):
+        tag = element.tag
+        if tag == f"{_W}t":
+            parts.append(element.text or "")
+        elif tag == f"{_W}tab":
+            parts.append("\t")
+        elif tag in (f"{_W}br", f"{_W}cr"):
+            parts.append("\n")
+        elif tag == f"{_W}p":
+            yield "".join(parts)
+            parts = []
+            element.clear()
+
+
+def iter_docx_paragraphs(file_path: str) -> Iterator[str]:
+    """
+    逐段落读取DOCX文本
+
+    依次读取页眉、正文、脚注、尾注和页脚（与docx2txt一致包含页眉页脚）。
+    正文保留空段落；其余部件跳过空段落，多个页眉/页脚中重复的段落只保留一次。
+
+    Args:
+        file_path: 文件路径
+
+    Yields:
+        str: 段落文本
+    """
+    try:
+        archive = zipfile.ZipFile(file_path)
+    except zipfile.BadZipFile as e:
+        raise DocumentProcessingError(f"DOCX文件格式不正确: {str(e)}") from e
+
+    with archive:
+        names = set(archive.namelist())
+        if "word/document.xml" not in names:
+            raise DocumentProcessingError("DOCX文件格式不正确: 缺少word/document.xml")
+
+        def _parts(prefix: str) -> List[str]:
+            matched = [
+                name
+                for name in names
+                if name.startswith(f"word/{prefix}") and name.endswith(".xml")
+            ]
+            return sorted(matched, key=_docx_part_order)
+
+        ordered = (
+            _parts("header")
+            + ["word/document.xml"]
+            + [name for name in ("word/footnotes.xml", "word/endnotes.xml") if name in names]
+            + _parts("footer")
+        )
+        seen_repeated = set()
+        for name in ordered:
+            is_body = name == "word/document.xml"
+            is_repeated = not is_body and name.startswith(("word/header", "word/footer"))
+            with archive.open(name) as xml_file:
+                for paragraph in _iter_docx_part(xml_file):
+                    if is_body:
+                        yield paragraph
+                        continue
+                    if not paragraph.strip():
+                        continue
+                    if is_repeated:
+                        if paragraph in seen_repeated:
+                            continue
+                        seen_repeated.add(paragraph)
+                    yield paragraph
+
+
+class DocxLoader(BaseLoader):
+    """DOCX加载器，逐段落读取页眉、正文、脚注、尾注和页脚并按段返回"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def _iter_text(self) -> Iterator[str]:
+        for index, paragraph in enumerate(iter_docx_paragraphs(self.file_path)):
+            yield paragraph if index == 0 else f"\n\n{paragraph}"
+
+    def lazy_load(self) -> Iterator[Document]:
+        yield from _segment_documents(
+            iter_text_segments(self._iter_text()), {"source": self.file_path}
+        )
+
+    def load(self) -> List[Document]:
+        text = "".join(self._iter_text())
+        return [Document(page_content=text, metadata={"source": self.file_path})]
 
 
 def _decode_bytes_fallback(content: bytes, encodings: List[str]) -> str:
@@ -61,18 +226,59 @@ def _decode_bytes_fallback(content: bytes, encodings: List[str]) -> str:
     return content.decode(encodings[0], errors="replace")
 
 
+def _detect_file_encoding(file_path: str, encodings: List[str]) -> Optional[str]:
+    """
+    按顺序找到第一个能完整解码文件的编码
+
+    使用增量解码器逐块校验，不在内存中保留文件内容。
+
+    Returns:
+        Optional[str]: 编码名称，均无法解码时返回None
+    """
+    for encoding in encodings:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(file_path, "rb") as f:
+                while True:
+                    raw = f.read(TEXT_READ_BYTES)
+                    if not raw:
+                        break
+                    decoder.decode(raw)
+            decoder.decode(b"", final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
 class RobustTextLoader(BaseLoader):
+    """文本加载器，自动识别编码，增量解码并按段返回"""
+
     def __init__(self, file_path: str):
         self.file_path = file_path
 
-    def load(self) -> List[Document]:
-        with open(self.file_path, "rb") as f:
-            raw = f.read()
-        text = _decode_bytes_fallback(
-            raw,
-            encodings=["utf-8", "utf-8-sig", "gb18030", "gbk", "latin-1"],
+    def _iter_text(self) -> Iterator[str]:
+        encoding = _detect_file_encoding(self.file_path, TEXT_ENCODINGS)
+        decoder = codecs.getincrementaldecoder(encoding or TEXT_ENCODINGS[0])(
+            errors="strict" if encoding else "replace"
         )
-        return [Document(page_content=text, metadata={})]
+        with open(self.file_path, "rb") as f:
+            while True:
+                raw = f.read(TEXT_READ_BYTES)
+                if not raw:
+                    break
+                text = decoder.decode(raw)
+                if text:
+                    yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    def lazy_load(self) -> Iterator[Document]:
+        yield from _segment_documents(iter_text_segments(self._iter_text()), {})
+
+    def load(self) -> List[Document]:
+        return [Document(page_content="".join(self._iter_text()), metadata={})]
 
 
 class RobustMarkdownLoader(BaseLoader):
@@ -86,15 +292,19 @@ class RobustMarkdownLoader(BaseLoader):
             logger.warning(f"Markdown结构化解析失败，降级为纯文本加载: error={str(e)}")
             return RobustTextLoader(self.file_path).load()
 
+    def lazy_load(self) -> Iterator[Document]:
+        # 结构化解析需要完整文档，这里整体加载后逐个返回
+        yield from self.load()
+
 
 class DocumentLoaderFactory:
     """
     文档加载器工厂类
 
     根据文件类型返回相应的文档加载器，支持：
-    - PDF: 使用PyPDFLoader
-    - Word (docx/doc): 使用Docx2txtLoader
-    - TXT: 使用TextLoader
+    - PDF: 使用LazyPDFLoader（逐页解析）
+    - Word (docx): 使用DocxLoader（逐段落解析）
+    - TXT: 使用RobustTextLoader（增量解码）
     - Markdown (md): 使用UnstructuredMarkdownLoader
 
     使用方式:
@@ -104,11 +314,15 @@ class DocumentLoaderFactory:
 
         # 直接加载文档
         documents = await DocumentLoaderFactory.load_document("/path/to/file.pdf", "pdf")
+
+        # 逐页加载文档（内存中只保留当前页）
+        for page in DocumentLoaderFactory.iter_document("/path/to/file.pdf", "pdf"):
+            ...
     """
 
     # 支持的文件类型映射
     SUPPORTED_LOADERS = {
-        "pdf": PyPDFLoader,
+        "pdf": LazyPDFLoader,
         "docx": DocxLoader,
         "txt": RobustTextLoader,
         "md": RobustMarkdownLoader,
@@ -213,6 +427,25 @@ class DocumentLoaderFactory:
         # 创建加载器实例
         return loader_class(file_path)
 
+    @staticmethod
+    def _add_metadata(
+        doc: Document,
+        file_path: str,
+        file_type: str,
+        document_id: Optional[int],
+        knowledge_base_id: Optional[int],
+    ) -> None:
+        doc.metadata["file_path"] = file_path
+        doc.metadata["file_type"] = file_type
+        doc.metadata["loaded_at"] = datetime.utcnow().isoformat()
+        doc.metadata["source"] = os.path.basename(file_path)
+
+        if document_id is not None:
+            doc.metadata["document_id"] = document_id
+
+        if knowledge_base_id is not None:
+            doc.metadata["knowledge_base_id"] = knowledge_base_id
+
     @classmethod
     def load_document(
         cls,
@@ -242,16 +475,7 @@ class DocumentLoaderFactory:
 
             # 添加元数据
             for doc in documents:
-                doc.metadata["file_path"] = file_path
-                doc.metadata["file_type"] = file_type
-                doc.metadata["loaded_at"] = datetime.utcnow().isoformat()
-                doc.metadata["source"] = os.path.basename(file_path)
-
-                if document_id is not None:
-                    doc.metadata["document_id"] = document_id
-
-                if knowledge_base_id is not None:
-                    doc.metadata["knowledge_base_id"] = knowledge_base_id
+                cls._add_metadata(doc, file_path, file_type, document_id, knowledge_base_id)
 
             logger.info(
                 f"文档加载成功: path={file_path}, type={file_type}, "
@@ -266,6 +490,68 @@ class DocumentLoaderFactory:
             logger.error(f"文档加载失败: path={file_path}, error={str(e)}")
             raise DocumentProcessingError(f"文档加载失败: {str(e)}")
 
+    @classmethod
+    def iter_document(
+        cls,
+        file_path: str,
+        file_type: str,
+        document_id: Optional[int] = None,
+        knowledge_base_id: Optional[int] = None,
+    ) -> Iterator[Document]:
+        """
+        逐页加载文档（同步生成器）
+
+        PDF逐页返回；TXT、DOCX按段落边界切成大小受限的文本段返回，
+        metadata中segment大于0表示与上一段是连续文本；Markdown整体返回。
+
+        Args:
+            file_path: 文件路径
+            file_type: 文件类型
+            document_id: 文档ID（可选，用于添加元数据）
+            knowledge_base_id: 知识库ID（可选，用于添加元数据）
+
+        Yields:
+            Document: 页面（或文本段）文档对象
+
+        Raises:
+            DocumentProcessingError: 文档加载失败
+        """
+        loader = cls.get_loader(file_path, file_type)
+        pages = 0
+        try:
+            for doc in loader.lazy_load():
+                cls._add_metadata(doc, file_path, file_type, document_id, knowledge_base_id)
+                pages += 1
+                yield doc
+        except (UnsupportedFileTypeError, FileNotFoundError, DocumentProcessingError):
+            raise
+        except Exception as e:
+            logger.error(f"文档加载失败: path={file_path}, error={str(e)}")
+            raise DocumentProcessingError(f"文档加载失败: {str(e)}")
+
+        logger.info(f"文档加载成功: path={file_path}, type={file_type}, pages={pages}")
+
+    @classmethod
+    def count_pages(cls, file_path: str, file_type: str) -> Optional[int]:
+        """
+        获取文档页数（仅PDF等可廉价获得页数的格式）
+
+        Args:
+            file_path: 文件路径
+            file_type: 文件类型
+
+        Returns:
+            Optional[int]: 页数，无法预知时返回None
+        """
+        page_count = getattr(cls.get_loader(file_path, file_type), "page_count", None)
+        if page_count is None:
+            return None
+        try:
+            return page_count()
+        except Exception as e:
+            logger.warning(f"获取文档页数失败: path={file_path}, error={str(e)}")
+            return None
+
     @classmethod
     async def load_document_async(
         cls,
@@ -277,7 +563,7 @@ class DocumentLoaderFactory:
         """
         异步加载文档并返回文档对象列表
 
-        注意：由于底层加载器大多是同步的，这里使用线程池执行
+        注意：由于底层加载器大多是同步的，这里在共享的解析执行器中执行
 
         Args:
             file_path: 文件路径
@@ -291,18 +577,11 @@ class DocumentLoaderFactory:
         Raises:
             DocumentProcessingError: 文档加载失败
         """
-        import asyncio
-        from concurrent.futures import ThreadPoolExecutor
+        from app.core.executors import get_executors
 
-        loop = asyncio.get_event_loop()
-
-        with ThreadPoolExecutor() as executor:
-            documents = await loop.run_in_executor(
-                executor,
-                lambda: cls.load_document(
-                    file_path, file_type, document_id, knowledge_base_id
-                ),
-            )
+        documents = await get_executors().run_cpu(
+            cls.load_document, file_path, file_type, document_id, knowledge_base_id
+        )
 
         return documents
 
@@ -344,24 +623,69 @@ class DocumentLoaderFactory:
             logger.error(f"获取文档预览失败: path={file_path}, error={str(e)}")
             raise DocumentProcessingError(f"获取文档预览失败: {str(e)}")
 
+    @classmethod
+    def iter_pages(cls, file_path: str, file_type: str) -> Iterator[Document]:
+        """
+        逐页加载文档（不添加元数据，供预览使用）
+
+        调用方停止迭代后不再解析剩余页面。
+
+        Args:
+            file_path: 文件路径
+            file_type: 文件类型
+
+        Yields:
+            Document: 页面文档对象
+        """
+        yield from cls.get_loader(file_path, file_type).lazy_load()
+
     @classmethod
     def get_document_preview_with_length(
         cls,
         file_path: str,
         file_type: str,
         max_chars: int = 1000,
-    ) -> tuple[str, int]:
+    ) -> tuple[str, Optional[int]]:
+        """
+        获取文档预览内容及全文长度
+
+        逐页读取，累计超过 max_chars 后停止解析剩余页面。
+
+        Args:
+            file_path: 文件路径
+            file_type: 文件类型
+            max_chars: 最大字符数，默认1000
+
+        Returns:
+            tuple[str, Optional[int]]: (预览文本, 全文长度)；
+                提前停止时全文长度未知，返回None
+
+        Raises:
+            DocumentProcessingError: 文档加载失败
+        """
         try:
-            documents = cls.load_document(file_path, file_type)
-            full_text = "\n".join(doc.page_content for doc in documents)
-            preview = full_text[:max_chars]
+            parts: List[str] = []
+            length = 0
+            complete = True
+            for page in cls.iter_pages(file_path, file_type):
+                if parts and not page.metadata.get("segment"):
+                    parts.append("\n")
+                    length += 1
+                parts.append(page.page_content)
+                length += len(page.page_content)
+                if length > max_chars:
+                    complete = False
+                    break
+
+            text = "".join(parts)
+            preview = text[:max_chars]
 
             logger.debug(
                 f"文档预览: path={file_path}, "
-                f"total_length={len(full_text)}, preview_length={len(preview)}"
+                f"read_length={length}, preview_length={len(preview)}"
             )
 
-            return preview, len(full_text)
+            return preview, length if complete else None
         except Exception as e:
             logger.error(f"获取文档预览失败: path={file_path}, error={str(e)}")
             raise DocumentProcessingError(f"获取文档预览失败: {str(e)}")
@@ -417,5 +741,10 @@ class DocumentLoaderFactory:
 __all__ = [
     "DocumentLoaderFactory",
     "DocumentProcessingError",
+    "DocxLoader",
+    "LazyPDFLoader",
+    "RobustTextLoader",
     "UnsupportedFileTypeError",
+    "iter_docx_paragraphs",
+    "iter_text_segments",
 ]
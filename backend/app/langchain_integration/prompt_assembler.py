@@ -0,0 +1,275 @@
+"""
+提示词组装模块
+
+将系统提示词、对话历史、检索到的文档片段和用户问题组装为提示词，
+并保证提示词不超过配置的token预算：
+- 系统提示词、模板和问题始终保留
+- 历史消息和文档片段按价值排序装入剩余预算，价值最低的最先被裁剪
+  （历史消息价值随轮次衰减，文档片段价值为相似度评分）
+- 每段文本的token数按文本缓存，多轮对话中重复出现的历史和片段无需重新编码
+- 组装完成后对最终提示词精确计数，用于配额扣除
+
+使用方式:
+    assembler = PromptAssembler(
+        template=PromptTemplate(input_variables=["history", "input"], template=...),
+        question_key="input",
+        history_key="history",
+    )
+    prompt = assembler.assemble(question="你好", history=[...])
+    llm.invoke(prompt.text)
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain.prompts import PromptTemplate
+
+from app.config import settings
+from app.core.tokenizer import TokenCounter, get_token_counter
+
+logger = logging.getLogger(__name__)
+
+# 默认历史消息角色标签
+DEFAULT_ROLE_LABELS = {"USER": "用户", "ASSISTANT": "AI助手"}
+
+
+def format_source_chunk(index: int, chunk: Any) -> str:
+    """
+    格式化文档片段
+
+    Args:
+        index: 片段序号（从1开始）
+        chunk: 文档片段（需有 document_name 和 content 属性）
+
+    Returns:
+        str: 格式化文本
+    """
+    return f"[{index}] 来源: {chunk.document_name}\n内容: {chunk.content}\n"
+
+
+@dataclass
+class AssembledPrompt:
+    """组装后的提示词"""
+
+    text: str
+    prompt_tokens: int
+    history: List[Dict[str, str]] = field(default_factory=list)
+    chunks: List[Any] = field(default_factory=list)
+    dropped_history: int = 0
+    dropped_chunks: int = 0
+
+
+@dataclass
+class _Piece:
+    kind: str  # "history" | "chunk"
+    index: int
+    value: float
+    tokens: int
+
+    def priority(self) -> tuple:
+        # 价值相同时：历史优先于片段，较新的历史优先，排名靠前的片段优先
+        if self.kind == "history":
+            return (-self.value, 0, -self.index)
+        return (-self.value, 1, self.index)
+
+
+class PromptAssembler:
+    """
+    按token预算组装提示词
+
+    模板中的问题变量必填；历史变量和上下文变量可选，
+    未提供对应变量名时忽略传入的历史或文档片段。
+    """
+
+    def __init__(
+        self,
+        template: PromptTemplate,
+        question_key: str,
+        history_key: Optional[str] = None,
+        context_key: Optional[str] = None,
+        role_labels: Optional[Dict[str, str]] = None,
+        format_chunk: Callable[[int, Any], str] = format_source_chunk,
+        empty_history: str = "",
+        empty_context: str = "",
+        max_tokens: Optional[int] = None,
+        history_decay: Optional[float] = None,
+        token_counter: Optional[TokenCounter] = None,
+    ):
+        """
+        初始化提示词组装器
+
+        Args:
+            template: 提示词模板
+            question_key: 问题变量名
+            history_key: 历史变量名
+            context_key: 文档片段上下文变量名
+            role_labels: 历史消息角色标签
+            format_chunk: 文档片段格式化函数 (序号, 片段) -> 文本
+            empty_history: 没有历史时填入的文本
+            empty_context: 没有文档片段时填入的文本
+            max_tokens: 提示词最大token数，默认从配置读取
+            history_decay: 历史消息价值衰减系数，默认从配置读取
+            token_counter: token计数器，默认使用全局实例
+        """
+        self.template = template
+        self.question_key = question_key
+        self.history_key = history_key
+        self.context_key = context_key
+        self.role_labels = role_labels or DEFAULT_ROLE_LABELS
+        self.format_chunk = format_chunk
+        self.empty_history = empty_history
+        self.empty_context = empty_context
+        self.max_tokens = max_tokens or settings.prompt.prompt_max_input_tokens
+        self.history_decay = history_decay or settings.prompt.prompt_history_decay
+        self._token_counter = token_counter
+
+    @property
+    def token_counter(self) -> TokenCounter:
+        return self._token_counter or get_token_counter()
+
+    def _format_message(self, message: Dict[str, str]) -> str:
+        return f"{self.role_labels[message['role']]}: {message.get('content', '')}"
+
+    def _render(
+        self,
+        question: str,
+        history: List[Dict[str, str]],
+        chunks: List[Any],
+        system_prompt: Optional[str],
+    ) -> str:
+        variables = {self.question_key: question}
+        if self.history_key:
+            lines = [self._format_message(msg) for msg in history]
+            variables[self.history_key] = "\n".join(lines) if lines else self.empty_history
+        if self.context_key:
+            parts = [self.format_chunk(i, chunk) for i, chunk in enumerate(chunks, 1)]
+            variables[self.context_key] = "\n".join(parts) if parts else self.empty_context
+
+        text = self.template.format(**variables)
+        if system_prompt:
+            text = f"{system_prompt.strip()}\n\n{text}"
+        return text
+
+    def _pieces(self, history: List[Dict[str, str]], chunks: List[Any]) -> List[_Piece]:
+        counter = self.token_counter
+        pieces: List[_Piece] = []
+
+        if self.history_key:
+            # 最新的一轮问答价值为1，之前每一轮按衰减系数递减
+            newest = len(history) - 1
+            for i, msg in enumerate(history):
+                turn = (newest - i) // 2
+                pieces.append(
+                    _Piece(
+                        kind="history",
+                        index=i,
+                        value=self.history_decay**turn,
+                        tokens=counter.count(self._format_message(msg)) + 1,
+                    )
+                )
+
+        if self.context_key:
+            for i, chunk in enumerate(chunks):
+                score = getattr(chunk, "similarity_score", None)
+                value = float(score) if score is not None else 1.0 / (i + 1)
+                pieces.append(
+                    _Piece(
+                        kind="chunk",
+                        index=i,
+                        value=value,
+                        tokens=counter.count(self.format_chunk(i + 1, chunk)) + 1,
+                    )
+                )
+
+        return pieces
+
+    def assemble(
+        self,
+        question: str,
+        history: Optional[List[Dict[str, str]]] = None,
+        chunks: Optional[List[Any]] = None,
+        system_prompt: Optional[str] = None,
+    ) -> AssembledPrompt:
+        """
+        组装提示词
+
+        Args:
+            question: 用户问题
+            history: 按时间顺序排列的历史消息 {"role": "USER" | "ASSISTANT", "content": ...}
+            chunks: 按相关性排序的文档片段
+            system_prompt: 系统提示词（置于模板之前）
+
+        Returns:
+            AssembledPrompt: 组装结果（含精确的提示词token数）
+        """
+        history = [msg for msg in (history or []) if msg.get("role") in self.role_labels]
+        chunks = list(chunks or [])
+        counter = self.token_counter
+
+        base_tokens = counter.count(self._render(question, [], [], system_prompt))
+        available = self.max_tokens - base_tokens
+        if available < 0:
+            logger.warning(
+                f"提示词基础部分已超出token预算: base={base_tokens}, budget={self.max_tokens}"
+            )
+
+        # 按价值从高到低装入预算；历史一旦有消息装不下，更早的历史不再装入，保证历史连续
+        selected: List[_Piece] = []
+        used = 0
+        history_open = True
+        for piece in sorted(self._pieces(history, chunks), key=_Piece.priority):
+            if piece.kind == "history" and not history_open:
+                continue
+            if used + piece.tokens <= available:
+                selected.append(piece)
+                used += piece.tokens
+            elif piece.kind == "history":
+                history_open = False
+
+        def _build(pieces: List[_Piece]):
+            indexes = {
+                kind: sorted(p.index for p in pieces if p.kind == kind)
+                for kind in ("history", "chunk")
+            }
+            kept_history = [history[i] for i in indexes["history"]]
+            while kept_history and kept_history[0]["role"] != "USER":
+                kept_history.pop(0)
+            return kept_history, [chunks[i] for i in indexes["chunk"]]
+
+        kept_history, kept_chunks = _build(selected)
+        text = self._render(question, kept_history, kept_chunks, system_prompt)
+        prompt_tokens = counter.count(text)
+
+        # 分段计数与整体计数在片段边界处可能略有差异，超出时继续裁剪价值最低的部分
+        while prompt_tokens > self.max_tokens and selected:
+            selected.pop()
+            kept_history, kept_chunks = _build(selected)
+            text = self._render(question, kept_history, kept_chunks, system_prompt)
+            prompt_tokens = counter.count(text)
+
+        dropped_history = len(history) - len(kept_history)
+        dropped_chunks = len(chunks) - len(kept_chunks)
+        if dropped_history or dropped_chunks:
+            logger.debug(
+                f"提示词超出预算已裁剪: dropped_history={dropped_history}, "
+                f"dropped_chunks={dropped_chunks}, tokens={prompt_tokens}/{self.max_tokens}"
+            )
+
+        return AssembledPrompt(
+            text=text,
+            prompt_tokens=prompt_tokens,
+            history=kept_history,
+            chunks=kept_chunks,
+            dropped_history=dropped_history,
+            dropped_chunks=dropped_chunks,
+        )
+
+
+# 导出
+__all__ = [
+    "AssembledPrompt",
+    "DEFAULT_ROLE_LABELS",
+    "PromptAssembler",
+    "format_source_chunk",
+]
@@ -14,28 +14,50 @@ RAG查询链模块
     - 需求4.4: 用户指定多个知识库ID，在所有指定知识库中进行联合检索
 """
 
+import asyncio
+import hashlib
 import logging
 import math
+import time
 from dataclasses import dataclass
 from typing import Any, AsyncGenerator, Dict, List, Optional
 
-from langchain.memory import ConversationBufferMemory
 from langchain.prompts import PromptTemplate
 from langchain_core.documents import Document
 
 from app.config import settings
+from app.core.answer_cache import (CachedAnswer, SemanticAnswerCache,
+                                   get_answer_cache, iter_replay_chunks)
+from app.core.conversation_memory import (ConversationMemoryStore,
+                                          get_conversation_memory_store)
 from app.core.llm import TongyiLLM, get_llm, get_streaming_llm
+from app.core.reranker import Reranker, get_reranker, rerank_candidates
+from app.core.retrieval_postprocess import select_candidates
+from app.core.tokenizer import count_tokens
+from app.core.tracing import record_stage, trace_stage
 from app.core.vector_store import VectorStoreManager, get_vector_store_manager
+from app.langchain_integration.prompt_assembler import (AssembledPrompt,
+                                                        PromptAssembler)
 
 logger = logging.getLogger(__name__)
 
-def _distance_to_similarity(distance: Any) -> float:
+# 对话记忆命名空间
+RAG_MEMORY_NAMESPACE = "rag"
+
+# 对话历史最多保留的消息数
+RAG_HISTORY_MESSAGES = 10
+
+# 没有检索到文档片段时的上下文
+EMPTY_CONTEXT = "没有找到相关的参考资料。"
+
+def _distance_to_similarity(distance: Any) -> Optional[float]:
+    """距离转换为0~1的相似度，缺少距离时返回None（不能当作不相关）"""
     if distance is None:
-        return 0.0
+        return None
     try:
         d = float(distance)
     except (TypeError, ValueError):
-        return 0.0
+        return None
     if d < 0:
         return 0.0
     if d <= 2.0:
@@ -101,15 +123,31 @@ class RAGResponse:
     answer: str
     sources: List[DocumentChunk]
     tokens_used: int
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached: bool = False
 
     def to_dict(self) -> dict:
         return {
             "answer": self.answer,
             "sources": [s.to_dict() for s in self.sources],
             "tokens_used": self.tokens_used,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached": self.cached,
         }
 
 
+@dataclass
+class _AnswerCacheProbe:
+    """答案缓存查找结果（未命中时用于写入缓存）"""
+
+    cache: SemanticAnswerCache
+    scope: str
+    vector: List[float]
+    hit: Optional[CachedAnswer] = None
+
+
 class RAGManager:
     """
     RAG管理器类
@@ -149,6 +187,9 @@ class RAGManager:
         self,
         vector_store_manager: Optional[VectorStoreManager] = None,
         llm: Optional[TongyiLLM] = None,
+        memory_store: Optional[ConversationMemoryStore] = None,
+        answer_cache: Optional[SemanticAnswerCache] = None,
+        reranker: Optional[Reranker] = None,
     ):
         """
         初始化RAG管理器
@@ -156,12 +197,24 @@ class RAGManager:
         Args:
             vector_store_manager: 向量存储管理器，默认使用全局实例
             llm: LLM实例，默认使用全局实例
+            memory_store: 对话记忆存储，默认使用全局实例
+            answer_cache: 答案语义缓存，默认使用全局实例（未启用时不缓存）
+            reranker: 检索结果打分器，默认使用全局实例（未启用时不重排序）
         """
         self.vector_store_manager = vector_store_manager or get_vector_store_manager()
         self._llm = llm
 
         # 对话记忆存储
-        self._memories: Dict[str, ConversationBufferMemory] = {}
+        self._memory_store = memory_store or get_conversation_memory_store()
+
+        # 答案语义缓存
+        self._answer_cache = answer_cache
+
+        # 检索结果打分器
+        self._reranker = reranker
+        self._template_version = hashlib.sha256(
+            (RAG_PROMPT_TEMPLATE + RAG_CONVERSATION_TEMPLATE).encode("utf-8")
+        ).hexdigest()[:16]
 
         # 提示模板
         self._prompt_template = PromptTemplate(
@@ -174,6 +227,23 @@ class RAGManager:
             template=RAG_CONVERSATION_TEMPLATE,
         )
 
+        # 提示词组装器（按token预算裁剪文档片段和对话历史）
+        self._prompt_assembler = PromptAssembler(
+            template=self._prompt_template,
+            question_key="question",
+            context_key="context",
+            empty_context=EMPTY_CONTEXT,
+        )
+        self._conversation_assembler = PromptAssembler(
+            template=self._conversation_template,
+            question_key="question",
+            context_key="context",
+            history_key="chat_history",
+            role_labels={"USER": "用户", "ASSISTANT": "助手"},
+            empty_history="无",
+            empty_context=EMPTY_CONTEXT,
+        )
+
     def _get_llm(self, streaming: bool = False) -> TongyiLLM:
         """
         获取LLM实例
@@ -226,52 +296,76 @@ class RAGManager:
             f"question长度={len(question)}, top_k={top_k}"
         )
 
+        # 步骤0: 查找相近问题的缓存答案（仅限无对话历史的问题）
+        with trace_stage("rag.history"):
+            history = await self._load_history(chat_history, conversation_id)
+        with trace_stage("rag.answer_cache"):
+            probe = await self._probe_answer_cache(knowledge_base_ids, question, top_k, history)
+        if probe is not None and probe.hit is not None:
+            if conversation_id:
+                await self._update_memory(conversation_id, question, probe.hit.answer)
+            logger.info(
+                f"RAG查询命中答案缓存: similarity={probe.hit.similarity:.4f}, "
+                f"tokens_saved={probe.hit.tokens_saved}"
+            )
+            return RAGResponse(
+                answer=probe.hit.answer,
+                sources=list(probe.hit.sources),
+                tokens_used=0,
+                cached=True,
+            )
+
         # 步骤1: 向量检索
-        retrieved_docs = await self._retrieve_documents(
-            knowledge_base_ids=knowledge_base_ids,
-            question=question,
-            top_k=top_k,
-        )
+        with trace_stage("rag.retrieve"):
+            retrieved_docs = await self._retrieve_documents(
+                knowledge_base_ids=knowledge_base_ids,
+                question=question,
+                top_k=top_k,
+                query_embedding=probe.vector if probe is not None else None,
+            )
 
         logger.debug(f"检索到 {len(retrieved_docs)} 个文档片段")
 
-        # 步骤2: 构建上下文
-        context = self._build_context(retrieved_docs)
+        # 步骤2: 按token预算组装上下文和提示
+        with trace_stage("rag.prompt"):
+            assembled = self._assemble_prompt(question, retrieved_docs, history)
 
-        # 步骤3: 构建提示
-        if chat_history or conversation_id:
-            history_str = self._format_chat_history(chat_history, conversation_id)
-            prompt = self._conversation_template.format(
-                context=context,
-                chat_history=history_str,
-                question=question,
-            )
-        else:
-            prompt = self._prompt_template.format(
-                context=context,
-                question=question,
-            )
-
-        # 步骤4: 调用LLM生成答案
+        # 步骤3: 调用LLM生成答案
         llm = self._get_llm(streaming=False)
-        answer = await llm.llm.ainvoke(prompt)
+        with trace_stage("llm.generate"):
+            answer = await llm.llm.ainvoke(assembled.text)
 
-        # 步骤5: 估算token数量
-        tokens_used = self._estimate_tokens(prompt + answer)
+        # 步骤4: 计算token数量
+        completion_tokens = count_tokens(answer)
+        tokens_used = assembled.prompt_tokens + completion_tokens
 
-        # 步骤6: 更新对话历史
+        # 步骤5: 更新对话历史和答案缓存
         if conversation_id:
-            self._update_memory(conversation_id, question, answer)
+            with trace_stage("rag.memory"):
+                await self._update_memory(conversation_id, question, answer)
+        if probe is not None:
+            probe.cache.store(
+                probe.scope,
+                knowledge_base_ids,
+                question,
+                probe.vector,
+                answer,
+                retrieved_docs,
+                assembled.prompt_tokens,
+                completion_tokens,
+            )
 
         logger.info(
             f"RAG查询完成: answer长度={len(answer)}, "
-            f"sources={len(retrieved_docs)}, tokens≈{tokens_used}"
+            f"sources={len(retrieved_docs)}, tokens={tokens_used}"
         )
 
         return RAGResponse(
             answer=answer,
             sources=retrieved_docs,
             tokens_used=tokens_used,
+            prompt_tokens=assembled.prompt_tokens,
+            completion_tokens=completion_tokens,
         )
 
     async def stream_query(
@@ -298,6 +392,8 @@ class RAGManager:
                 - sources: 文档片段列表（type为sources时）
                 - content: 文本片段（type为token时）
                 - tokens_used: 总token数（type为done时）
+                - prompt_tokens / completion_tokens: 提示和回答的token数（type为done时）
+                - cached: 是否为缓存答案的回放（type为done时）
         """
         if top_k is None:
             top_k = settings.rag.rag_top_k
@@ -308,53 +404,54 @@ class RAGManager:
         )
 
         try:
-            # 步骤1: 向量检索
-            retrieved_docs = await self._retrieve_documents(
-                knowledge_base_ids=knowledge_base_ids,
-                question=question,
-                top_k=top_k,
-            )
+            # 步骤0: 命中答案缓存时回放缓存答案（仅限无对话历史的问题）
+            with trace_stage("rag.history"):
+                history = await self._load_history(chat_history, conversation_id)
+            with trace_stage("rag.answer_cache"):
+                probe = await self._probe_answer_cache(
+                    knowledge_base_ids, question, top_k, history
+                )
+            if probe is not None and probe.hit is not None:
+                async for event in self._replay_cached_answer(
+                    probe.hit, question, conversation_id
+                ):
+                    yield event
+                return
 
-            # 去重：按文档名称去重，保留相似度最高的chunk
-            unique_sources = {}
-            for doc in retrieved_docs:
-                doc_name = doc.document_name
-                if doc_name not in unique_sources or doc.similarity_score > unique_sources[doc_name].similarity_score:
-                    unique_sources[doc_name] = doc
+            # 步骤1: 向量检索
+            with trace_stage("rag.retrieve"):
+                retrieved_docs = await self._retrieve_documents(
+                    knowledge_base_ids=knowledge_base_ids,
+                    question=question,
+                    top_k=top_k,
+                    query_embedding=probe.vector if probe is not None else None,
+                )
 
             # 先返回检索到的文档片段（已去重）
             yield {
                 "type": "sources",
-                "sources": [doc.to_dict() for doc in unique_sources.values()],
+                "sources": self._unique_sources(retrieved_docs),
             }
 
-            # 步骤2: 构建上下文和提示
-            context = self._build_context(retrieved_docs)
-
-            if chat_history or conversation_id:
-                history_str = self._format_chat_history(chat_history, conversation_id)
-                prompt = self._conversation_template.format(
-                    context=context,
-                    chat_history=history_str,
-                    question=question,
-                )
-            else:
-                prompt = self._prompt_template.format(
-                    context=context,
-                    question=question,
-                )
+            # 步骤2: 按token预算组装上下文和提示
+            with trace_stage("rag.prompt"):
+                assembled = self._assemble_prompt(question, retrieved_docs, history)
 
             # 步骤3: 流式调用LLM
             llm = self._get_llm(streaming=True)
             full_answer = ""
+            interrupted = False
+            llm_started = time.perf_counter()
 
             try:
-                async for chunk in llm.llm.astream(prompt):
+                async for chunk in llm.llm.astream(assembled.text):
                     if hasattr(chunk, "content"):
                         content = chunk.content
                     else:
                         content = str(chunk)
 
+                    if content and not full_answer:
+                        record_stage("llm.first_token", time.perf_counter() - llm_started)
                     full_answer += content
                     yield {
                         "type": "token",
@@ -362,6 +459,7 @@ class RAGManager:
                     }
             except Exception as stream_err:
                 logger.error(f"LLM流式生成中断: {str(stream_err)}", exc_info=True)
+                interrupted = True
 
                 # 先发送错误事件给前端
                 yield {
@@ -372,34 +470,44 @@ class RAGManager:
                 # 如果已经生成了部分内容，继续后续流程
                 if not full_answer:
                     return  # 直接返回，不再继续
+            record_stage("llm.generate", time.perf_counter() - llm_started)
 
-            # 步骤4: 估算token数量
-            # Note: _estimate_tokens 内部实现很简单，不会抛出 "Additional kwargs key output_tokens already exists" 错误
-            # 这个错误通常来自 Pydantic 模型验证或 LangChain 内部。
-            # 如果是 full_answer 拼接导致的问题，前面的循环应该会报错。
-            # 这里最可疑的是 self._estimate_tokens 的调用或 yield 语句。
-            # 让我们尝试捕获这个特定步骤的异常
-            try:
-                tokens_used = self._estimate_tokens(prompt + full_answer)
-            except Exception as token_err:
-                logger.warning(f"Token估算失败: {str(token_err)}")
-                tokens_used = len(full_answer) # 降级策略
+            # 步骤4: 计算token数量
+            completion_tokens = count_tokens(full_answer)
+            tokens_used = assembled.prompt_tokens + completion_tokens
 
             # 步骤5: 更新对话历史
             if conversation_id:
                 try:
-                    self._update_memory(conversation_id, question, full_answer)
+                    with trace_stage("rag.memory"):
+                        await self._update_memory(conversation_id, question, full_answer)
                 except Exception as mem_err:
                     logger.warning(f"更新对话历史失败: {str(mem_err)}")
 
+            # 只缓存完整生成的答案
+            if probe is not None and not interrupted:
+                probe.cache.store(
+                    probe.scope,
+                    knowledge_base_ids,
+                    question,
+                    probe.vector,
+                    full_answer,
+                    retrieved_docs,
+                    assembled.prompt_tokens,
+                    completion_tokens,
+                )
+
             yield {
                 "type": "done",
                 "content": full_answer,
                 "tokens_used": tokens_used,
+                "prompt_tokens": assembled.prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cached": False,
             }
 
             logger.info(
-                f"流式RAG查询完成: answer长度={len(full_answer)}, " f"tokens≈{tokens_used}"
+                f"流式RAG查询完成: answer长度={len(full_answer)}, " f"tokens={tokens_used}"
             )
 
         except Exception as e:
@@ -414,42 +522,109 @@ class RAGManager:
         knowledge_base_ids: List[int],
         question: str,
         top_k: int,
+        query_embedding: Optional[List[float]] = None,
     ) -> List[DocumentChunk]:
         """
         从向量数据库检索相关文档
 
+        启用重排序时召回 top_k × 倍数 个候选并在时间预算内重新打分；
+        检索结果按相似度阈值过滤；启用MMR时先召回更多候选（附带已存储的分块向量），
+        再在相关性与多样性之间权衡选出 top_k 个，不额外调用嵌入模型。
+
         Args:
             knowledge_base_ids: 知识库ID列表
             question: 查询问题
             top_k: 返回文档数量
+            query_embedding: 已生成的查询向量（可选，例如查找答案缓存时生成的向量）
 
         Returns:
             List[DocumentChunk]: 文档片段列表
         """
-        if len(knowledge_base_ids) == 1:
+        mmr_enabled = settings.rag.rag_mmr_enabled
+        reranker = self._reranker if self._reranker is not None else get_reranker()
+        fetch_k = top_k
+        if reranker is not None:
+            fetch_k = top_k * settings.rag.rag_rerank_candidate_multiplier
+        if mmr_enabled:
+            fetch_k = max(fetch_k, settings.rag.rag_mmr_fetch_k)
+
+        if settings.rag.rag_hybrid_search_enabled:
+            # 稀疏(BM25) + 稠密向量混合检索，倒数排名融合
+            results = await self.vector_store_manager.hybrid_search(
+                knowledge_base_ids=knowledge_base_ids,
+                query=question,
+                k=fetch_k,
+                query_embedding=query_embedding,
+                include_embeddings=mmr_enabled,
+            )
+        elif mmr_enabled:
+            # 附带分块向量召回候选，用于MMR多样化选择
+            outcome = await self.vector_store_manager.multi_knowledge_base_search_detailed(
+                knowledge_base_ids=knowledge_base_ids,
+                query=question,
+                k=fetch_k,
+                query_embedding=query_embedding,
+                include_embeddings=True,
+            )
+            results = outcome.results
+        elif len(knowledge_base_ids) == 1:
             # 单知识库检索
             results = await self.vector_store_manager.similarity_search_with_score(
                 knowledge_base_id=knowledge_base_ids[0],
                 query=question,
-                k=top_k,
+                k=fetch_k,
             )
         else:
             # 多知识库联合检索
             results = await self.vector_store_manager.multi_knowledge_base_search(
                 knowledge_base_ids=knowledge_base_ids,
                 query=question,
-                k=top_k,
+                k=fetch_k,
+            )
+
+        # 重排序（超时或出错时保留检索顺序）
+        reranked = False
+        if reranker is not None:
+            with trace_stage("rag.rerank"):
+                order = await rerank_candidates(
+                    reranker, question, [result[0].page_content for result in results]
+                )
+            if order is not None:
+                results = [results[i] for i in order]
+                reranked = True
+
+        # 相似度阈值过滤 + MMR多样化选择
+        similarities = [_distance_to_similarity(result[1]) for result in results]
+        relevance = None
+        threshold = settings.rag.rag_similarity_threshold
+        if (reranked or settings.rag.rag_hybrid_search_enabled) and results:
+            # 结果已按重排序/融合得分排序，MMR按该排名计算相关性；
+            # 向量相似度阈值只适用于纯稠密检索，否则会丢弃仅被BM25召回或被重排提前的精确匹配
+            relevance = [1.0 - i / len(results) for i in range(len(results))]
+            threshold = 0.0
+        selected = select_candidates(
+            similarities=similarities,
+            embeddings=[result[2] for result in results] if mmr_enabled else None,
+            k=top_k,
+            similarity_threshold=threshold,
+            mmr_lambda=settings.rag.rag_mmr_lambda if mmr_enabled else None,
+            duplicate_threshold=settings.rag.rag_mmr_duplicate_threshold,
+            relevance=relevance,
+        )
+        if len(selected) < min(top_k, len(results)):
+            logger.debug(
+                f"检索后处理丢弃文档片段: candidates={len(results)}, selected={len(selected)}, "
+                f"threshold={threshold}"
             )
 
         # 转换为DocumentChunk对象
         chunks = []
-        for doc, score in results:
-            similarity = _distance_to_similarity(score)
-
+        for i in selected:
+            doc = results[i][0]
             chunk = DocumentChunk(
                 content=doc.page_content,
                 document_name=doc.metadata.get("source", "Unknown"),
-                similarity_score=round(similarity, 6),
+                similarity_score=round(similarities[i] or 0.0, 6),
                 document_id=doc.metadata.get("document_id"),
                 chunk_index=doc.metadata.get("chunk_index"),
             )
@@ -457,69 +632,168 @@ class RAGManager:
 
         return chunks
 
-    def _build_context(self, documents: List[DocumentChunk]) -> str:
+    @staticmethod
+    def _unique_sources(documents: List[DocumentChunk]) -> List[dict]:
+        """按文档名称去重，保留相似度最高的片段"""
+        unique_sources: Dict[str, DocumentChunk] = {}
+        for doc in documents:
+            doc_name = doc.document_name
+            if doc_name not in unique_sources or doc.similarity_score > unique_sources[doc_name].similarity_score:
+                unique_sources[doc_name] = doc
+        return [doc.to_dict() for doc in unique_sources.values()]
+
+    async def _load_history(
+        self,
+        chat_history: Optional[List[Dict[str, str]]],
+        conversation_id: Optional[str],
+    ) -> Optional[List[Dict[str, str]]]:
         """
-        构建上下文文本
+        加载对话历史
 
         Args:
-            documents: 文档片段列表
+            chat_history: 对话历史列表
+            conversation_id: 对话ID（未传入对话历史时从记忆中读取）
 
         Returns:
-            str: 格式化的上下文文本
+            Optional[List[Dict[str, str]]]: 最近的对话历史，非对话查询时返回None
         """
-        if not documents:
-            return "没有找到相关的参考资料。"
+        if not (chat_history or conversation_id):
+            return None
 
-        context_parts = []
-        for i, doc in enumerate(documents, 1):
-            context_parts.append(
-                f"[{i}] 来源: {doc.document_name}\n" f"内容: {doc.content}\n"
-            )
+        # 未传入历史时从记忆中获取
+        if not chat_history and conversation_id:
+            chat_history = await self._memory_store.aload(RAG_MEMORY_NAMESPACE, conversation_id)
 
-        return "\n".join(context_parts)
+        return (chat_history or [])[-RAG_HISTORY_MESSAGES:]
 
-    def _format_chat_history(
+    def _assemble_prompt(
         self,
-        chat_history: Optional[List[Dict[str, str]]],
+        question: str,
+        documents: List[DocumentChunk],
+        history: Optional[List[Dict[str, str]]],
+    ) -> AssembledPrompt:
+        """
+        按token预算组装提示
+
+        超出预算时优先裁剪相似度最低的文档片段和最早的对话历史。
+
+        Args:
+            question: 用户问题
+            documents: 按相关性排序的文档片段
+            history: 对话历史（None表示非对话查询）
+
+        Returns:
+            AssembledPrompt: 组装后的提示（含精确的提示token数）
+        """
+        if history is None:
+            return self._prompt_assembler.assemble(question=question, chunks=documents)
+
+        return self._conversation_assembler.assemble(
+            question=question, history=history, chunks=documents
+        )
+
+    async def _probe_answer_cache(
+        self,
+        knowledge_base_ids: List[int],
+        question: str,
+        top_k: int,
+        history: Optional[List[Dict[str, str]]],
+    ) -> Optional[_AnswerCacheProbe]:
+        """
+        查找相近问题的缓存答案
+
+        答案依赖对话历史时不使用缓存。
+
+        Args:
+            knowledge_base_ids: 知识库ID列表
+            question: 用户问题
+            top_k: 检索文档数量
+            history: 对话历史
+
+        Returns:
+            Optional[_AnswerCacheProbe]: 查找结果，不使用缓存时返回None
+        """
+        cache = self._answer_cache if self._answer_cache is not None else get_answer_cache()
+        if cache is None or history:
+            return None
+
+        variant = (
+            f"{self._template_version}:{top_k}:{settings.tongyi.tongyi_model_name}:"
+            f"{self.vector_store_manager.embedding_model_id}:"
+            f"hybrid={settings.rag.rag_hybrid_search_enabled}:"
+            f"threshold={settings.rag.rag_similarity_threshold}:"
+            f"mmr={settings.rag.rag_mmr_enabled}:{settings.rag.rag_mmr_lambda}:"
+            f"rerank={settings.rag.rag_rerank_enabled}:{settings.rag.rag_reranker}"
+        )
+        try:
+            scope = await cache.ascope(knowledge_base_ids, variant)
+            if scope is None:
+                return None
+            vector = await self.vector_store_manager.embed_query(question)
+        except Exception as e:
+            logger.warning(f"查找答案缓存失败: {str(e)}")
+            return None
+
+        return _AnswerCacheProbe(
+            cache=cache, scope=scope, vector=vector, hit=cache.lookup(scope, vector)
+        )
+
+    async def _replay_cached_answer(
+        self,
+        cached: CachedAnswer,
+        question: str,
         conversation_id: Optional[str],
-    ) -> str:
+    ) -> AsyncGenerator[Dict[str, Any], None]:
         """
-        格式化对话历史
+        以与实时生成相同的事件序列回放缓存答案
 
         Args:
-            chat_history: 对话历史列表
+            cached: 缓存答案
+            question: 用户问题
             conversation_id: 对话ID
 
-        Returns:
-            str: 格式化的对话历史文本
+        Yields:
+            Dict[str, Any]: 流式响应数据
         """
-        history_parts = []
-
-        # 从传入的历史中获取
-        if chat_history:
-            for msg in chat_history[-10:]:  # 只保留最近10条
-                role = msg.get("role", "")
-                content = msg.get("content", "")
-                if role == "USER":
-                    history_parts.append(f"用户: {content}")
-                elif role == "ASSISTANT":
-                    history_parts.append(f"助手: {content}")
-
-        # 从记忆中获取
-        elif conversation_id and conversation_id in self._memories:
-            memory = self._memories[conversation_id]
-            history = memory.load_memory_variables({})
-            if "history" in history:
-                for msg in history["history"][-10:]:
-                    if hasattr(msg, "content"):
-                        if msg.__class__.__name__ == "HumanMessage":
-                            history_parts.append(f"用户: {msg.content}")
-                        elif msg.__class__.__name__ == "AIMessage":
-                            history_parts.append(f"助手: {msg.content}")
-
-        return "\n".join(history_parts) if history_parts else "无"
-
-    def _update_memory(
+        cache_settings = settings.answer_cache
+        interval = cache_settings.answer_cache_replay_interval_ms / 1000
+
+        yield {
+            "type": "sources",
+            "sources": self._unique_sources(cached.sources),
+        }
+
+        for content in iter_replay_chunks(
+            cached.answer, cache_settings.answer_cache_replay_chunk_chars
+        ):
+            yield {
+                "type": "token",
+                "content": content,
+            }
+            if interval > 0:
+                await asyncio.sleep(interval)
+
+        if conversation_id:
+            try:
+                await self._update_memory(conversation_id, question, cached.answer)
+            except Exception as mem_err:
+                logger.warning(f"更新对话历史失败: {str(mem_err)}")
+
+        yield {
+            "type": "done",
+            "content": cached.answer,
+            "tokens_used": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached": True,
+        }
+
+        logger.info(
+            f"流式RAG查询命中答案缓存: similarity={cached.similarity:.4f}, "
+            f"tokens_saved={cached.tokens_saved}"
+        )
+
+    async def _update_memory(
         self,
         conversation_id: str,
         question: str,
@@ -533,14 +807,9 @@ class RAGManager:
             question: 用户问题
             answer: AI回答
         """
-        if conversation_id not in self._memories:
-            self._memories[conversation_id] = ConversationBufferMemory(
-                return_messages=True,
-            )
-
-        memory = self._memories[conversation_id]
-        memory.chat_memory.add_user_message(question)
-        memory.chat_memory.add_ai_message(answer)
+        await self._memory_store.aappend_turn(
+            RAG_MEMORY_NAMESPACE, conversation_id, question, answer
+        )
 
     def clear_memory(self, conversation_id: str) -> None:
         """
@@ -549,28 +818,7 @@ class RAGManager:
         Args:
             conversation_id: 对话ID
         """
-        if conversation_id in self._memories:
-            self._memories[conversation_id].clear()
-            del self._memories[conversation_id]
-
-    def _estimate_tokens(self, text: str) -> int:
-        """
-        估算文本的token数量
-
-        Args:
-            text: 文本内容
-
-        Returns:
-            int: 估算的token数量
-        """
-        # 统计中文字符数
-        chinese_chars = sum(1 for c in text if "\u4e00" <= c <= "\u9fff")
-        # 统计其他字符数
-        other_chars = len(text) - chinese_chars
-
-        # 估算token数
-        estimated = (chinese_chars / 2) + (other_chars / 4)
-        return int(estimated)
+        self._memory_store.delete(RAG_MEMORY_NAMESPACE, conversation_id)
 
 
 # 全局RAG管理器实例
@@ -611,4 +859,5 @@ __all__ = [
     "clear_rag_manager",
     "RAG_PROMPT_TEMPLATE",
     "RAG_CONVERSATION_TEMPLATE",
+    "RAG_MEMORY_NAMESPACE",
 ]
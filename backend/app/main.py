@@ -37,6 +37,9 @@ logger = get_logger(__name__)
 # 全局调度器实例
 scheduler: AsyncIOScheduler = None
 
+# 进程内文档处理worker实例（document_worker_embedded启用时）
+document_worker = None
+
 
 def setup_scheduler() -> AsyncIOScheduler:
     """
@@ -44,7 +47,7 @@ def setup_scheduler() -> AsyncIOScheduler:
 
     配置的定时任务:
         1. 配额重置任务: 每月1日凌晨0点执行
-        2. 清理任务: 每天凌晨2点执行
+        2. 清理任务: 每天凌晨2点执行（含孤立向量集合清理和向量集合压缩）
 
     Returns:
         AsyncIOScheduler: 配置好的调度器实例
@@ -128,14 +131,20 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     应用生命周期管理
 
     启动时:
+        - 创建共享执行器（I/O、数据库线程池和解析进程池）
         - 初始化数据库表
         - 初始化Redis连接
         - 初始化向量数据库
         - 启动定时任务调度器
+        - 启动进程内文档处理worker（如启用）
+        - 启动流式对话回复写入器（如启用）
         - 记录启动日志
 
     关闭时:
+        - 停止进程内文档处理worker
+        - 停止流式对话回复写入器
         - 关闭定时任务调度器
+        - 关闭DashScope连接池和共享执行器
         - 关闭Redis连接
         - 关闭数据库连接
         - 记录关闭日志
@@ -149,7 +158,7 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     Yields:
         None
     """
-    global scheduler
+    global scheduler, document_worker
 
     # 启动时执行
     logger.info("=" * 60)
@@ -164,6 +173,22 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
             raise RuntimeError("配置验证失败，应用启动中止")
         logger.warning("配置验证失败，部分功能可能不可用")
 
+    # 创建共享执行器（事件循环的默认执行器保持不变）
+    from app.core.executors import init_executors, shutdown_executors
+
+    executors = init_executors()
+
+    # 后台预加载分词器，避免首个请求承担加载耗时
+    from app.core.tokenizer import get_token_counter
+
+    executors.io.submit(get_token_counter().warm_up)
+
+    # 启用重排序时后台预加载打分器（ONNX模型加载较慢）
+    if settings.rag.rag_rerank_enabled:
+        from app.core.reranker import get_reranker
+
+        executors.io.submit(get_reranker)
+
     # 初始化数据库表（如果需要）
     try:
         # 注意：在生产环境中应该使用Alembic进行数据库迁移
@@ -217,6 +242,29 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     else:
         logger.info("定时任务调度器已禁用（通过配置）")
 
+    # 启动进程内文档处理worker
+    queue_settings = settings.document_queue
+    if queue_settings.document_queue_enabled and queue_settings.document_worker_embedded:
+        try:
+            from app.tasks.document_worker import DocumentWorker
+
+            document_worker = DocumentWorker()
+            await document_worker.start()
+        except Exception as e:
+            logger.error(f"启动文档处理worker失败: {str(e)}")
+            document_worker = None
+    elif queue_settings.document_queue_enabled:
+        logger.info("文档处理队列已启用，请单独运行worker: python -m app.worker")
+
+    # 启动流式对话回复写入器（done事件后批量写入AI回复和配额）
+    if settings.chat_persistence.chat_write_behind_enabled:
+        try:
+            from app.tasks.chat_persistence import get_chat_persistence_writer
+
+            await get_chat_persistence_writer().start()
+        except Exception as e:
+            logger.error(f"启动对话回复写入器失败: {str(e)}")
+
     logger.info("应用启动完成")
     logger.info("=" * 60)
 
@@ -226,6 +274,22 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     logger.info("=" * 60)
     logger.info("正在关闭应用...")
 
+    # 停止进程内文档处理worker
+    if document_worker is not None:
+        try:
+            await document_worker.stop()
+        except Exception as e:
+            logger.error(f"停止文档处理worker失败: {str(e)}")
+        document_worker = None
+
+    # 停止对话回复写入器（写入队列中剩余的回复）
+    try:
+        from app.tasks.chat_persistence import get_chat_persistence_writer
+
+        await get_chat_persistence_writer().stop()
+    except Exception as e:
+        logger.error(f"停止对话回复写入器失败: {str(e)}")
+
     # 关闭定时任务调度器
     if scheduler and scheduler.running:
         try:
@@ -234,6 +298,20 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
         except Exception as e:
             logger.error(f"关闭定时任务调度器失败: {str(e)}")
 
+    # 关闭DashScope流式客户端连接池
+    try:
+        from app.core.dashscope_client import close_dashscope_stream_client
+
+        await close_dashscope_stream_client()
+    except Exception as e:
+        logger.error(f"关闭DashScope连接池失败: {str(e)}")
+
+    # 关闭共享执行器
+    try:
+        shutdown_executors(wait=False)
+    except Exception as e:
+        logger.error(f"关闭共享执行器失败: {str(e)}")
+
     # 关闭Redis连接
     try:
         from app.core.redis import close_redis
@@ -660,6 +738,8 @@ async def metrics(request: Request, db: Session = Depends(get_db)):
     * `llm_tokens_total` - LLM token使用总量（按类型分组）
     * `db_connections_active` - 数据库活跃连接数
     * `redis_connection_status` - Redis连接状态
+    * `embedding_cache_requests_total` - 查询向量缓存查找次数（按层级、命中结果分组）
+    * `chunk_embedding_store_lookups_total` - 文档分块向量复用查找次数（按命中结果分组）
 
     需求引用:
         - 需求8.1: 提供监控指标接口
@@ -9,7 +9,7 @@ Prometheus监控中间件
 
 import time
 import re
-from typing import Callable
+from typing import Callable, Optional
 
 from fastapi import Request, Response
 from prometheus_client import Counter, Gauge, Histogram
@@ -81,6 +81,91 @@ redis_connection_status = Gauge(
     "redis_connection_status", "Redis connection status (1=connected, 0=disconnected)"
 )
 
+# 8. 查询向量缓存命中计数器
+embedding_cache_requests = Counter(
+    "embedding_cache_requests_total",
+    "Total number of query embedding cache lookups",
+    ["tier", "result"],  # tier: memory, redis; result: hit, miss
+)
+
+# 9. 分块向量存储复用计数器
+chunk_embedding_store_lookups = Counter(
+    "chunk_embedding_store_lookups_total",
+    "Total number of document chunks looked up in the persistent chunk embedding store",
+    ["result"],  # result: hit, miss
+)
+
+# 10. 共享执行器指标
+executor_active_workers = Gauge(
+    "executor_active_workers",
+    "Number of workers currently running tasks in a shared executor",
+    ["pool"],  # pool: io, db, cpu
+)
+executor_queue_depth = Gauge(
+    "executor_queue_depth",
+    "Number of tasks waiting for a free worker in a shared executor",
+    ["pool"],
+)
+
+# 11. 对话记忆存储指标
+conversation_memory_entries = Gauge(
+    "conversation_memory_entries",
+    "Number of conversations held in an in-process conversation memory tier",
+    ["store"],  # store: memory, history
+)
+conversation_memory_bytes = Gauge(
+    "conversation_memory_bytes",
+    "Approximate size in bytes of message text held in an in-process conversation memory tier",
+    ["store"],
+)
+conversation_memory_evictions = Counter(
+    "conversation_memory_evictions_total",
+    "Total number of conversations evicted from an in-process conversation memory tier",
+    ["store", "reason"],  # reason: lru, ttl
+)
+
+# 12. RAG答案语义缓存指标
+answer_cache_requests = Counter(
+    "rag_answer_cache_requests_total",
+    "Total number of RAG answer cache lookups",
+    ["result"],  # result: hit, miss
+)
+answer_cache_tokens_saved = Counter(
+    "rag_answer_cache_tokens_saved_total",
+    "Total number of LLM tokens (prompt + completion) saved by RAG answer cache hits",
+)
+answer_cache_entries = Gauge(
+    "rag_answer_cache_entries",
+    "Number of answers held in the in-process RAG answer cache",
+)
+
+# 13. RAG重排序指标
+rerank_duration = Histogram(
+    "rag_rerank_duration_seconds",
+    "RAG rerank stage duration in seconds",
+    ["reranker", "outcome"],  # outcome: ok, timeout, error
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+# 14. 请求处理分阶段耗时（RAG、对话、文档处理）
+pipeline_stage_duration = Histogram(
+    "pipeline_stage_duration_seconds",
+    "Duration of request pipeline stages in seconds",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+# 15. 向量库集合句柄缓存指标
+vector_store_open_collections = Gauge(
+    "vector_store_open_collections",
+    "Number of Chroma collection handles held in the vector store handle cache",
+)
+vector_store_collection_cache_events = Counter(
+    "vector_store_collection_cache_events_total",
+    "Total number of Chroma collection handle cache events",
+    ["event"],  # event: hit, miss, evict, close
+)
+
 
 class PrometheusMiddleware(BaseHTTPMiddleware):
     """
@@ -221,3 +306,143 @@ def update_redis_status(connected: bool) -> None:
         connected: 是否已连接
     """
     redis_connection_status.set(1 if connected else 0)
+
+
+def record_embedding_cache_lookup(tier: str, hit: bool) -> None:
+    """
+    记录查询向量缓存查找结果
+
+    Args:
+        tier: 缓存层级（"memory", "redis"）
+        hit: 是否命中
+    """
+    embedding_cache_requests.labels(tier=tier, result="hit" if hit else "miss").inc()
+
+
+def record_chunk_embedding_store_lookup(hits: int, misses: int) -> None:
+    """
+    记录分块向量存储查找结果
+
+    Args:
+        hits: 命中（复用已有向量）的分块数
+        misses: 未命中（需要调用嵌入接口）的分块数
+    """
+    if hits > 0:
+        chunk_embedding_store_lookups.labels(result="hit").inc(hits)
+    if misses > 0:
+        chunk_embedding_store_lookups.labels(result="miss").inc(misses)
+
+
+def record_executor_state(pool: str, active: int, queued: int) -> None:
+    """
+    记录共享执行器状态
+
+    Args:
+        pool: 执行器名称（"io", "db", "cpu"）
+        active: 正在执行任务的worker数
+        queued: 等待空闲worker的任务数
+    """
+    executor_active_workers.labels(pool=pool).set(active)
+    executor_queue_depth.labels(pool=pool).set(queued)
+
+
+def record_conversation_memory_usage(store: str, entries: int, size_bytes: int) -> None:
+    """
+    记录进程内对话记忆占用
+
+    Args:
+        store: 存储名称（"memory": 对话记忆, "history": 对话历史缓存）
+        entries: 当前保留的对话数
+        size_bytes: 消息文本占用的近似字节数
+    """
+    conversation_memory_entries.labels(store=store).set(entries)
+    conversation_memory_bytes.labels(store=store).set(size_bytes)
+
+
+def record_conversation_memory_eviction(store: str, reason: str, count: int = 1) -> None:
+    """
+    记录对话记忆淘汰
+
+    Args:
+        store: 存储名称
+        reason: 淘汰原因（"lru", "ttl"）
+        count: 淘汰的对话数
+    """
+    if count > 0:
+        conversation_memory_evictions.labels(store=store, reason=reason).inc(count)
+
+
+def record_answer_cache_lookup(hit: bool, tokens_saved: int = 0) -> None:
+    """
+    记录RAG答案缓存查找结果
+
+    Args:
+        hit: 是否命中
+        tokens_saved: 命中时节省的token数
+    """
+    answer_cache_requests.labels(result="hit" if hit else "miss").inc()
+    if tokens_saved > 0:
+        answer_cache_tokens_saved.inc(tokens_saved)
+
+
+def record_answer_cache_size(entries: int) -> None:
+    """
+    记录进程内RAG答案缓存条目数
+
+    Args:
+        entries: 当前缓存的答案数
+    """
+    answer_cache_entries.set(entries)
+
+
+def record_rerank(reranker: str, outcome: str, duration: float) -> None:
+    """
+    记录RAG重排序耗时
+
+    Args:
+        reranker: 打分器名称（"bm25", "onnx"）
+        outcome: 结果（"ok", "timeout", "error"）
+        duration: 耗时（秒）
+    """
+    rerank_duration.labels(reranker=reranker, outcome=outcome).observe(duration)
+
+
+def record_pipeline_stage(stage: str, duration: float, request_id: Optional[str] = None) -> None:
+    """
+    记录请求处理阶段耗时
+
+    Args:
+        stage: 阶段名称（如 "rag.retrieve", "llm.first_token", "chat.persist"）
+        duration: 耗时（秒）
+        request_id: 请求ID（作为exemplar附带，OpenMetrics格式抓取时可见）
+    """
+    histogram = pipeline_stage_duration.labels(stage=stage)
+    if request_id:
+        try:
+            histogram.observe(duration, exemplar={"request_id": request_id[:64]})
+            return
+        except Exception:
+            pass
+    histogram.observe(duration)
+
+
+def record_vector_store_collections(open_collections: int) -> None:
+    """
+    记录当前缓存的向量库集合句柄数
+
+    Args:
+        open_collections: 缓存的集合句柄数
+    """
+    vector_store_open_collections.set(open_collections)
+
+
+def record_vector_store_collection_event(event: str, count: int = 1) -> None:
+    """
+    记录向量库集合句柄缓存事件
+
+    Args:
+        event: 事件类型（hit/miss/evict/close）
+        count: 事件数量
+    """
+    if count > 0:
+        vector_store_collection_cache_events.labels(event=event).inc(count)
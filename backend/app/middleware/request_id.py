@@ -3,6 +3,7 @@
 
 为每个请求生成唯一的追踪ID，用于日志记录和错误追踪。
 请求ID会添加到响应头中，并存储在request.state中供其他中间件和处理器使用。
+同时为请求开始分阶段耗时追踪（见 app.core.tracing）。
 """
 import logging
 import uuid
@@ -11,6 +12,9 @@ from typing import Callable
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from app.core.tracing import (DEBUG_TIMING_HEADER, STAGE_TIMINGS_HEADER,
+                              start_trace, timing_requested)
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,6 +26,7 @@ class RequestIDMiddleware(BaseHTTPMiddleware):
     1. 存储在request.state.request_id中
     2. 添加到响应头X-Request-ID中
     3. 用于日志记录
+    4. 关联本次请求的分阶段耗时追踪（request.state.trace）
     """
 
     def __init__(self, app, header_name: str = "X-Request-ID"):
@@ -56,6 +61,12 @@ class RequestIDMiddleware(BaseHTTPMiddleware):
         # 将请求ID存储到request.state中，供其他中间件和处理器使用
         request.state.request_id = request_id
 
+        # 开始分阶段耗时追踪（追踪对象通过contextvars传递给路由处理器及其调用的服务）
+        trace = start_trace(
+            request_id, expose=timing_requested(request.headers.get(DEBUG_TIMING_HEADER))
+        )
+        request.state.trace = trace
+
         # 记录请求开始日志
         logger.info(
             f"Request started: {request.method} {request.url.path} "
@@ -69,6 +80,12 @@ class RequestIDMiddleware(BaseHTTPMiddleware):
             # 将请求ID添加到响应头
             response.headers[self.header_name] = request_id
 
+            # 流式响应在返回响应头时尚未处理完，由SSE timing事件返回耗时
+            if not response.headers.get("content-type", "").startswith("text/event-stream"):
+                if trace.expose:
+                    response.headers[STAGE_TIMINGS_HEADER] = trace.header_value()
+                trace.log_summary()
+
             # 记录请求完成日志
             logger.info(
                 f"Request completed: {request.method} {request.url.path} "
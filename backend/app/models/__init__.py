@@ -9,6 +9,7 @@ from app.models.agent_tool import AgentTool, ToolType
 from app.models.api_usage import APIUsage
 from app.models.conversation import Conversation
 from app.models.document import Document, DocumentStatus
+from app.models.document_job import DocumentJob, DocumentJobStatus
 from app.models.knowledge_base import KnowledgeBase
 from app.models.knowledge_base_permission import (KnowledgeBasePermission,
                                                   PermissionType)
@@ -28,6 +29,8 @@ __all__ = [
     "KnowledgeBase",
     "Document",
     "DocumentStatus",
+    "DocumentJob",
+    "DocumentJobStatus",
     "AgentTool",
     "ToolType",
     "AgentExecution",
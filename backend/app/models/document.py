@@ -35,6 +35,7 @@ class Document(Base):
         file_path: 文件存储路径
         file_size: 文件大小（字节）
         file_type: 文件类型（pdf/docx/txt/md）
+        content_hash: 文件内容SHA256摘要
         status: 处理状态（processing/completed/failed）
         chunk_count: 分块数量
         error_message: 错误信息（处理失败时）
@@ -42,6 +43,7 @@ class Document(Base):
 
     关系:
         knowledge_base: 所属知识库
+        job: 文档处理任务
 
     索引:
         - knowledge_base_id: 用于快速查询知识库的所有文档
@@ -74,6 +76,7 @@ class Document(Base):
     file_path = Column(String(500), nullable=False, comment="文件存储路径")
     file_size = Column(Integer, nullable=False, comment="文件大小（字节）")
     file_type = Column(String(50), nullable=False, comment="文件类型")
+    content_hash = Column(String(64), nullable=True, index=True, comment="文件内容SHA256")
 
     # 处理状态
     status = Column(
@@ -97,6 +100,13 @@ class Document(Base):
 
     # 关系映射
     knowledge_base = relationship("KnowledgeBase", back_populates="documents")
+    job = relationship(
+        "DocumentJob",
+        back_populates="document",
+        uselist=False,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
 
     # 复合索引
     __table_args__ = (
@@ -0,0 +1,116 @@
+"""
+文档处理任务模型
+
+定义DocumentJob数据库模型，作为持久化的文档处理队列。
+"""
+
+import enum
+from datetime import datetime
+
+from sqlalchemy import (Column, DateTime, Enum, ForeignKey, Index, Integer,
+                        String, Text)
+from sqlalchemy.orm import relationship
+
+from app.core.database import Base
+
+
+class DocumentJobStatus(str, enum.Enum):
+    """
+    文档处理任务状态枚举
+
+    - queued: 排队中
+    - running: 处理中（已被worker领取）
+    - completed: 处理完成
+    - failed: 处理失败
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class DocumentJob(Base):
+    """
+    文档处理任务模型
+
+    每个文档对应一条任务记录。API进程上传文档后写入排队记录，
+    文档处理worker从表中领取任务并定期更新心跳；worker异常退出后，
+    心跳过期的任务会被重新排队。
+
+    字段说明:
+        id: 任务唯一标识
+        document_id: 文档ID（外键，唯一）
+        knowledge_base_id: 知识库ID（冗余存储，用于按知识库限制并发）
+        status: 任务状态（queued/running/completed/failed）
+        attempts: 已领取次数
+        progress: 处理进度百分比
+        worker_id: 领取任务的worker标识
+        heartbeat_at: 最近一次心跳时间
+        error_message: 错误信息
+        created_at: 入队时间
+        updated_at: 更新时间
+
+    关系:
+        document: 对应的文档
+
+    索引:
+        - (status, created_at): 按入队顺序领取任务
+        - (knowledge_base_id, status): 统计知识库的运行中任务数
+    """
+
+    __tablename__ = "document_jobs"
+
+    # 主键
+    id = Column(Integer, primary_key=True, index=True, comment="任务ID")
+
+    # 外键
+    document_id = Column(
+        Integer,
+        ForeignKey("documents.id", ondelete="CASCADE"),
+        nullable=False,
+        unique=True,
+        comment="文档ID",
+    )
+    knowledge_base_id = Column(Integer, nullable=False, index=True, comment="知识库ID")
+
+    # 任务状态
+    status = Column(
+        Enum(
+            DocumentJobStatus,
+            name="documentjobstatus",
+            values_callable=lambda enum_cls: [e.value for e in enum_cls],
+        ),
+        default=DocumentJobStatus.QUEUED,
+        nullable=False,
+        comment="任务状态",
+    )
+    attempts = Column(Integer, default=0, nullable=False, comment="已领取次数")
+    progress = Column(Integer, default=0, nullable=False, comment="处理进度百分比")
+    worker_id = Column(String(100), nullable=True, comment="worker标识")
+    heartbeat_at = Column(DateTime, nullable=True, comment="最近心跳时间")
+    error_message = Column(Text, nullable=True, comment="错误信息")
+
+    # 时间戳
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, comment="入队时间")
+    updated_at = Column(
+        DateTime,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        nullable=False,
+        comment="更新时间",
+    )
+
+    # 关系映射
+    document = relationship("Document", back_populates="job")
+
+    # 复合索引
+    __table_args__ = (
+        Index("idx_doc_job_status_created", "status", "created_at"),
+        Index("idx_doc_job_kb_status", "knowledge_base_id", "status"),
+        {"comment": "文档处理任务表"},
+    )
+
+    def __repr__(self) -> str:
+        """字符串表示"""
+        return f"<DocumentJob(id={self.id}, document_id={self.document_id}, status='{self.status.value}')>"
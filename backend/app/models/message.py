@@ -47,6 +47,7 @@ class Message(Base):
         - conversation_id: 用于快速查询对话的所有消息
         - created_at: 用于按时间排序
         - (conversation_id, created_at): 复合索引，优化消息列表查询
+        - (conversation_id, role): 复合索引，优化按角色统计消息数
     """
 
     __tablename__ = "messages"
@@ -83,6 +84,7 @@ class Message(Base):
     # 复合索引
     __table_args__ = (
         Index("idx_conversation_created", "conversation_id", "created_at"),
+        Index("idx_conversation_role", "conversation_id", "role"),
         {"comment": "消息表"},
     )
 
@@ -7,6 +7,7 @@
 from app.repositories.agent_repository import (AgentExecutionRepository,
                                                AgentToolRepository)
 from app.repositories.conversation_repository import ConversationRepository
+from app.repositories.document_job_repository import DocumentJobRepository
 from app.repositories.document_repository import DocumentRepository
 from app.repositories.knowledge_base_repository import KnowledgeBaseRepository
 from app.repositories.message_repository import MessageRepository
@@ -22,4 +23,5 @@ __all__ = [
     "QuotaRepository",
     "KnowledgeBaseRepository",
     "DocumentRepository",
+    "DocumentJobRepository",
 ]
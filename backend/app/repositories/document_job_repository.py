@@ -0,0 +1,407 @@
+"""
+文档处理任务数据访问层（Repository）
+
+封装文档处理任务表的数据库操作，实现持久化队列的入队、领取、
+心跳、完成/失败标记以及过期任务回收。
+
+领取任务使用"先查询候选、再带状态条件更新"的乐观方式，
+多个worker进程并发领取时同一任务只会被一个worker拿到。
+单知识库并发上限在领取的UPDATE语句中校验，并先锁定知识库行
+（SELECT ... FOR UPDATE，SQLite依靠写事务串行化），
+多个worker同时领取同一知识库的任务时合计运行数不会超过上限。
+"""
+
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session, aliased
+
+from app.models.document import Document, DocumentStatus
+from app.models.document_job import DocumentJob, DocumentJobStatus
+from app.models.knowledge_base import KnowledgeBase
+
+# 单次领取时检查的候选任务数
+_CLAIM_CANDIDATES = 10
+
+
+class DocumentJobRepository:
+    """
+    文档处理任务Repository类
+
+    使用方式:
+        repo = DocumentJobRepository(db)
+        repo.enqueue(document_id=1, knowledge_base_id=1)
+        job = repo.claim_next(worker_id="host:123", per_kb_limit=2)
+        repo.mark_completed(job.id, worker_id="host:123")
+    """
+
+    def __init__(self, db: Session):
+        """
+        初始化Repository
+
+        Args:
+            db: SQLAlchemy数据库会话
+        """
+        self.db = db
+
+    def get_by_id(self, job_id: int) -> Optional[DocumentJob]:
+        """
+        根据ID获取任务
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            Optional[DocumentJob]: 任务对象，不存在则返回None
+        """
+        return self.db.query(DocumentJob).filter(DocumentJob.id == job_id).first()
+
+    def get_by_document_id(self, document_id: int) -> Optional[DocumentJob]:
+        """
+        根据文档ID获取任务
+
+        Args:
+            document_id: 文档ID
+
+        Returns:
+            Optional[DocumentJob]: 任务对象，不存在则返回None
+        """
+        return (
+            self.db.query(DocumentJob)
+            .filter(DocumentJob.document_id == document_id)
+            .first()
+        )
+
+    def enqueue(self, document_id: int, knowledge_base_id: int) -> DocumentJob:
+        """
+        将文档加入处理队列
+
+        文档已有任务记录（重试）时重置为排队状态。
+
+        Args:
+            document_id: 文档ID
+            knowledge_base_id: 知识库ID
+
+        Returns:
+            DocumentJob: 任务对象
+        """
+        job = self.get_by_document_id(document_id)
+        if job is None:
+            job = DocumentJob(
+                document_id=document_id,
+                knowledge_base_id=knowledge_base_id,
+                status=DocumentJobStatus.QUEUED,
+                attempts=0,
+                progress=0,
+            )
+            self.db.add(job)
+        else:
+            job.knowledge_base_id = knowledge_base_id
+            job.status = DocumentJobStatus.QUEUED
+            job.attempts = 0
+            job.progress = 0
+            job.worker_id = None
+            job.heartbeat_at = None
+            job.error_message = None
+
+        self.db.commit()
+        self.db.refresh(job)
+        return job
+
+    def claim_next(self, worker_id: str, per_kb_limit: int) -> Optional[DocumentJob]:
+        """
+        领取下一个排队中的任务
+
+        按入队顺序领取，跳过运行中任务数已达上限的知识库。
+        候选查询只用于缩小范围，上限由_try_claim在更新时原子校验。
+
+        Args:
+            worker_id: worker标识
+            per_kb_limit: 单个知识库的最大运行中任务数
+
+        Returns:
+            Optional[DocumentJob]: 领取到的任务，没有可领取的任务时返回None
+        """
+        busy_kbs = (
+            self.db.query(DocumentJob.knowledge_base_id)
+            .filter(DocumentJob.status == DocumentJobStatus.RUNNING)
+            .group_by(DocumentJob.knowledge_base_id)
+            .having(func.count(DocumentJob.id) >= per_kb_limit)
+        )
+        candidates = (
+            self.db.query(DocumentJob.id, DocumentJob.knowledge_base_id)
+            .filter(
+                DocumentJob.status == DocumentJobStatus.QUEUED,
+                DocumentJob.knowledge_base_id.notin_(busy_kbs),
+            )
+            .order_by(DocumentJob.created_at, DocumentJob.id)
+            .limit(_CLAIM_CANDIDATES)
+            .all()
+        )
+        # 结束只读事务，避免后续更新基于过期快照
+        self.db.commit()
+
+        for job_id, kb_id in candidates:
+            job = self._try_claim(job_id, kb_id, worker_id, per_kb_limit)
+            if job is not None:
+                return job
+
+        return None
+
+    def _try_claim(
+        self, job_id: int, kb_id: int, worker_id: str, per_kb_limit: int
+    ) -> Optional[DocumentJob]:
+        """
+        领取指定任务（任务仍在排队且知识库运行中任务数未达上限时）
+
+        Args:
+            job_id: 任务ID
+            kb_id: 任务所属知识库ID
+            worker_id: worker标识
+            per_kb_limit: 单个知识库的最大运行中任务数
+
+        Returns:
+            Optional[DocumentJob]: 领取到的任务，未领取到时返回None
+        """
+        # 锁定知识库行，同一知识库的领取串行执行
+        self.db.query(KnowledgeBase.id).filter(KnowledgeBase.id == kb_id).with_for_update().first()
+
+        # 运行中任务数放在派生表中统计（MySQL不允许UPDATE的子查询直接读取被更新的表）
+        running = aliased(DocumentJob)
+        running_count = (
+            select(func.count())
+            .select_from(
+                select(running.id)
+                .where(
+                    running.knowledge_base_id == kb_id,
+                    running.status == DocumentJobStatus.RUNNING,
+                )
+                .subquery()
+            )
+            .scalar_subquery()
+        )
+
+        now = datetime.utcnow()
+        result = self.db.execute(
+            update(DocumentJob)
+            .where(
+                DocumentJob.id == job_id,
+                DocumentJob.status == DocumentJobStatus.QUEUED,
+                running_count < per_kb_limit,
+            )
+            .values(
+                status=DocumentJobStatus.RUNNING,
+                worker_id=worker_id,
+                attempts=DocumentJob.attempts + 1,
+                progress=0,
+                heartbeat_at=now,
+                updated_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+
+        if result.rowcount != 1:
+            return None
+        job = self.get_by_id(job_id)
+        self.db.refresh(job)
+        return job
+
+    def _update_owned(self, job_id: int, owner: str, **values) -> bool:
+        """更新仍由指定worker（owner）持有的运行中任务"""
+        values.setdefault("updated_at", datetime.utcnow())
+        result = self.db.execute(
+            update(DocumentJob)
+            .where(
+                DocumentJob.id == job_id,
+                DocumentJob.worker_id == owner,
+                DocumentJob.status == DocumentJobStatus.RUNNING,
+            )
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+        return result.rowcount == 1
+
+    def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        """
+        更新任务心跳
+
+        Args:
+            job_id: 任务ID
+            worker_id: worker标识
+
+        Returns:
+            bool: 任务是否仍由该worker持有
+        """
+        now = datetime.utcnow()
+        return self._update_owned(job_id, worker_id, heartbeat_at=now, updated_at=now)
+
+    def update_progress(self, job_id: int, worker_id: str, progress: int) -> bool:
+        """
+        更新任务进度（同时刷新心跳）
+
+        Args:
+            job_id: 任务ID
+            worker_id: worker标识
+            progress: 进度百分比
+
+        Returns:
+            bool: 任务是否仍由该worker持有
+        """
+        now = datetime.utcnow()
+        return self._update_owned(
+            job_id, worker_id, progress=progress, heartbeat_at=now, updated_at=now
+        )
+
+    def mark_completed(self, job_id: int, worker_id: str) -> bool:
+        """
+        标记任务完成
+
+        Args:
+            job_id: 任务ID
+            worker_id: worker标识
+
+        Returns:
+            bool: 是否更新成功（任务已被回收时返回False）
+        """
+        return self._update_owned(
+            job_id, worker_id, status=DocumentJobStatus.COMPLETED, progress=100
+        )
+
+    def mark_failed(self, job_id: int, worker_id: str, error_message: str) -> bool:
+        """
+        标记任务失败
+
+        Args:
+            job_id: 任务ID
+            worker_id: worker标识
+            error_message: 错误信息
+
+        Returns:
+            bool: 是否更新成功（任务已被回收时返回False）
+        """
+        return self._update_owned(
+            job_id,
+            worker_id,
+            status=DocumentJobStatus.FAILED,
+            error_message=error_message,
+        )
+
+    def release(self, job_id: int, worker_id: str) -> bool:
+        """
+        归还任务（worker停止时将未完成的任务重新排队，不计入领取次数）
+
+        Args:
+            job_id: 任务ID
+            worker_id: worker标识
+
+        Returns:
+            bool: 是否更新成功
+        """
+        return self._update_owned(
+            job_id,
+            worker_id,
+            status=DocumentJobStatus.QUEUED,
+            attempts=DocumentJob.attempts - 1,
+            progress=0,
+            worker_id=None,
+        )
+
+    def requeue_stale(
+        self,
+        stale_before: datetime,
+        max_attempts: int,
+    ) -> Tuple[List[int], List[int]]:
+        """
+        回收心跳过期的运行中任务
+
+        领取次数未达上限的任务重新排队，达到上限的任务标记为失败。
+
+        Args:
+            stale_before: 心跳早于该时间的任务视为过期
+            max_attempts: 最大领取次数
+
+        Returns:
+            Tuple[List[int], List[int]]: (重新排队的文档ID列表, 标记失败的文档ID列表)
+        """
+        stale_jobs = (
+            self.db.query(DocumentJob)
+            .filter(
+                DocumentJob.status == DocumentJobStatus.RUNNING,
+                DocumentJob.heartbeat_at < stale_before,
+            )
+            .all()
+        )
+
+        requeued: List[int] = []
+        failed: List[int] = []
+        for job in stale_jobs:
+            if job.attempts >= max_attempts:
+                job.status = DocumentJobStatus.FAILED
+                job.error_message = f"处理中断次数过多（{job.attempts}次）"
+                failed.append(job.document_id)
+            else:
+                job.status = DocumentJobStatus.QUEUED
+                job.progress = 0
+                requeued.append(job.document_id)
+            job.worker_id = None
+
+        self.db.commit()
+        return requeued, failed
+
+    def enqueue_orphaned_processing_documents(self) -> List[int]:
+        """
+        为没有任务记录的处理中文档补建排队任务
+
+        用于从请求内后台任务模式切换过来，或进程重启前遗留的文档。
+
+        Returns:
+            List[int]: 补建任务的文档ID列表
+        """
+        orphans = (
+            self.db.query(Document.id, Document.knowledge_base_id)
+            .outerjoin(DocumentJob, DocumentJob.document_id == Document.id)
+            .filter(
+                Document.status == DocumentStatus.PROCESSING,
+                DocumentJob.id.is_(None),
+            )
+            .order_by(Document.created_at)
+            .all()
+        )
+
+        for document_id, knowledge_base_id in orphans:
+            self.db.add(
+                DocumentJob(
+                    document_id=document_id,
+                    knowledge_base_id=knowledge_base_id,
+                    status=DocumentJobStatus.QUEUED,
+                    attempts=0,
+                    progress=0,
+                )
+            )
+
+        self.db.commit()
+        return [document_id for document_id, _ in orphans]
+
+    def count_by_status(self, status: DocumentJobStatus) -> int:
+        """
+        统计指定状态的任务数
+
+        Args:
+            status: 任务状态
+
+        Returns:
+            int: 任务数
+        """
+        return (
+            self.db.query(func.count(DocumentJob.id))
+            .filter(DocumentJob.status == status)
+            .scalar()
+            or 0
+        )
+
+
+# 导出
+__all__ = ["DocumentJobRepository"]
@@ -53,6 +53,7 @@ class DocumentRepository:
         file_path: str,
         file_size: int,
         file_type: str,
+        content_hash: Optional[str] = None,
     ) -> Document:
         """
         创建新文档记录
@@ -65,6 +66,7 @@ class DocumentRepository:
             file_path: 文件存储路径
             file_size: 文件大小（字节）
             file_type: 文件类型（pdf/docx/txt/md）
+            content_hash: 文件内容SHA256摘要（可选）
 
         Returns:
             Document: 创建的文档对象
@@ -75,6 +77,7 @@ class DocumentRepository:
             file_path=file_path,
             file_size=file_size,
             file_type=file_type,
+            content_hash=content_hash,
             status=DocumentStatus.PROCESSING,
         )
         self.db.add(document)
@@ -8,8 +8,8 @@
 from datetime import datetime
 from typing import List, Optional, Tuple
 
-from sqlalchemy import asc, desc, func
-from sqlalchemy.orm import Session
+from sqlalchemy import asc, desc, func, select
+from sqlalchemy.orm import Session, aliased
 
 from app.models.message import Message, MessageRole
 
@@ -166,6 +166,44 @@ class MessageRepository:
         # 反转为正序
         return list(reversed(messages))
 
+    def get_context_window(
+        self, conversation_id: int, limit: int = 10
+    ) -> Tuple[List[Message], int]:
+        """
+        获取对话的最近消息和用户消息总数
+
+        一次查询完成：用户消息数作为标量子查询随最近消息一起返回，
+        分别使用 (conversation_id, created_at) 和 (conversation_id, role) 索引。
+
+        Args:
+            conversation_id: 对话ID
+            limit: 返回的最大消息数
+
+        Returns:
+            Tuple[List[Message], int]: (消息列表（按时间正序）, 用户消息总数)
+        """
+        counted = aliased(Message)
+        user_turns = (
+            select(func.count(counted.id))
+            .where(
+                counted.conversation_id == conversation_id,
+                counted.role == MessageRole.USER,
+            )
+            .scalar_subquery()
+        )
+
+        rows = (
+            self.db.query(Message, user_turns)
+            .filter(Message.conversation_id == conversation_id)
+            .order_by(desc(Message.created_at), desc(Message.id))
+            .limit(limit)
+            .all()
+        )
+
+        if not rows:
+            return [], 0
+        return [message for message, _ in reversed(rows)], rows[0][1]
+
     def get_first_user_message(self, conversation_id: int) -> Optional[Message]:
         """
         获取对话的第一条用户消息
@@ -93,7 +93,8 @@ class DocumentPreviewResponse(BaseModel):
     document_id: int = Field(..., description="文档ID")
     filename: str = Field(..., description="文件名")
     content: str = Field(..., description="预览内容")
-    total_length: int = Field(..., description="文档总长度")
+    total_length: Optional[int] = Field(None, description="文档总长度（未完整解析时为空）")
+    truncated: bool = Field(False, description="预览内容是否只是文档的一部分")
 
 
 class DocumentUploadResponse(BaseModel):
@@ -144,6 +145,7 @@ class RAGQueryResponse(BaseModel):
     answer: str = Field(..., description="生成的答案")
     sources: List[DocumentChunkResponse] = Field(..., description="参考文档片段")
     tokens_used: int = Field(..., description="消耗的token数量")
+    cached: bool = Field(default=False, description="是否为缓存答案")
 
 
 class RAGStreamSourcesEvent(BaseModel):
@@ -166,6 +168,7 @@ class RAGStreamDoneEvent(BaseModel):
     type: str = Field("done", description="事件类型")
     content: str = Field(..., description="完整答案")
     tokens_used: int = Field(..., description="消耗的token数量")
+    cached: bool = Field(default=False, description="是否为缓存答案的回放")
 
 
 class RAGStreamErrorEvent(BaseModel):
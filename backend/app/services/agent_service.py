@@ -17,7 +17,7 @@ from typing import Any, AsyncGenerator, Dict, List, Optional
 
 from sqlalchemy.orm import Session
 
-from app.langchain_integration.agent_executor import AgentManager
+from app.langchain_integration.agent_executor import get_agent_manager
 from app.models.agent_execution import AgentExecution, ExecutionStatus
 from app.models.agent_tool import AgentTool, ToolType
 from app.repositories.agent_repository import (AgentExecutionRepository,
@@ -49,7 +49,7 @@ class AgentService:
         self.db = db
         self.tool_repo = AgentToolRepository(db)
         self.execution_repo = AgentExecutionRepository(db)
-        self.agent_manager = AgentManager()
+        self.agent_manager = get_agent_manager()
 
     # ==================== 工具管理 ====================
 
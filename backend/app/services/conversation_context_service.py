@@ -0,0 +1,220 @@
+"""
+对话上下文服务模块
+
+为聊天接口提供对话上下文（最近的历史消息 + 用户消息总数）：
+- 缓存未命中时一次查询完成加载（见 MessageRepository.get_context_window）
+- 历史窗口缓存在进程内LRU层，可选Redis共享层（复用对话记忆存储）；
+  默认只在启用Redis共享层时缓存，多worker之间按修订号同步
+- 写入消息时增量追加到已缓存的窗口，每轮对话不再重复查询历史
+
+历史消息格式与对话管理器一致: {"role": "USER" | "ASSISTANT", "content": "..."}。
+
+使用方式:
+    context = ConversationContextService(db).get_context(conversation_id)
+    history = context.history
+    if context.is_first_user_message:
+        ...
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.conversation_memory import (ConversationMemoryStore,
+                                          InMemoryConversationTier,
+                                          RedisConversationTier)
+from app.models.message import MessageRole
+from app.repositories.message_repository import MessageRepository
+
+logger = logging.getLogger(__name__)
+
+# 历史窗口缓存命名空间
+HISTORY_NAMESPACE = "history"
+
+
+@dataclass
+class ConversationContext:
+    """对话上下文"""
+
+    conversation_id: int
+    history: List[Dict[str, str]]
+    user_turns: int
+
+    @property
+    def is_first_user_message(self) -> bool:
+        """对话中是否还没有用户消息"""
+        return self.user_turns == 0
+
+
+def to_history_message(role: MessageRole, content: str) -> Dict[str, str]:
+    """
+    转换为对话管理器使用的历史消息格式
+
+    Args:
+        role: 消息角色
+        content: 消息内容
+
+    Returns:
+        Dict[str, str]: {"role": "USER" | "ASSISTANT" | "SYSTEM", "content": ...}
+    """
+    return {"role": role.name, "content": content}
+
+
+class ConversationContextService:
+    """
+    对话上下文服务类
+
+    使用方式:
+        service = ConversationContextService(db)
+        context = service.get_context(conversation_id=1)
+        service.record_message(conversation_id=1, role=MessageRole.USER, content="你好")
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        cache: Optional[ConversationMemoryStore] = None,
+        window: Optional[int] = None,
+    ):
+        """
+        初始化对话上下文服务
+
+        Args:
+            db: SQLAlchemy数据库会话
+            cache: 历史窗口缓存，默认使用全局实例（未启用缓存时为None）
+            window: 加载的最近历史消息数，默认从配置读取
+        """
+        self.db = db
+        self.message_repo = MessageRepository(db)
+        self.cache = cache if cache is not None else get_conversation_history_cache()
+        self.window = window or settings.conversation_memory.conversation_history_window
+
+    def get_context(self, conversation_id: int) -> ConversationContext:
+        """
+        获取对话上下文
+
+        调用方需已验证对话存在且属于当前用户。
+
+        Args:
+            conversation_id: 对话ID
+
+        Returns:
+            ConversationContext: 对话上下文
+        """
+        if self.cache is not None:
+            entry = self.cache.get_entry(HISTORY_NAMESPACE, conversation_id)
+            if entry is not None:
+                return ConversationContext(
+                    conversation_id=conversation_id,
+                    history=list(entry.messages),
+                    user_turns=entry.user_turns,
+                )
+
+        messages, user_turns = self.message_repo.get_context_window(
+            conversation_id=conversation_id, limit=self.window
+        )
+        history = [to_history_message(msg.role, msg.content) for msg in messages]
+
+        if self.cache is not None:
+            self.cache.put_entry(HISTORY_NAMESPACE, conversation_id, history, user_turns)
+
+        return ConversationContext(
+            conversation_id=conversation_id, history=list(history), user_turns=user_turns
+        )
+
+    def record_message(self, conversation_id: int, role: MessageRole, content: str) -> None:
+        """
+        将新写入的消息追加到已缓存的历史窗口
+
+        窗口未缓存时不做处理，下次读取时从数据库加载。
+
+        Args:
+            conversation_id: 对话ID
+            role: 消息角色
+            content: 消息内容
+        """
+        if self.cache is None:
+            return
+
+        entry = self.cache.get_entry(HISTORY_NAMESPACE, conversation_id)
+        if entry is None:
+            return
+
+        messages = (entry.messages + [to_history_message(role, content)])[-self.window :]
+        user_turns = entry.user_turns + (1 if role == MessageRole.USER else 0)
+        self.cache.put_entry(HISTORY_NAMESPACE, conversation_id, messages, user_turns)
+
+    def invalidate(self, conversation_id: int) -> None:
+        """
+        清除对话的历史窗口缓存
+
+        Args:
+            conversation_id: 对话ID
+        """
+        if self.cache is not None:
+            self.cache.delete(HISTORY_NAMESPACE, conversation_id)
+
+
+# 全局历史窗口缓存实例
+_history_cache: Optional[ConversationMemoryStore] = None
+
+
+def get_conversation_history_cache() -> Optional[ConversationMemoryStore]:
+    """
+    获取全局对话历史窗口缓存
+
+    Returns:
+        Optional[ConversationMemoryStore]: 缓存实例，未启用时返回None
+    """
+    global _history_cache
+
+    memory_settings = settings.conversation_memory
+    enabled = memory_settings.conversation_history_cache_enabled
+    if enabled is None:
+        # 只有进程内缓存时，其他worker写入的消息不会更新本进程的缓存窗口
+        enabled = memory_settings.conversation_memory_redis_enabled
+    if not enabled:
+        return None
+
+    if _history_cache is None:
+        local = None
+        if memory_settings.conversation_memory_max_conversations > 0:
+            local = InMemoryConversationTier(
+                max_entries=memory_settings.conversation_memory_max_conversations,
+                ttl_seconds=memory_settings.conversation_memory_ttl_seconds,
+                name="history",
+            )
+        shared = None
+        if memory_settings.conversation_memory_redis_enabled:
+            shared = RedisConversationTier(
+                ttl_seconds=memory_settings.conversation_memory_ttl_seconds
+            )
+        _history_cache = ConversationMemoryStore(local=local, shared=shared)
+    return _history_cache
+
+
+def reset_conversation_history_cache() -> None:
+    """
+    重置全局对话历史窗口缓存
+
+    用于测试或重新加载配置
+    """
+    global _history_cache
+
+    if _history_cache is not None and _history_cache.local is not None:
+        _history_cache.local.clear()
+    _history_cache = None
+
+
+# 导出
+__all__ = [
+    "ConversationContext",
+    "ConversationContextService",
+    "HISTORY_NAMESPACE",
+    "get_conversation_history_cache",
+    "reset_conversation_history_cache",
+    "to_history_message",
+]
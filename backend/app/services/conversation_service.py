@@ -22,6 +22,8 @@ from app.models.conversation import Conversation
 from app.models.message import Message, MessageRole
 from app.repositories.conversation_repository import ConversationRepository
 from app.repositories.message_repository import MessageRepository
+from app.services.conversation_context_service import (
+    ConversationContext, ConversationContextService)
 
 logger = logging.getLogger(__name__)
 
@@ -66,6 +68,7 @@ class ConversationService:
         self.db = db
         self.conversation_repo = ConversationRepository(db)
         self.message_repo = MessageRepository(db)
+        self.context_service = ConversationContextService(db)
 
     def create_conversation(self, user_id: int, title: str = "新对话") -> Conversation:
         """
@@ -204,6 +207,7 @@ class ConversationService:
         if not success:
             raise ConversationNotFoundError(f"对话 {conversation_id} 不存在或无权访问")
 
+        self.context_service.invalidate(conversation_id)
         return True
 
     def get_messages(
@@ -284,6 +288,9 @@ class ConversationService:
         # 更新对话的更新时间
         self.conversation_repo.touch(conversation_id)
 
+        # 增量更新已缓存的历史窗口
+        self.context_service.record_message(conversation_id, role, content)
+
         return message
 
     def get_recent_messages(
@@ -317,6 +324,21 @@ class ConversationService:
             conversation_id=conversation_id, limit=limit
         )
 
+    def get_conversation_context(self, conversation_id: int) -> ConversationContext:
+        """
+        获取对话上下文（最近的历史消息和用户消息数）
+
+        优先读取历史窗口缓存，未命中时一次查询加载。
+        调用方需已通过 get_conversation 等方法验证对话归属。
+
+        Args:
+            conversation_id: 对话ID
+
+        Returns:
+            ConversationContext: 对话上下文
+        """
+        return self.context_service.get_context(conversation_id)
+
     def get_conversation_token_usage(self, conversation_id: int, user_id: int) -> int:
         """
         获取对话的总token消耗
@@ -651,13 +673,7 @@ class ConversationService:
         Returns:
             bool: 如果没有用户消息返回True
         """
-        messages = self.message_repo.get_by_conversation(
-            conversation_id=conversation_id, skip=0, limit=1, order_asc=True
-        )
-
-        # 检查是否有用户消息
-        user_messages = [m for m in messages if m.role == MessageRole.USER]
-        return len(user_messages) == 0
+        return self.message_repo.get_first_user_message(conversation_id) is None
 
 
 # 导出
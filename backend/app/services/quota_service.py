@@ -54,6 +54,47 @@ class InvalidQuotaValueError(QuotaServiceError):
     pass
 
 
+def notify_quota_warning(user_id: int, remaining_quota: int, usage_percentage: float) -> None:
+    """
+    配额使用超过90%时通过WebSocket发送警告（需在事件循环线程中调用）
+
+    Args:
+        user_id: 用户ID
+        remaining_quota: 剩余配额
+        usage_percentage: 使用百分比
+    """
+    if usage_percentage >= 95:
+        level = "critical"
+        message = f"配额严重不足，剩余 {remaining_quota} tokens ({100-usage_percentage:.1f}%)"
+    elif usage_percentage >= 90:
+        level = "low"
+        message = f"配额即将用尽，剩余 {remaining_quota} tokens ({100-usage_percentage:.1f}%)"
+    else:
+        return
+
+    try:
+        import asyncio
+
+        asyncio.create_task(
+            connection_manager.send_personal_message(
+                user_id,
+                {
+                    "type": "quota_warning",
+                    "data": {
+                        "level": level,
+                        "remaining_quota": remaining_quota,
+                        "usage_percentage": usage_percentage,
+                        "message": message,
+                        "timestamp": datetime.utcnow().isoformat(),
+                    },
+                },
+            )
+        )
+    except Exception:
+        # WebSocket通知失败不影响主流程
+        pass
+
+
 class QuotaService:
     """
     配额服务类
@@ -180,12 +221,38 @@ class QuotaService:
             )
 
         # 使用Redis原子操作扣除配额
+        self.increment_cached_usage(user_id, tokens_used)
+
+        # 更新数据库中的配额
+        quota = self.quota_repo.consume_quota(user_id, tokens_used)
+
+        # 检查配额警告阈值（剩余10%时发送警告）
+        notify_quota_warning(user_id, quota.remaining_quota, quota.usage_percentage)
+
+        # 记录API使用情况
+        api_usage = APIUsage(
+            user_id=user_id, api_type=api_type, tokens_used=tokens_used, cost=cost
+        )
+        self.db.add(api_usage)
+        self.db.commit()
+        self.db.refresh(api_usage)
+
+        return quota, api_usage
+
+    def increment_cached_usage(self, user_id: int, tokens_used: int) -> None:
+        """
+        原子递增Redis中缓存的已用配额（Redis不可用时忽略）
+
+        Args:
+            user_id: 用户ID
+            tokens_used: 消耗的token数量
+        """
         try:
             redis_client = get_redis_client()
             used_key = RedisKeys.format_key(RedisKeys.USER_QUOTA_USED, user_id=user_id)
 
             # 原子递增
-            new_used = redis_client.incrby(used_key, tokens_used)
+            redis_client.incrby(used_key, tokens_used)
 
             # 设置过期时间（到下个月1日）
             next_reset = self._get_next_reset_date()
@@ -200,68 +267,6 @@ class QuotaService:
             # Redis不可用时，仅使用数据库
             pass
 
-        # 更新数据库中的配额
-        quota = self.quota_repo.consume_quota(user_id, tokens_used)
-
-        # 检查配额警告阈值（剩余10%时发送警告）
-        usage_percentage = quota.usage_percentage
-        if usage_percentage >= 90 and usage_percentage < 95:
-            # 发送低配额警告
-            try:
-                import asyncio
-
-                asyncio.create_task(
-                    connection_manager.send_personal_message(
-                        user_id,
-                        {
-                            "type": "quota_warning",
-                            "data": {
-                                "level": "low",
-                                "remaining_quota": quota.remaining_quota,
-                                "usage_percentage": usage_percentage,
-                                "message": f"配额即将用尽，剩余 {quota.remaining_quota} tokens ({100-usage_percentage:.1f}%)",
-                                "timestamp": datetime.utcnow().isoformat(),
-                            },
-                        },
-                    )
-                )
-            except Exception as e:
-                # WebSocket通知失败不影响主流程
-                pass
-        elif usage_percentage >= 95:
-            # 发送严重警告
-            try:
-                import asyncio
-
-                asyncio.create_task(
-                    connection_manager.send_personal_message(
-                        user_id,
-                        {
-                            "type": "quota_warning",
-                            "data": {
-                                "level": "critical",
-                                "remaining_quota": quota.remaining_quota,
-                                "usage_percentage": usage_percentage,
-                                "message": f"配额严重不足，剩余 {quota.remaining_quota} tokens ({100-usage_percentage:.1f}%)",
-                                "timestamp": datetime.utcnow().isoformat(),
-                            },
-                        },
-                    )
-                )
-            except Exception as e:
-                # WebSocket通知失败不影响主流程
-                pass
-
-        # 记录API使用情况
-        api_usage = APIUsage(
-            user_id=user_id, api_type=api_type, tokens_used=tokens_used, cost=cost
-        )
-        self.db.add(api_usage)
-        self.db.commit()
-        self.db.refresh(api_usage)
-
-        return quota, api_usage
-
     def update_quota(self, user_id: int, new_quota: int) -> UserQuota:
         """
         更新用户的月度配额上限（管理员功能）
@@ -450,4 +455,5 @@ __all__ = [
     "QuotaNotFoundError",
     "InsufficientQuotaError",
     "InvalidQuotaValueError",
+    "notify_quota_warning",
 ]
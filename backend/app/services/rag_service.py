@@ -14,6 +14,7 @@ RAG服务模块
     - 需求3.10: 用户查询文档处理状态
 """
 
+import asyncio
 import logging
 import os
 import re
@@ -26,18 +27,26 @@ from fastapi import BackgroundTasks, UploadFile
 from sqlalchemy.orm import Session
 
 from app.config import settings
+from app.core.answer_cache import invalidate_answer_cache
+from app.core.chunk_embedding_store import get_chunk_embedding_store
+from app.core.text_artifact import (artifact_path_for, read_text_slice,
+                                    remove_text_artifact)
 from app.core.vector_store import get_vector_store_manager
 from app.langchain_integration.document_loaders import (
     DocumentLoaderFactory, DocumentProcessingError, UnsupportedFileTypeError)
 from app.models.document import Document, DocumentStatus
 from app.models.knowledge_base import KnowledgeBase
 from app.models.knowledge_base_permission import PermissionType
+from app.repositories.document_job_repository import DocumentJobRepository
 from app.repositories.document_repository import DocumentRepository
 from app.repositories.knowledge_base_repository import KnowledgeBaseRepository
 from app.services.knowledge_base_permission_service import (
     KnowledgeBasePermissionService,
 )
+from app.tasks.cleanup_tasks import purge_knowledge_base_data
 from app.tasks.document_tasks import process_document_task
+from app.utils.upload_writer import (SavedUpload, UploadTooLargeError,
+                                     stream_upload_to_file)
 
 logger = logging.getLogger(__name__)
 
@@ -141,6 +150,7 @@ class RAGService:
         self.db = db
         self.kb_repo = KnowledgeBaseRepository(db)
         self.doc_repo = DocumentRepository(db)
+        self.job_repo = DocumentJobRepository(db)
         self.kb_permission_service = KnowledgeBasePermissionService(db)
         self.vector_store_manager = get_vector_store_manager()
 
@@ -287,15 +297,18 @@ class RAGService:
         self,
         kb_id: int,
         user_id: int,
+        background_tasks: BackgroundTasks,
     ) -> bool:
         """
         删除知识库
 
-        删除知识库及其所有文档和向量数据。
+        请求内只删除数据库记录（知识库立即不可见），向量集合和上传文件
+        在响应返回后由后台任务批量删除，不在请求中逐个删除文件。
 
         Args:
             kb_id: 知识库ID
             user_id: 用户ID
+            background_tasks: FastAPI后台任务
 
         Returns:
             bool: 是否删除成功
@@ -308,25 +321,16 @@ class RAGService:
         if not kb:
             raise KnowledgeBaseNotFoundError(f"知识库不存在: id={kb_id}")
 
-        # 删除向量数据
-        try:
-            self.vector_store_manager.delete_collection(kb_id)
-        except Exception as e:
-            logger.warning(f"删除向量集合失败: {str(e)}")
-
-        # 删除文档文件
-        for doc in kb.documents:
-            try:
-                if os.path.exists(doc.file_path):
-                    os.remove(doc.file_path)
-            except Exception as e:
-                logger.warning(f"删除文件失败: {doc.file_path}, error={str(e)}")
+        file_paths = [doc.file_path for doc in kb.documents]
 
         # 删除数据库记录
         success = self.kb_repo.delete(kb_id, user_id)
 
         if success:
-            logger.info(f"知识库删除成功: id={kb_id}")
+            invalidate_answer_cache([kb_id])
+            # 后台删除失败留下的孤立集合和上传目录由每日清理任务回收
+            background_tasks.add_task(purge_knowledge_base_data, kb_id, file_paths)
+            logger.info(f"知识库删除成功: id={kb_id}, 待删除文件 {len(file_paths)} 个")
 
         return success
 
@@ -342,7 +346,7 @@ class RAGService:
         """
         上传文档
 
-        保存文件并创建后台处理任务。
+        流式保存文件并创建后台处理任务。
 
         Args:
             kb_id: 知识库ID
@@ -364,10 +368,132 @@ class RAGService:
         # 验证知识库
         self._require_kb_permission(kb_id, user_id, PermissionType.EDITOR.value)
 
-        # 获取文件类型
+        saved, display_filename, file_type = await self._receive_upload(kb_id, file)
+        return self._create_document(
+            kb_id, saved, display_filename, file_type, background_tasks
+        )
+
+    async def upload_documents_batch(
+        self,
+        kb_id: int,
+        user_id: int,
+        files: List[UploadFile],
+        background_tasks: BackgroundTasks,
+    ) -> Tuple[List[Document], List[dict]]:
+        """
+        批量上传文档
+
+        多个文件并发流式保存（并发数受 upload_batch_concurrency 限制），
+        全部保存完成后依次创建文档记录。单个文件失败时回滚会话并记录失败，
+        不影响其余文件；批量上传中止时删除已保存但未创建记录的文件。
+
+        Args:
+            kb_id: 知识库ID
+            user_id: 用户ID
+            files: 上传的文件列表
+            background_tasks: FastAPI后台任务
+
+        Returns:
+            Tuple[List[Document], List[dict]]: (创建的文档记录列表, 失败文件列表)
+
+        Raises:
+            KnowledgeBaseNotFoundError: 知识库不存在
+
+        需求引用:
+            - 需求3.3: 用户批量上传多个文档
+        """
+        self._require_kb_permission(kb_id, user_id, PermissionType.EDITOR.value)
+
+        semaphore = asyncio.Semaphore(settings.file_storage.upload_batch_concurrency)
+
+        async def _receive(file: UploadFile):
+            async with semaphore:
+                return await self._receive_upload(kb_id, file)
+
+        tasks = [asyncio.ensure_future(_receive(file)) for file in files]
+        try:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        except BaseException:
+            # 请求被取消：删除已经保存完成的文件
+            self._discard_saved_uploads(
+                task.result()[0].path
+                for task in tasks
+                if task.done() and not task.cancelled() and task.exception() is None
+            )
+            raise
+
+        documents = []
+        errors = []
+        # 已保存但尚未创建文档记录的文件（序号 -> 路径）
+        pending = {
+            i: result[0].path
+            for i, result in enumerate(results)
+            if not isinstance(result, BaseException)
+        }
+
+        try:
+            for i, (file, result) in enumerate(zip(files, results)):
+                try:
+                    if isinstance(result, BaseException):
+                        raise result
+                    saved, display_filename, file_type = result
+                    documents.append(
+                        self._create_document(
+                            kb_id, saved, display_filename, file_type, background_tasks
+                        )
+                    )
+                except Exception as e:
+                    # 数据库错误会使会话不可用，回滚后继续处理其余文件
+                    self.db.rollback()
+                    errors.append(
+                        {
+                            "filename": file.filename,
+                            "error": str(e),
+                        }
+                    )
+                    logger.warning(f"批量上传文件失败: {file.filename}, error={str(e)}")
+                # 成功时文件归文档记录所有，失败时已由_create_document删除
+                pending.pop(i, None)
+        finally:
+            self._discard_saved_uploads(pending.values())
+
+        if errors:
+            logger.warning(f"批量上传部分失败: {len(errors)}/{len(files)}")
+
+        return documents, errors
+
+    @staticmethod
+    def _discard_saved_uploads(paths) -> None:
+        """删除已保存但未创建文档记录的上传文件"""
+        for path in paths:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError as e:
+                logger.warning(f"删除未入库的上传文件失败: {path}, error={str(e)}")
+
+    async def _receive_upload(
+        self,
+        kb_id: int,
+        file: UploadFile,
+    ) -> Tuple[SavedUpload, str, str]:
+        """
+        校验文件类型并流式保存上传文件
+
+        Args:
+            kb_id: 知识库ID
+            file: 上传的文件
+
+        Returns:
+            Tuple[SavedUpload, str, str]: (保存结果, 显示文件名, 文件类型)
+
+        Raises:
+            UnsupportedFileTypeError: 不支持的文件类型
+            FileUploadError: 文件过大或保存失败
+        """
         display_filename = _normalize_display_filename(file.filename)
         file_type = DocumentLoaderFactory.get_file_type_from_extension(display_filename)
-        
+
         logger.info(f"开始处理文件上传: filename={display_filename}, type={file_type}")
 
         if not file_type:
@@ -377,55 +503,50 @@ class RAGService:
                 f"支持的类型: {', '.join(DocumentLoaderFactory.get_supported_types())}"
             )
 
-        # 验证文件大小（在保存文件之前）
-        # 读取文件内容以获取大小
-        try:
-            file_content = await file.read()
-            file_size = len(file_content)
-            max_size = settings.file_storage.max_upload_size_bytes
-            
-            logger.info(f"文件大小: {file_size} bytes, 最大允许: {max_size} bytes")
-
-            if file_size > max_size:
-                max_size_mb = max_size / (1024 * 1024)
-                file_size_mb = file_size / (1024 * 1024)
-                logger.warning(f"文件大小超出限制: {file_size_mb:.2f}MB > {max_size_mb:.2f}MB")
-                raise FileUploadError(
-                    f"文件大小超出限制: {file_size_mb:.2f}MB > {max_size_mb:.2f}MB"
-                )
-        except Exception as e:
-            if isinstance(e, FileUploadError):
-                raise
-            logger.error(f"读取文件失败: {str(e)}")
-            raise FileUploadError(f"读取文件失败: {str(e)}")
+        saved = await self._save_upload_file(file, kb_id, display_filename=display_filename)
+        logger.info(
+            f"文件保存成功: {saved.path}, size={saved.size} bytes, sha256={saved.sha256}"
+        )
+        return saved, display_filename, file_type
 
-        try:
-            file_path = await self._save_upload_file(
-                file, kb_id, content=file_content, display_filename=display_filename
-            )
-            logger.info(f"文件保存成功: {file_path}")
-        except Exception as e:
-            logger.error(f"保存文件失败: {str(e)}")
-            raise FileUploadError(f"保存文件失败: {str(e)}")
+    def _create_document(
+        self,
+        kb_id: int,
+        saved: SavedUpload,
+        display_filename: str,
+        file_type: str,
+        background_tasks: BackgroundTasks,
+    ) -> Document:
+        """
+        创建文档记录并安排处理，失败时删除已保存的文件
+
+        Args:
+            kb_id: 知识库ID
+            saved: 已保存的上传文件
+            display_filename: 显示文件名
+            file_type: 文件类型
+            background_tasks: FastAPI后台任务
 
+        Returns:
+            Document: 创建的文档记录
+        """
         try:
             # 创建文档记录
             document = self.doc_repo.create(
                 knowledge_base_id=kb_id,
                 filename=display_filename,
-                file_path=file_path,
-                file_size=file_size,
+                file_path=saved.path,
+                file_size=saved.size,
                 file_type=file_type,
+                content_hash=saved.sha256,
             )
 
-            # 更新知识库更新时间
+            # 更新知识库更新时间，使该知识库的缓存答案失效
             self.kb_repo.touch(kb_id)
+            invalidate_answer_cache([kb_id])
 
-            # 添加后台处理任务
-            background_tasks.add_task(
-                self._process_document_background,
-                document.id,
-            )
+            # 加入文档处理队列
+            self._schedule_processing(document, background_tasks)
 
             logger.info(
                 f"文档上传成功: id={document.id}, "
@@ -434,76 +555,33 @@ class RAGService:
 
             return document
 
-        except Exception as e:
+        except Exception:
             # 清理已保存的文件
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            if os.path.exists(saved.path):
+                os.remove(saved.path)
             raise
 
-    async def upload_documents_batch(
-        self,
-        kb_id: int,
-        user_id: int,
-        files: List[UploadFile],
-        background_tasks: BackgroundTasks,
-    ) -> List[Document]:
-        """
-        批量上传文档
-
-        Args:
-            kb_id: 知识库ID
-            user_id: 用户ID
-            files: 上传的文件列表
-            background_tasks: FastAPI后台任务
-
-        Returns:
-            List[Document]: 创建的文档记录列表
-
-        需求引用:
-            - 需求3.3: 用户批量上传多个文档
-        """
-        documents = []
-        errors = []
-
-        for file in files:
-            try:
-                doc = await self.upload_document(
-                    kb_id=kb_id,
-                    user_id=user_id,
-                    file=file,
-                    background_tasks=background_tasks,
-                )
-                documents.append(doc)
-            except Exception as e:
-                errors.append(
-                    {
-                        "filename": file.filename,
-                        "error": str(e),
-                    }
-                )
-                logger.warning(f"批量上传文件失败: {file.filename}, error={str(e)}")
-
-        if errors:
-            logger.warning(f"批量上传部分失败: {len(errors)}/{len(files)}")
-
-        return documents
-
     async def _save_upload_file(
         self,
         file: UploadFile,
         kb_id: int,
-        content: Optional[bytes] = None,
         display_filename: Optional[str] = None,
-    ) -> str:
+    ) -> SavedUpload:
         """
-        保存上传的文件
+        流式保存上传的文件
+
+        按块读取并写入磁盘，超过大小上限时立即中止。
 
         Args:
             file: 上传的文件
             kb_id: 知识库ID
+            display_filename: 显示文件名（用于生成存储文件名）
 
         Returns:
-            str: 保存的文件路径
+            SavedUpload: 保存结果（路径、大小、SHA256）
+
+        Raises:
+            FileUploadError: 文件过大或保存失败
         """
         # 生成唯一文件名
         timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
@@ -520,18 +598,43 @@ class RAGService:
         file_path = os.path.join(kb_dir, safe_filename)
 
         try:
-            with open(file_path, "wb") as buffer:
-                if content is None:
-                    content = await file.read()
-                buffer.write(content)
-
+            saved = await stream_upload_to_file(
+                file,
+                file_path,
+                max_size=settings.file_storage.max_upload_size_bytes,
+                chunk_size=settings.file_storage.upload_chunk_size_kb * 1024,
+            )
             logger.debug(f"文件保存成功: {file_path}")
-            return file_path
+            return saved
 
+        except UploadTooLargeError as e:
+            logger.warning(f"{str(e)}: filename={safe_original}")
+            raise FileUploadError(str(e))
         except Exception as e:
             logger.error(f"文件保存失败: {str(e)}")
             raise FileUploadError(f"文件保存失败: {str(e)}")
 
+    def _schedule_processing(
+        self,
+        document: Document,
+        background_tasks: BackgroundTasks,
+    ) -> None:
+        """
+        安排文档处理
+
+        启用文档处理队列时写入持久化任务表，由文档处理worker领取执行；
+        否则在当前请求结束后通过FastAPI后台任务处理。
+
+        Args:
+            document: 文档记录
+            background_tasks: FastAPI后台任务
+        """
+        if settings.document_queue.document_queue_enabled:
+            self.job_repo.enqueue(document.id, document.knowledge_base_id)
+            logger.debug(f"文档已加入处理队列: document_id={document.id}")
+        else:
+            background_tasks.add_task(self._process_document_background, document.id)
+
     async def _process_document_background(self, document_id: int) -> None:
         """
         后台处理文档
@@ -578,8 +681,12 @@ class RAGService:
         except KnowledgeBaseNotFoundError as e:
             raise DocumentNotFoundError(f"文档不存在: id={document_id}") from e
 
-        # 计算进度
+        # 计算进度（处理中的文档优先使用任务表记录的实际进度）
         progress = self._calculate_progress(document.status)
+        if document.status == DocumentStatus.PROCESSING:
+            job = self.job_repo.get_by_document_id(document.id)
+            if job is not None:
+                progress = job.progress
 
         return DocumentStatusResponse(
             document_id=document.id,
@@ -669,19 +776,15 @@ class RAGService:
         except KnowledgeBaseNotFoundError as e:
             raise DocumentNotFoundError(f"文档不存在: id={document_id}") from e
 
-        # 获取预览
-        return DocumentLoaderFactory.get_document_preview(
-            file_path=document.file_path,
-            file_type=document.file_type,
-            max_chars=max_chars,
-        )
+        preview, _ = self._read_preview(document, max_chars)
+        return preview
 
     def get_document_preview_with_length(
         self,
         document_id: int,
         user_id: int,
         max_chars: int = 1000,
-    ) -> Tuple[str, int]:
+    ) -> Tuple[str, Optional[int]]:
         document = self.doc_repo.get_by_id(document_id)
         if not document:
             raise DocumentNotFoundError(f"文档不存在: id={document_id}")
@@ -693,6 +796,26 @@ class RAGService:
         except KnowledgeBaseNotFoundError as e:
             raise DocumentNotFoundError(f"文档不存在: id={document_id}") from e
 
+        return self._read_preview(document, max_chars)
+
+    def _read_preview(self, document: Document, max_chars: int) -> Tuple[str, Optional[int]]:
+        """
+        读取文档预览
+
+        优先读取入库时保存的提取文本缓存；缓存不存在（如旧文档或处理未完成）时
+        逐页解析原文件，读够 max_chars 个字符即停止，此时全文长度未知。
+
+        Args:
+            document: 文档记录
+            max_chars: 最大字符数
+
+        Returns:
+            Tuple[str, Optional[int]]: (预览文本, 全文长度)；逐页解析提前停止时全文长度为None
+        """
+        cached = read_text_slice(artifact_path_for(document.file_path), 0, max_chars)
+        if cached is not None:
+            return cached
+
         return DocumentLoaderFactory.get_document_preview_with_length(
             file_path=document.file_path,
             file_type=document.file_type,
@@ -754,7 +877,8 @@ class RAGService:
             self.db.commit()
             self.db.refresh(document)
 
-        background_tasks.add_task(self._process_document_background, document.id)
+        invalidate_answer_cache([document.knowledge_base_id])
+        self._schedule_processing(document, background_tasks)
         return document
 
     async def delete_document(
@@ -801,17 +925,27 @@ class RAGService:
         except Exception as e:
             logger.warning(f"删除向量数据失败: {str(e)}")
 
+        # 删除分块向量存储中只被该文档引用的向量（重试处理时保留，以便复用）
+        chunk_store = get_chunk_embedding_store()
+        if chunk_store is not None:
+            try:
+                await asyncio.to_thread(chunk_store.delete_document, kb_id, document_id)
+            except Exception as e:
+                logger.warning(f"删除分块向量存储失败: document_id={document_id}, error={str(e)}")
+
         # 删除文件
         try:
             if os.path.exists(file_path):
                 os.remove(file_path)
         except Exception as e:
             logger.warning(f"删除文件失败: {file_path}, error={str(e)}")
+        remove_text_artifact(file_path)
 
         # 删除数据库记录
         success = self.doc_repo.delete(document_id)
 
         if success:
+            invalidate_answer_cache([kb_id])
             logger.info(f"文档删除成功: id={document_id}")
 
         return success
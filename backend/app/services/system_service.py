@@ -179,6 +179,7 @@ class SystemService:
             # 向量数据库配置
             "vector_db": {
                 "type": "chroma",
+                "mode": settings.vector_db.chroma_mode,
                 "persist_directory": settings.vector_db.chroma_persist_directory,
             },
             # 文件存储配置
@@ -521,6 +522,7 @@ class SystemService:
                 "message": "向量数据库连接正常",
             }
             if detailed:
+                health_status["components"]["vector_db"]["mode"] = settings.vector_db.chroma_mode
                 health_status["components"]["vector_db"]["persist_directory"] = (
                     settings.vector_db.chroma_persist_directory
                 )
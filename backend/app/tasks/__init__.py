@@ -6,12 +6,16 @@
 
 from app.tasks.cleanup_tasks import (cleanup_old_api_usage,
                                      cleanup_old_login_attempts,
-                                     cleanup_temp_files, run_all_cleanup_tasks)
+                                     cleanup_temp_files,
+                                     compact_vector_collections,
+                                     purge_knowledge_base_data,
+                                     run_all_cleanup_tasks)
 from app.tasks.document_tasks import (DocumentProcessingQueue,
                                       DocumentProcessingTask,
                                       get_document_queue,
                                       process_document_sync,
                                       process_document_task)
+from app.tasks.document_worker import DocumentWorker
 from app.tasks.quota_tasks import reset_monthly_quotas, reset_single_user_quota
 
 __all__ = [
@@ -21,6 +25,7 @@ __all__ = [
     "process_document_task",
     "process_document_sync",
     "get_document_queue",
+    "DocumentWorker",
     # 配额任务
     "reset_monthly_quotas",
     "reset_single_user_quota",
@@ -29,4 +34,6 @@ __all__ = [
     "cleanup_temp_files",
     "cleanup_old_api_usage",
     "run_all_cleanup_tasks",
+    "purge_knowledge_base_data",
+    "compact_vector_collections",
 ]
@@ -0,0 +1,450 @@
+"""
+流式对话回复写入模块
+
+将流式对话结束后的数据库写入移出SSE关键路径：
+- AI回复、API使用记录和配额扣除进入内存队列，done事件无需等待数据库
+- 后台写入任务按批合并写入：一个事务内批量插入消息和API使用记录，
+  按对话更新时间、按用户合并配额增量
+- 批量写入失败时逐条重试，单条失败不影响同批其他回复
+- 写入队列未启动或已满时，在请求内（数据库线程池中）逐条写入
+- 首条消息的对话标题在后台生成，不阻塞流式输出
+
+消息的创建时间在提交时确定，队列延迟不会改变消息顺序。
+
+使用方式:
+    writer = get_chat_persistence_writer()
+    await writer.start()
+
+    reply = ChatReply(conversation_id=1, user_id=1, content="你好", tokens=20)
+    if not writer.submit(reply):
+        message_id = await writer.persist(reply)
+
+    writer.schedule_title(conversation_id=1, first_message="你好")
+    await writer.stop()
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.database import SessionLocal
+from app.core.executors import get_executors
+from app.core.tracing import record_stage
+from app.models.api_usage import APIUsage
+from app.models.conversation import Conversation
+from app.models.message import Message, MessageRole
+from app.models.user_quota import UserQuota
+from app.repositories.quota_repository import QuotaRepository
+from app.services.conversation_context_service import ConversationContextService
+from app.services.conversation_service import ConversationService
+from app.services.quota_service import QuotaService, notify_quota_warning
+
+logger = logging.getLogger(__name__)
+
+# 写入队列中的停止信号
+_STOP = object()
+
+
+@dataclass
+class ChatReply:
+    """待写入的AI回复"""
+
+    conversation_id: int
+    user_id: int
+    content: str
+    tokens: int = 0
+    api_type: str = "chat"
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+
+@dataclass
+class _FlushResult:
+    """批量写入结果"""
+
+    message_ids: List[int]
+    # user_id -> (剩余配额, 使用百分比)
+    quota_levels: Dict[int, Tuple[int, float]]
+
+
+class ChatPersistenceWriter:
+    """
+    流式对话回复写入器
+
+    使用方式:
+        writer = ChatPersistenceWriter()
+        await writer.start()
+        writer.submit(ChatReply(conversation_id=1, user_id=1, content="你好"))
+        await writer.stop()
+    """
+
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        flush_interval_ms: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        """
+        初始化写入器
+
+        Args:
+            batch_size: 每个事务最多合并写入的回复数，默认从配置读取
+            flush_interval_ms: 凑批等待时间（毫秒），默认从配置读取
+            queue_size: 写入队列容量，默认从配置读取
+            session_factory: 数据库会话工厂
+        """
+        persistence_settings = settings.chat_persistence
+        self.batch_size = batch_size or persistence_settings.chat_write_behind_batch_size
+        self.flush_interval = (
+            persistence_settings.chat_write_behind_flush_interval_ms
+            if flush_interval_ms is None
+            else flush_interval_ms
+        ) / 1000
+        self.queue_size = queue_size or persistence_settings.chat_write_behind_queue_size
+        self.session_factory = session_factory
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._background: Set[asyncio.Task] = set()
+
+    @property
+    def running(self) -> bool:
+        """后台写入任务是否在运行"""
+        return self._writer_task is not None and not self._writer_task.done()
+
+    def pending(self) -> int:
+        """队列中等待写入的回复数"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """启动后台写入任务"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._writer_task = asyncio.create_task(self._run())
+        logger.info(
+            f"对话回复写入器已启动: batch_size={self.batch_size}, "
+            f"flush_interval={self.flush_interval}s"
+        )
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        停止写入器
+
+        写入队列中剩余的回复，并等待后台标题生成任务完成（超时后取消）。
+
+        Args:
+            timeout: 等待写入任务和后台标题生成任务的最长时间（秒）
+        """
+        if self._writer_task is not None:
+            # 通知写入任务写完当前批次后退出
+            await self._queue.put(_STOP)
+            try:
+                await asyncio.wait_for(asyncio.shield(self._writer_task), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("等待对话回复写入超时，取消写入任务")
+                self._writer_task.cancel()
+                await asyncio.gather(self._writer_task, return_exceptions=True)
+            self._writer_task = None
+
+        # 写入停止信号之后提交的回复
+        remaining: List[ChatReply] = []
+        while self._queue is not None and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                remaining.append(item)
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start : start + self.batch_size])
+        self._queue = None
+
+        background = list(self._background)
+        if background:
+            _, pending = await asyncio.wait(background, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        logger.info("对话回复写入器已停止")
+
+    # ------------------------------------------------------------------
+    # 提交
+    # ------------------------------------------------------------------
+
+    def submit(self, reply: ChatReply) -> bool:
+        """
+        提交回复到写入队列
+
+        Args:
+            reply: 待写入的回复
+
+        Returns:
+            bool: 已进入队列返回True；写入器未启动或队列已满返回False（调用方应使用persist）
+        """
+        if not self.running or self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait(reply)
+        except asyncio.QueueFull:
+            logger.warning("对话回复写入队列已满，改为同步写入")
+            return False
+        return True
+
+    async def persist(self, reply: ChatReply) -> int:
+        """
+        立即写入单条回复（在数据库线程池中执行）
+
+        Args:
+            reply: 待写入的回复
+
+        Returns:
+            int: 消息ID
+        """
+        result = await get_executors().run_db(self._write_batch, [reply])
+        self._notify(result)
+        return result.message_ids[0]
+
+    def schedule_title(
+        self, conversation_id: int, first_message: str, max_length: int = 20
+    ) -> asyncio.Task:
+        """
+        在后台根据首条消息生成对话标题
+
+        Args:
+            conversation_id: 对话ID
+            first_message: 首条用户消息
+            max_length: 标题最大长度
+
+        Returns:
+            asyncio.Task: 标题生成任务
+        """
+        task = asyncio.create_task(
+            self._generate_title(conversation_id, first_message, max_length)
+        )
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    # ------------------------------------------------------------------
+    # 后台写入
+    # ------------------------------------------------------------------
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    if timeout > 0:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    else:
+                        item = self._queue.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[ChatReply]) -> None:
+        start = time.perf_counter()
+        executors = get_executors()
+        try:
+            result = await executors.run_db(self._write_batch, batch)
+            self._notify(result)
+        except Exception as e:
+            logger.warning(f"批量写入对话回复失败，逐条重试: count={len(batch)}, error={str(e)}")
+            for reply in batch:
+                try:
+                    self._notify(await executors.run_db(self._write_batch, [reply]))
+                except Exception as item_error:
+                    logger.error(
+                        f"保存AI回复失败: conversation_id={reply.conversation_id}, "
+                        f"error={str(item_error)}"
+                    )
+                    await executors.run_db(self._invalidate_history, reply.conversation_id)
+        finally:
+            record_stage("chat.persist_batch", time.perf_counter() - start)
+
+    def _write_batch(self, batch: List[ChatReply]) -> _FlushResult:
+        """
+        在一个事务内写入一批回复（在数据库线程中执行）
+
+        配额不足的回复仍然保存，但不扣除配额、不记录API使用（与单条写入行为一致）。
+        """
+        db = self.session_factory()
+        try:
+            messages = [
+                Message(
+                    conversation_id=reply.conversation_id,
+                    role=MessageRole.ASSISTANT,
+                    content=reply.content,
+                    tokens=reply.tokens,
+                    created_at=reply.created_at,
+                )
+                for reply in batch
+            ]
+            db.add_all(messages)
+
+            # 更新对话的更新时间
+            touched_at = max(reply.created_at for reply in batch)
+            db.query(Conversation).filter(
+                Conversation.id.in_({reply.conversation_id for reply in batch})
+            ).update({Conversation.updated_at: touched_at}, synchronize_session=False)
+
+            # 按用户合并配额增量
+            quotas = self._load_quotas(db, {reply.user_id for reply in batch})
+            monthly = {user_id: quota.monthly_quota for user_id, quota in quotas.items()}
+            used = {user_id: quota.used_quota for user_id, quota in quotas.items()}
+            charged: Dict[int, int] = {}
+            for reply in batch:
+                if monthly[reply.user_id] - used[reply.user_id] < reply.tokens:
+                    logger.warning(f"用户 {reply.user_id} 配额不足，但已完成本次调用")
+                    continue
+                used[reply.user_id] += reply.tokens
+                charged[reply.user_id] = charged.get(reply.user_id, 0) + reply.tokens
+                db.add(
+                    APIUsage(
+                        user_id=reply.user_id,
+                        api_type=reply.api_type,
+                        tokens_used=reply.tokens,
+                        created_at=reply.created_at,
+                    )
+                )
+            for user_id, tokens in charged.items():
+                db.query(UserQuota).filter(UserQuota.user_id == user_id).update(
+                    {UserQuota.used_quota: UserQuota.used_quota + tokens},
+                    synchronize_session=False,
+                )
+
+            # 提交前读取消息ID，避免提交后逐条刷新
+            db.flush()
+            message_ids = [message.id for message in messages]
+            db.commit()
+
+            quota_service = QuotaService(db)
+            quota_levels = {}
+            for user_id, tokens in charged.items():
+                quota_service.increment_cached_usage(user_id, tokens)
+                remaining = max(0, monthly[user_id] - used[user_id])
+                percentage = (
+                    100.0
+                    if monthly[user_id] == 0
+                    else round(used[user_id] / monthly[user_id] * 100, 2)
+                )
+                quota_levels[user_id] = (remaining, percentage)
+
+            return _FlushResult(message_ids=message_ids, quota_levels=quota_levels)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _load_quotas(db: Session, user_ids: Set[int]) -> Dict[int, UserQuota]:
+        quotas = {
+            quota.user_id: quota
+            for quota in db.query(UserQuota).filter(UserQuota.user_id.in_(user_ids)).all()
+        }
+        missing = user_ids - quotas.keys()
+        if missing:
+            repo = QuotaRepository(db)
+            for user_id in missing:
+                quotas[user_id] = repo.get_or_create(
+                    user_id=user_id, monthly_quota=settings.quota.default_monthly_quota
+                )
+        return quotas
+
+    def _invalidate_history(self, conversation_id: int) -> None:
+        """写入失败时清除已提前追加回复的历史窗口缓存"""
+        db = self.session_factory()
+        try:
+            ConversationContextService(db).invalidate(conversation_id)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _notify(result: _FlushResult) -> None:
+        for user_id, (remaining, percentage) in result.quota_levels.items():
+            notify_quota_warning(user_id, remaining, percentage)
+
+    # ------------------------------------------------------------------
+    # 对话标题
+    # ------------------------------------------------------------------
+
+    def _update_title(self, conversation_id: int, title: str) -> None:
+        db = self.session_factory()
+        try:
+            ConversationService(db).update_conversation_title(
+                conversation_id=conversation_id, title=title
+            )
+        finally:
+            db.close()
+
+    async def _generate_title(
+        self, conversation_id: int, first_message: str, max_length: int
+    ) -> None:
+        db = self.session_factory()
+        try:
+            title = await ConversationService(db).generate_title(
+                first_message=first_message, max_length=max_length
+            )
+        finally:
+            db.close()
+
+        try:
+            await get_executors().run_db(self._update_title, conversation_id, title)
+            logger.info(f"自动生成对话标题: {title}")
+        except Exception as e:
+            logger.error(f"自动生成标题失败: {str(e)}")
+
+
+# 全局写入器实例
+_writer: Optional[ChatPersistenceWriter] = None
+
+
+def get_chat_persistence_writer() -> ChatPersistenceWriter:
+    """
+    获取全局对话回复写入器（未启动时submit返回False，调用方同步写入）
+
+    Returns:
+        ChatPersistenceWriter: 写入器实例
+    """
+    global _writer
+    if _writer is None:
+        _writer = ChatPersistenceWriter()
+    return _writer
+
+
+def reset_chat_persistence_writer() -> None:
+    """重置全局写入器（用于测试）"""
+    global _writer
+    _writer = None
+
+
+# 导出
+__all__ = [
+    "ChatReply",
+    "ChatPersistenceWriter",
+    "get_chat_persistence_writer",
+    "reset_chat_persistence_writer",
+]
@@ -1,15 +1,20 @@
 """
 清理定时任务模块
 
-实现系统数据清理功能，包括清理旧登录记录、临时文件和处理账号注销。
+实现系统数据清理功能，包括清理旧登录记录、临时文件、处理账号注销，
+以及删除孤立的知识库向量集合/上传目录并压缩墓碑较多的向量集合。
 使用APScheduler配置定时任务，在每天凌晨执行。
 
+删除知识库时，向量集合和上传文件由 purge_knowledge_base_data 在响应返回后批量删除。
+
 需求引用:
     - 需求8.5: 清理旧登录记录任务
 """
 
+import asyncio
 import logging
 import os
+import re
 import shutil
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -20,12 +25,21 @@ from sqlalchemy.orm import Session
 
 from app.config import settings
 from app.core.database import SessionLocal
+from app.core.text_artifact import remove_text_artifact
+from app.models.document_job import DocumentJob, DocumentJobStatus
+from app.models.knowledge_base import KnowledgeBase
 from app.models.login_attempt import LoginAttempt
 from app.models.user import User
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# 知识库上传目录名（upload_dir/kb_{id}）
+_KB_DIRECTORY_RE = re.compile(r"^kb_(\d+)$")
+
+# 知识库删除时每批删除的文件数
+_FILE_DELETE_BATCH_SIZE = 200
+
 
 def cleanup_old_login_attempts(days_to_keep: int = 30) -> dict:
     """
@@ -356,6 +370,304 @@ def cleanup_old_api_usage(days_to_keep: int = 90) -> dict:
             db.close()
 
 
+def _remove_files(file_paths: List[str]) -> int:
+    """删除一批文档文件及其提取文本缓存，返回删除的文件数"""
+    removed = 0
+    for file_path in file_paths:
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+                removed += 1
+        except OSError as e:
+            logger.warning(f"删除文件失败: {file_path}, error={str(e)}")
+        remove_text_artifact(file_path)
+    return removed
+
+
+def _remove_directory(path: str) -> bool:
+    """删除目录树，目录不存在时返回False"""
+    if not os.path.isdir(path):
+        return False
+    shutil.rmtree(path)
+    return True
+
+
+async def purge_knowledge_base_data(
+    kb_id: int,
+    file_paths: Optional[List[str]] = None,
+    batch_size: int = _FILE_DELETE_BATCH_SIZE,
+) -> dict:
+    """
+    删除知识库的向量数据和上传文件
+
+    知识库数据库记录删除后作为FastAPI后台任务执行，不阻塞删除请求：
+    - 向量集合（含压缩留下的各代集合）整体删除，不逐文档按条件删除
+    - 稀疏索引文件（稀疏检索已停用时遗留的文件也一并删除）
+    - 分块向量存储中只被该知识库引用的向量
+    - 上传目录 upload_dir/kb_{id}（含提取文本缓存）整体删除
+    - 不在上传目录下的文档文件按批在I/O线程池中并发删除
+
+    删除失败留下的孤立集合和上传目录由每日的 compact_vector_collections 回收。
+
+    Args:
+        kb_id: 知识库ID
+        file_paths: 知识库文档的文件路径
+        batch_size: 每批删除的文件数
+
+    Returns:
+        dict: 包含执行结果的字典
+            - success: 是否成功
+            - vector_deleted: 向量集合是否删除
+            - sparse_index_deleted: 稀疏索引文件是否已删除
+            - chunk_embeddings_deleted: 分块向量存储中删除的向量数
+            - directory_deleted: 上传目录是否删除
+            - deleted_files: 上传目录外删除的文件数
+            - timestamp: 执行时间
+
+    使用方式:
+        background_tasks.add_task(purge_knowledge_base_data, kb_id, file_paths)
+    """
+    from app.core.chunk_embedding_store import get_chunk_embedding_store
+    from app.core.executors import get_executors
+    from app.core.sparse_index import (SparseIndexStore, default_index_directory,
+                                       get_sparse_index_store)
+    from app.core.vector_store import get_vector_store_manager
+
+    start_time = datetime.utcnow()
+    executors = get_executors()
+    result = {
+        "success": True,
+        "kb_id": kb_id,
+        "sparse_index_deleted": False,
+        "chunk_embeddings_deleted": 0,
+    }
+
+    try:
+        result["vector_deleted"] = await executors.run_io(
+            get_vector_store_manager().delete_collection, kb_id
+        )
+    except Exception as e:
+        logger.error(f"删除知识库向量集合失败: kb_id={kb_id}, error={str(e)}")
+        result.update(success=False, vector_deleted=False, error=str(e))
+    else:
+        if not result["vector_deleted"]:
+            logger.error(f"删除知识库向量集合失败: kb_id={kb_id}")
+            result.update(success=False, error="向量集合删除失败")
+
+    # delete_collection失败时可能未执行到稀疏索引删除，这里单独删除一次
+    sparse_store = get_sparse_index_store() or SparseIndexStore(default_index_directory())
+    try:
+        await executors.run_io(sparse_store.delete_knowledge_base, kb_id)
+        result["sparse_index_deleted"] = True
+    except OSError as e:
+        logger.error(f"删除知识库稀疏索引失败: kb_id={kb_id}, error={str(e)}")
+        result.update(success=False, error=str(e))
+
+    chunk_store = get_chunk_embedding_store()
+    if chunk_store is not None:
+        try:
+            result["chunk_embeddings_deleted"] = await executors.run_io(
+                chunk_store.delete_knowledge_base, kb_id
+            )
+        except Exception as e:
+            logger.error(f"删除知识库分块向量失败: kb_id={kb_id}, error={str(e)}")
+            result.update(success=False, error=str(e))
+
+    kb_dir = os.path.abspath(os.path.join(settings.file_storage.upload_dir, f"kb_{kb_id}"))
+    try:
+        result["directory_deleted"] = await executors.run_io(_remove_directory, kb_dir)
+    except OSError as e:
+        logger.error(f"删除知识库上传目录失败: {kb_dir}, error={str(e)}")
+        result.update(success=False, directory_deleted=False, error=str(e))
+
+    # 上传目录已整体删除时只需处理目录外的文件
+    removed_prefix = kb_dir + os.sep if result["directory_deleted"] else None
+    outside = [
+        path
+        for path in file_paths or []
+        if removed_prefix is None or not os.path.abspath(path).startswith(removed_prefix)
+    ]
+    batches = [outside[i : i + batch_size] for i in range(0, len(outside), batch_size)]
+    deleted = await asyncio.gather(
+        *(executors.run_io(_remove_files, batch) for batch in batches)
+    )
+    result["deleted_files"] = sum(deleted)
+
+    end_time = datetime.utcnow()
+    result["timestamp"] = end_time.isoformat()
+    result["duration_seconds"] = (end_time - start_time).total_seconds()
+    logger.info(
+        f"知识库数据删除完成: kb_id={kb_id}, 向量集合={result['vector_deleted']}, "
+        f"上传目录={result['directory_deleted']}, 其他文件={result['deleted_files']}, "
+        f"耗时 {result['duration_seconds']:.2f} 秒"
+    )
+    return result
+
+
+def compact_vector_collections(
+    min_tombstone_ratio: Optional[float] = None,
+    min_tombstones: Optional[int] = None,
+) -> dict:
+    """
+    回收向量库空间
+
+    1. 删除知识库已不存在的向量集合和上传目录（后台删除失败、账号注销级联删除知识库等情况）
+    2. 压缩墓碑行占比和数量均达到阈值的集合（按文档删除向量只打墓碑）；
+       numpy模式在线压缩并原子切换，Chroma集合重建到新集合后切换集合别名。
+       有排队或处理中文档任务的知识库本轮跳过，避免重建期间的写入导致校验失败
+
+    Args:
+        min_tombstone_ratio: 触发压缩的墓碑行占比，默认从配置读取
+        min_tombstones: 触发压缩的最少墓碑行数，默认从配置读取
+
+    Returns:
+        dict: 包含执行结果的字典
+            - success: 是否成功
+            - orphaned_collections: 删除的孤立集合对应的知识库ID
+            - orphaned_directories: 删除的孤立上传目录对应的知识库ID
+            - compacted: 压缩的集合数
+            - busy: 因有文档任务而跳过的集合数
+            - reclaimed_rows: 回收的墓碑行数
+            - reclaimed_mb: 回收的磁盘空间（MB，仅统计numpy集合）
+            - message: 执行消息
+            - timestamp: 执行时间
+
+    使用方式:
+        # 手动执行
+        result = compact_vector_collections(min_tombstone_ratio=0.1)
+
+        # 由run_all_cleanup_tasks每天凌晨调用
+    """
+    db: Optional[Session] = None
+    start_time = datetime.utcnow()
+
+    if not settings.vector_db.vector_compaction_enabled:
+        return {
+            "success": True,
+            "message": "向量集合压缩已禁用",
+            "timestamp": start_time.isoformat(),
+        }
+
+    try:
+        from app.core.vector_store import get_vector_store_manager
+
+        logger.info("开始回收向量库空间")
+        manager = get_vector_store_manager()
+
+        # 先列出集合和上传目录再查询知识库：集合/目录只在知识库创建后生成，
+        # 查询时不存在的知识库不会是列出之后新建的
+        collection_kb_ids = manager.list_knowledge_base_ids()
+        upload_dir = settings.file_storage.upload_dir
+        directory_kb_ids = []
+        if os.path.isdir(upload_dir):
+            for name in os.listdir(upload_dir):
+                match = _KB_DIRECTORY_RE.match(name)
+                if match and os.path.isdir(os.path.join(upload_dir, name)):
+                    directory_kb_ids.append(int(match.group(1)))
+
+        db = SessionLocal()
+        candidates = set(collection_kb_ids) | set(directory_kb_ids)
+        existing = set()
+        candidate_list = sorted(candidates)
+        for i in range(0, len(candidate_list), 500):
+            part = candidate_list[i : i + 500]
+            existing.update(
+                kb_id
+                for (kb_id,) in db.query(KnowledgeBase.id).filter(KnowledgeBase.id.in_(part))
+            )
+        busy = {
+            kb_id
+            for (kb_id,) in db.query(DocumentJob.knowledge_base_id)
+            .filter(
+                DocumentJob.status.in_([DocumentJobStatus.QUEUED, DocumentJobStatus.RUNNING])
+            )
+            .distinct()
+        }
+        db.close()
+        db = None
+
+        orphaned_collections = []
+        for kb_id in collection_kb_ids:
+            if kb_id not in existing and manager.delete_collection(kb_id):
+                orphaned_collections.append(kb_id)
+
+        orphaned_directories = []
+        for kb_id in directory_kb_ids:
+            if kb_id in existing:
+                continue
+            try:
+                shutil.rmtree(os.path.join(upload_dir, f"kb_{kb_id}"))
+                orphaned_directories.append(kb_id)
+            except OSError as e:
+                logger.warning(f"删除孤立上传目录失败: kb_id={kb_id}, error={str(e)}")
+
+        status_counts = {"compacted": 0, "skipped": 0, "busy": 0, "failed": 0}
+        reclaimed_rows = 0
+        reclaimed_bytes = 0
+        for kb_id in collection_kb_ids:
+            if kb_id not in existing:
+                continue
+            if kb_id in busy:
+                status_counts["busy"] += 1
+                continue
+            try:
+                result = manager.compact_collection(kb_id, min_tombstone_ratio, min_tombstones)
+            except Exception as e:
+                status_counts["failed"] += 1
+                logger.warning(f"压缩向量集合失败: kb_id={kb_id}, error={str(e)}")
+                continue
+            status_counts[result["status"]] += 1
+            if result["status"] == "compacted":
+                reclaimed_rows += result["reclaimed"]
+                # Chroma集合重建不统计磁盘占用
+                reclaimed_bytes += result.get("disk_bytes_before", 0) - result.get(
+                    "disk_bytes_after", 0
+                )
+
+        end_time = datetime.utcnow()
+        duration = (end_time - start_time).total_seconds()
+        reclaimed_mb = reclaimed_bytes / (1024 * 1024)
+
+        logger.info(
+            f"向量库空间回收完成: 孤立集合 {len(orphaned_collections)} 个, "
+            f"孤立上传目录 {len(orphaned_directories)} 个, "
+            f"压缩 {status_counts['compacted']} 个集合, 回收 {reclaimed_rows} 行/"
+            f"{reclaimed_mb:.2f} MB, 有文档任务跳过 {status_counts['busy']} 个, "
+            f"耗时 {duration:.2f} 秒"
+        )
+
+        return {
+            "success": status_counts["failed"] == 0,
+            "orphaned_collections": orphaned_collections,
+            "orphaned_directories": orphaned_directories,
+            **status_counts,
+            "reclaimed_rows": reclaimed_rows,
+            "reclaimed_mb": round(reclaimed_mb, 2),
+            "message": (
+                f"删除 {len(orphaned_collections)} 个孤立集合，"
+                f"压缩 {status_counts['compacted']} 个集合"
+            ),
+            "timestamp": end_time.isoformat(),
+            "duration_seconds": duration,
+        }
+
+    except Exception as e:
+        logger.error(f"向量库空间回收任务失败: {str(e)}", exc_info=True)
+
+        return {
+            "success": False,
+            "compacted": 0,
+            "message": f"回收失败: {str(e)}",
+            "timestamp": datetime.utcnow().isoformat(),
+            "error": str(e),
+        }
+
+    finally:
+        # 关闭数据库会话
+        if db:
+            db.close()
+
+
 def run_all_cleanup_tasks() -> dict:
     """
     运行所有清理任务
@@ -415,6 +727,14 @@ def run_all_cleanup_tasks() -> dict:
         logger.error(f"处理账号删除请求失败: {str(e)}")
         results["tasks"]["account_deletions"] = {"success": False, "error": str(e)}
 
+    # 回收向量库空间（账号删除后执行，同一轮即可回收级联删除的知识库数据）
+    try:
+        compaction_result = compact_vector_collections()
+        results["tasks"]["vector_compaction"] = compaction_result
+    except Exception as e:
+        logger.error(f"回收向量库空间失败: {str(e)}")
+        results["tasks"]["vector_compaction"] = {"success": False, "error": str(e)}
+
     end_time = datetime.utcnow()
     duration = (end_time - start_time).total_seconds()
 
@@ -575,4 +895,6 @@ __all__ = [
     "cleanup_old_api_usage",
     "run_all_cleanup_tasks",
     "process_account_deletions",
+    "purge_knowledge_base_data",
+    "compact_vector_collections",
 ]
@@ -8,6 +8,10 @@
 - 存储到向量数据库
 - 更新文档状态和进度
 
+文档以流式方式处理：解析线程（或worker的解析进程）逐页加载、分块，
+按嵌入批大小通过有界队列交给事件循环向量化，内存占用与批大小相关，
+与文档大小无关。
+
 需求引用:
     - 需求3.3: 用户上传文档且文件类型为PDF、Word、TXT或Markdown
     - 需求3.4: 文档上传完成，异步提取文本内容并使用RecursiveCharacterTextSplitter进行分块处理
@@ -17,34 +21,200 @@
 
 import asyncio
 import logging
-from concurrent.futures import ThreadPoolExecutor
-from typing import Any, Callable, Optional
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Optional
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document as LangchainDocument
 from sqlalchemy.orm import Session
 
 from app.config import settings
+from app.core.answer_cache import invalidate_answer_cache
+from app.core.chunk_embedding_store import get_chunk_embedding_store
 from app.core.database import SessionLocal
+from app.core.executors import get_executors
+from app.core.sparse_index import get_sparse_index_store
+from app.core.text_artifact import TextArtifactWriter, artifact_path_for
+from app.core.tracing import trace_stage, traced
 from app.core.vector_store import get_vector_store_manager
 from app.langchain_integration.document_loaders import (
     DocumentLoaderFactory, DocumentProcessingError)
 from app.models.document import Document, DocumentStatus
 from app.repositories.document_repository import DocumentRepository
+from app.tasks.embedding_pipeline import BatchEmbeddingPipeline
 from app.websocket.connection_manager import connection_manager
 
 logger = logging.getLogger(__name__)
 
 
+def build_text_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    """
+    创建文本分块器
+
+    Args:
+        chunk_size: 分块大小
+        chunk_overlap: 分块重叠大小
+
+    Returns:
+        RecursiveCharacterTextSplitter: 文本分块器
+    """
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", "。", "！", "？", ".", "!", "?", " ", ""],
+    )
+
+
+# 解析方最多领先向量化的批次数
+STREAM_MAX_PENDING_BATCHES = 2
+
+# 解析方写入队列/向量化方读取队列的等待超时（秒），超时后检查对方是否已停止
+_STREAM_QUEUE_TIMEOUT = 0.5
+
+
+@dataclass
+class ChunkStreamSpec:
+    """流式解析分块参数（可序列化后传给解析进程）"""
+
+    file_path: str
+    file_type: str
+    document_id: int
+    knowledge_base_id: int
+    filename: str
+    chunk_size: int
+    chunk_overlap: int
+    batch_size: int
+    artifact_path: Optional[str] = None
+
+
+def produce_document_chunks(spec: ChunkStreamSpec, out_queue: Any, stop_event: Any) -> None:
+    """
+    逐页加载并分块，按批放入队列（模块级函数，可提交到进程池执行）
+
+    队列消息：
+        ("batch", 分块列表, 已解析页数, 总页数或None)
+        ("done", 已解析页数, 分块总数)
+        ("error", 异常)
+
+    队列已满时阻塞等待，stop_event被设置后放弃剩余内容并退出。
+    同时将提取出的文本写入提取文本缓存。
+
+    Args:
+        spec: 解析分块参数
+        out_queue: 有界队列（线程模式为queue.Queue，进程模式为Manager队列）
+        stop_event: 停止事件
+    """
+
+    def _put(message: tuple) -> bool:
+        while not stop_event.is_set():
+            try:
+                out_queue.put(message, timeout=_STREAM_QUEUE_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    writer: Optional[TextArtifactWriter] = None
+    try:
+        if spec.artifact_path:
+            try:
+                writer = TextArtifactWriter(spec.artifact_path)
+            except OSError as e:
+                logger.warning(f"创建提取文本缓存失败: path={spec.artifact_path}, error={str(e)}")
+
+        text_splitter = build_text_splitter(spec.chunk_size, spec.chunk_overlap)
+        total_pages = DocumentLoaderFactory.count_pages(spec.file_path, spec.file_type)
+        pages = 0
+        chunk_count = 0
+        batch: list[LangchainDocument] = []
+
+        for page in DocumentLoaderFactory.iter_document(
+            spec.file_path, spec.file_type, spec.document_id, spec.knowledge_base_id
+        ):
+            # 连续文本段之间没有分隔符，页面之间以换行分隔（与预览的拼接方式一致）
+            continued = page.metadata.pop("segment", 0) > 0
+            if writer is not None:
+                writer.write(page.page_content if continued or pages == 0 else "\n" + page.page_content)
+            pages += 1
+
+            for chunk in text_splitter.split_documents([page]):
+                chunk.metadata["chunk_index"] = chunk_count
+                chunk.metadata["document_id"] = spec.document_id
+                chunk.metadata["knowledge_base_id"] = spec.knowledge_base_id
+                chunk.metadata["source"] = spec.filename
+                chunk_count += 1
+                batch.append(chunk)
+                if len(batch) >= spec.batch_size:
+                    if not _put(("batch", batch, pages, total_pages)):
+                        return
+                    batch = []
+
+        if batch and not _put(("batch", batch, pages, total_pages)):
+            return
+
+        if writer is not None:
+            try:
+                writer.commit()
+            except OSError as e:
+                logger.warning(f"保存提取文本缓存失败: path={spec.artifact_path}, error={str(e)}")
+            writer = None
+
+        _put(("done", pages, chunk_count))
+    except Exception as e:
+        try:
+            _put(("error", e))
+        except Exception:
+            # 异常对象无法序列化时（进程模式）改为传递消息文本
+            _put(("error", DocumentProcessingError(str(e))))
+    finally:
+        if writer is not None:
+            writer.abort()
+
+
+# 进程模式下解析进程与事件循环之间的队列由Manager提供
+_stream_manager = None
+_stream_manager_lock = threading.Lock()
+
+
+def get_stream_manager():
+    """
+    获取流式解析使用的Manager（首次使用时启动）
+
+    Returns:
+        SyncManager: Manager实例
+    """
+    global _stream_manager
+
+    if _stream_manager is None:
+        with _stream_manager_lock:
+            if _stream_manager is None:
+                _stream_manager = multiprocessing.get_context("spawn").Manager()
+    return _stream_manager
+
+
+def shutdown_stream_manager() -> None:
+    """关闭流式解析使用的Manager"""
+    global _stream_manager
+
+    with _stream_manager_lock:
+        if _stream_manager is not None:
+            _stream_manager.shutdown()
+            _stream_manager = None
+
+
 class DocumentProcessingTask:
     """
     文档处理任务类
 
     封装文档处理的完整流程：
-    1. 加载文档
-    2. 文本分块
-    3. 向量化并存储
-    4. 更新状态
+    1. 逐页加载文档并分块（在解析线程或解析进程中执行）
+    2. 分块按批向量化并存储（与解析同时进行）
+    3. 更新状态
 
     使用方式:
         task = DocumentProcessingTask(document_id=1)
@@ -60,6 +230,7 @@ class DocumentProcessingTask:
         chunk_size: Optional[int] = None,
         chunk_overlap: Optional[int] = None,
         progress_callback: Optional[Callable[[int, str], Any]] = None,
+        parse_executor: Optional[Executor] = None,
     ):
         """
         初始化文档处理任务
@@ -69,19 +240,18 @@ class DocumentProcessingTask:
             chunk_size: 分块大小，默认从配置读取
             chunk_overlap: 分块重叠大小，默认从配置读取
             progress_callback: 进度回调函数，接收(progress, status)参数
+            parse_executor: 执行文档解析和分块的执行器（如worker的进程池），
+                不传则在共享的流式解析线程池中执行
         """
         self.document_id = document_id
         self.chunk_size = chunk_size or settings.document_processing.chunk_size
         self.chunk_overlap = chunk_overlap or settings.document_processing.chunk_overlap
         self.progress_callback = progress_callback
+        self.parse_executor = parse_executor
 
-        # 文本分块器
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", "。", "！", "？", ".", "!", "?", " ", ""],
-        )
+        # 流式解析进度
+        self._pages_read = 0
+        self._total_pages: Optional[int] = None
 
         # 向量存储管理器
         self.vector_store_manager = get_vector_store_manager()
@@ -137,6 +307,10 @@ class DocumentProcessingTask:
         Returns:
             bool: 处理是否成功
         """
+        with traced(f"document-{self.document_id}"):
+            return await self._process()
+
+    async def _process(self) -> bool:
         db = self._get_db_session()
 
         try:
@@ -157,32 +331,17 @@ class DocumentProcessingTask:
             repo.update_status(self.document_id, DocumentStatus.PROCESSING)
             await self._update_progress(10, "开始处理")
 
-            # 步骤1: 加载文档
-            await self._update_progress(20, "加载文档")
-            langchain_docs = await self._load_document(document)
-
-            if not langchain_docs:
-                raise DocumentProcessingError("文档加载失败：未提取到任何内容")
-
-            await self._update_progress(40, "文档加载完成")
-
-            # 步骤2: 文本分块
-            await self._update_progress(50, "文本分块")
-            chunks = await self._split_documents(langchain_docs, document)
-
-            if not chunks:
-                raise DocumentProcessingError("文档分块失败：未生成任何分块")
-
-            await self._update_progress(60, f"分块完成，共{len(chunks)}个分块")
-
-            # 步骤3: 向量化并存储
-            await self._update_progress(70, "向量化存储")
-            await self._store_vectors(chunks, document)
+            # 步骤1: 逐页解析、分块并向量化存储
+            await self._update_progress(20, "解析文档并向量化")
+            with trace_stage("document.ingest"):
+                chunk_count = await self._ingest(document)
 
             await self._update_progress(90, "向量存储完成")
 
-            # 步骤4: 更新文档状态为完成
-            repo.mark_completed(self.document_id, len(chunks))
+            # 步骤2: 更新文档状态为完成
+            with trace_stage("document.persist"):
+                repo.mark_completed(self.document_id, chunk_count)
+            invalidate_answer_cache([document.knowledge_base_id])
             await self._update_progress(100, "处理完成")
 
             # 通过WebSocket通知文档处理完成
@@ -196,7 +355,7 @@ class DocumentProcessingTask:
                             "data": {
                                 "document_id": document.id,
                                 "filename": document.filename,
-                                "chunk_count": len(chunks),
+                                "chunk_count": chunk_count,
                                 "status": "completed",
                                 "timestamp": asyncio.get_event_loop().time(),
                             },
@@ -207,7 +366,7 @@ class DocumentProcessingTask:
 
             logger.info(
                 f"文档处理完成: id={document.id}, "
-                f"filename={document.filename}, chunks={len(chunks)}"
+                f"filename={document.filename}, chunks={chunk_count}"
             )
 
             return True
@@ -220,8 +379,12 @@ class DocumentProcessingTask:
                 repo = DocumentRepository(db)
                 repo.mark_failed(self.document_id, str(e))
 
-                # 通过WebSocket通知文档处理失败
+                # 处理失败前可能已写入部分向量
                 document = repo.get_by_id(self.document_id)
+                if document:
+                    invalidate_answer_cache([document.knowledge_base_id])
+
+                # 通过WebSocket通知文档处理失败
                 if document and document.knowledge_base:
                     user_id = document.knowledge_base.user_id
                     await connection_manager.send_personal_message(
@@ -245,90 +408,157 @@ class DocumentProcessingTask:
         finally:
             db.close()
 
-    async def _load_document(self, document: Document) -> list[LangchainDocument]:
-        """
-        加载文档
-
-        Args:
-            document: 文档数据库记录
-
-        Returns:
-            list[LangchainDocument]: LangChain文档对象列表
-        """
-        logger.debug(f"加载文档: path={document.file_path}, type={document.file_type}")
-
-        # 使用异步加载
-        docs = await DocumentLoaderFactory.load_document_async(
+    def _build_stream_spec(self, document: Document, batch_size: int) -> ChunkStreamSpec:
+        artifact_path = None
+        if settings.file_storage.extracted_text_cache_enabled:
+            artifact_path = artifact_path_for(document.file_path)
+        return ChunkStreamSpec(
             file_path=document.file_path,
             file_type=document.file_type,
             document_id=document.id,
             knowledge_base_id=document.knowledge_base_id,
+            filename=document.filename,
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            batch_size=batch_size,
+            artifact_path=artifact_path,
         )
 
-        logger.debug(f"文档加载完成: pages={len(docs)}")
-        return docs
-
-    async def _split_documents(
-        self,
-        documents: list[LangchainDocument],
-        document: Document,
-    ) -> list[LangchainDocument]:
+    async def _iter_chunks(self, spec: ChunkStreamSpec) -> AsyncIterator[LangchainDocument]:
         """
-        文本分块
+        流式解析分块
+
+        解析方在parse_executor（未设置时为共享的流式解析线程池）中运行，
+        最多领先 STREAM_MAX_PENDING_BATCHES 批；迭代结束或中止时通知解析方停止。
 
         Args:
-            documents: LangChain文档对象列表
-            document: 文档数据库记录
+            spec: 解析分块参数
 
-        Returns:
-            list[LangchainDocument]: 分块后的文档列表
+        Yields:
+            LangchainDocument: 分块
         """
-        logger.debug(
-            f"开始文本分块: chunk_size={self.chunk_size}, overlap={self.chunk_overlap}"
+        executors = get_executors()
+        if isinstance(self.parse_executor, ProcessPoolExecutor):
+            manager = await executors.run_io(get_stream_manager)
+            out_queue = manager.Queue(maxsize=STREAM_MAX_PENDING_BATCHES)
+            stop_event = manager.Event()
+        else:
+            out_queue = queue.Queue(maxsize=STREAM_MAX_PENDING_BATCHES)
+            stop_event = threading.Event()
+
+        loop = asyncio.get_running_loop()
+        producer = loop.run_in_executor(
+            self.parse_executor or executors.stream,
+            produce_document_chunks,
+            spec,
+            out_queue,
+            stop_event,
         )
 
-        # 在线程池中执行分块（避免阻塞事件循环）
-        loop = asyncio.get_event_loop()
-
-        with ThreadPoolExecutor() as executor:
-            chunks = await loop.run_in_executor(
-                executor, lambda: self.text_splitter.split_documents(documents)
-            )
-
-        # 为每个分块添加元数据
-        for i, chunk in enumerate(chunks):
-            chunk.metadata["chunk_index"] = i
-            chunk.metadata["document_id"] = document.id
-            chunk.metadata["knowledge_base_id"] = document.knowledge_base_id
-            chunk.metadata["source"] = document.filename
-
-        logger.debug(f"文本分块完成: chunks={len(chunks)}")
-        return chunks
+        try:
+            while True:
+                try:
+                    message = await executors.run_io(
+                        out_queue.get, True, _STREAM_QUEUE_TIMEOUT
+                    )
+                except queue.Empty:
+                    if producer.done():
+                        producer.result()
+                        raise DocumentProcessingError("文档解析意外中止")
+                    continue
+
+                kind = message[0]
+                if kind == "batch":
+                    _, chunks, self._pages_read, self._total_pages = message
+                    for chunk in chunks:
+                        yield chunk
+                elif kind == "done":
+                    self._pages_read = message[1]
+                    return
+                else:
+                    raise message[1]
+        finally:
+            stop_event.set()
+            await asyncio.wait([producer], timeout=_STREAM_QUEUE_TIMEOUT * 4)
+            if producer.done() and not producer.cancelled():
+                producer.exception()
+
+    @staticmethod
+    def _get_sparse_index(knowledge_base_id: int):
+        """获取知识库的稀疏倒排索引，未启用或打开失败时返回None"""
+        store = get_sparse_index_store()
+        if store is None:
+            return None
+        try:
+            return store.get(knowledge_base_id)
+        except Exception as e:
+            logger.warning(f"打开稀疏索引失败: kb_id={knowledge_base_id}, error={str(e)}")
+            return None
 
-    async def _store_vectors(
-        self,
-        chunks: list[LangchainDocument],
-        document: Document,
-    ) -> None:
+    async def _ingest(self, document: Document) -> int:
         """
-        向量化并存储到向量数据库
+        流式解析、分块并向量化存储
+
+        进度在20%~90%之间推进：可预知页数（PDF）时按已解析页数计算，
+        否则每若干批推送一次已完成的分块数。已向量化过的分块（重试、
+        重复上传）直接复用分块向量存储中的向量。
 
         Args:
-            chunks: 分块后的文档列表
             document: 文档数据库记录
+
+        Returns:
+            int: 分块数量
         """
         logger.debug(
-            f"开始向量化存储: kb_id={document.knowledge_base_id}, chunks={len(chunks)}"
+            f"开始流式处理: kb_id={document.knowledge_base_id}, "
+            f"chunk_size={self.chunk_size}, overlap={self.chunk_overlap}"
         )
 
-        # 使用向量存储管理器添加文档
-        await self.vector_store_manager.add_documents(
+        last_reported = 20
+        batches_done = 0
+
+        async def _on_batch_done(completed: int, total: Optional[int]) -> None:
+            nonlocal last_reported, batches_done
+            batches_done += 1
+            if self._total_pages:
+                progress = 20 + int(70 * self._pages_read / self._total_pages)
+                # 仅在进度百分比变化时通知，避免每批都访问数据库和推送WebSocket
+                if progress > last_reported and progress < 90:
+                    last_reported = progress
+                    await self._update_progress(
+                        progress,
+                        f"向量化存储 第{self._pages_read}/{self._total_pages}页，{completed}个分块",
+                    )
+            elif batches_done % 10 == 0:
+                await self._update_progress(last_reported, f"向量化存储 {completed}个分块")
+
+        pipeline = BatchEmbeddingPipeline(
+            vector_store_manager=self.vector_store_manager,
             knowledge_base_id=document.knowledge_base_id,
-            documents=chunks,
             document_id=document.id,
+            progress_callback=_on_batch_done,
+            chunk_store=get_chunk_embedding_store(),
+            sparse_index=self._get_sparse_index(document.knowledge_base_id),
         )
 
-        logger.debug(f"向量化存储完成")
+        self._pages_read = 0
+        self._total_pages = None
+        chunks = self._iter_chunks(self._build_stream_spec(document, pipeline.batch_size))
+        try:
+            stored = await pipeline.run(chunks)
+        finally:
+            await chunks.aclose()
+
+        if self._pages_read == 0:
+            raise DocumentProcessingError("文档加载失败：未提取到任何内容")
+        if stored == 0:
+            raise DocumentProcessingError("文档分块失败：未生成任何分块")
+
+        logger.debug(
+            f"流式处理完成: pages={self._pages_read}, chunks={stored}, "
+            f"reused={pipeline.reused_count}"
+        )
+        return stored
 
 
 async def process_document_task(
@@ -336,6 +566,7 @@ async def process_document_task(
     chunk_size: Optional[int] = None,
     chunk_overlap: Optional[int] = None,
     progress_callback: Optional[Callable[[int, str], Any]] = None,
+    parse_executor: Optional[Executor] = None,
 ) -> bool:
     """
     处理文档的便捷函数
@@ -345,6 +576,7 @@ async def process_document_task(
         chunk_size: 分块大小
         chunk_overlap: 分块重叠大小
         progress_callback: 进度回调函数
+        parse_executor: 执行文档解析和分块的执行器
 
     Returns:
         bool: 处理是否成功
@@ -354,6 +586,7 @@ async def process_document_task(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
         progress_callback=progress_callback,
+        parse_executor=parse_executor,
     )
     return await task.process()
 
@@ -429,25 +662,21 @@ class DocumentProcessingQueue:
 
         self._processing = True
         results = {"success": 0, "failed": 0, "total": 0}
+        semaphore = asyncio.Semaphore(self.max_workers)
 
         try:
             tasks = []
 
+            # 任一文档处理完成即开始下一个，而不是按批等待整批结束
             while not self._queue.empty():
                 document_id = await self._queue.get()
                 results["total"] += 1
-
-                task = asyncio.create_task(
-                    self._process_with_semaphore(document_id, results)
+                tasks.append(
+                    asyncio.create_task(
+                        self._process_with_semaphore(document_id, results, semaphore)
+                    )
                 )
-                tasks.append(task)
-
-                # 限制并发数
-                if len(tasks) >= self.max_workers:
-                    await asyncio.gather(*tasks)
-                    tasks = []
 
-            # 处理剩余任务
             if tasks:
                 await asyncio.gather(*tasks)
 
@@ -460,6 +689,7 @@ class DocumentProcessingQueue:
         self,
         document_id: int,
         results: dict,
+        semaphore: asyncio.Semaphore,
     ) -> None:
         """
         使用信号量限制并发处理
@@ -467,9 +697,11 @@ class DocumentProcessingQueue:
         Args:
             document_id: 文档ID
             results: 结果统计字典
+            semaphore: 并发信号量
         """
         try:
-            success = await process_document_task(document_id)
+            async with semaphore:
+                success = await process_document_task(document_id)
             if success:
                 results["success"] += 1
             else:
@@ -503,6 +735,12 @@ def get_document_queue(max_workers: int = 3) -> DocumentProcessingQueue:
 
 # 导出
 __all__ = [
+    "ChunkStreamSpec",
+    "STREAM_MAX_PENDING_BATCHES",
+    "build_text_splitter",
+    "get_stream_manager",
+    "produce_document_chunks",
+    "shutdown_stream_manager",
     "DocumentProcessingTask",
     "DocumentProcessingQueue",
     "process_document_task",
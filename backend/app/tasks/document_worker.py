@@ -0,0 +1,344 @@
+"""
+文档处理worker模块
+
+从持久化任务表（document_jobs）领取文档处理任务并执行：
+- 全局并发受 document_worker_concurrency 限制（单个worker进程）
+- 单个知识库并发受 document_worker_per_kb_concurrency 限制（全部worker合计）
+- 文档解析和分块在独立进程池中执行，不占用API进程的事件循环
+- 运行中的任务定期写入心跳；启动时及运行期间回收心跳过期的任务，
+  并为遗留在"处理中"状态但没有任务记录的文档补建任务
+
+worker既可以通过 python -m app.worker 独立运行，
+也可以在开发环境中随API进程启动（document_worker_embedded）。
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from concurrent.futures import Executor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.database import SessionLocal
+from app.core.executors import get_executors
+from app.models.document import DocumentStatus
+from app.models.document_job import DocumentJob
+from app.repositories.document_job_repository import DocumentJobRepository
+from app.repositories.document_repository import DocumentRepository
+from app.tasks.document_tasks import (process_document_task,
+                                      shutdown_stream_manager)
+
+logger = logging.getLogger(__name__)
+
+
+def _default_worker_id() -> str:
+    """生成worker标识（主机名:进程号:随机后缀）"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class DocumentWorker:
+    """
+    文档处理worker
+
+    使用方式:
+        worker = DocumentWorker()
+        await worker.start()
+        ...
+        await worker.stop()
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        per_kb_concurrency: Optional[int] = None,
+        parse_processes: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        worker_id: Optional[str] = None,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        """
+        初始化worker
+
+        Args:
+            concurrency: 同时处理的文档数，默认从配置读取
+            per_kb_concurrency: 单个知识库同时处理的文档数，默认从配置读取
+            parse_processes: 解析进程数（0表示在线程中解析），默认从配置读取；
+                大于0时使用共享执行器的解析进程池（进程池大小由共享执行器决定）
+            poll_interval: 队列为空时的轮询间隔（秒），默认从配置读取
+            worker_id: worker标识，默认自动生成
+            session_factory: 数据库会话工厂
+        """
+        queue_settings = settings.document_queue
+        self.concurrency = concurrency or queue_settings.document_worker_concurrency
+        self.per_kb_concurrency = (
+            per_kb_concurrency or queue_settings.document_worker_per_kb_concurrency
+        )
+        self.parse_processes = (
+            settings.executors.executor_cpu_processes
+            if parse_processes is None
+            else parse_processes
+        )
+        self.poll_interval = (
+            poll_interval or queue_settings.document_worker_poll_interval_seconds
+        )
+        self.heartbeat_interval = queue_settings.document_job_heartbeat_seconds
+        self.stale_seconds = queue_settings.document_job_stale_seconds
+        self.max_attempts = queue_settings.document_job_max_attempts
+        self.worker_id = worker_id or _default_worker_id()
+        self.session_factory = session_factory
+
+        self._loop_task: Optional[asyncio.Task] = None
+        self._jobs: Dict[int, asyncio.Task] = {}
+        self._stopping = asyncio.Event()
+        self._last_sweep = 0.0
+
+    # ------------------------------------------------------------------
+    # 数据库访问（在共享的数据库线程池中执行，避免阻塞事件循环）
+    # ------------------------------------------------------------------
+
+    def _with_session(self, fn: Callable[[Session], object]) -> object:
+        db = self.session_factory()
+        try:
+            return fn(db)
+        finally:
+            db.close()
+
+    async def _db(self, fn: Callable[[Session], object]) -> object:
+        return await get_executors().run_db(self._with_session, fn)
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    def _get_parse_executor(self) -> Optional[Executor]:
+        """获取解析执行器（共享的解析进程池；不使用进程池时返回None）"""
+        if self.parse_processes <= 0:
+            return None
+        return get_executors().cpu
+
+    async def recover(self) -> None:
+        """
+        恢复遗留任务
+
+        回收心跳过期的运行中任务，并为没有任务记录的处理中文档补建任务。
+        """
+        stale_before = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+
+        def _recover(db: Session):
+            job_repo = DocumentJobRepository(db)
+            requeued, failed = job_repo.requeue_stale(stale_before, self.max_attempts)
+            doc_repo = DocumentRepository(db)
+            for document_id in failed:
+                doc_repo.mark_failed(document_id, "文档处理多次中断，已停止重试")
+            orphaned = job_repo.enqueue_orphaned_processing_documents()
+            return requeued, failed, orphaned
+
+        requeued, failed, orphaned = await self._db(_recover)
+        self._last_sweep = time.monotonic()
+
+        if requeued or failed or orphaned:
+            logger.info(
+                f"文档任务恢复完成: requeued={len(requeued)}, "
+                f"failed={len(failed)}, orphaned={len(orphaned)}"
+            )
+
+    async def start(self) -> None:
+        """启动worker（后台运行领取循环）"""
+        if self._loop_task is not None:
+            return
+        self._stopping.clear()
+        self._loop_task = asyncio.create_task(self._run())
+        logger.info(
+            f"文档处理worker已启动: id={self.worker_id}, concurrency={self.concurrency}, "
+            f"per_kb={self.per_kb_concurrency}, parse_processes={self.parse_processes}"
+        )
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """
+        停止worker
+
+        等待运行中的任务完成，超时后取消并将任务归还队列。
+
+        Args:
+            timeout: 等待运行中任务的最长时间（秒）
+        """
+        self._stopping.set()
+
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+
+        running = list(self._jobs.values())
+        if running:
+            _, pending = await asyncio.wait(running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        # 解析进程池由共享执行器管理，这里只关闭流式解析使用的Manager
+        await asyncio.to_thread(shutdown_stream_manager)
+
+        logger.info(f"文档处理worker已停止: id={self.worker_id}")
+
+    # ------------------------------------------------------------------
+    # 领取循环
+    # ------------------------------------------------------------------
+
+    async def _wait_or_stop(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self) -> None:
+        try:
+            await self.recover()
+        except Exception as e:
+            logger.error(f"文档任务恢复失败: {str(e)}")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        while not self._stopping.is_set():
+            await semaphore.acquire()
+
+            try:
+                if time.monotonic() - self._last_sweep >= self.heartbeat_interval:
+                    await self.recover()
+
+                job = await self.claim_next()
+            except Exception as e:
+                semaphore.release()
+                logger.error(f"领取文档任务失败: {str(e)}")
+                await self._wait_or_stop(self.poll_interval * 5)
+                continue
+
+            if job is None:
+                semaphore.release()
+                await self._wait_or_stop(self.poll_interval)
+                continue
+
+            task = asyncio.create_task(self._run_job(job.id, job.document_id))
+            self._jobs[job.id] = task
+            task.add_done_callback(
+                lambda _t, job_id=job.id: (self._jobs.pop(job_id, None), semaphore.release())
+            )
+
+    async def claim_next(self) -> Optional[DocumentJob]:
+        """
+        领取下一个任务
+
+        Returns:
+            Optional[DocumentJob]: 领取到的任务（已脱离会话），没有则返回None
+        """
+
+        def _claim(db: Session):
+            job = DocumentJobRepository(db).claim_next(
+                self.worker_id, self.per_kb_concurrency
+            )
+            if job is not None:
+                db.expunge(job)
+            return job
+
+        return await self._db(_claim)
+
+    # ------------------------------------------------------------------
+    # 任务执行
+    # ------------------------------------------------------------------
+
+    async def _heartbeat_loop(self, job_id: int) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                owned = await self._db(
+                    lambda db: DocumentJobRepository(db).heartbeat(job_id, self.worker_id)
+                )
+                if not owned:
+                    logger.warning(f"文档任务已被回收: job_id={job_id}")
+                    return
+            except Exception as e:
+                logger.warning(f"文档任务心跳失败: job_id={job_id}, error={str(e)}")
+
+    async def _run_job(self, job_id: int, document_id: int) -> None:
+        """
+        执行单个任务
+
+        Args:
+            job_id: 任务ID
+            document_id: 文档ID
+        """
+        heartbeat = asyncio.create_task(self._heartbeat_loop(job_id))
+
+        async def _on_progress(progress: int, status: str) -> None:
+            await self._db(
+                lambda db: DocumentJobRepository(db).update_progress(
+                    job_id, self.worker_id, progress
+                )
+            )
+
+        logger.info(f"开始处理文档任务: job_id={job_id}, document_id={document_id}")
+
+        try:
+            success = await process_document_task(
+                document_id,
+                progress_callback=_on_progress,
+                parse_executor=self._get_parse_executor(),
+            )
+
+            def _finish(db: Session) -> None:
+                job_repo = DocumentJobRepository(db)
+                if success:
+                    job_repo.mark_completed(job_id, self.worker_id)
+                    return
+                document = DocumentRepository(db).get_by_id(document_id)
+                error_message = (
+                    document.error_message if document and document.error_message else "文档处理失败"
+                )
+                job_repo.mark_failed(job_id, self.worker_id, error_message)
+
+            await self._db(_finish)
+            logger.info(
+                f"文档任务结束: job_id={job_id}, document_id={document_id}, success={success}"
+            )
+
+        except asyncio.CancelledError:
+            try:
+                await self._db(
+                    lambda db: DocumentJobRepository(db).release(job_id, self.worker_id)
+                )
+                logger.info(f"文档任务已归还队列: job_id={job_id}")
+            except Exception as e:
+                logger.warning(f"归还文档任务失败: job_id={job_id}, error={str(e)}")
+            raise
+
+        except Exception as e:
+            logger.error(f"执行文档任务异常: job_id={job_id}, error={str(e)}")
+
+            # 直接标记失败：任务保持运行中会在心跳过期后被重新领取，必然失败的任务会反复重试
+            error_message = str(e)
+
+            def _fail(db: Session) -> None:
+                if not DocumentJobRepository(db).mark_failed(job_id, self.worker_id, error_message):
+                    return
+                document = DocumentRepository(db).get_by_id(document_id)
+                if document is not None and document.status == DocumentStatus.PROCESSING:
+                    DocumentRepository(db).mark_failed(document_id, error_message)
+
+            try:
+                await self._db(_fail)
+            except Exception as mark_error:
+                logger.warning(f"标记文档任务失败出错: job_id={job_id}, error={str(mark_error)}")
+
+        finally:
+            heartbeat.cancel()
+
+
+# 导出
+__all__ = ["DocumentWorker"]
@@ -0,0 +1,341 @@
+"""
+批量向量化流水线模块
+
+将文档分块按嵌入接口的批大小切分，以受限并发度并行向量化，
+并逐批写入向量数据库：
+- 同时在途的批次数受 embedding_max_concurrency 限制，内存占用与批大小相关
+- 写入向量库按批串行执行，避免并发写入同一集合
+- 每完成一批回调一次进度，便于实时反映处理进度
+- 可选地先查询分块向量持久化存储，只对从未向量化过的分块调用嵌入接口
+- 可选地将写入的分块同步写入知识库稀疏倒排索引（混合检索使用）
+
+需求引用:
+    - 需求3.5: 文档分块完成，使用DashScopeEmbeddings生成向量嵌入并存储到向量数据库
+"""
+
+import asyncio
+import logging
+import uuid
+from typing import (AsyncIterable, AsyncIterator, Awaitable, Callable,
+                    Iterable, Iterator, List, Optional, Union)
+
+from langchain_core.documents import Document as LangchainDocument
+
+from app.config import settings
+from app.core.chunk_embedding_store import ChunkEmbeddingStore
+from app.core.sparse_index import SparseChunk, SparseIndex
+from app.core.vector_store import VectorStoreManager
+from app.middleware.prometheus_middleware import \
+    record_chunk_embedding_store_lookup
+
+logger = logging.getLogger(__name__)
+
+# 进度回调：接收(已完成分块数, 分块总数)，总数未知时为None
+BatchProgressCallback = Callable[[int, Optional[int]], Awaitable[None]]
+
+
+def iter_batches(
+    chunks: Iterable[LangchainDocument],
+    batch_size: int,
+) -> Iterator[List[LangchainDocument]]:
+    """
+    按批大小切分分块序列
+
+    Args:
+        chunks: 分块序列
+        batch_size: 批大小
+
+    Yields:
+        List[LangchainDocument]: 一批分块
+    """
+    batch: List[LangchainDocument] = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def aiter_batches(
+    chunks: Union[Iterable[LangchainDocument], AsyncIterable[LangchainDocument]],
+    batch_size: int,
+) -> AsyncIterator[List[LangchainDocument]]:
+    """
+    按批大小切分分块序列（支持异步分块流）
+
+    Args:
+        chunks: 分块序列或异步分块流
+        batch_size: 批大小
+
+    Yields:
+        List[LangchainDocument]: 一批分块
+    """
+    if not isinstance(chunks, AsyncIterable):
+        for batch in iter_batches(chunks, batch_size):
+            yield batch
+        return
+
+    batch: List[LangchainDocument] = []
+    async for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BatchEmbeddingPipeline:
+    """
+    批量向量化流水线
+
+    使用方式:
+        pipeline = BatchEmbeddingPipeline(
+            vector_store_manager=get_vector_store_manager(),
+            knowledge_base_id=1,
+            document_id=10,
+        )
+        stored = await pipeline.run(chunks, total=len(chunks))
+
+    分块也可以是异步分块流（边解析边向量化），此时在途分块数受
+    max_concurrency * batch_size 限制，与文档大小无关。
+    """
+
+    def __init__(
+        self,
+        vector_store_manager: VectorStoreManager,
+        knowledge_base_id: int,
+        document_id: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        progress_callback: Optional[BatchProgressCallback] = None,
+        chunk_store: Optional[ChunkEmbeddingStore] = None,
+        sparse_index: Optional[SparseIndex] = None,
+    ):
+        """
+        初始化流水线
+
+        Args:
+            vector_store_manager: 向量存储管理器
+            knowledge_base_id: 知识库ID
+            document_id: 文档ID（用于元数据和生成稳定的向量ID）
+            batch_size: 批大小，默认从配置读取
+            max_concurrency: 最大在途批次数，默认从配置读取
+            progress_callback: 每完成一批后调用的进度回调
+            chunk_store: 分块向量持久化存储（可选，命中的分块不再调用嵌入接口）
+            sparse_index: 知识库稀疏倒排索引（可选，写入向量库后同步写入）
+        """
+        self.vector_store_manager = vector_store_manager
+        self.knowledge_base_id = knowledge_base_id
+        self.document_id = document_id
+        self.batch_size = batch_size or settings.document_processing.embedding_batch_size
+        self.max_concurrency = (
+            max_concurrency or settings.document_processing.embedding_max_concurrency
+        )
+        self.progress_callback = progress_callback
+        self.chunk_store = chunk_store
+        self.sparse_index = sparse_index
+
+        self._completed = 0
+        self._reused = 0
+        self._error: Optional[BaseException] = None
+
+    def _build_ids(self, batch: List[LangchainDocument]) -> Optional[List[str]]:
+        """
+        生成稳定的向量ID
+
+        同一文档的同一分块总是得到相同ID，重试时upsert覆盖而不是重复写入。
+        """
+        if self.document_id is None:
+            return None
+        ids = []
+        for chunk in batch:
+            chunk_index = chunk.metadata.get("chunk_index")
+            if chunk_index is None:
+                return None
+            ids.append(f"doc_{self.document_id}_chunk_{chunk_index}")
+        return ids
+
+    async def _embed_batch(self, batch: List[LangchainDocument]) -> List[List[float]]:
+        """
+        生成一批分块的向量，优先复用持久化存储中的向量
+
+        Args:
+            batch: 一批分块
+
+        Returns:
+            List[List[float]]: 与分块一一对应的向量
+        """
+        texts = [chunk.page_content for chunk in batch]
+        if self.chunk_store is None:
+            return await self.vector_store_manager.embed_documents(texts)
+
+        model_id = self.vector_store_manager.embedding_model_id
+        try:
+            stored = await asyncio.to_thread(
+                self.chunk_store.get_many,
+                model_id,
+                texts,
+                self.knowledge_base_id,
+                self.document_id,
+            )
+        except Exception as e:
+            logger.warning(f"查询分块向量存储失败，改为直接向量化: {str(e)}")
+            stored = {}
+
+        hits = sum(1 for t in texts if t in stored)
+        record_chunk_embedding_store_lookup(hits=hits, misses=len(texts) - hits)
+        self._reused += hits
+
+        missing = list(dict.fromkeys(t for t in texts if t not in stored))
+
+        if missing:
+            new_vectors = await self.vector_store_manager.embed_documents(missing)
+            fresh = dict(zip(missing, new_vectors))
+            try:
+                await asyncio.to_thread(
+                    self.chunk_store.put_many,
+                    model_id,
+                    list(fresh.items()),
+                    self.knowledge_base_id,
+                    self.document_id,
+                )
+            except Exception as e:
+                logger.warning(f"写入分块向量存储失败: {str(e)}")
+            stored = {**stored, **fresh}
+
+        return [stored[t] for t in texts]
+
+    async def _index_sparse(self, batch: List[LangchainDocument], ids: List[str]) -> None:
+        """将一批分块写入稀疏倒排索引（失败时仅记录警告，不影响向量写入）"""
+        chunks = [
+            SparseChunk(
+                chunk_id=chunk_id,
+                document_id=self.document_id,
+                content=chunk.page_content,
+                metadata=dict(chunk.metadata),
+            )
+            for chunk_id, chunk in zip(ids, batch)
+        ]
+        try:
+            await asyncio.to_thread(self.sparse_index.add_chunks, chunks)
+        except Exception as e:
+            logger.warning(
+                f"写入稀疏索引失败: kb_id={self.knowledge_base_id}, "
+                f"document_id={self.document_id}, error={str(e)}"
+            )
+
+    async def _process_batch(
+        self,
+        batch: List[LangchainDocument],
+        semaphore: asyncio.Semaphore,
+        upsert_lock: asyncio.Lock,
+        total: Optional[int],
+    ) -> None:
+        try:
+            vectors = await self._embed_batch(batch)
+
+            ids = self._build_ids(batch) or [str(uuid.uuid4()) for _ in batch]
+            async with upsert_lock:
+                await self.vector_store_manager.upsert_embedded_documents(
+                    knowledge_base_id=self.knowledge_base_id,
+                    documents=batch,
+                    embeddings=vectors,
+                    document_id=self.document_id,
+                    ids=ids,
+                )
+                if self.sparse_index is not None:
+                    await self._index_sparse(batch, ids)
+
+            self._completed += len(batch)
+            if self.progress_callback:
+                try:
+                    await self.progress_callback(self._completed, total)
+                except Exception as e:
+                    logger.warning(f"向量化进度回调失败: {str(e)}")
+        except BaseException as e:
+            if self._error is None:
+                self._error = e
+            raise
+        finally:
+            semaphore.release()
+
+    async def run(
+        self,
+        chunks: Union[Iterable[LangchainDocument], AsyncIterable[LangchainDocument]],
+        total: Optional[int] = None,
+    ) -> int:
+        """
+        执行向量化并逐批写入向量库
+
+        Args:
+            chunks: 分块序列或异步分块流
+            total: 分块总数（可选，用于进度回调）
+
+        Returns:
+            int: 成功写入的分块数
+
+        Raises:
+            Exception: 任一批次失败时取消其余批次并抛出首个异常
+        """
+        self._completed = 0
+        self._reused = 0
+        self._error = None
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        upsert_lock = asyncio.Lock()
+        pending: set = set()
+
+        def _on_task_done(task: asyncio.Task) -> None:
+            pending.discard(task)
+            # 异常已记录在 self._error 中，这里取出以避免未检索异常告警
+            if not task.cancelled():
+                task.exception()
+
+        try:
+            async for batch in aiter_batches(chunks, self.batch_size):
+                await semaphore.acquire()
+                if self._error is not None:
+                    semaphore.release()
+                    break
+
+                task = asyncio.create_task(
+                    self._process_batch(batch, semaphore, upsert_lock, total)
+                )
+                pending.add(task)
+                task.add_done_callback(_on_task_done)
+
+            if pending:
+                await asyncio.gather(*pending)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            raise
+
+        if self._error is not None:
+            raise self._error
+
+        logger.debug(
+            f"批量向量化完成: kb_id={self.knowledge_base_id}, "
+            f"document_id={self.document_id}, chunks={self._completed}, "
+            f"reused={self._reused}"
+        )
+        return self._completed
+
+    @property
+    def reused_count(self) -> int:
+        """最近一次运行中复用已存储向量的分块数"""
+        return self._reused
+
+
+# 导出
+__all__ = [
+    "BatchEmbeddingPipeline",
+    "BatchProgressCallback",
+    "aiter_batches",
+    "iter_batches",
+]
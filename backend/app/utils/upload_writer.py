@@ -0,0 +1,117 @@
+"""
+上传文件流式写入模块
+
+按块读取上传文件并写入磁盘，不在内存中保留完整文件内容：
+- 边读取边累计大小，超过上限立即中止并删除已写入的部分文件
+- 边读取边计算SHA256摘要
+- 磁盘写入在线程中执行，不阻塞事件循环
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+# 默认每次读取的块大小（1MB）
+DEFAULT_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """上传文件超过大小上限"""
+
+    def __init__(self, max_size: int, size: Optional[int] = None):
+        """
+        Args:
+            max_size: 允许的最大字节数
+            size: 已知的文件大小（流式读取中止时为已读取的字节数）
+        """
+        self.max_size = max_size
+        self.size = size
+        max_size_mb = max_size / (1024 * 1024)
+        if size is not None:
+            message = f"文件大小超出限制: {size / (1024 * 1024):.2f}MB > {max_size_mb:.2f}MB"
+        else:
+            message = f"文件大小超出限制: 超过{max_size_mb:.2f}MB"
+        super().__init__(message)
+
+
+@dataclass
+class SavedUpload:
+    """已保存的上传文件信息"""
+
+    path: str
+    size: int
+    sha256: str
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except OSError as e:
+        logger.warning(f"删除未完成的上传文件失败: {path}, error={str(e)}")
+
+
+async def stream_upload_to_file(
+    file: UploadFile,
+    dest_path: str,
+    max_size: int,
+    chunk_size: int = DEFAULT_UPLOAD_CHUNK_SIZE,
+) -> SavedUpload:
+    """
+    将上传文件流式写入目标路径
+
+    Args:
+        file: 上传的文件
+        dest_path: 目标文件路径（所在目录需已存在）
+        max_size: 允许的最大字节数
+        chunk_size: 每次读取的字节数
+
+    Returns:
+        SavedUpload: 保存结果（路径、大小、SHA256）
+
+    Raises:
+        UploadTooLargeError: 文件超过大小上限（已删除部分写入的文件）
+        OSError: 写入失败（已删除部分写入的文件）
+    """
+    # 客户端声明了大小时，无需读取即可拒绝
+    declared_size = getattr(file, "size", None)
+    if declared_size is not None and declared_size > max_size:
+        raise UploadTooLargeError(max_size, declared_size)
+
+    digest = hashlib.sha256()
+    size = 0
+    handle: BinaryIO = await asyncio.to_thread(open, dest_path, "wb")
+
+    try:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLargeError(max_size)
+            digest.update(chunk)
+            await asyncio.to_thread(handle.write, chunk)
+        await asyncio.to_thread(handle.close)
+    except BaseException:
+        await asyncio.to_thread(handle.close)
+        await asyncio.to_thread(_remove_quietly, dest_path)
+        raise
+
+    return SavedUpload(path=dest_path, size=size, sha256=digest.hexdigest())
+
+
+# 导出
+__all__ = [
+    "DEFAULT_UPLOAD_CHUNK_SIZE",
+    "SavedUpload",
+    "UploadTooLargeError",
+    "stream_upload_to_file",
+]
@@ -0,0 +1,94 @@
+"""
+文档处理worker入口
+
+独立于API进程运行文档处理worker，从持久化任务表领取并处理文档，
+文档解析和向量化不再占用API进程的资源。
+
+使用方式:
+    python -m app.worker
+    python -m app.worker --concurrency 8 --per-kb-concurrency 2
+
+生产环境部署时应将 DOCUMENT_WORKER_EMBEDDED 设为 False，
+避免API进程内再运行一份worker。
+"""
+
+import argparse
+import asyncio
+import signal
+
+import app.utils.platform_compat  # noqa: F401
+from app.config import settings
+from app.core.executors import init_executors, shutdown_executors
+from app.tasks.document_worker import DocumentWorker
+from app.utils.logger import (get_logger, set_third_party_log_levels,
+                              setup_logging)
+
+# 配置日志系统
+setup_logging()
+set_third_party_log_levels()
+logger = get_logger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    """解析命令行参数"""
+    queue_settings = settings.document_queue
+    parser = argparse.ArgumentParser(description="文档处理worker")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=queue_settings.document_worker_concurrency,
+        help="同时处理的文档数",
+    )
+    parser.add_argument(
+        "--per-kb-concurrency",
+        type=int,
+        default=queue_settings.document_worker_per_kb_concurrency,
+        help="单个知识库同时处理的文档数",
+    )
+    parser.add_argument(
+        "--parse-processes",
+        type=int,
+        default=settings.executors.executor_cpu_processes,
+        help="文档解析进程池大小（0表示在线程中解析）",
+    )
+    return parser.parse_args()
+
+
+async def main() -> None:
+    """运行worker直到收到退出信号"""
+    args = parse_args()
+
+    # 共享执行器（事件循环的默认执行器保持不变）
+    init_executors(cpu_processes=args.parse_processes)
+
+    worker = DocumentWorker(
+        concurrency=args.concurrency,
+        per_kb_concurrency=args.per_kb_concurrency,
+        parse_processes=args.parse_processes,
+    )
+
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Windows不支持add_signal_handler，依赖KeyboardInterrupt退出
+            pass
+
+    await worker.start()
+    logger.info("文档处理worker运行中，按Ctrl+C退出")
+
+    try:
+        await stop_event.wait()
+    finally:
+        logger.info("正在停止文档处理worker...")
+        await worker.stop()
+        shutdown_executors(wait=False)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,61 @@
+"""添加文档处理任务表
+
+创建document_jobs表，作为持久化的文档处理队列。
+
+Revision ID: 009_add_document_jobs
+Revises: 008_fix_tooltype_enum_lowercase
+Create Date: 2026-10-16
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '009_add_document_jobs'
+down_revision: Union[str, None] = '008_fix_tooltype_enum_lowercase'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """升级数据库"""
+
+    op.create_table(
+        'document_jobs',
+        sa.Column('id', sa.Integer(), nullable=False, comment='任务ID'),
+        sa.Column('document_id', sa.Integer(), nullable=False, comment='文档ID'),
+        sa.Column('knowledge_base_id', sa.Integer(), nullable=False, comment='知识库ID'),
+        sa.Column(
+            'status',
+            sa.Enum('queued', 'running', 'completed', 'failed', name='documentjobstatus'),
+            nullable=False,
+            comment='任务状态',
+        ),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0', comment='已领取次数'),
+        sa.Column('progress', sa.Integer(), nullable=False, server_default='0', comment='处理进度百分比'),
+        sa.Column('worker_id', sa.String(100), nullable=True, comment='worker标识'),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True, comment='最近心跳时间'),
+        sa.Column('error_message', sa.Text(), nullable=True, comment='错误信息'),
+        sa.Column('created_at', sa.DateTime(), nullable=False, comment='入队时间'),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, comment='更新时间'),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('document_id'),
+        comment='文档处理任务表'
+    )
+    op.create_index('ix_document_jobs_id', 'document_jobs', ['id'])
+    op.create_index('ix_document_jobs_knowledge_base_id', 'document_jobs', ['knowledge_base_id'])
+    op.create_index('idx_doc_job_status_created', 'document_jobs', ['status', 'created_at'])
+    op.create_index('idx_doc_job_kb_status', 'document_jobs', ['knowledge_base_id', 'status'])
+
+
+def downgrade() -> None:
+    """降级数据库"""
+
+    op.drop_index('idx_doc_job_kb_status', table_name='document_jobs')
+    op.drop_index('idx_doc_job_status_created', table_name='document_jobs')
+    op.drop_index('ix_document_jobs_knowledge_base_id', table_name='document_jobs')
+    op.drop_index('ix_document_jobs_id', table_name='document_jobs')
+    op.drop_table('document_jobs')
@@ -0,0 +1,36 @@
+"""添加文档内容摘要字段
+
+为documents表添加content_hash字段，记录上传文件的SHA256摘要。
+
+Revision ID: 010_add_document_content_hash
+Revises: 009_add_document_jobs
+Create Date: 2026-10-16
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '010_add_document_content_hash'
+down_revision: Union[str, None] = '009_add_document_jobs'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """升级数据库"""
+
+    op.add_column(
+        'documents',
+        sa.Column('content_hash', sa.String(64), nullable=True, comment='文件内容SHA256'),
+    )
+    op.create_index('ix_documents_content_hash', 'documents', ['content_hash'])
+
+
+def downgrade() -> None:
+    """降级数据库"""
+
+    op.drop_index('ix_documents_content_hash', table_name='documents')
+    op.drop_column('documents', 'content_hash')
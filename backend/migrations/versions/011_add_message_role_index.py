@@ -0,0 +1,31 @@
+"""添加消息角色复合索引
+
+为messages表添加(conversation_id, role)复合索引，
+用于加载对话上下文时统计用户消息数。
+
+Revision ID: 011_add_message_role_index
+Revises: 010_add_document_content_hash
+Create Date: 2026-10-16
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '011_add_message_role_index'
+down_revision: Union[str, None] = '010_add_document_content_hash'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """升级数据库"""
+
+    op.create_index('idx_conversation_role', 'messages', ['conversation_id', 'role'])
+
+
+def downgrade() -> None:
+    """降级数据库"""
+
+    op.drop_index('idx_conversation_role', table_name='messages')
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Agent请求准备开销基准脚本
+
+对比每个请求执行Agent任务前的准备耗时（不调用LLM）：
+- 每请求创建: 新建AgentManager（Tongyi客户端、六个内置工具）并编译提示词、Agent和AgentExecutor
+- 进程级复用: 使用全局AgentManager和已缓存的AgentExecutor，只创建步骤记录回调
+
+使用方式:
+    python scripts/benchmark_agent_setup.py --requests 200
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.langchain_integration.agent_executor import (AgentManager,
+                                                      StepRecordingCallback,
+                                                      clear_agent_manager,
+                                                      get_agent_manager)
+
+
+def setup_per_request() -> None:
+    manager = AgentManager(api_key="sk-benchmark")
+    tools = manager._select_tools()
+    manager._get_agent_executor(tools, max_iterations=10, verbose=False, cacheable=False)
+    StepRecordingCallback()
+
+
+def setup_shared() -> None:
+    manager = get_agent_manager()
+    tools = manager._select_tools()
+    manager._get_agent_executor(tools, max_iterations=10, verbose=False)
+    StepRecordingCallback()
+
+
+def measure(fn, requests: int) -> dict:
+    durations = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+    return {
+        "mean_ms": statistics.mean(durations) * 1000,
+        "p95_ms": durations[int(len(durations) * 0.95) - 1] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Agent请求准备开销基准")
+    parser.add_argument("--requests", type=int, default=200, help="模拟请求数")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("DASHSCOPE_API_KEY", "sk-benchmark")
+
+    # 预热：导入和首次编译不计入
+    setup_per_request()
+    clear_agent_manager()
+    setup_shared()
+
+    print(f"requests={args.requests}")
+    for name, fn in (("每请求创建", setup_per_request), ("进程级复用", setup_shared)):
+        result = measure(fn, args.requests)
+        print(f"{name}: 平均={result['mean_ms']:.3f}ms, P95={result['p95_ms']:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+向量化流水线吞吐基准脚本
+
+使用本地桩嵌入模型（每次接口调用固定延迟，模拟网络往返）对比：
+- 串行方式: VectorStoreManager.add_documents（逐批串行向量化后一次写入）
+- 流水线方式: BatchEmbeddingPipeline（多批并发向量化，逐批写入）
+
+输出每种方式的吞吐量（chunks/sec）。
+
+使用方式:
+    python scripts/benchmark_embedding_pipeline.py --chunks 2000 --latency-ms 80
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.documents import Document
+
+from app.core.vector_store import DevMockEmbeddings, VectorStoreManager
+from app.tasks.embedding_pipeline import BatchEmbeddingPipeline
+
+PROVIDER_BATCH_SIZE = 25
+
+
+class StubEmbeddings(DevMockEmbeddings):
+    """桩嵌入模型：按接口批大小分批，每批固定延迟"""
+
+    def __init__(self, latency_s: float, dim: int = 256):
+        super().__init__(dim=dim)
+        self.latency_s = latency_s
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        out: List[List[float]] = []
+        for i in range(0, len(texts), PROVIDER_BATCH_SIZE):
+            time.sleep(self.latency_s)
+            out.extend(super().embed_documents(texts[i : i + PROVIDER_BATCH_SIZE]))
+        return out
+
+
+def make_chunks(count: int) -> List[Document]:
+    return [
+        Document(
+            page_content=f"第{i}个分块的示例文本内容，用于吞吐测试。" * 8,
+            metadata={"chunk_index": i, "source": "bench.txt"},
+        )
+        for i in range(count)
+    ]
+
+
+def make_manager(latency_s: float) -> VectorStoreManager:
+    manager = VectorStoreManager(persist_directory=tempfile.mkdtemp(prefix="bench_chroma_"))
+    manager._embeddings = StubEmbeddings(latency_s=latency_s)
+    return manager
+
+
+async def bench_serial(chunk_count: int, latency_s: float) -> float:
+    manager = make_manager(latency_s)
+    chunks = make_chunks(chunk_count)
+    start = time.perf_counter()
+    await manager.add_documents(knowledge_base_id=1, documents=chunks, document_id=1)
+    return time.perf_counter() - start
+
+
+async def bench_pipeline(chunk_count: int, latency_s: float, concurrency: int) -> float:
+    manager = make_manager(latency_s)
+    chunks = make_chunks(chunk_count)
+    pipeline = BatchEmbeddingPipeline(
+        vector_store_manager=manager,
+        knowledge_base_id=1,
+        document_id=1,
+        batch_size=PROVIDER_BATCH_SIZE,
+        max_concurrency=concurrency,
+    )
+    start = time.perf_counter()
+    await pipeline.run(chunks, total=len(chunks))
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="向量化流水线吞吐基准")
+    parser.add_argument("--chunks", type=int, default=1000, help="分块数量")
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="桩嵌入接口单次调用延迟（毫秒）")
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 2, 4, 8], help="流水线并发批次数"
+    )
+    args = parser.parse_args()
+
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+    latency_s = args.latency_ms / 1000.0
+
+    print(f"chunks={args.chunks}, latency={args.latency_ms}ms/批, batch_size={PROVIDER_BATCH_SIZE}")
+    print(f"{'模式':<24}{'耗时(s)':>10}{'chunks/sec':>14}")
+
+    elapsed = await bench_serial(args.chunks, latency_s)
+    print(f"{'add_documents(串行)':<24}{elapsed:>10.2f}{args.chunks / elapsed:>14.1f}")
+
+    for concurrency in args.concurrency:
+        elapsed = await bench_pipeline(args.chunks, latency_s, concurrency)
+        label = f"pipeline(并发={concurrency})"
+        print(f"{label:<24}{elapsed:>10.2f}{args.chunks / elapsed:>14.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+流式LLM调用基准脚本
+
+使用本地DashScope桩服务（固定首块延迟和块间隔，模拟模型生成）对比：
+- 线程方式: 在线程中迭代DashScope SDK同步生成器，每个块一次线程池调度
+- 原生方式: httpx异步客户端直接消费SSE流，长连接复用
+
+输出每种方式的平均首块延迟（TTFT）、总吞吐量（chunks/sec）和运行期间的峰值线程数。
+
+使用方式:
+    python scripts/benchmark_llm_stream.py --streams 32 --chunks 200 --chunk-delay-ms 2
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import dashscope
+
+from app.config import settings
+from app.core import dashscope_client
+from app.core.llm import PatchedTongyi
+from tests.dashscope_stub import DashScopeStubServer
+
+
+async def run_stream(llm: PatchedTongyi, native: bool) -> tuple:
+    stream = llm._astream_native("基准测试") if native else llm._astream_threaded("基准测试")
+    started = time.perf_counter()
+    first = None
+    chunks = 0
+    async for _ in stream:
+        if first is None:
+            first = time.perf_counter() - started
+        chunks += 1
+    return first, chunks
+
+
+async def run_mode(llm: PatchedTongyi, native: bool, streams: int) -> dict:
+    peak_threads = threading.active_count()
+    done = asyncio.Event()
+
+    async def _sample_threads():
+        nonlocal peak_threads
+        while not done.is_set():
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.01)
+
+    sampler = asyncio.create_task(_sample_threads())
+    started = time.perf_counter()
+    results = await asyncio.gather(*(run_stream(llm, native) for _ in range(streams)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await sampler
+
+    total_chunks = sum(chunks for _, chunks in results)
+    return {
+        "ttft_ms": statistics.mean(first for first, _ in results) * 1000,
+        "chunks_per_sec": total_chunks / elapsed,
+        "elapsed_s": elapsed,
+        "peak_threads": peak_threads,
+    }
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    with DashScopeStubServer(
+        chunks=args.chunks,
+        text="测试",
+        chunk_delay=args.chunk_delay_ms / 1000,
+        first_chunk_delay=args.first_chunk_delay_ms / 1000,
+    ) as stub:
+        settings.tongyi.dashscope_base_url = stub.base_url
+        dashscope.base_http_api_url = stub.base_url
+        dashscope_client._stream_client = None
+
+        llm = PatchedTongyi(dashscope_api_key="sk-benchmark", model_name="qwen-turbo", streaming=True)
+
+        print(
+            f"streams={args.streams}, chunks/stream={args.chunks}, "
+            f"first_chunk_delay={args.first_chunk_delay_ms}ms, chunk_delay={args.chunk_delay_ms}ms"
+        )
+        # 先运行原生方式，避免线程方式创建的线程影响其峰值线程数统计
+        for name, native in (("原生方式", True), ("线程方式", False)):
+            result = await run_mode(llm, native, args.streams)
+            print(
+                f"{name}: TTFT={result['ttft_ms']:.1f}ms, "
+                f"吞吐={result['chunks_per_sec']:.0f} chunks/sec, "
+                f"耗时={result['elapsed_s']:.2f}s, 峰值线程数={result['peak_threads']}"
+            )
+
+        await dashscope_client.close_dashscope_stream_client()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="流式LLM调用基准")
+    parser.add_argument("--streams", type=int, default=32, help="并发流数量")
+    parser.add_argument("--chunks", type=int, default=200, help="每个流的数据块数")
+    parser.add_argument("--chunk-delay-ms", type=float, default=2.0, help="块间隔（毫秒）")
+    parser.add_argument("--first-chunk-delay-ms", type=float, default=50.0, help="首块延迟（毫秒）")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
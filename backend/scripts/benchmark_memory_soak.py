@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+对话记忆浸泡测试脚本
+
+模拟大量对话依次产生多轮问答，对比：
+- 无界方式: 每个对话一个 ConversationBufferMemory，保存在普通字典中（原实现）
+- 有界方式: ConversationMemoryStore（LRU/TTL进程内层 + token预算窗口）
+
+每处理一批对话输出一次当前RSS，有界方式的RSS应在进程内层写满后保持平稳。
+
+使用方式:
+    python scripts/benchmark_memory_soak.py --conversations 100000 --turns 4
+    python scripts/benchmark_memory_soak.py --mode bounded --max-conversations 5000
+"""
+
+import argparse
+import gc
+import os
+import resource
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.conversation_memory import (ConversationMemoryStore,
+                                          InMemoryConversationTier)
+
+
+def current_rss_mb() -> float:
+    """读取当前进程RSS（MB），非Linux系统退化为峰值RSS"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_turn(conversation_id: int, turn: int, answer_chars: int) -> tuple:
+    question = f"对话{conversation_id}的第{turn}个问题：请解释一下这个概念？"
+    answer = (f"关于对话{conversation_id}第{turn}轮的回答。" * (answer_chars // 16 + 1))[:answer_chars]
+    return question, answer
+
+
+def run_unbounded(args: argparse.Namespace, report) -> None:
+    from langchain.memory import ConversationBufferMemory
+
+    memories = {}
+    for cid in range(args.conversations):
+        memory = ConversationBufferMemory(return_messages=True)
+        for turn in range(args.turns):
+            question, answer = make_turn(cid, turn, args.answer_chars)
+            memory.chat_memory.add_user_message(question)
+            memory.chat_memory.add_ai_message(answer)
+        memories[cid] = memory
+        report(cid + 1, len(memories))
+
+
+def run_bounded(args: argparse.Namespace, report) -> None:
+    store = ConversationMemoryStore(
+        local=InMemoryConversationTier(max_entries=args.max_conversations, ttl_seconds=3600),
+        max_tokens=args.max_tokens,
+        max_messages=args.max_messages,
+    )
+    for cid in range(args.conversations):
+        for turn in range(args.turns):
+            question, answer = make_turn(cid, turn, args.answer_chars)
+            store.append_turn("chat", cid, question, answer)
+        report(cid + 1, len(store.local))
+
+
+def soak(name: str, runner, args: argparse.Namespace) -> None:
+    gc.collect()
+    baseline = current_rss_mb()
+    samples = []
+    started = time.perf_counter()
+
+    def report(done: int, held: int) -> None:
+        if done % args.report_every == 0 or done == args.conversations:
+            rss = current_rss_mb()
+            samples.append(rss)
+            print(f"  [{name}] 对话数={done:>7}, 保留={held:>7}, RSS={rss:8.1f}MB (+{rss - baseline:.1f}MB)")
+
+    print(f"{name}:")
+    runner(args, report)
+    elapsed = time.perf_counter() - started
+
+    # 后半程RSS波动反映是否平稳
+    tail = samples[len(samples) // 2 :]
+    print(
+        f"  [{name}] 耗时={elapsed:.1f}s, 最终RSS增长={samples[-1] - baseline:.1f}MB, "
+        f"后半程RSS波动={max(tail) - min(tail):.1f}MB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="对话记忆浸泡测试")
+    parser.add_argument("--conversations", type=int, default=100000, help="对话总数")
+    parser.add_argument("--turns", type=int, default=4, help="每个对话的问答轮数")
+    parser.add_argument("--answer-chars", type=int, default=400, help="每条回答的字符数")
+    parser.add_argument("--max-conversations", type=int, default=5000, help="进程内层对话数上限")
+    parser.add_argument("--max-tokens", type=int, default=3000, help="每个对话的历史token预算")
+    parser.add_argument("--max-messages", type=int, default=20, help="每个对话的最大消息数")
+    parser.add_argument("--report-every", type=int, default=10000, help="RSS采样间隔（对话数）")
+    parser.add_argument(
+        "--mode", choices=("both", "bounded", "unbounded"), default="both", help="测试方式"
+    )
+    args = parser.parse_args()
+
+    print(
+        f"conversations={args.conversations}, turns={args.turns}, "
+        f"answer_chars={args.answer_chars}, max_conversations={args.max_conversations}"
+    )
+    # 先运行有界方式，避免无界方式已占用的内存影响其RSS统计
+    if args.mode in ("both", "bounded"):
+        soak("有界方式", run_bounded, args)
+    if args.mode in ("both", "unbounded"):
+        soak("无界方式", run_unbounded, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+向量库后端检索基准脚本
+
+在同一批随机聚类向量上对比 VectorStoreManager 的两种进程内后端：
+- embedded: Chroma PersistentClient（HNSW + SQLite元数据）
+- numpy: NumPy矩阵索引（内存映射 + 向量化top-k，超过阈值启用IVF）
+
+检索走 similarity_search_by_vector_with_score（与RAG检索路径一致），
+输出单线程QPS、P50/P99延迟，以及相对精确top-k的 recall@k。
+
+使用方式:
+    python scripts/benchmark_vector_backends.py --chunks 20000 --dim 1536 --queries 500
+    python scripts/benchmark_vector_backends.py --chunks 80000 --ivf-threshold 50000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.chroma_backend import EmbeddedChromaBackend
+from app.core.numpy_index import NumpyVectorBackend
+from app.core.vector_store import VectorStoreManager
+
+KNOWLEDGE_BASE_ID = 1
+BATCH_SIZE = 1000
+
+
+def build_vectors(chunks: int, dim: int, seed: int) -> np.ndarray:
+    """生成带聚类结构的单位向量（近似真实嵌入分布）"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, chunks // 200), dim))
+    vectors = centers[rng.integers(0, len(centers), chunks)] + rng.normal(size=(chunks, dim)) * 0.5
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+async def load(manager: VectorStoreManager, vectors: np.ndarray) -> float:
+    started = time.perf_counter()
+    for start in range(0, len(vectors), BATCH_SIZE):
+        block = vectors[start : start + BATCH_SIZE]
+        documents = [
+            Document(page_content=f"chunk {start + i}", metadata={"chunk_index": start + i})
+            for i in range(len(block))
+        ]
+        await manager.upsert_embedded_documents(
+            KNOWLEDGE_BASE_ID,
+            documents,
+            block.tolist(),
+            document_id=start // BATCH_SIZE,
+            ids=[str(start + i) for i in range(len(block))],
+        )
+    return time.perf_counter() - started
+
+
+async def measure(
+    manager: VectorStoreManager, queries: np.ndarray, exact: List[set], k: int
+) -> Tuple[List[float], float]:
+    latencies = []
+    hits = 0
+    for query, relevant in zip(queries, exact):
+        started = time.perf_counter()
+        results = await manager.similarity_search_by_vector_with_score(
+            KNOWLEDGE_BASE_ID, query.tolist(), k=k
+        )
+        latencies.append(time.perf_counter() - started)
+        hits += len({doc.metadata["chunk_index"] for doc, _ in results} & relevant)
+    return latencies, hits / (len(queries) * k)
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def run(args: argparse.Namespace) -> None:
+    vectors = build_vectors(args.chunks, args.dim, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = queries + rng.normal(size=queries.shape).astype(np.float32) * 0.05
+    norms = np.einsum("ij,ij->i", vectors, vectors)
+    exact = [
+        set(np.argsort(norms - 2.0 * (vectors @ query))[: args.k].tolist()) for query in queries
+    ]
+
+    print(f"chunks={args.chunks}, dim={args.dim}, queries={args.queries}, k={args.k}")
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            "embedded": EmbeddedChromaBackend(os.path.join(tmp, "chroma")),
+            "numpy": NumpyVectorBackend(
+                os.path.join(tmp, "chroma"), ivf_threshold=args.ivf_threshold, ivf_nprobe=args.nprobe
+            ),
+        }
+        for name, backend in backends.items():
+            manager = VectorStoreManager(
+                persist_directory=os.path.join(tmp, "chroma"),
+                api_key="DUMMY_DASHSCOPE_API_KEY",
+                backend=backend,
+            )
+            load_seconds = await load(manager, vectors)
+            # 预热
+            await measure(manager, queries[:10], exact[:10], args.k)
+            latencies, recall = await measure(manager, queries, exact, args.k)
+            print(
+                f"{name}: 写入={load_seconds:.1f}s, QPS={len(latencies) / sum(latencies):.1f}, "
+                f"P50={percentile(latencies, 0.5) * 1000:.2f}ms, "
+                f"P99={percentile(latencies, 0.99) * 1000:.2f}ms, recall@{args.k}={recall:.3f}"
+            )
+            manager.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="向量库后端检索基准")
+    parser.add_argument("--chunks", type=int, default=20000, help="分块数")
+    parser.add_argument("--dim", type=int, default=1536, help="向量维度")
+    parser.add_argument("--queries", type=int, default=500, help="查询数")
+    parser.add_argument("--k", type=int, default=5, help="返回结果数")
+    parser.add_argument("--ivf-threshold", type=int, default=50000, help="numpy后端启用IVF的阈值")
+    parser.add_argument("--nprobe", type=int, default=16, help="numpy后端IVF扫描分区数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
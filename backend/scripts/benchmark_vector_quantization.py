@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+向量量化基准脚本
+
+在同一批随机聚类向量上对比NumPy向量索引的三种存储方式：
+- none: float32矩阵全量扫描（基线）
+- int8: 标量量化粗排 + float32精确重排
+- pq: 乘积量化粗排 + float32精确重排
+
+输出每种方式的常驻内存（检索时全量扫描的数据）、磁盘占用、
+recall@k（相对精确top-k；同时给出不重排时的粗排recall）以及P50/P99延迟。
+量化方式保留完整的float32矩阵用于精确重排，磁盘占用高于基线：
+磁盘一栏给出目录总大小、其中float32矩阵与量化数据的大小，以及相对none的倍数。
+
+使用方式:
+    python scripts/benchmark_vector_quantization.py --chunks 20000 --dim 1536
+    python scripts/benchmark_vector_quantization.py --chunks 50000 --rescore-factor 8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from app.core.numpy_index import NumpyIndexCollection
+
+BATCH_SIZE = 1000
+
+
+def build_vectors(chunks: int, dim: int, seed: int) -> np.ndarray:
+    """生成带聚类结构的单位向量（近似真实嵌入分布）"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, chunks // 200), dim))
+    vectors = centers[rng.integers(0, len(centers), chunks)] + rng.normal(size=(chunks, dim)) * 0.5
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def directory_size(path: str) -> int:
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+def measure(
+    collection: NumpyIndexCollection, queries: np.ndarray, exact: List[set], k: int
+) -> Tuple[List[float], float]:
+    latencies = []
+    hits = 0
+    for query, relevant in zip(queries, exact):
+        started = time.perf_counter()
+        result = collection.query(query_embeddings=[query], n_results=k, include=["distances"])
+        latencies.append(time.perf_counter() - started)
+        hits += len({int(i) for i in result["ids"][0]} & relevant)
+    return latencies, hits / (len(queries) * k)
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="向量量化内存与召回率基准")
+    parser.add_argument("--chunks", type=int, default=20000, help="分块数")
+    parser.add_argument("--dim", type=int, default=1536, help="向量维度")
+    parser.add_argument("--queries", type=int, default=200, help="查询数")
+    parser.add_argument("--k", type=int, default=5, help="返回结果数")
+    parser.add_argument("--rescore-factor", type=int, default=4, help="精确重排候选数倍率")
+    parser.add_argument("--pq-subvector-dim", type=int, default=8, help="乘积量化子向量维度")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    vectors = build_vectors(args.chunks, args.dim, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = queries + rng.normal(size=queries.shape).astype(np.float32) * 0.05
+    norms = np.einsum("ij,ij->i", vectors, vectors)
+    exact = [
+        set(np.argsort(norms - 2.0 * (vectors @ query))[: args.k].tolist()) for query in queries
+    ]
+
+    print(f"chunks={args.chunks}, dim={args.dim}, queries={args.queries}, k={args.k}")
+    baseline_disk = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for quantization in ("none", "int8", "pq"):
+            directory = os.path.join(tmp, quantization)
+            collection = NumpyIndexCollection(
+                "kb_bench",
+                directory,
+                ivf_threshold=args.chunks + 1,
+                quantization=quantization,
+                pq_subvector_dim=args.pq_subvector_dim,
+                rescore_factor=args.rescore_factor,
+            )
+            started = time.perf_counter()
+            for start in range(0, len(vectors), BATCH_SIZE):
+                collection.upsert(
+                    ids=[str(i) for i in range(start, min(start + BATCH_SIZE, len(vectors)))],
+                    embeddings=vectors[start : start + BATCH_SIZE],
+                )
+            load_seconds = time.perf_counter() - started
+
+            measure(collection, queries[:10], exact[:10], args.k)
+            latencies, recall = measure(collection, queries, exact, args.k)
+            stats = collection.stats()
+            disk = directory_size(directory)
+            baseline_disk = baseline_disk or disk
+            line = (
+                f"{quantization}: 写入={load_seconds:.1f}s, "
+                f"常驻={stats['resident_bytes'] / 1024 / 1024:.1f}MB, "
+                f"磁盘={disk / 1024 / 1024:.1f}MB"
+                f"（float32 {stats['vector_disk_bytes'] / 1024 / 1024:.1f}MB"
+                f" + 量化 {stats['quantized_disk_bytes'] / 1024 / 1024:.1f}MB，"
+                f"为none的{disk / baseline_disk:.2f}倍）, "
+                f"recall@{args.k}={recall:.3f}"
+            )
+            if quantization != "none":
+                # 不重排：候选数等于k，结果完全由量化距离决定
+                collection.rescore_factor = 1
+                _, coarse_recall = measure(collection, queries, exact, args.k)
+                collection.rescore_factor = args.rescore_factor
+                line += f"（不重排 {coarse_recall:.3f}）"
+            line += (
+                f", P50={percentile(latencies, 0.5) * 1000:.2f}ms, "
+                f"P99={percentile(latencies, 0.99) * 1000:.2f}ms"
+            )
+            print(line)
+            collection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+向量集合压缩脚本
+
+按文档删除向量只会在索引中打删除标记，频繁增删后集合的磁盘占用和检索耗时会明显高于存活分块数。
+脚本与每日清理任务使用相同的压缩流程（VectorStoreManager.compact_collection），可在服务运行时执行：
+- numpy模式：集合在线压缩并原子切换数据文件
+- embedded/http模式：存活分块复制到新一代集合，条数校验通过后切换集合别名，
+  旧集合保留 VECTOR_COMPACTION_RETIRE_GRACE_SECONDS 秒后由下一次压缩删除
+
+中途中断时重新运行即可：未切换的新集合在宽限期后被清理，原集合不受影响。
+
+使用方式:
+    python scripts/compact_vector_collections.py                      # 全部知识库
+    python scripts/compact_vector_collections.py --kb-id 1 2
+    python scripts/compact_vector_collections.py --min-tombstone-ratio 0.1   # 按墓碑占比筛选
+    python scripts/compact_vector_collections.py --kb-id 1 --force           # 忽略阈值强制重建
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+from app.config import settings
+from app.core.chroma_backend import build_vector_store_backend
+from app.core.vector_store import VectorStoreManager
+
+
+def directory_size(path: str) -> int:
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="压缩知识库向量集合，回收已删除向量占用的空间")
+    parser.add_argument("--kb-id", type=int, nargs="*", help="知识库ID（默认全部）")
+    parser.add_argument(
+        "--min-tombstone-ratio",
+        type=float,
+        default=0.0,
+        help="只压缩墓碑占比不低于该值的集合",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="忽略墓碑阈值（Chroma集合的墓碑数只从记录删除计数后开始统计，旧数据需强制重建）",
+    )
+    args = parser.parse_args()
+
+    vector_settings = settings.vector_db
+    persist_directory = vector_settings.chroma_persist_directory
+    backend = build_vector_store_backend(persist_directory)
+    manager = VectorStoreManager(persist_directory=persist_directory, backend=backend)
+    kb_ids = args.kb_id or manager.list_knowledge_base_ids()
+    print(f"后端: {backend.describe()}, 待压缩知识库: {kb_ids}")
+
+    local = vector_settings.chroma_mode != "http"
+    size_before = directory_size(persist_directory) if local else 0
+
+    for kb_id in kb_ids:
+        name = f"kb_{kb_id}"
+        try:
+            result = manager.compact_collection(
+                kb_id,
+                min_tombstone_ratio=args.min_tombstone_ratio,
+                min_tombstones=1,
+                force=args.force,
+            )
+            if result["status"] == "compacted":
+                print(
+                    f"  {name}: {result['rows_before']} -> {result['rows_after']} 行, "
+                    f"当前集合 {result['collection_name']}"
+                )
+            else:
+                reason = result.get("reason") or f"墓碑 {result.get('tombstones', 0)} 行"
+                print(f"  {name}: 跳过（{reason}）")
+        except Exception as e:
+            print(f"  {name}: 压缩失败 - {str(e)}")
+
+    manager.close()
+    if local:
+        size_after = directory_size(persist_directory)
+        print(
+            f"向量库磁盘占用: {size_before / 1024 / 1024:.1f}MB -> "
+            f"{size_after / 1024 / 1024:.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+向量量化迁移脚本
+
+将已有知识库集合（kb_{id}）转换为量化存储的NumPy向量索引：
+- 来源可以是Chroma（embedded/http）集合（按集合别名解析），也可以是已有的NumPy索引（更换量化方式）
+- 向量按页读取后写入临时目录，条数校验通过后原子替换 numpy_index/kb_{id}
+- 迁移完成后设置 CHROMA_MODE=numpy、NUMPY_INDEX_QUANTIZATION=<方式> 并重启服务和文档worker
+  （运行中的进程持有旧文件句柄，建议停服或在低峰期执行）
+
+使用方式:
+    python scripts/migrate_vector_quantization.py --quantization int8              # 全部知识库
+    python scripts/migrate_vector_quantization.py --quantization pq --kb-id 1 2
+    python scripts/migrate_vector_quantization.py --quantization int8 --source numpy
+"""
+
+import argparse
+import os
+import re
+import shutil
+import sys
+from pathlib import Path
+from typing import List
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+from app.config import settings
+from app.core.chroma_backend import EmbeddedChromaBackend, HttpChromaBackend
+from app.core.collection_aliases import CollectionAliasRegistry
+from app.core.numpy_index import NumpyIndexClient, NumpyIndexCollection, numpy_index_root
+
+# kb_{id}，Chroma集合压缩重建后为 kb_{id}_g{代数}
+_COLLECTION_PATTERN = re.compile(r"^kb_(\d+)(?:_g\d+)?$")
+
+
+def create_source_client(source: str):
+    vector_settings = settings.vector_db
+    if source == "numpy":
+        return NumpyIndexClient(numpy_index_root(vector_settings.chroma_persist_directory))
+    if source == "http":
+        return HttpChromaBackend(
+            host=vector_settings.chroma_server_host,
+            port=vector_settings.chroma_server_port,
+            ssl=vector_settings.chroma_server_ssl,
+            auth_token=vector_settings.chroma_server_auth_token,
+        ).create_client()
+    return EmbeddedChromaBackend(vector_settings.chroma_persist_directory).create_client()
+
+
+def list_knowledge_base_ids(client) -> List[int]:
+    ids = set()
+    for collection in client.list_collections():
+        match = _COLLECTION_PATTERN.match(collection.name)
+        if match:
+            ids.add(int(match.group(1)))
+    return sorted(ids)
+
+
+def directory_size(path: str) -> int:
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+def migrate(client, kb_id: int, quantization: str, page_size: int) -> NumpyIndexCollection:
+    name = f"kb_{kb_id}"
+    root = numpy_index_root(settings.vector_db.chroma_persist_directory)
+    target_dir = os.path.join(root, name)
+    staging_dir = target_dir + ".migrating"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+    # Chroma集合压缩重建后通过别名解析实际集合
+    source = client.get_collection(CollectionAliasRegistry(lambda: client).resolve(kb_id))
+    target = NumpyIndexCollection(name, staging_dir, quantization=quantization)
+    offset = 0
+    while True:
+        page = source.get(
+            include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset
+        )
+        if not page["ids"]:
+            break
+        target.upsert(
+            ids=page["ids"],
+            embeddings=page["embeddings"],
+            documents=page["documents"],
+            metadatas=page["metadatas"],
+        )
+        offset += len(page["ids"])
+
+    if target.count() != source.count():
+        target.close()
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise RuntimeError(f"条数校验失败: source={source.count()}, target={target.count()}")
+    target.close()
+
+    # 原子替换：旧目录先移开再换入新目录
+    if isinstance(client, NumpyIndexClient):
+        client.close()
+    retired_dir = target_dir + ".old"
+    if os.path.isdir(target_dir):
+        os.replace(target_dir, retired_dir)
+    os.replace(staging_dir, target_dir)
+    shutil.rmtree(retired_dir, ignore_errors=True)
+    return NumpyIndexCollection(name, target_dir)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="将知识库向量转换为量化存储的NumPy索引")
+    parser.add_argument("--quantization", choices=["none", "int8", "pq"], required=True, help="量化方式")
+    parser.add_argument("--kb-id", type=int, nargs="*", help="知识库ID（默认全部）")
+    parser.add_argument(
+        "--source",
+        choices=["embedded", "http", "numpy"],
+        default=None,
+        help="来源向量库（默认按CHROMA_MODE）",
+    )
+    parser.add_argument("--page-size", type=int, default=1000, help="每次从来源读取的分块数")
+    args = parser.parse_args()
+
+    source = args.source or settings.vector_db.chroma_mode
+    client = create_source_client(source)
+    kb_ids = args.kb_id or list_knowledge_base_ids(client)
+    print(f"来源: {source}, 量化方式: {args.quantization}, 待迁移知识库: {kb_ids}")
+
+    for kb_id in kb_ids:
+        try:
+            collection = migrate(client, kb_id, args.quantization, args.page_size)
+            stats = collection.stats()
+            print(
+                f"  kb_{kb_id}: {stats['live']} 个分块, "
+                f"常驻 {stats['resident_bytes'] / 1024 / 1024:.1f}MB, "
+                f"磁盘 {directory_size(collection.directory) / 1024 / 1024:.1f}MB"
+                f"（其中float32向量 {stats['vector_disk_bytes'] / 1024 / 1024:.1f}MB）"
+            )
+            collection.close()
+        except Exception as e:
+            print(f"  kb_{kb_id}: 迁移失败 - {str(e)}")
+        if source == "numpy":
+            client = create_source_client(source)
+
+
+if __name__ == "__main__":
+    main()
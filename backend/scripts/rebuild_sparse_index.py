@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+稀疏倒排索引重建脚本
+
+从Chroma向量库读取已有分块，为知识库重建BM25稀疏索引。
+用于启用混合检索前已处理完成的文档（新处理的文档会在处理时自动写入索引）。
+
+使用方式:
+    python scripts/rebuild_sparse_index.py              # 重建所有知识库
+    python scripts/rebuild_sparse_index.py --kb-id 1 2  # 重建指定知识库
+"""
+
+import argparse
+import os
+import re
+import sys
+from pathlib import Path
+from typing import List
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+import chromadb
+
+from app.config import settings
+from app.core.collection_aliases import CollectionAliasRegistry
+from app.core.sparse_index import SparseChunk, get_sparse_index_store
+
+# kb_{id}，压缩重建后为 kb_{id}_g{代数}
+_COLLECTION_PATTERN = re.compile(r"^kb_(\d+)(?:_g\d+)?$")
+
+
+def list_knowledge_base_ids(client) -> List[int]:
+    ids = set()
+    for collection in client.list_collections():
+        match = _COLLECTION_PATTERN.match(collection.name)
+        if match:
+            ids.add(int(match.group(1)))
+    return sorted(ids)
+
+
+def rebuild(client, kb_id: int, page_size: int) -> int:
+    store = get_sparse_index_store()
+    store.delete_knowledge_base(kb_id)
+    index = store.get(kb_id)
+    collection = client.get_collection(CollectionAliasRegistry(lambda: client).resolve(kb_id))
+
+    total = 0
+    offset = 0
+    while True:
+        page = collection.get(
+            include=["documents", "metadatas"], limit=page_size, offset=offset
+        )
+        if not page["ids"]:
+            break
+        index.add_chunks(
+            [
+                SparseChunk(
+                    chunk_id=chunk_id,
+                    document_id=(metadata or {}).get("document_id"),
+                    content=content or "",
+                    metadata=metadata or {},
+                )
+                for chunk_id, content, metadata in zip(
+                    page["ids"], page["documents"], page["metadatas"]
+                )
+            ]
+        )
+        total += len(page["ids"])
+        offset += len(page["ids"])
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="重建知识库稀疏倒排索引")
+    parser.add_argument("--kb-id", type=int, nargs="*", help="知识库ID（默认全部）")
+    parser.add_argument("--page-size", type=int, default=500, help="每次从向量库读取的分块数")
+    args = parser.parse_args()
+
+    if get_sparse_index_store() is None:
+        print("稀疏索引未启用（SPARSE_INDEX_ENABLED=false）")
+        sys.exit(1)
+
+    client = chromadb.PersistentClient(path=settings.vector_db.chroma_persist_directory)
+    kb_ids = args.kb_id or list_knowledge_base_ids(client)
+    print(f"待重建知识库: {kb_ids}")
+
+    for kb_id in kb_ids:
+        try:
+            count = rebuild(client, kb_id, args.page_size)
+            print(f"  kb_{kb_id}: {count} 个分块")
+        except Exception as e:
+            print(f"  kb_{kb_id}: 重建失败 - {str(e)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,9 +12,11 @@ from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import StaticPool
 
 from app.main import app
+from app.core.conversation_memory import reset_conversation_memory_store
 from app.core.database import Base, get_db
 from app.models.user import User
 from app.core.security import hash_password, create_access_token
+from app.services.conversation_context_service import reset_conversation_history_cache
 
 
 # 使用内存SQLite数据库进行测试
@@ -55,6 +57,9 @@ def db() -> Generator[Session, None, None]:
         db.close()
         # 清理所有表
         Base.metadata.drop_all(bind=engine)
+        # 清理按对话ID缓存的历史和记忆，避免下一个测试复用相同ID时读到旧数据
+        reset_conversation_history_cache()
+        reset_conversation_memory_store()
 
 
 @pytest.fixture(scope="function")
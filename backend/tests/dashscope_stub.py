@@ -0,0 +1,166 @@
+"""
+DashScope文本生成接口桩服务
+
+在后台线程中运行的最小HTTP/1.1服务，按DashScope SSE格式流式返回固定文本，
+支持长连接，供流式客户端测试和基准脚本使用（同时兼容DashScope SDK）。
+"""
+
+import asyncio
+import json
+import threading
+from typing import List, Optional, Tuple
+
+
+class DashScopeStubServer:
+    """
+    DashScope流式接口桩服务
+
+    使用方式:
+        with DashScopeStubServer(chunks=5, text="你好") as stub:
+            base_url = stub.base_url  # http://127.0.0.1:{port}/api/v1
+    """
+
+    def __init__(
+        self,
+        chunks: int = 10,
+        text: str = "你好",
+        chunk_delay: float = 0.0,
+        first_chunk_delay: float = 0.0,
+        error: Optional[Tuple[int, str, str]] = None,
+    ):
+        """
+        Args:
+            chunks: 每次响应的数据块数
+            text: 每个数据块的文本
+            chunk_delay: 数据块之间的间隔（秒）
+            first_chunk_delay: 首个数据块前的延迟（秒）
+            error: 以SSE错误事件返回 (HTTP状态码, 错误码, 错误信息)
+        """
+        self.chunks = chunks
+        self.text = text
+        self.chunk_delay = chunk_delay
+        self.first_chunk_delay = first_chunk_delay
+        self.error = error
+
+        self.requests: List[dict] = []
+        self.headers: List[dict] = []
+        self.connections = 0
+        self.port: Optional[int] = None
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/api/v1"
+
+    def start(self) -> "DashScopeStubServer":
+        self._thread = threading.Thread(target=self._run, name="dashscope-stub", daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5)
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "DashScopeStubServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, "127.0.0.1", 0)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode("latin-1").strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.headers.append(headers)
+                self.requests.append(json.loads(body or b"{}"))
+
+                await self._write_stream(writer)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _write_chunk(self, writer: asyncio.StreamWriter, data: bytes) -> None:
+        writer.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        await writer.drain()
+
+    async def _write_stream(self, writer: asyncio.StreamWriter) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream;charset=UTF-8\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"Connection: keep-alive\r\n\r\n"
+        )
+
+        if self.error is not None:
+            status, code, message = self.error
+            payload = json.dumps({"code": code, "message": message, "request_id": "stub"})
+            event = f"id:1\nevent:error\n:HTTP_STATUS/{status}\ndata:{payload}\n\n"
+            await self._write_chunk(writer, event.encode("utf-8"))
+            await self._write_chunk(writer, b"")
+            return
+
+        if self.first_chunk_delay:
+            await asyncio.sleep(self.first_chunk_delay)
+
+        for index in range(self.chunks):
+            if index and self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            finish_reason = "stop" if index == self.chunks - 1 else "null"
+            payload = json.dumps(
+                {
+                    "output": {
+                        "choices": [
+                            {
+                                "message": {"content": self.text, "role": "assistant"},
+                                "finish_reason": finish_reason,
+                            }
+                        ]
+                    },
+                    "usage": {"input_tokens": 1, "output_tokens": index + 1},
+                    "request_id": "stub",
+                },
+                ensure_ascii=False,
+            )
+            event = f"id:{index + 1}\nevent:result\n:HTTP_STATUS/200\ndata:{payload}\n\n"
+            await self._write_chunk(writer, event.encode("utf-8"))
+
+        await self._write_chunk(writer, b"")
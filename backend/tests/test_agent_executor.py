@@ -4,7 +4,11 @@ Agent执行器集成测试
 import pytest
 from unittest.mock import Mock, patch, AsyncMock
 
-from app.langchain_integration.agent_executor import AgentManager
+from app.langchain_integration.agent_executor import (
+    AgentManager,
+    clear_agent_manager,
+    get_agent_manager,
+)
 from app.langchain_integration.tools import (
     CalculatorTool,
     FileOperationsTool,
@@ -136,7 +140,7 @@ class TestAgentManager:
                 # Mock流式执行
                 mock_executor = Mock()
 
-                async def mock_astream(input_dict):
+                async def mock_astream(input_dict, config=None):
                     yield {"type": "step", "data": {"step_number": 1}}
                     yield {"type": "result", "data": {"result": "完成"}}
 
@@ -149,3 +153,58 @@ class TestAgentManager:
 
                 assert len(results) > 0
                 assert any(event["type"] == "result" for event in results)
+
+    @pytest.mark.asyncio
+    async def test_executor_is_reused_with_per_run_callbacks(self, agent_manager):
+        """测试相同工具集合复用AgentExecutor，回调按次传入"""
+        with patch('app.langchain_integration.agent_executor.create_react_agent') as mock_create:
+            with patch('app.langchain_integration.agent_executor.AgentExecutor') as mock_executor_class:
+                mock_executor = AsyncMock()
+                mock_executor.ainvoke.return_value = {"output": "任务完成"}
+                mock_executor_class.return_value = mock_executor
+
+                await agent_manager.execute_task("任务1")
+                await agent_manager.execute_task("任务2")
+
+                assert mock_create.call_count == 1
+                assert mock_executor_class.call_count == 1
+                assert "callbacks" not in mock_executor_class.call_args.kwargs
+                callbacks = [
+                    call.kwargs["config"]["callbacks"][0]
+                    for call in mock_executor.ainvoke.call_args_list
+                ]
+                assert callbacks[0] is not callbacks[1]
+
+                await agent_manager.execute_task("任务3", max_iterations=5)
+                assert mock_executor_class.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_executor_with_custom_tools_is_not_cached(self, agent_manager):
+        """测试包含自定义工具时不缓存AgentExecutor"""
+        custom_tool = Mock()
+        custom_tool.name = "custom_tool"
+
+        with patch('app.langchain_integration.agent_executor.create_react_agent'):
+            with patch('app.langchain_integration.agent_executor.AgentExecutor') as mock_executor_class:
+                mock_executor = AsyncMock()
+                mock_executor.ainvoke.return_value = {"output": "ok"}
+                mock_executor_class.return_value = mock_executor
+
+                await agent_manager.execute_task("任务", custom_tools=[custom_tool])
+                await agent_manager.execute_task("任务", custom_tools=[custom_tool])
+
+                assert mock_executor_class.call_count == 2
+
+
+def test_get_agent_manager_returns_shared_instance():
+    """测试全局Agent管理器在请求之间共享"""
+    clear_agent_manager()
+    try:
+        with patch('app.langchain_integration.agent_executor.Tongyi') as mock_tongyi:
+            first = get_agent_manager()
+            second = get_agent_manager()
+
+        assert first is second
+        assert mock_tongyi.call_count == 1
+    finally:
+        clear_agent_manager()
@@ -0,0 +1,94 @@
+import pytest
+
+
+def test_lookup_matches_near_duplicates_and_invalidates_by_kb():
+    from app.core.answer_cache import SemanticAnswerCache
+
+    cache = SemanticAnswerCache(max_entries=10, similarity_threshold=0.95)
+    scope = cache.scope([2, 1], "v1")
+    cache.store(scope, [1, 2], "什么是Python？", [1.0, 0.0, 0.1], "一种语言", [], 100, 20)
+
+    hit = cache.lookup(cache.scope([1, 2], "v1"), [0.99, 0.01, 0.1])
+    assert hit is not None and hit.answer == "一种语言"
+    assert hit.tokens_saved == 120
+
+    assert cache.lookup(scope, [0.0, 1.0, 0.0]) is None
+    assert cache.lookup(cache.scope([1, 2], "v2"), [1.0, 0.0, 0.1]) is None
+
+    cache.invalidate([2])
+    assert len(cache) == 0
+    assert cache.scope([1, 2], "v1") != scope
+    assert cache.scope([1, 3], "v1") == cache.scope([3, 1], "v1")
+
+
+def test_store_evicts_oldest_entries_over_capacity():
+    from app.core.answer_cache import SemanticAnswerCache
+
+    cache = SemanticAnswerCache(max_entries=2, similarity_threshold=0.99)
+    scope = cache.scope([1])
+    for i, vector in enumerate(([1.0, 0.0], [0.0, 1.0], [-1.0, 0.0])):
+        cache.store(scope, [1], f"q{i}", vector, f"a{i}", [], 1, 1)
+
+    assert len(cache) == 2
+    assert cache.lookup(scope, [1.0, 0.0]) is None
+    assert cache.lookup(scope, [-1.0, 0.0]).answer == "a2"
+
+
+class _VectorStore:
+    embedding_model_id = "test-embedding"
+
+    def __init__(self):
+        self.searches = 0
+
+    async def embed_query(self, query):
+        return [1.0, float(len(query))]
+
+    async def similarity_search_with_score(self, knowledge_base_id, query, k=5, filter_dict=None):
+        from langchain_core.documents import Document
+
+        self.searches += 1
+        return [(Document(page_content="Python是一种语言", metadata={"source": "py.md"}), 0.2)]
+
+
+class _LLM:
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = 0
+        self.llm = self
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        return self.answer
+
+    async def astream(self, prompt):
+        self.calls += 1
+        for ch in self.answer:
+            yield ch
+
+
+@pytest.mark.asyncio
+async def test_rag_manager_replays_cached_answer_until_kb_changes(monkeypatch):
+    from app.core import answer_cache
+    from app.core.answer_cache import SemanticAnswerCache
+    from app.langchain_integration.rag_chain import RAGManager
+
+    cache = SemanticAnswerCache(max_entries=10, similarity_threshold=0.95)
+    monkeypatch.setattr(answer_cache, "get_answer_cache", lambda: cache)
+    vector_store = _VectorStore()
+    llm = _LLM("Python是一种编程语言。")
+    manager = RAGManager(vector_store_manager=vector_store, llm=llm, answer_cache=cache)
+
+    first = await manager.query([1], "什么是Python")
+    assert not first.cached and first.tokens_used > 0
+
+    events = [e async for e in manager.stream_query([1], "什么是Python")]
+    assert llm.calls == 1 and vector_store.searches == 1
+    assert [e["type"] for e in events][:2] == ["sources", "token"]
+    assert "".join(e["content"] for e in events if e["type"] == "token") == llm.answer
+    assert events[-1]["cached"] is True and events[-1]["tokens_used"] == 0
+    assert events[0]["sources"][0]["document_name"] == "py.md"
+
+    answer_cache.invalidate_answer_cache([1])
+    second = await manager.query([1], "什么是Python")
+    assert not second.cached
+    assert llm.calls == 2
@@ -0,0 +1,80 @@
+import pytest
+
+
+@pytest.fixture
+def conversation(db, test_user):
+    from app.services.conversation_service import ConversationService
+
+    return ConversationService(db).create_conversation(user_id=test_user.id)
+
+
+@pytest.fixture
+def writer(db):
+    from app.tasks.chat_persistence import ChatPersistenceWriter
+    from tests.conftest import TestingSessionLocal
+
+    return ChatPersistenceWriter(
+        batch_size=10, flush_interval_ms=20, queue_size=100, session_factory=TestingSessionLocal
+    )
+
+
+@pytest.mark.asyncio
+async def test_queued_replies_are_written_in_one_batch(db, test_user, conversation, writer):
+    from app.models.api_usage import APIUsage
+    from app.models.message import Message, MessageRole
+    from app.services.quota_service import QuotaService
+    from app.tasks.chat_persistence import ChatReply
+
+    QuotaService(db).get_user_quota(test_user.id)
+    flushed = []
+    original = writer._write_batch
+    writer._write_batch = lambda batch: flushed.append(len(batch)) or original(batch)
+
+    await writer.start()
+    for i in range(3):
+        assert writer.submit(
+            ChatReply(
+                conversation_id=conversation.id,
+                user_id=test_user.id,
+                content=f"a{i}",
+                tokens=100,
+            )
+        )
+    await writer.stop()
+
+    db.expire_all()
+    messages = db.query(Message).filter(Message.conversation_id == conversation.id).all()
+    assert [m.content for m in messages] == ["a0", "a1", "a2"]
+    assert all(m.role == MessageRole.ASSISTANT for m in messages)
+    assert db.query(APIUsage).filter(APIUsage.user_id == test_user.id).count() == 3
+    assert QuotaService(db).get_user_quota(test_user.id).used_quota == 300
+    assert flushed == [3]
+
+
+@pytest.mark.asyncio
+async def test_reply_is_saved_without_charging_when_quota_is_exhausted(
+    db, test_user, conversation, writer
+):
+    from app.models.api_usage import APIUsage
+    from app.models.message import Message
+    from app.services.quota_service import QuotaService
+    from app.tasks.chat_persistence import ChatReply
+
+    quota = QuotaService(db).get_user_quota(test_user.id)
+    quota.used_quota = quota.monthly_quota - 50
+    db.commit()
+
+    message_id = await writer.persist(
+        ChatReply(conversation_id=conversation.id, user_id=test_user.id, content="a", tokens=100)
+    )
+
+    db.expire_all()
+    assert db.query(Message).filter(Message.id == message_id).count() == 1
+    assert db.query(APIUsage).count() == 0
+    assert QuotaService(db).get_user_quota(test_user.id).remaining_quota == 50
+
+
+def test_submit_is_rejected_when_writer_is_not_started(writer):
+    from app.tasks.chat_persistence import ChatReply
+
+    assert not writer.submit(ChatReply(conversation_id=1, user_id=1, content="a"))
@@ -34,3 +34,39 @@ def test_chat_stream_returns_mock_response_when_api_key_placeholder(
     assert "模拟回复" in token_text
     assert any(e.get("type") == "done" for e in events)
 
+
+def test_sync_persisted_reply_is_appended_to_cached_history(client, auth_headers, monkeypatch):
+    from app.config import settings
+    from app.core.llm import clear_llm_cache
+    from app.services.conversation_context_service import (
+        HISTORY_NAMESPACE, get_conversation_history_cache, reset_conversation_history_cache)
+    from app.tasks.chat_persistence import get_chat_persistence_writer
+    from tests.conftest import TestingSessionLocal
+
+    monkeypatch.setattr(settings, "debug", True, raising=False)
+    monkeypatch.setattr(settings, "environment", "development", raising=False)
+    monkeypatch.setattr(
+        settings.tongyi, "dashscope_api_key", "DUMMY_DASHSCOPE_API_KEY", raising=False
+    )
+    monkeypatch.setattr(
+        settings.conversation_memory, "conversation_history_cache_enabled", True, raising=False
+    )
+    clear_llm_cache()
+    reset_conversation_history_cache()
+    # 写入队列不可用时走同步写入
+    writer = get_chat_persistence_writer()
+    monkeypatch.setattr(writer, "submit", lambda reply: False)
+    monkeypatch.setattr(writer, "session_factory", TestingSessionLocal)
+
+    events = []
+    payload = {"conversation_id": None, "content": "你好", "config": {}}
+    with client.stream("POST", "/api/v1/chat/stream", headers=auth_headers, json=payload) as resp:
+        for line in resp.iter_lines():
+            if line.startswith("data: ") and line[6:].strip() != "[DONE]":
+                events.append(json.loads(line[6:]))
+
+    done = next(e for e in events if e.get("type") == "done")
+    assert done["message_id"]
+    entry = get_conversation_history_cache().get_entry(HISTORY_NAMESPACE, done["conversation_id"])
+    assert [m["role"] for m in entry.messages][-2:] == ["USER", "ASSISTANT"]
+    reset_conversation_history_cache()
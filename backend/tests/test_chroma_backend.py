@@ -0,0 +1,116 @@
+import shutil
+import socket
+import subprocess
+import time
+
+import pytest
+import requests
+
+
+def test_backend_follows_chroma_mode(monkeypatch):
+    from app.config import settings
+    from app.core.chroma_backend import (EmbeddedChromaBackend, HttpChromaBackend,
+                                         build_vector_store_backend)
+
+    monkeypatch.setattr(settings.vector_db, "chroma_mode", "embedded")
+    backend = build_vector_store_backend("/tmp/chroma-test")
+    assert isinstance(backend, EmbeddedChromaBackend)
+    assert backend.persist_directory == "/tmp/chroma-test"
+
+    monkeypatch.setattr(settings.vector_db, "chroma_mode", "http")
+    monkeypatch.setattr(settings.vector_db, "chroma_server_host", "chroma")
+    monkeypatch.setattr(settings.vector_db, "chroma_server_auth_token", "token")
+    backend = build_vector_store_backend("/tmp/chroma-test")
+    assert isinstance(backend, HttpChromaBackend)
+    assert backend.describe() == f"http://chroma:{settings.vector_db.chroma_server_port}"
+    assert backend._headers() == {"Authorization": "Bearer token"}
+
+
+def test_http_session_gets_pooled_adapter_with_default_timeout():
+    from app.core.chroma_backend import configure_http_session
+
+    class _Server:
+        _session = requests.Session()
+
+    class _Client:
+        _server = _Server()
+
+    assert configure_http_session(
+        _Client(), pool_size=7, connect_timeout=1.5, read_timeout=9.0, max_retries=3
+    )
+    adapter = _Server._session.get_adapter("http://chroma:8000/api/v1/heartbeat")
+    assert adapter._pool_maxsize == 7
+    assert adapter.max_retries.connect == 3
+    assert adapter.max_retries.read == 0
+
+    sent = {}
+
+    def _send(self, request, **kwargs):
+        sent.update(kwargs)
+        raise requests.ConnectionError()
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(requests.adapters.HTTPAdapter, "send", _send)
+        with pytest.raises(requests.ConnectionError):
+            _Server._session.get("http://chroma:8000/api/v1/heartbeat")
+    assert sent["timeout"] == (1.5, 9.0)
+
+
+def test_unknown_client_is_left_unconfigured():
+    from app.core.chroma_backend import configure_http_session
+
+    assert not configure_http_session(
+        object(), pool_size=1, connect_timeout=1, read_timeout=1, max_retries=0
+    )
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def chroma_server(tmp_path):
+    if shutil.which("chroma") is None:
+        pytest.skip("chroma命令不可用")
+    port = _free_port()
+    process = subprocess.Popen(
+        ["chroma", "run", "--path", str(tmp_path / "server"), "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(100):
+            try:
+                requests.get(f"http://127.0.0.1:{port}/api/v1/heartbeat", timeout=0.5)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        else:
+            pytest.skip("chroma服务未能启动")
+        yield port
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def test_manager_reads_and_writes_through_chroma_server(tmp_path, chroma_server):
+    from app.core.chroma_backend import HttpChromaBackend
+    from app.core.vector_store import VectorStoreManager
+
+    backend = HttpChromaBackend(host="127.0.0.1", port=chroma_server, pool_size=4)
+    writer = VectorStoreManager(
+        persist_directory=str(tmp_path / "a"), api_key="DUMMY_DASHSCOPE_API_KEY", backend=backend
+    )
+    reader = VectorStoreManager(
+        persist_directory=str(tmp_path / "b"), api_key="DUMMY_DASHSCOPE_API_KEY", backend=backend
+    )
+
+    writer.client.get_or_create_collection("kb_1").add(
+        ids=["c1"], embeddings=[[0.1, 0.2, 0.3]], documents=["hello"]
+    )
+
+    assert reader.client.get_collection("kb_1").count() == 1
+    writer.delete_collection(1)
+    assert "kb_1" not in [c.name for c in reader.client.list_collections()]
@@ -0,0 +1,110 @@
+import pytest
+from langchain_core.documents import Document
+
+
+def test_store_roundtrip_and_model_isolation(tmp_path):
+    from app.core.chunk_embedding_store import ChunkEmbeddingStore
+
+    store = ChunkEmbeddingStore(str(tmp_path / "chunks.sqlite3"))
+    store.put_many("model-a", [("你好", [0.5, -0.25]), ("world", [1.0, 2.0])])
+    store.put_many("model-a", [("你好", [9.0, 9.0])])
+
+    found = store.get_many("model-a", ["你好", "world", "missing"])
+    assert found == {"你好": [0.5, -0.25], "world": [1.0, 2.0]}
+    assert store.get_many("model-b", ["你好"]) == {}
+    assert store.count("model-a") == 2
+    store.close()
+
+
+def test_delete_keeps_vectors_still_referenced_elsewhere(tmp_path):
+    from app.core.chunk_embedding_store import ChunkEmbeddingStore
+
+    store = ChunkEmbeddingStore(str(tmp_path / "chunks.sqlite3"))
+    store.put_many("m", [("共享", [1.0]), ("独有", [2.0])], knowledge_base_id=1, document_id=10)
+    # 同一分块在另一个知识库中复用
+    assert store.get_many("m", ["共享"], knowledge_base_id=2, document_id=20) == {"共享": [1.0]}
+
+    assert store.delete_document(knowledge_base_id=1, document_id=10) == 1
+    assert store.get_many("m", ["共享", "独有"]) == {"共享": [1.0]}
+
+    assert store.delete_knowledge_base(2) == 1
+    assert store.count() == 0
+    store.close()
+
+
+def test_store_evicts_least_recently_used_over_capacity(tmp_path):
+    from app.core.chunk_embedding_store import ChunkEmbeddingStore
+
+    store = ChunkEmbeddingStore(str(tmp_path / "chunks.sqlite3"), max_entries=10)
+    store.put_many("m", [(f"t{i}", [float(i)]) for i in range(10)], knowledge_base_id=1)
+    # 刷新t0的使用时间，使其不被淘汰
+    store.get_many("m", ["t0"])
+    store.put_many("m", [("new", [1.0])], knowledge_base_id=1)
+
+    assert store.count() == 9
+    assert set(store.get_many("m", ["t0", "new", "t1", "t2"])) == {"t0", "new"}
+    store.close()
+
+
+def test_store_upgrades_existing_database(tmp_path):
+    import sqlite3
+
+    from app.core.chunk_embedding_store import ChunkEmbeddingStore, chunk_key
+
+    path = str(tmp_path / "chunks.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE chunk_embeddings (key TEXT PRIMARY KEY, model TEXT NOT NULL, "
+        "dim INTEGER NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO chunk_embeddings VALUES (?, 'm', 1, ?, 1.0)",
+        (chunk_key("m", "旧"), ChunkEmbeddingStore._encode([3.0])),
+    )
+    conn.commit()
+    conn.close()
+
+    store = ChunkEmbeddingStore(path)
+    store.put_many("m", [("新", [4.0])], knowledge_base_id=1)
+
+    assert store.prune(1) == 1
+    assert store.get_many("m", ["旧", "新"]) == {"新": [4.0]}
+    store.close()
+
+
+class _CountingVectorStore:
+    embedding_model_id = "stub"
+
+    def __init__(self):
+        self.embedded = 0
+
+    async def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+    async def upsert_embedded_documents(self, knowledge_base_id, documents, embeddings, document_id=None, ids=None):
+        assert len(documents) == len(embeddings)
+        return ids
+
+
+@pytest.mark.asyncio
+async def test_pipeline_only_embeds_unseen_chunks(tmp_path):
+    from app.core.chunk_embedding_store import ChunkEmbeddingStore
+    from app.tasks.embedding_pipeline import BatchEmbeddingPipeline
+
+    store = ChunkEmbeddingStore(str(tmp_path / "chunks.sqlite3"))
+    vs = _CountingVectorStore()
+
+    def chunks(texts):
+        return [Document(page_content=t, metadata={"chunk_index": i}) for i, t in enumerate(texts)]
+
+    first = BatchEmbeddingPipeline(vs, knowledge_base_id=1, document_id=1, batch_size=2, chunk_store=store)
+    await first.run(chunks(["a", "a", "b", "c"]))
+    assert vs.embedded == 3
+
+    # 同一文件上传到另一个知识库，外加一个新分块
+    second = BatchEmbeddingPipeline(vs, knowledge_base_id=2, document_id=2, batch_size=2, chunk_store=store)
+    await second.run(chunks(["a", "b", "c", "d"]))
+    assert vs.embedded == 4
+    assert second.reused_count == 3
+    store.close()
@@ -0,0 +1,151 @@
+import asyncio
+
+import numpy as np
+
+
+class _RebuildOnlyCollection:
+    """隐藏compact，让NumPy集合按Chroma集合的方式走重建流程"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        if name == "compact":
+            raise AttributeError(name)
+        return getattr(self._collection, name)
+
+
+def _manager(tmp_path):
+    from app.core.chroma_backend import VectorStoreBackend
+    from app.core.numpy_index import NumpyIndexClient
+    from app.core.vector_store import VectorStoreManager
+
+    class _Client(NumpyIndexClient):
+        def get_or_create_collection(self, name, *args, **kwargs):
+            collection = super().get_or_create_collection(name, *args, **kwargs)
+            wrappers = self.__dict__.setdefault("wrappers", {})
+            if name not in wrappers or wrappers[name]._collection is not collection:
+                wrappers[name] = _RebuildOnlyCollection(collection)
+            return wrappers[name]
+
+        create_collection = get_or_create_collection
+
+    class _Backend(VectorStoreBackend):
+        def create_client(self):
+            return _Client(str(tmp_path / "index"), ivf_threshold=10**9)
+
+        def describe(self):
+            return "rebuild-only"
+
+    return VectorStoreManager(
+        persist_directory=str(tmp_path / "chroma"),
+        api_key="DUMMY_DASHSCOPE_API_KEY",
+        backend=_Backend(),
+    )
+
+
+def _fill(collection, ids, document_id, seed):
+    vectors = np.random.default_rng(seed).normal(size=(len(ids), 8)).astype(np.float32)
+    collection.upsert(
+        ids=ids,
+        embeddings=vectors,
+        documents=[f"text {i}" for i in ids],
+        metadatas=[{"document_id": document_id(i)} for i in range(len(ids))],
+    )
+    return vectors
+
+
+def test_registry_switch_is_visible_after_refresh(tmp_path):
+    from app.core.collection_aliases import CollectionAliasRegistry
+    from app.core.numpy_index import NumpyIndexClient
+
+    writer_client = NumpyIndexClient(str(tmp_path))
+    reader_client = NumpyIndexClient(str(tmp_path))
+    writer = CollectionAliasRegistry(lambda: writer_client, refresh_seconds=3600)
+    reader = CollectionAliasRegistry(lambda: reader_client, refresh_seconds=3600)
+
+    assert reader.resolve(1) == "kb_1"
+    writer.add_tombstones(1, 5)
+    writer.switch(1, "kb_1_g1", generation=1, retired="kb_1")
+    writer.add_tombstones(1, 2)
+
+    # 缓存未过期时仍读旧集合，写入前刷新后切换到新集合
+    assert reader.resolve(1) == "kb_1"
+    assert reader.resolve(1, refresh=True) == "kb_1_g1"
+    record = reader.get_record(1)
+    assert (record["generation"], record["retired"], record["tombstones"]) == (1, "kb_1", 2)
+
+    writer.delete(1)
+    assert writer.resolve(1) == "kb_1"
+
+
+def test_manager_rebuilds_collection_and_switches_alias(tmp_path, monkeypatch):
+    from app.config import settings
+
+    manager = _manager(tmp_path)
+    source = manager.client.get_or_create_collection("kb_1")
+    vectors = _fill(source, [f"c{i}" for i in range(100)], lambda i: i % 5, seed=7)
+    assert manager.compact_collection(1, min_tombstone_ratio=0.1, min_tombstones=1)["status"] == "skipped"
+
+    assert asyncio.run(manager.delete_by_document_id(1, 0)) is True
+    assert manager.aliases.get_record(1)["tombstones"] == 20
+
+    result = manager.compact_collection(1, min_tombstone_ratio=0.1, min_tombstones=1)
+    assert result["status"] == "compacted" and result["collection_name"] == "kb_1_g1"
+    assert (result["rows_before"], result["rows_after"], result["reclaimed"]) == (100, 80, 20)
+    assert manager.get_collection_stats(1) == {
+        "collection_name": "kb_1_g1",
+        "document_count": 80,
+        "knowledge_base_id": 1,
+    }
+    copied = manager.client.get_collection("kb_1_g1").get(ids=["c99"], include=["embeddings"])
+    assert copied["embeddings"][0] == vectors[99].tolist()
+
+    # 旧集合在宽限期内保留，之后的压缩先删除旧集合
+    assert manager.list_knowledge_base_ids() == [1]
+    assert manager.compact_collection(1, force=True)["reason"] == "retiring"
+    monkeypatch.setattr(settings.vector_db, "vector_compaction_retire_grace_seconds", 0.0)
+    assert manager.compact_collection(1, force=True)["collection_name"] == "kb_1_g2"
+    assert manager._list_collection_names(1) == ["kb_1_g1", "kb_1_g2"]
+
+    assert manager.delete_collection(1) is True
+    assert manager.list_knowledge_base_ids() == []
+    assert manager.aliases.resolve(1) == "kb_1"
+    manager.close()
+
+
+def test_rebuild_keeps_writes_made_during_copy_and_after_switch(tmp_path):
+    manager = _manager(tmp_path)
+    source = manager.client.get_or_create_collection("kb_1")
+    _fill(source, [f"c{i}" for i in range(100)], lambda i: i % 5, seed=3)
+    assert asyncio.run(manager.delete_by_document_id(1, 0)) is True
+
+    # 分页复制第一页后删除20行、新增20行，集合条数不变
+    original_get = source.get
+    writes = []
+
+    def get_then_write(**kwargs):
+        page = original_get(**kwargs)
+        if "embeddings" in kwargs.get("include", []) and not writes:
+            writes.append(True)
+            source.delete(where={"document_id": 1})
+            _fill(source, [f"n{i}" for i in range(20)], lambda i: 9, seed=4)
+        return page
+
+    source.get = get_then_write
+    result = manager.compact_collection(1, min_tombstone_ratio=0.1, min_tombstones=1)
+    assert writes and result["status"] == "compacted"
+    assert "disk_bytes_before" not in result
+
+    target = manager.client.get_collection("kb_1_g1")
+    source_ids = set(original_get(include=[])["ids"])
+    assert set(target.get(include=[])["ids"]) == source_ids
+    assert "n0" in source_ids and "c1" not in source_ids
+
+    # 切换前已解析到旧集合的写入方在写入后补写到当前集合
+    _fill(source, ["late"], lambda i: 8, seed=5)
+    manager._replay_if_switched(1, "kb_1", ids=["late"])
+    manager._replay_if_switched(1, "kb_1", where={"document_id": 9})
+    remaining = set(target.get(include=[])["ids"])
+    assert "late" in remaining and not any(i.startswith("n") for i in remaining)
+    manager.close()
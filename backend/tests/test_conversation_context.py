@@ -0,0 +1,84 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+@contextmanager
+def _count_message_selects(db):
+    statements = []
+
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith("SELECT") and "FROM messages" in statement:
+            statements.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", _before)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", _before)
+
+
+def test_context_loads_window_and_user_turns_in_one_query(db, test_user):
+    from app.models.message import MessageRole
+    from app.services.conversation_context_service import (
+        ConversationContextService, reset_conversation_history_cache)
+    from app.services.conversation_service import ConversationService
+
+    service = ConversationService(db)
+    conversation = service.create_conversation(user_id=test_user.id)
+    for i in range(3):
+        service.add_message(conversation.id, test_user.id, MessageRole.USER, f"q{i}")
+        service.add_message(conversation.id, test_user.id, MessageRole.ASSISTANT, f"a{i}")
+    reset_conversation_history_cache()
+
+    context_service = ConversationContextService(db, window=4)
+    with _count_message_selects(db) as selects:
+        context = context_service.get_context(conversation.id)
+
+    assert len(selects) == 1
+    assert context.user_turns == 3
+    assert context.history == [
+        {"role": "USER", "content": "q1"},
+        {"role": "ASSISTANT", "content": "a1"},
+        {"role": "USER", "content": "q2"},
+        {"role": "ASSISTANT", "content": "a2"},
+    ]
+
+
+def test_history_cache_defaults_to_off_without_shared_tier(monkeypatch):
+    from app.config import settings
+    from app.services.conversation_context_service import get_conversation_history_cache
+
+    memory_settings = settings.conversation_memory
+    monkeypatch.setattr(memory_settings, "conversation_history_cache_enabled", None)
+    monkeypatch.setattr(memory_settings, "conversation_memory_redis_enabled", False)
+    assert get_conversation_history_cache() is None
+
+
+def test_cached_window_is_appended_on_add_message(db, test_user, monkeypatch):
+    from app.config import settings
+    from app.models.message import MessageRole
+    from app.services.conversation_service import ConversationService
+
+    monkeypatch.setattr(settings.conversation_memory, "conversation_history_cache_enabled", True)
+    service = ConversationService(db)
+    conversation = service.create_conversation(user_id=test_user.id)
+
+    assert service.get_conversation_context(conversation.id).is_first_user_message
+
+    service.add_message(conversation.id, test_user.id, MessageRole.USER, "你好")
+    service.add_message(conversation.id, test_user.id, MessageRole.ASSISTANT, "你好！")
+
+    with _count_message_selects(db) as selects:
+        context = service.get_conversation_context(conversation.id)
+
+    assert selects == []
+    assert context.user_turns == 1
+    assert not context.is_first_user_message
+    assert [m["content"] for m in context.history] == ["你好", "你好！"]
+
+    service.delete_conversation(conversation.id, test_user.id)
+    with _count_message_selects(db) as selects:
+        service.get_conversation_context(conversation.id)
+    assert len(selects) == 1
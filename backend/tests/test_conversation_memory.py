@@ -0,0 +1,121 @@
+import pytest
+from prometheus_client import REGISTRY
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def hmget(self, key, *fields):
+        return [self.data.get(key, {}).get(field) for field in fields]
+
+    def pipeline(self):
+        return self
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+
+    def expire(self, key, ttl):
+        pass
+
+    def execute(self):
+        pass
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def _turn(i, size=10):
+    return [
+        {"role": "USER", "content": f"q{i}" + "x" * size},
+        {"role": "ASSISTANT", "content": f"a{i}" + "x" * size},
+    ]
+
+
+def _messages(question, answer):
+    return [{"role": "USER", "content": question}, {"role": "ASSISTANT", "content": answer}]
+
+
+def test_window_keeps_latest_messages_within_token_budget():
+    from app.core.conversation_memory import window_messages
+
+    messages = [m for i in range(10) for m in _turn(i, size=38)]  # 每条10 tokens
+
+    window = window_messages(messages, max_tokens=45, max_messages=20)
+
+    assert [m["content"][:2] for m in window] == ["q8", "a8", "q9", "a9"]
+    assert window_messages(messages, max_tokens=1000, max_messages=3)[0]["role"] == "USER"
+
+
+def test_in_memory_tier_is_bounded_and_reports_usage(monkeypatch):
+    from app.core import conversation_memory
+    from app.core.conversation_memory import (ConversationMemoryStore,
+                                              InMemoryConversationTier)
+
+    store = ConversationMemoryStore(local=InMemoryConversationTier(max_entries=3, ttl_seconds=60))
+    for cid in range(5):
+        store.append_turn("chat", cid, "问题", "回答")
+
+    assert store.load("chat", 0) is None
+    assert store.load("chat", 4) == _messages("问题", "回答")
+    labels = {"store": "memory"}
+    assert REGISTRY.get_sample_value("conversation_memory_entries", labels) == 3
+    assert (
+        REGISTRY.get_sample_value("conversation_memory_bytes", labels)
+        == store.local.stats()["size_bytes"]
+    )
+
+    now = conversation_memory.time.monotonic()
+    monkeypatch.setattr(conversation_memory.time, "monotonic", lambda: now + 120)
+    store.append_turn("chat", 99, "新问题", "新回答")
+    assert len(store.local) == 1
+
+
+def test_workers_share_memory_through_redis_tier(monkeypatch):
+    from app.core import conversation_memory
+    from app.core.conversation_memory import (ConversationMemoryStore,
+                                              InMemoryConversationTier,
+                                              RedisConversationTier)
+
+    fake = _FakeRedis()
+    monkeypatch.setattr(conversation_memory, "get_redis_client", lambda: fake)
+    worker_a = ConversationMemoryStore(local=InMemoryConversationTier(), shared=RedisConversationTier())
+    worker_b = ConversationMemoryStore(local=InMemoryConversationTier(), shared=RedisConversationTier())
+
+    worker_a.append_turn("rag", "7", "q1", "a1")
+    assert worker_b.load("rag", "7") == _messages("q1", "a1")
+
+    worker_a.append_turn("rag", "7", "q2", "a2")
+    assert worker_b.load("rag", "7") == _messages("q1", "a1") + _messages("q2", "a2")
+    assert "memory:conversation:rag:7" in fake.data
+
+
+@pytest.mark.asyncio
+async def test_conversation_manager_seeds_memory_from_history(monkeypatch):
+    from app.core.conversation_memory import (ConversationMemoryStore,
+                                              InMemoryConversationTier)
+    from app.langchain_integration.chains import ConversationManager
+
+    prompts = []
+
+    class _LLM:
+        async def ainvoke(self, prompt):
+            prompts.append(prompt)
+            return "好的"
+
+    class _Wrapper:
+        llm = _LLM()
+
+    store = ConversationMemoryStore(local=InMemoryConversationTier())
+    manager = ConversationManager(memory_store=store)
+    monkeypatch.setattr(manager, "_get_llm", lambda config, streaming=False: _Wrapper())
+
+    await manager.chat(1, "第二个问题", history=_messages("第一个问题", "第一个回答"))
+    await manager.chat(1, "第三个问题")
+
+    assert "第一个问题" in prompts[1] and "第二个问题" in prompts[1]
+    assert manager.get_memory_messages(1)[-2:] == _messages("第三个问题", "好的")
+    assert len(manager.get_memory_messages(1)) == 6
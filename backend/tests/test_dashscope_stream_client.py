@@ -0,0 +1,66 @@
+import pytest
+
+from tests.dashscope_stub import DashScopeStubServer
+
+
+async def _lines(items):
+    for item in items:
+        yield item
+
+
+@pytest.fixture
+def stream_client_reset(monkeypatch):
+    from app.core import dashscope_client
+
+    monkeypatch.setattr(dashscope_client, "_stream_client", None)
+
+
+@pytest.mark.asyncio
+async def test_sse_parser_handles_comments_and_multiline_data():
+    from app.core.dashscope_client import iter_sse_events
+
+    lines = ["id:1", "event:result", ":HTTP_STATUS/200", "data:a", "data: b", "", "data:c"]
+    events = [event async for event in iter_sse_events(_lines(lines))]
+
+    assert [(e.event, e.id, e.data) for e in events] == [("result", "1", "a\nb"), ("message", None, "c")]
+    assert events[0].comments == ["HTTP_STATUS/200"]
+
+
+@pytest.mark.asyncio
+async def test_streaming_llm_uses_native_client_over_keepalive(stream_client_reset, monkeypatch):
+    from app.config import settings
+    from app.core.llm import PatchedTongyi
+
+    with DashScopeStubServer(chunks=5, text="你好") as stub:
+        monkeypatch.setattr(settings.tongyi, "dashscope_base_url", stub.base_url)
+        monkeypatch.setattr(settings.tongyi, "tongyi_native_stream_enabled", True)
+
+        llm = PatchedTongyi(dashscope_api_key="sk-test", model_name="qwen-turbo", streaming=True)
+        first = [chunk async for chunk in llm.astream("问题")]
+        second = [chunk async for chunk in llm.astream("问题")]
+
+    assert "".join(first) == "你好" * 5
+    assert second == first
+    assert stub.connections == 1
+    assert stub.headers[0]["authorization"] == "Bearer sk-test"
+    assert stub.requests[0]["input"] == {"prompt": "问题"}
+    assert stub.requests[0]["parameters"]["incremental_output"] is True
+
+
+@pytest.mark.asyncio
+async def test_native_stream_raises_on_error_event(stream_client_reset, monkeypatch):
+    from app.config import settings
+    from app.core.dashscope_client import (DashScopeAPIError,
+                                           get_dashscope_stream_client)
+
+    with DashScopeStubServer(error=(401, "InvalidApiKey", "Invalid API-key provided.")) as stub:
+        monkeypatch.setattr(settings.tongyi, "dashscope_base_url", stub.base_url)
+
+        with pytest.raises(DashScopeAPIError) as exc_info:
+            async for _ in get_dashscope_stream_client().stream_generation(
+                model="qwen-turbo", prompt="x", api_key="bad"
+            ):
+                pass
+
+    assert exc_info.value.status_code == 401
+    assert exc_info.value.code == "InvalidApiKey"
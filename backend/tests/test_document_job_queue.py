@@ -0,0 +1,231 @@
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+from io import BytesIO
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models.document import Document, DocumentStatus
+from app.models.document_job import DocumentJob, DocumentJobStatus
+from app.models.knowledge_base import KnowledgeBase
+
+
+def _seed(db, user_id, docs_per_kb):
+    doc_ids = []
+    for kb_index, count in enumerate(docs_per_kb):
+        kb = KnowledgeBase(user_id=user_id, name=f"kb{kb_index}")
+        db.add(kb)
+        db.flush()
+        for i in range(count):
+            doc = Document(
+                knowledge_base_id=kb.id,
+                filename=f"{kb_index}_{i}.txt",
+                file_path=f"/tmp/{kb_index}_{i}.txt",
+                file_size=1,
+                file_type="txt",
+            )
+            db.add(doc)
+            db.flush()
+            doc_ids.append((doc.id, kb.id))
+    db.commit()
+    return doc_ids
+
+
+def test_claim_respects_per_kb_limit_and_requeues_stale(db, test_user):
+    from app.repositories.document_job_repository import DocumentJobRepository
+
+    repo = DocumentJobRepository(db)
+    for doc_id, kb_id in _seed(db, test_user.id, [3, 1]):
+        repo.enqueue(doc_id, kb_id)
+
+    claimed = [repo.claim_next("w1", per_kb_limit=2) for _ in range(4)]
+    assert [job is not None for job in claimed] == [True, True, True, False]
+    assert sorted(job.knowledge_base_id for job in claimed[:3]) == [1, 1, 2]
+
+    # 第一个任务的worker失联：心跳过期后重新排队，领取次数用尽的任务标记失败
+    stale = claimed[0]
+    stale.heartbeat_at = datetime.utcnow() - timedelta(minutes=10)
+    claimed[1].heartbeat_at = datetime.utcnow() - timedelta(minutes=10)
+    claimed[1].attempts = 3
+    db.commit()
+
+    requeued, failed = repo.requeue_stale(datetime.utcnow() - timedelta(minutes=3), max_attempts=3)
+    assert requeued == [stale.document_id]
+    assert failed == [claimed[1].document_id]
+    assert repo.mark_completed(stale.id, "w1") is False
+
+    again = repo.claim_next("w2", per_kb_limit=2)
+    assert again.document_id in (stale.document_id, 3)
+
+
+def test_orphaned_processing_documents_are_enqueued(db, test_user):
+    from app.repositories.document_job_repository import DocumentJobRepository
+
+    seeded = _seed(db, test_user.id, [2])
+    repo = DocumentJobRepository(db)
+    repo.enqueue(*seeded[0])
+
+    assert repo.enqueue_orphaned_processing_documents() == [seeded[1][0]]
+    assert repo.enqueue_orphaned_processing_documents() == []
+
+
+@pytest.mark.asyncio
+async def test_worker_processes_queue_with_concurrency_limits(tmp_path, monkeypatch):
+    from app.models.user import User
+    from app.repositories.document_job_repository import DocumentJobRepository
+    from app.tasks import document_worker as worker_module
+
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'jobs.db'}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = Session()
+    user = User(username="u", email="u@example.com", password_hash="x", is_active=True)
+    db.add(user)
+    db.commit()
+    seeded = _seed(db, user.id, [4, 4])
+    for doc_id, kb_id in seeded:
+        DocumentJobRepository(db).enqueue(doc_id, kb_id)
+    kb_of = dict(seeded)
+    db.close()
+
+    running = {"total": 0, "peak": 0, "per_kb": {}, "per_kb_peak": 0}
+
+    async def _fake_process(document_id, progress_callback=None, parse_executor=None):
+        kb_id = kb_of[document_id]
+        running["total"] += 1
+        running["per_kb"][kb_id] = running["per_kb"].get(kb_id, 0) + 1
+        running["peak"] = max(running["peak"], running["total"])
+        running["per_kb_peak"] = max(running["per_kb_peak"], running["per_kb"][kb_id])
+        await progress_callback(50, "processing")
+        await asyncio.sleep(0.05)
+        running["total"] -= 1
+        running["per_kb"][kb_id] -= 1
+        return document_id % 4 != 0
+
+    monkeypatch.setattr(worker_module, "process_document_task", _fake_process)
+
+    worker = worker_module.DocumentWorker(
+        concurrency=3,
+        per_kb_concurrency=1,
+        parse_processes=0,
+        poll_interval=0.01,
+        session_factory=Session,
+    )
+    await worker.start()
+    for _ in range(300):
+        check = Session()
+        remaining = check.query(DocumentJob).filter(
+            DocumentJob.status.in_([DocumentJobStatus.QUEUED, DocumentJobStatus.RUNNING])
+        ).count()
+        check.close()
+        if remaining == 0:
+            break
+        await asyncio.sleep(0.02)
+    await worker.stop()
+
+    assert running["peak"] <= 2
+    assert running["per_kb_peak"] == 1
+
+    check = Session()
+    statuses = {job.document_id: job.status for job in check.query(DocumentJob).all()}
+    check.close()
+    assert all(
+        status == (DocumentJobStatus.FAILED if doc_id % 4 == 0 else DocumentJobStatus.COMPLETED)
+        for doc_id, status in statuses.items()
+    )
+
+
+@pytest.mark.asyncio
+async def test_worker_marks_job_failed_when_processing_raises(tmp_path, monkeypatch):
+    from app.models.user import User
+    from app.repositories.document_job_repository import DocumentJobRepository
+    from app.tasks import document_worker as worker_module
+
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'jobs.db'}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = Session()
+    user = User(username="u", email="u@example.com", password_hash="x", is_active=True)
+    db.add(user)
+    db.commit()
+    (doc_id, kb_id), = _seed(db, user.id, [1])
+    db.query(Document).filter(Document.id == doc_id).update({"status": DocumentStatus.PROCESSING})
+    db.commit()
+    DocumentJobRepository(db).enqueue(doc_id, kb_id)
+    db.close()
+
+    async def _broken_process(document_id, progress_callback=None, parse_executor=None):
+        raise RuntimeError("解析器崩溃")
+
+    monkeypatch.setattr(worker_module, "process_document_task", _broken_process)
+
+    worker = worker_module.DocumentWorker(
+        concurrency=1, parse_processes=0, poll_interval=0.01, session_factory=Session
+    )
+    await worker.start()
+    for _ in range(300):
+        check = Session()
+        job = check.query(DocumentJob).one()
+        check.close()
+        if job.status not in (DocumentJobStatus.QUEUED, DocumentJobStatus.RUNNING):
+            break
+        await asyncio.sleep(0.02)
+    await worker.stop()
+
+    check = Session()
+    job = check.query(DocumentJob).one()
+    document = check.query(Document).filter(Document.id == doc_id).one()
+    check.close()
+    assert (job.status, job.attempts, job.error_message) == (DocumentJobStatus.FAILED, 1, "解析器崩溃")
+    assert document.status == DocumentStatus.FAILED
+
+
+@pytest.mark.asyncio
+async def test_upload_enqueues_processing_job(db, test_user, monkeypatch):
+    from fastapi import BackgroundTasks, UploadFile
+
+    from app.config import settings
+    from app.services.rag_service import RAGService
+
+    monkeypatch.setattr(settings.file_storage, "upload_dir", tempfile.mkdtemp(prefix="uploads_"))
+    monkeypatch.setattr(settings.document_queue, "document_queue_enabled", True)
+
+    service = RAGService(db)
+    kb = service.create_knowledge_base(user_id=test_user.id, name="kb", description="d")
+    background_tasks = BackgroundTasks()
+
+    document = await service.upload_document(
+        kb_id=kb.id,
+        user_id=test_user.id,
+        file=UploadFile(file=BytesIO(b"hello"), filename="a.txt"),
+        background_tasks=background_tasks,
+    )
+
+    job = db.query(DocumentJob).filter(DocumentJob.document_id == document.id).one()
+    assert job.status == DocumentJobStatus.QUEUED
+    assert job.knowledge_base_id == kb.id
+    assert document.status == DocumentStatus.PROCESSING
+    assert background_tasks.tasks == []
+
+
+def test_claim_rechecks_per_kb_limit_when_candidates_are_stale(db, test_user):
+    from app.repositories.document_job_repository import DocumentJobRepository
+
+    repo = DocumentJobRepository(db)
+    jobs = [repo.enqueue(doc_id, kb_id) for doc_id, kb_id in _seed(db, test_user.id, [3])]
+
+    # 另一个worker在候选查询之后领取了任务：基于过期候选的领取不能突破上限
+    assert repo._try_claim(jobs[0].id, jobs[0].knowledge_base_id, "w1", per_kb_limit=1)
+    assert repo._try_claim(jobs[1].id, jobs[1].knowledge_base_id, "w2", per_kb_limit=1) is None
+    assert repo.get_by_id(jobs[1].id).status == DocumentJobStatus.QUEUED
@@ -0,0 +1,102 @@
+import pytest
+
+
+class _CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [float(len(text)), 0.5]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+
+def test_normalized_queries_share_cache_entry():
+    from app.core.embedding_cache import CachedEmbeddings, InMemoryEmbeddingCache
+
+    underlying = _CountingEmbeddings()
+    emb = CachedEmbeddings(underlying, "m", [InMemoryEmbeddingCache(max_entries=10)])
+
+    first = emb.embed_query("什么是 Python？")
+    second = emb.embed_query("  什么是   Python？ ")
+
+    assert first == second
+    assert underlying.calls == 1
+
+
+def test_cache_key_includes_model_name():
+    from app.core.embedding_cache import CachedEmbeddings, InMemoryEmbeddingCache
+
+    shared = InMemoryEmbeddingCache(max_entries=10)
+    underlying = _CountingEmbeddings()
+    CachedEmbeddings(underlying, "model-a", [shared]).embed_query("q")
+    CachedEmbeddings(underlying, "model-b", [shared]).embed_query("q")
+
+    assert underlying.calls == 2
+
+
+def test_in_memory_cache_evicts_lru_and_expired(monkeypatch):
+    from app.core import embedding_cache
+    from app.core.embedding_cache import InMemoryEmbeddingCache
+
+    cache = InMemoryEmbeddingCache(max_entries=2, ttl_seconds=60)
+    cache.set("m", "a", [1.0])
+    cache.set("m", "b", [2.0])
+    assert cache.get("m", "a") == [1.0]
+    cache.set("m", "c", [3.0])
+
+    assert cache.get("m", "b") is None
+    assert cache.get("m", "a") == [1.0]
+
+    now = embedding_cache.time.monotonic()
+    monkeypatch.setattr(embedding_cache.time, "monotonic", lambda: now + 120)
+    assert cache.get("m", "a") is None
+    assert len(cache) == 1
+
+
+def test_lower_tier_hit_backfills_memory_tier():
+    from app.core.embedding_cache import (CachedEmbeddings, EmbeddingCache,
+                                          InMemoryEmbeddingCache)
+
+    class _DictCache(EmbeddingCache):
+        tier = "redis"
+
+        def __init__(self):
+            self.data = {}
+
+        def get(self, model, key):
+            return self.data.get((model, key))
+
+        def set(self, model, key, vector):
+            self.data[(model, key)] = vector
+
+    memory = InMemoryEmbeddingCache(max_entries=10)
+    shared = _DictCache()
+    underlying = _CountingEmbeddings()
+
+    CachedEmbeddings(underlying, "m", [InMemoryEmbeddingCache(), shared]).embed_query("q")
+    emb = CachedEmbeddings(underlying, "m", [memory, shared])
+    emb.embed_query("q")
+
+    assert underlying.calls == 1
+    assert len(memory) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_query_uses_cache():
+    from app.core.embedding_cache import CachedEmbeddings, InMemoryEmbeddingCache
+
+    underlying = _CountingEmbeddings()
+    emb = CachedEmbeddings(underlying, "m", [InMemoryEmbeddingCache()])
+
+    assert await emb.aembed_query("q") == await emb.aembed_query("q")
+    assert underlying.calls == 1
+
+
+def test_redis_cache_roundtrip_is_exact():
+    from app.core.embedding_cache import RedisEmbeddingCache
+
+    vector = [0.1, -0.333333333333, 1e-12]
+    assert RedisEmbeddingCache._decode(RedisEmbeddingCache._encode(vector)) == vector
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+
+
+def _chunks(n):
+    return [
+        Document(page_content=f"chunk {i}", metadata={"chunk_index": i}) for i in range(n)
+    ]
+
+
+class _RecordingVectorStore:
+    def __init__(self, fail_on_batch=None):
+        self.in_flight = 0
+        self.peak = 0
+        self.batches = []
+        self.fail_on_batch = fail_on_batch
+
+    async def embed_documents(self, texts):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if self.fail_on_batch is not None and texts[0] == f"chunk {self.fail_on_batch}":
+            raise RuntimeError("embedding failed")
+        return [[0.0] for _ in texts]
+
+    async def upsert_embedded_documents(self, knowledge_base_id, documents, embeddings, document_id=None, ids=None):
+        self.batches.append(ids)
+        return ids
+
+
+@pytest.mark.asyncio
+async def test_pipeline_batches_with_bounded_concurrency_and_reports_progress():
+    from app.tasks.embedding_pipeline import BatchEmbeddingPipeline
+
+    vs = _RecordingVectorStore()
+    progress = []
+
+    async def on_progress(done, total):
+        progress.append((done, total))
+
+    pipeline = BatchEmbeddingPipeline(
+        vector_store_manager=vs,
+        knowledge_base_id=1,
+        document_id=7,
+        batch_size=10,
+        max_concurrency=3,
+        progress_callback=on_progress,
+    )
+    stored = await pipeline.run(_chunks(95), total=95)
+
+    assert stored == 95
+    assert len(vs.batches) == 10
+    assert vs.peak == 3
+    assert progress[-1] == (95, 95)
+    assert sorted(i for batch in vs.batches for i in batch)[0] == "doc_7_chunk_0"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_raises_first_batch_error():
+    from app.tasks.embedding_pipeline import BatchEmbeddingPipeline
+
+    vs = _RecordingVectorStore(fail_on_batch=20)
+    pipeline = BatchEmbeddingPipeline(
+        vector_store_manager=vs,
+        knowledge_base_id=1,
+        batch_size=10,
+        max_concurrency=2,
+    )
+
+    with pytest.raises(RuntimeError, match="embedding failed"):
+        await pipeline.run(_chunks(100))
+
+    assert len(vs.batches) < 10
+
+
+@pytest.mark.asyncio
+async def test_pipeline_upserts_into_chroma_idempotently(tmp_path):
+    from app.core.vector_store import DevMockEmbeddings, VectorStoreManager
+    from app.tasks.embedding_pipeline import BatchEmbeddingPipeline
+
+    m = VectorStoreManager(persist_directory=str(tmp_path / "chroma"), api_key="DUMMY_DASHSCOPE_API_KEY")
+    m._embeddings = DevMockEmbeddings(dim=8)
+
+    for _ in range(2):
+        pipeline = BatchEmbeddingPipeline(
+            vector_store_manager=m,
+            knowledge_base_id=3,
+            document_id=11,
+            batch_size=4,
+            max_concurrency=2,
+        )
+        await pipeline.run(_chunks(10), total=10)
+
+    assert m.get_collection_stats(3)["document_count"] == 10
@@ -0,0 +1,88 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+from prometheus_client import REGISTRY
+
+
+@pytest.fixture
+def executors():
+    from app.core.executors import init_executors, shutdown_executors
+
+    shutdown_executors()
+    registry = init_executors(io_threads=2, db_threads=1, cpu_processes=0, stream_threads=1)
+    yield registry
+    shutdown_executors()
+
+
+def _gauge(name, pool):
+    return REGISTRY.get_sample_value(name, {"pool": pool})
+
+
+def test_executor_reports_active_and_queued_tasks(executors):
+    release = threading.Event()
+    futures = [executors.io.submit(release.wait) for _ in range(5)]
+
+    assert executors.io.stats() == {"active": 2, "queued": 3, "max_workers": 2}
+    assert _gauge("executor_active_workers", "io") == 2
+    assert _gauge("executor_queue_depth", "io") == 3
+
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+
+    assert executors.io.stats()["active"] == 0
+    assert _gauge("executor_queue_depth", "io") == 0
+
+
+@pytest.mark.asyncio
+async def test_load_document_async_runs_on_shared_pool(executors, monkeypatch):
+    from app.core.executors import get_executors
+    from app.langchain_integration.document_loaders import DocumentLoaderFactory
+
+    thread_names = []
+
+    def _load(file_path, file_type, document_id=None, knowledge_base_id=None):
+        thread_names.append(threading.current_thread().name)
+        return []
+
+    monkeypatch.setattr(DocumentLoaderFactory, "load_document", _load)
+    before = threading.active_count()
+
+    for _ in range(10):
+        await DocumentLoaderFactory.load_document_async("/tmp/a.txt", "txt")
+
+    assert get_executors() is executors
+    assert all(name.startswith("io-pool") for name in thread_names)
+    assert threading.active_count() - before <= 2
+
+
+@pytest.mark.asyncio
+async def test_stream_producers_do_not_occupy_io_pool(executors, tmp_path, monkeypatch):
+    from app.config import settings
+    from app.tasks import document_tasks
+
+    monkeypatch.setattr(settings.file_storage, "extracted_text_cache_enabled", False)
+    thread_names = []
+    produce = document_tasks.produce_document_chunks
+
+    def _produce(spec, out_queue, stop_event):
+        thread_names.append(threading.current_thread().name)
+        return produce(spec, out_queue, stop_event)
+
+    monkeypatch.setattr(document_tasks, "produce_document_chunks", _produce)
+    path = tmp_path / "a.txt"
+    path.write_text("第一段内容。\n\n第二段内容。", encoding="utf-8")
+    task = document_tasks.DocumentProcessingTask(document_id=1, chunk_size=200, chunk_overlap=20)
+    spec = task._build_stream_spec(
+        SimpleNamespace(
+            id=1, knowledge_base_id=2, file_path=str(path), file_type="txt", filename="a.txt"
+        ),
+        batch_size=10,
+    )
+
+    chunks = [chunk async for chunk in task._iter_chunks(spec)]
+
+    assert chunks
+    assert all(name.startswith("stream-pool") for name in thread_names)
+    assert executors.stats()["stream"]["max_workers"] >= 1
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+
+class _CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    async def aembed_query(self, text):
+        self.calls += 1
+        return [0.1, 0.2, 0.3]
+
+
+def _make_manager(tmp_path):
+    from app.core.vector_store import VectorStoreManager
+
+    m = VectorStoreManager(
+        persist_directory=str(tmp_path / "chroma"),
+        api_key="DUMMY_DASHSCOPE_API_KEY",
+    )
+    m._embeddings = _CountingEmbeddings()
+    return m
+
+
+@pytest.mark.asyncio
+async def test_multi_kb_search_embeds_once_and_merges_top_k(tmp_path, monkeypatch):
+    from langchain_core.documents import Document
+
+    m = _make_manager(tmp_path)
+
+    scores = {1: [0.5, 0.9], 2: [0.1, 0.7], 3: [0.3]}
+
+    async def fake_search(knowledge_base_id, embedding, k=5, filter_dict=None):
+        return [
+            (Document(page_content=f"{knowledge_base_id}-{s}"), s)
+            for s in scores[knowledge_base_id]
+        ]
+
+    monkeypatch.setattr(m, "similarity_search_by_vector_with_score", fake_search)
+
+    results = await m.multi_knowledge_base_search([1, 2, 3], "q", k=3)
+
+    assert m.embeddings.calls == 1
+    assert [score for _, score in results] == [0.1, 0.3, 0.5]
+
+
+@pytest.mark.asyncio
+async def test_multi_kb_search_reports_failed_and_timed_out_kbs(tmp_path, monkeypatch):
+    from langchain_core.documents import Document
+
+    m = _make_manager(tmp_path)
+
+    async def fake_search(knowledge_base_id, embedding, k=5, filter_dict=None):
+        if knowledge_base_id == 2:
+            raise RuntimeError("boom")
+        if knowledge_base_id == 3:
+            await asyncio.sleep(1)
+        return [(Document(page_content="ok"), 0.2)]
+
+    monkeypatch.setattr(m, "similarity_search_by_vector_with_score", fake_search)
+
+    outcome = await m.multi_knowledge_base_search_detailed(
+        [1, 2, 3], "q", k=5, max_concurrency=2, timeout=0.05
+    )
+
+    assert len(outcome.results) == 1
+    assert outcome.failed_knowledge_base_ids == [2]
+    assert outcome.timed_out_knowledge_base_ids == [3]
+    assert outcome.is_partial
+
+
+@pytest.mark.asyncio
+async def test_multi_kb_search_respects_concurrency_limit(tmp_path, monkeypatch):
+    m = _make_manager(tmp_path)
+
+    in_flight = 0
+    peak = 0
+
+    async def fake_search(knowledge_base_id, embedding, k=5, filter_dict=None):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return []
+
+    monkeypatch.setattr(m, "similarity_search_by_vector_with_score", fake_search)
+
+    await m.multi_knowledge_base_search_detailed(
+        list(range(1, 9)), "q", k=5, max_concurrency=3, timeout=5
+    )
+
+    assert peak == 3
+
+
+@pytest.mark.asyncio
+async def test_timed_out_query_keeps_its_slot_until_the_thread_finishes(tmp_path, monkeypatch):
+    import threading
+    import time
+
+    m = _make_manager(tmp_path)
+
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def _blocking_query():
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.2)
+        with lock:
+            in_flight -= 1
+        return []
+
+    async def fake_search(knowledge_base_id, embedding, k=5, filter_dict=None):
+        return await asyncio.to_thread(_blocking_query)
+
+    monkeypatch.setattr(m, "similarity_search_by_vector_with_score", fake_search)
+
+    outcome = await m.multi_knowledge_base_search_detailed(
+        [1, 2, 3], "q", k=5, max_concurrency=1, timeout=0.05
+    )
+    await asyncio.sleep(0.3)
+
+    assert outcome.timed_out_knowledge_base_ids == [1, 2, 3]
+    assert peak == 1
@@ -0,0 +1,193 @@
+import os
+
+import numpy as np
+import pytest
+
+
+def _collection(tmp_path, name="kb_1", **kwargs):
+    from app.core.numpy_index import NumpyIndexCollection
+
+    kwargs.setdefault("ivf_threshold", 10**9)
+    return NumpyIndexCollection(name, str(tmp_path / name), **kwargs)
+
+
+def _fill(collection, vectors, documents_per_id=5):
+    collection.upsert(
+        ids=[f"c{i}" for i in range(len(vectors))],
+        embeddings=vectors,
+        documents=[f"text {i}" for i in range(len(vectors))],
+        metadatas=[{"document_id": i % documents_per_id, "chunk_index": i} for i in range(len(vectors))],
+    )
+
+
+def _exact(vectors, query, k):
+    return [f"c{i}" for i in np.argsort(((vectors - query) ** 2).sum(axis=1))[:k]]
+
+
+def test_flat_search_matches_brute_force(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(300, 16)).astype(np.float32)
+    collection = _collection(tmp_path)
+    _fill(collection, vectors)
+
+    query = rng.normal(size=16).astype(np.float32)
+    result = collection.query(
+        query_embeddings=[query.tolist()], n_results=5, include=["documents", "distances"]
+    )
+
+    assert result["ids"][0] == _exact(vectors, query, 5)
+    expected = ((vectors[[int(i[1:]) for i in result["ids"][0]]] - query) ** 2).sum(axis=1)
+    assert np.allclose(result["distances"][0], expected, atol=1e-4)
+    assert result["documents"][0][0] == f"text {result['ids'][0][0][1:]}"
+
+
+def test_tombstones_filters_and_upsert(tmp_path):
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(100, 8)).astype(np.float32)
+    collection = _collection(tmp_path)
+    _fill(collection, vectors)
+
+    assert collection.delete(where={"document_id": 2}) == 20
+    assert collection.count() == 80
+
+    query = rng.normal(size=8).astype(np.float32)
+    result = collection.query(
+        query_embeddings=query.tolist(), n_results=10, where={"document_id": {"$in": [2, 3]}}
+    )
+    assert {m["document_id"] for m in result["metadatas"][0]} == {3}
+
+    # 已存在的ID：旧行打墓碑，新行追加
+    collection.upsert(ids=["c0"], embeddings=[query.tolist()], documents=["new"], metadatas=[{}])
+    assert collection.count() == 80
+    assert collection.query(query_embeddings=[query.tolist()], n_results=1)["ids"] == [["c0"]]
+    assert collection.get(ids=["c0"])["documents"] == ["new"]
+    assert collection.stats()["tombstones"] == 21
+
+
+def test_dimension_mismatch_raises_chroma_error(tmp_path):
+    from chromadb.errors import InvalidDimensionException
+
+    from app.core.vector_store import _DIMENSION_MISMATCH_RE
+
+    collection = _collection(tmp_path)
+    collection.upsert(ids=["a"], embeddings=[[0.0] * 8])
+
+    with pytest.raises(InvalidDimensionException) as exc_info:
+        collection.upsert(ids=["b"], embeddings=[[0.0] * 4])
+    assert _DIMENSION_MISMATCH_RE.search(str(exc_info.value))
+
+
+def test_writes_from_another_connection_are_visible(tmp_path):
+    reader = _collection(tmp_path)
+    writer = _collection(tmp_path)
+
+    writer.upsert(ids=["a"], embeddings=[[1.0, 0.0]], documents=["x"])
+    assert reader.count() == 1
+    assert reader.query(query_embeddings=[[1.0, 0.0]], n_results=1)["ids"] == [["a"]]
+
+    writer.delete(ids=["a"])
+    assert reader.count() == 0
+
+
+def test_ivf_partitions_keep_recall(tmp_path):
+    rng = np.random.default_rng(2)
+    centers = rng.normal(size=(20, 32)) * 5
+    vectors = (centers[rng.integers(0, 20, 5000)] + rng.normal(size=(5000, 32))).astype(np.float32)
+    collection = _collection(tmp_path, ivf_threshold=1000, ivf_nprobe=8)
+    _fill(collection, vectors)
+    assert collection.stats()["ivf_lists"] > 1
+
+    hits = 0
+    for _ in range(20):
+        query = vectors[rng.integers(0, len(vectors))] + rng.normal(size=32).astype(np.float32) * 0.1
+        found = collection.query(query_embeddings=[query], n_results=10)["ids"][0]
+        hits += len(set(found) & set(_exact(vectors, query, 10)))
+    assert hits / 200 >= 0.9
+
+    # 追加的行按已训练的分区归类，仍可检索到
+    collection.upsert(ids=["new"], embeddings=[vectors[0]])
+    assert "new" in collection.query(query_embeddings=[vectors[0]], n_results=2)["ids"][0]
+
+
+def test_manager_uses_numpy_backend(tmp_path):
+    import asyncio
+
+    from langchain_core.documents import Document
+
+    from app.core.numpy_index import NumpyVectorBackend
+    from app.core.vector_store import VectorStoreManager
+
+    manager = VectorStoreManager(
+        persist_directory=str(tmp_path / "chroma"),
+        api_key="DUMMY_DASHSCOPE_API_KEY",
+        backend=NumpyVectorBackend(str(tmp_path / "chroma")),
+    )
+
+    async def _run():
+        await manager.upsert_embedded_documents(
+            1,
+            [Document(page_content="a"), Document(page_content="b")],
+            [[1.0, 0.0], [0.0, 1.0]],
+            document_id=7,
+        )
+        results = await manager.similarity_search_by_vector_with_score(1, [0.9, 0.1], k=1)
+        assert results[0][0].page_content == "a"
+        assert results[0][0].metadata["document_id"] == 7
+        assert await manager.delete_by_document_id(1, 7)
+
+    asyncio.run(_run())
+    assert manager.get_collection_stats(1)["document_count"] == 0
+    assert manager.delete_collection(1)
+    manager.close()
+
+
+@pytest.mark.parametrize("quantization", ["none", "int8"])
+def test_compact_reclaims_tombstones(tmp_path, quantization):
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(400, 8)).astype(np.float32)
+    writer = _collection(tmp_path, quantization=quantization)
+    reader = _collection(tmp_path)
+    _fill(writer, vectors, documents_per_id=4)
+    writer.delete(where={"document_id": 1})
+
+    query = vectors[2] + 0.01
+    before = reader.query(query_embeddings=[query], n_results=5)
+    disk_before = writer.stats()["disk_bytes"]
+
+    assert writer.compact() == {"rows_before": 400, "rows_after": 300, "reclaimed": 100}
+
+    # 另一个连接检测到代号切换后加载新文件，结果不变
+    stats = reader.stats()
+    assert (stats["rows"], stats["tombstones"], stats["generation"]) == (300, 0, 1)
+    assert stats["disk_bytes"] < disk_before
+    after = reader.query(query_embeddings=[query], n_results=5)
+    assert after["ids"] == before["ids"]
+    assert np.allclose(after["distances"], before["distances"])
+    assert reader.get(ids=["c399"], include=["embeddings"])["embeddings"][0] == vectors[399].tolist()
+    assert not any(name.startswith("vectors.") for name in os.listdir(writer.directory))
+
+    writer.upsert(ids=["new"], embeddings=[query])
+    assert reader.query(query_embeddings=[query], n_results=1)["ids"] == [["new"]]
+
+
+def test_manager_compacts_only_fragmented_collections(tmp_path):
+    from app.core.numpy_index import NumpyVectorBackend
+    from app.core.vector_store import VectorStoreManager
+
+    manager = VectorStoreManager(
+        persist_directory=str(tmp_path / "chroma"),
+        api_key="DUMMY_DASHSCOPE_API_KEY",
+        backend=NumpyVectorBackend(str(tmp_path / "chroma"), ivf_threshold=10**9),
+    )
+    vectors = np.random.default_rng(4).normal(size=(100, 8)).astype(np.float32)
+    for kb_id in (1, 2):
+        collection = manager.client.get_or_create_collection(f"kb_{kb_id}")
+        _fill(collection, vectors)
+    manager.client.get_collection("kb_1").delete(where={"document_id": 0})
+
+    assert manager.list_knowledge_base_ids() == [1, 2]
+    assert manager.compact_collection(2, min_tombstone_ratio=0.1, min_tombstones=1)["status"] == "skipped"
+    result = manager.compact_collection(1, min_tombstone_ratio=0.1, min_tombstones=1)
+    assert result["status"] == "compacted" and result["reclaimed"] == 20
+    assert manager.get_collection_stats(1)["document_count"] == 80
+    manager.close()
@@ -0,0 +1,85 @@
+from dataclasses import dataclass
+
+from langchain.prompts import PromptTemplate
+
+from app.core.tokenizer import TokenCounter, estimate_tokens
+from app.langchain_integration.prompt_assembler import PromptAssembler
+
+TEMPLATE = PromptTemplate(
+    input_variables=["context", "history", "question"],
+    template="资料:\n{context}\n历史:\n{history}\n问题: {question}\n回答:",
+)
+
+
+@dataclass
+class _Chunk:
+    content: str
+    document_name: str
+    similarity_score: float
+
+
+class _WordCounter(TokenCounter):
+    """按空白分词计数，便于构造精确的预算"""
+
+    def __init__(self):
+        super().__init__(model_name="test", cache_size=100)
+        self._loaded = True
+
+    def _encode_count(self, text: str) -> int:
+        return len(text.split())
+
+
+def _assembler(max_tokens):
+    return PromptAssembler(
+        template=TEMPLATE,
+        question_key="question",
+        history_key="history",
+        context_key="context",
+        max_tokens=max_tokens,
+        history_decay=0.5,
+        token_counter=_WordCounter(),
+    )
+
+
+def _history(turns):
+    history = []
+    for i in range(turns):
+        history.append({"role": "USER", "content": f"q{i} " + "w " * 5})
+        history.append({"role": "ASSISTANT", "content": f"a{i} " + "w " * 5})
+    return history
+
+
+def test_everything_fits_within_budget():
+    chunks = [_Chunk("c " * 5, "doc", 0.9)]
+    result = _assembler(1000).assemble("问题", history=_history(2), chunks=chunks)
+
+    assert result.dropped_history == 0
+    assert result.dropped_chunks == 0
+    assert result.prompt_tokens == _WordCounter().count(result.text)
+    assert "q0" in result.text and "来源: doc" in result.text
+
+
+def test_oldest_history_and_low_score_chunks_are_trimmed_first():
+    chunks = [
+        _Chunk("high " * 5, "high", 0.9),
+        _Chunk("low " * 5, "low", 0.1),
+    ]
+    assembler = _assembler(45)
+    result = assembler.assemble("问题", history=_history(3), chunks=chunks)
+
+    assert result.prompt_tokens <= 45
+    assert [c.document_name for c in result.chunks] == ["high"]
+    # 保留的历史是最近的连续若干轮，并以用户消息开头
+    assert result.history == _history(3)[-len(result.history) :]
+    assert result.history and result.history[0]["role"] == "USER"
+    assert "q0" not in result.text and "q2" in result.text
+
+
+def test_falls_back_to_estimate_without_tokenizer(monkeypatch):
+    from app.core import tokenizer
+
+    monkeypatch.setattr(tokenizer, "_load_encoding", lambda model_name: None)
+    counter = TokenCounter(model_name="unknown")
+
+    assert not counter.exact
+    assert counter.count("你好世界 hello world") == estimate_tokens("你好世界 hello world")
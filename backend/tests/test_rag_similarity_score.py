@@ -2,11 +2,14 @@ import pytest
 
 
 @pytest.mark.asyncio
-async def test_distance_to_similarity_not_zero_for_large_l2_distance():
+async def test_distance_to_similarity_not_zero_for_large_l2_distance(monkeypatch):
     from langchain_core.documents import Document
 
+    from app.config import settings
     from app.langchain_integration.rag_chain import RAGManager
 
+    monkeypatch.setattr(settings.rag, "rag_similarity_threshold", 0.0)
+
     class _VS:
         async def similarity_search_with_score(self, knowledge_base_id, query, k=5, filter_dict=None):
             doc = Document(page_content="c", metadata={"source": "d"})
@@ -17,3 +20,51 @@ async def test_distance_to_similarity_not_zero_for_large_l2_distance():
     assert len(chunks) == 1
     assert chunks[0].similarity_score > 0.0
 
+
+
+class _HybridVS:
+    async def hybrid_search(self, knowledge_base_ids, query, k=5, query_embedding=None, include_embeddings=False):
+        from langchain_core.documents import Document
+
+        return [
+            (Document(page_content="dense", metadata={"source": "a"}), 0.2),
+            # 仅被BM25召回：向量距离较远，或读取分块向量失败时缺少距离
+            (Document(page_content="keyword", metadata={"source": "b"}), 1.5),
+            (Document(page_content="missing", metadata={"source": "c"}), None),
+        ]
+
+    async def similarity_search_with_score(self, knowledge_base_id, query, k=5, filter_dict=None):
+        results = await self.hybrid_search([knowledge_base_id], query, k)
+        return results[:2]
+
+
+@pytest.mark.asyncio
+async def test_hybrid_search_keeps_bm25_only_hits_with_default_threshold(monkeypatch):
+    from app.config import settings
+    from app.langchain_integration.rag_chain import RAGManager
+
+    monkeypatch.setattr(settings.rag, "rag_similarity_threshold", 0.7)
+    monkeypatch.setattr(settings.rag, "rag_hybrid_search_enabled", True)
+    monkeypatch.setattr(settings.rag, "rag_mmr_enabled", False)
+    monkeypatch.setattr(settings.rag, "rag_rerank_enabled", False)
+
+    manager = RAGManager(vector_store_manager=_HybridVS())
+    chunks = await manager._retrieve_documents([1], "q", 3)
+
+    assert [chunk.content for chunk in chunks] == ["dense", "keyword", "missing"]
+
+
+@pytest.mark.asyncio
+async def test_dense_only_search_still_applies_threshold(monkeypatch):
+    from app.config import settings
+    from app.langchain_integration.rag_chain import RAGManager
+
+    monkeypatch.setattr(settings.rag, "rag_similarity_threshold", 0.7)
+    monkeypatch.setattr(settings.rag, "rag_hybrid_search_enabled", False)
+    monkeypatch.setattr(settings.rag, "rag_mmr_enabled", False)
+    monkeypatch.setattr(settings.rag, "rag_rerank_enabled", False)
+
+    manager = RAGManager(vector_store_manager=_HybridVS())
+    chunks = await manager._retrieve_documents([1], "q", 3)
+
+    assert [chunk.content for chunk in chunks] == ["dense"]
@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+
+def test_bm25_reranker_prefers_exact_identifier_match():
+    from app.core.reranker import BM25Reranker
+
+    scores = BM25Reranker().score(
+        "E10423 是什么错误",
+        ["错误码 E10424 表示登录超时", "错误码 E10423 表示支付签名校验失败", "NovaLink 用户手册"],
+    )
+
+    assert scores[1] == max(scores) and scores[2] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_rerank_candidates_falls_back_on_timeout():
+    from app.core.reranker import Reranker, rerank_candidates
+
+    class _SlowReranker(Reranker):
+        name = "slow"
+
+        def score(self, query, passages):
+            time.sleep(0.2)
+            return list(range(len(passages)))
+
+    assert await rerank_candidates(_SlowReranker(), "q", ["a", "b"], timeout=0.01) is None
+    assert await rerank_candidates(_SlowReranker(), "q", ["a", "b"], timeout=1.0) == [1, 0]
+
+
+def test_onnx_reranker_builds_pair_inputs_and_reads_relevance_logit():
+    from tokenizers import Tokenizer
+    from tokenizers.models import WordLevel
+    from tokenizers.pre_tokenizers import Whitespace
+
+    from app.core.reranker import ONNXCrossEncoderReranker
+
+    tokenizer = Tokenizer(WordLevel({"[UNK]": 0, "[PAD]": 1, "a": 2, "b": 3}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    tokenizer.enable_padding(pad_id=1, pad_token="[PAD]")
+
+    class _Input:
+        def __init__(self, name):
+            self.name = name
+
+    class _Session:
+        def run(self, outputs, feeds):
+            assert set(feeds) == {"input_ids", "attention_mask"}
+            # 两列输出（不相关/相关），相关列为匹配到 "b" 的数量
+            relevant = (feeds["input_ids"] == 3).sum(axis=1)
+            return [[[0.0, float(r)] for r in relevant]]
+
+    reranker = ONNXCrossEncoderReranker("model.onnx", batch_size=2)
+    reranker._tokenizer = tokenizer
+    reranker._input_names = ["input_ids", "attention_mask"]
+    reranker._session = _Session()
+
+    assert reranker.score("a", ["a", "b b", "b"]) == [0.0, 2.0, 1.0]
+
+
+@pytest.mark.asyncio
+async def test_rag_manager_overfetches_and_reranks(monkeypatch):
+    from langchain_core.documents import Document
+
+    from app.config import settings
+    from app.core.reranker import BM25Reranker
+    from app.langchain_integration.rag_chain import RAGManager
+
+    class _VS:
+        def __init__(self):
+            self.k = None
+
+        async def similarity_search_with_score(self, knowledge_base_id, query, k=5, filter_dict=None):
+            self.k = k
+            docs = [f"错误码 E{10000 + i} 的说明" for i in range(k)]
+            return [(Document(page_content=d, metadata={"chunk_index": i}), 0.1) for i, d in enumerate(docs)]
+
+    monkeypatch.setattr(settings.rag, "rag_rerank_candidate_multiplier", 4)
+    vector_store = _VS()
+    manager = RAGManager(vector_store_manager=vector_store, llm=object(), reranker=BM25Reranker())
+
+    chunks = await manager._retrieve_documents([1], "E10007 怎么处理", top_k=2)
+
+    assert vector_store.k == 8
+    assert [c.chunk_index for c in chunks] == [7, 0]
@@ -0,0 +1,66 @@
+import pytest
+
+
+def test_mmr_skips_near_duplicates_and_keeps_diverse_chunks():
+    from app.core.retrieval_postprocess import maximal_marginal_relevance
+
+    embeddings = [[1.0, 0.0, 0.0], [0.99, 0.01, 0.0], [0.6, 0.8, 0.0], [0.0, 0.0, 1.0]]
+    relevance = [0.95, 0.94, 0.80, 0.30]
+
+    assert maximal_marginal_relevance(relevance, embeddings, k=2, lambda_mult=1.0) == [0, 1]
+    assert maximal_marginal_relevance(relevance, embeddings, k=2, lambda_mult=0.7) == [0, 2]
+    assert maximal_marginal_relevance(
+        relevance, embeddings, k=4, lambda_mult=1.0, duplicate_threshold=0.95
+    ) == [0, 2, 3]
+
+
+def test_select_candidates_applies_threshold_before_mmr():
+    from app.core.retrieval_postprocess import select_candidates
+
+    similarities = [0.9, 0.85, 0.5]
+    embeddings = [[1.0, 0.0], None, [1.0, 0.0]]
+
+    assert select_candidates(similarities, None, k=5, similarity_threshold=0.7) == [0, 1]
+    assert select_candidates(similarities, embeddings, k=5, similarity_threshold=0.6, mmr_lambda=0.7) == [0, 1]
+
+
+def test_select_candidates_keeps_candidates_without_similarity():
+    from app.core.retrieval_postprocess import select_candidates
+
+    similarities = [0.9, None, 0.5]
+    embeddings = [[1.0, 0.0], [0.0, 1.0], [1.0, 0.0]]
+
+    assert select_candidates(similarities, None, k=5, similarity_threshold=0.7) == [0, 1]
+    assert select_candidates(similarities, embeddings, k=5, similarity_threshold=0.7, mmr_lambda=0.7) == [0, 1]
+
+
+@pytest.mark.asyncio
+async def test_retrieve_documents_diversifies_with_stored_embeddings(tmp_path, monkeypatch):
+    from langchain_core.documents import Document
+
+    from app.config import settings
+    from app.core.vector_store import VectorStoreManager
+    from app.langchain_integration.rag_chain import RAGManager
+
+    class _Embeddings:
+        def embed_query(self, text):
+            return [1.0, 0.0, 0.0]
+
+        async def aembed_query(self, text):
+            return self.embed_query(text)
+
+    m = VectorStoreManager(persist_directory=str(tmp_path / "chroma"), api_key="DUMMY_DASHSCOPE_API_KEY")
+    m._embeddings = _Embeddings()
+    docs = [Document(page_content=f"片段{i}", metadata={"source": "a.md", "chunk_index": i}) for i in range(4)]
+    vectors = [[1.0, 0.0, 0.0], [0.99, 0.14, 0.0], [0.9, 0.0, 0.43], [0.0, 1.0, 0.0]]
+    await m.upsert_embedded_documents(1, docs, vectors, document_id=1, ids=[f"c{i}" for i in range(4)])
+
+    manager = RAGManager(vector_store_manager=m, llm=object())
+    monkeypatch.setattr(settings.rag, "rag_similarity_threshold", 0.5)
+    monkeypatch.setattr(settings.rag, "rag_mmr_enabled", True)
+    monkeypatch.setattr(settings.rag, "rag_mmr_fetch_k", 4)
+
+    chunks = await manager._retrieve_documents([1], "q", top_k=3)
+
+    assert [c.chunk_index for c in chunks] == [0, 2]
+    assert all(c.similarity_score >= 0.5 for c in chunks)
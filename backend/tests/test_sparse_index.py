@@ -0,0 +1,86 @@
+import pytest
+
+
+def test_tokenize_keeps_identifiers_and_cjk_bigrams():
+    from app.core.sparse_index import tokenize
+
+    tokens = tokenize("错误码 ERR-1042：连接超时", tokenizer="ngram")
+
+    assert "err-1042" in tokens and "err" in tokens and "1042" in tokens
+    assert "错误" in tokens and "超时" in tokens and "码" in tokens
+
+
+def test_sparse_index_upserts_searches_and_deletes(tmp_path):
+    from app.core.sparse_index import SparseChunk, SparseIndex
+
+    index = SparseIndex(str(tmp_path / "kb_1.sqlite3"), tokenizer="ngram")
+    index.add_chunks(
+        [
+            SparseChunk("doc_1_chunk_0", 1, "错误码 E10423 表示支付签名校验失败", {"chunk_index": 0}),
+            SparseChunk("doc_1_chunk_1", 1, "错误码 E10424 表示登录超时", {"chunk_index": 1}),
+            SparseChunk("doc_2_chunk_0", 2, "NovaLink Pro 用户手册", {"chunk_index": 0}),
+        ]
+    )
+    index.add_chunks([SparseChunk("doc_1_chunk_1", 1, "错误码 E10424 表示登录失败", {"chunk_index": 1})])
+
+    hits = index.search("E10423 是什么错误", k=5)
+    assert hits[0].chunk_id == "doc_1_chunk_0"
+    assert hits[0].metadata == {"chunk_index": 0}
+    assert index.count() == 3
+
+    assert index.delete_document(1) == 2
+    assert [h.chunk_id for h in index.search("错误码", k=5)] == []
+    assert index.search("novalink", k=5)[0].chunk_id == "doc_2_chunk_0"
+    index.close()
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    from app.core.vector_store import reciprocal_rank_fusion
+
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], rrf_k=60)
+
+    assert fused[0][0] == "c"
+    assert [key for key, _ in fused][1:] == ["a", "b", "d"]
+
+
+@pytest.mark.asyncio
+async def test_hybrid_search_recovers_exact_identifier(tmp_path, monkeypatch):
+    from langchain_core.documents import Document
+
+    from app.config import settings
+    from app.core.sparse_index import get_sparse_index_store, reset_sparse_index_store
+    from app.core.vector_store import DevMockEmbeddings, VectorStoreManager
+    from app.tasks.embedding_pipeline import BatchEmbeddingPipeline
+
+    monkeypatch.setattr(settings.vector_db, "sparse_index_directory", str(tmp_path / "sparse"))
+    reset_sparse_index_store()
+    try:
+        m = VectorStoreManager(
+            persist_directory=str(tmp_path / "chroma"), api_key="DUMMY_DASHSCOPE_API_KEY"
+        )
+        m._embeddings = DevMockEmbeddings(dim=8)
+        chunks = [
+            Document(
+                page_content=f"错误码 E{10000 + i} 的处理说明",
+                metadata={"chunk_index": i, "source": "errors.md"},
+            )
+            for i in range(30)
+        ]
+        pipeline = BatchEmbeddingPipeline(
+            vector_store_manager=m,
+            knowledge_base_id=1,
+            document_id=7,
+            batch_size=8,
+            sparse_index=get_sparse_index_store().get(1),
+        )
+        await pipeline.run(chunks)
+
+        results = await m.hybrid_search([1], "E10017 怎么处理", k=3)
+        # 稠密检索（随机Mock向量）召回不到时，稀疏检索仍能把精确匹配的分块带入结果
+        assert 17 in [doc.metadata["chunk_index"] for doc, _ in results]
+        assert all(distance is not None for _, distance in results)
+
+        await m.delete_by_document_id(1, 7)
+        assert get_sparse_index_store().get(1).count() == 0
+    finally:
+        reset_sparse_index_store()
@@ -0,0 +1,181 @@
+import asyncio
+import multiprocessing
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.documents import Document as LangchainDocument
+
+
+class _RecordingVectorStore:
+    embedding_model_id = "test-model"
+
+    def __init__(self, on_upsert=None):
+        self.ids = []
+        self.on_upsert = on_upsert
+
+    async def embed_documents(self, texts):
+        await asyncio.sleep(0.001)
+        return [[0.0] for _ in texts]
+
+    async def upsert_embedded_documents(self, knowledge_base_id, documents, embeddings, document_id=None, ids=None):
+        self.ids.extend(ids)
+        if self.on_upsert:
+            self.on_upsert(len(self.ids))
+        return ids
+
+
+def _task(monkeypatch, vector_store, **kwargs):
+    from app.config import settings
+    from app.tasks import document_tasks
+
+    monkeypatch.setattr(settings.vector_db, "chunk_embedding_store_enabled", False)
+    monkeypatch.setattr(document_tasks, "get_vector_store_manager", lambda: vector_store)
+    task = document_tasks.DocumentProcessingTask(
+        document_id=1, chunk_size=200, chunk_overlap=20, **kwargs
+    )
+    task.progress_callback = None
+    task._update_progress = lambda *args, **kwargs: asyncio.sleep(0)
+    return task
+
+
+def _document(path, file_type):
+    return SimpleNamespace(
+        id=1, knowledge_base_id=2, file_path=str(path), file_type=file_type, filename=path.name
+    )
+
+
+def test_text_loader_decodes_incrementally_into_segments(tmp_path, monkeypatch):
+    from app.langchain_integration import document_loaders
+
+    monkeypatch.setattr(document_loaders, "TEXT_READ_BYTES", 7)
+    text = "".join(f"第{i}段：中文内容。\n\n" for i in range(300))
+    path = tmp_path / "a.txt"
+    path.write_bytes(text.encode("gb18030"))
+
+    segments = list(
+        document_loaders.iter_text_segments(
+            document_loaders.RobustTextLoader(str(path))._iter_text(), segment_chars=500
+        )
+    )
+
+    assert "".join(segments) == text
+    assert len(segments) > 1
+    assert all(segment.endswith("\n\n") for segment in segments[:-1])
+
+
+def test_docx_loader_reads_paragraphs(tmp_path):
+    from app.langchain_integration.document_loaders import DocumentLoaderFactory
+
+    ns = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    body = "".join(
+        f"<w:p><w:r><w:t>段落{i}</w:t><w:tab/><w:t>结尾</w:t></w:r></w:p>" for i in range(3)
+    )
+    path = tmp_path / "a.docx"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr(
+            "word/document.xml", f'<w:document xmlns:w="{ns}"><w:body>{body}</w:body></w:document>'
+        )
+
+    docs = DocumentLoaderFactory.load_document(str(path), "docx")
+    assert docs[0].page_content == "段落0\t结尾\n\n段落1\t结尾\n\n段落2\t结尾"
+
+
+def test_docx_loader_reads_headers_footers_and_notes(tmp_path):
+    from app.langchain_integration.document_loaders import DocumentLoaderFactory
+
+    ns = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+    def part(root, paragraphs):
+        body = "".join(
+            f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>" if text else "<w:p/>"
+            for text in paragraphs
+        )
+        return f'<w:{root} xmlns:w="{ns}">{body}</w:{root}>'
+
+    path = tmp_path / "a.docx"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("word/document.xml", part("document", ["正文"]))
+        archive.writestr("word/header1.xml", part("hdr", ["公司机密"]))
+        archive.writestr("word/header2.xml", part("hdr", ["公司机密"]))
+        archive.writestr("word/footnotes.xml", part("footnotes", ["", "脚注"]))
+        archive.writestr("word/endnotes.xml", part("endnotes", ["尾注"]))
+        archive.writestr("word/footer1.xml", part("ftr", ["页脚"]))
+
+    docs = DocumentLoaderFactory.load_document(str(path), "docx")
+    assert docs[0].page_content == "公司机密\n\n正文\n\n脚注\n\n尾注\n\n页脚"
+
+
+@pytest.mark.asyncio
+async def test_ingest_keeps_parsing_bounded_by_embedding_batches(tmp_path, monkeypatch):
+    from app.config import settings
+    from app.langchain_integration.document_loaders import DocumentLoaderFactory
+
+    monkeypatch.setattr(settings.document_processing, "embedding_batch_size", 5)
+    monkeypatch.setattr(settings.document_processing, "embedding_max_concurrency", 1)
+    monkeypatch.setattr(settings.file_storage, "extracted_text_cache_enabled", False)
+
+    state = {"pages": 0, "lead": 0}
+
+    def _pages(file_path, file_type, document_id=None, knowledge_base_id=None):
+        for i in range(200):
+            state["pages"] += 1
+            yield LangchainDocument(page_content=f"第{i}页" * 20, metadata={"page": i})
+
+    def _on_upsert(stored):
+        state["lead"] = max(state["lead"], state["pages"] - stored)
+
+    monkeypatch.setattr(DocumentLoaderFactory, "iter_document", _pages)
+    monkeypatch.setattr(DocumentLoaderFactory, "count_pages", lambda *args: 200)
+
+    vector_store = _RecordingVectorStore(on_upsert=_on_upsert)
+    task = _task(monkeypatch, vector_store)
+    count = await task._ingest(_document(tmp_path / "a.pdf", "pdf"))
+
+    assert count == 200
+    assert vector_store.ids == [f"doc_1_chunk_{i}" for i in range(200)]
+    # 解析方最多领先若干批，而不是整篇文档
+    assert state["lead"] <= 30
+
+
+@pytest.mark.asyncio
+async def test_ingest_in_process_pool_matches_thread_mode(tmp_path, monkeypatch):
+    from app.config import settings
+    from app.core.text_artifact import artifact_path_for, read_text_slice
+
+    monkeypatch.setattr(settings.file_storage, "extracted_text_cache_enabled", True)
+    text = "".join(f"第{i}段，hello world。\n\n" for i in range(400))
+    path = tmp_path / "a.txt"
+    path.write_text(text, encoding="utf-8")
+
+    thread_store = _RecordingVectorStore()
+    thread_count = await _task(monkeypatch, thread_store)._ingest(_document(path, "txt"))
+
+    assert read_text_slice(artifact_path_for(str(path))) == (text, len(text))
+
+    executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        process_store = _RecordingVectorStore()
+        process_count = await _task(
+            monkeypatch, process_store, parse_executor=executor
+        )._ingest(_document(path, "txt"))
+    finally:
+        executor.shutdown()
+        from app.tasks.document_tasks import shutdown_stream_manager
+
+        shutdown_stream_manager()
+
+    assert process_count == thread_count > 1
+    assert process_store.ids == thread_store.ids
+
+
+@pytest.mark.asyncio
+async def test_ingest_reports_empty_document(tmp_path, monkeypatch):
+    from app.langchain_integration.document_loaders import DocumentProcessingError
+
+    path = tmp_path / "empty.txt"
+    path.write_text("   \n\n  ", encoding="utf-8")
+
+    with pytest.raises(DocumentProcessingError, match="未生成任何分块"):
+        await _task(monkeypatch, _RecordingVectorStore())._ingest(_document(path, "txt"))
@@ -0,0 +1,103 @@
+import queue
+import threading
+
+import pytest
+from langchain_core.documents import Document as LangchainDocument
+
+
+def test_text_artifact_slices_across_blocks(tmp_path):
+    from app.core.text_artifact import read_text_slice, write_text_artifact
+
+    text = "".join(f"第{i}段，hello。" for i in range(500))
+    path = str(tmp_path / "doc.txt.txtz")
+    write_text_artifact(path, text, block_chars=100)
+
+    assert read_text_slice(path, 0, 1000) == (text[:1000], len(text))
+    assert read_text_slice(path, 250, 120) == (text[250:370], len(text))
+    assert read_text_slice(path, len(text) - 5) == (text[-5:], len(text))
+    assert read_text_slice(str(tmp_path / "missing.txtz")) is None
+
+    (tmp_path / "bad.txtz").write_bytes(b"not an artifact")
+    assert read_text_slice(str(tmp_path / "bad.txtz")) is None
+
+
+def test_preview_fallback_stops_after_max_chars(monkeypatch):
+    from app.langchain_integration.document_loaders import DocumentLoaderFactory
+
+    consumed = []
+
+    def _pages(file_path, file_type):
+        for i in range(100):
+            consumed.append(i)
+            yield LangchainDocument(page_content="x" * 400, metadata={"page": i})
+
+    monkeypatch.setattr(DocumentLoaderFactory, "iter_pages", _pages)
+
+    preview, length = DocumentLoaderFactory.get_document_preview_with_length(
+        "/tmp/a.pdf", "pdf", max_chars=1000
+    )
+
+    assert preview == ("x" * 400 + "\n") * 2 + "x" * 198
+    assert len(consumed) == 3
+    # 提前停止时不知道全文长度
+    assert length is None
+
+    consumed.clear()
+    preview, length = DocumentLoaderFactory.get_document_preview_with_length(
+        "/tmp/a.pdf", "pdf", max_chars=100000
+    )
+    assert len(consumed) == 100
+    assert length == len(preview) == 400 * 100 + 99
+
+
+@pytest.mark.asyncio
+async def test_preview_reads_artifact_written_during_ingestion(db, test_user, tmp_path, monkeypatch):
+    from app.langchain_integration.document_loaders import DocumentLoaderFactory
+    from app.models.document import Document
+    from app.models.knowledge_base import KnowledgeBase
+    from app.services.rag_service import RAGService
+    from app.core.text_artifact import artifact_path_for
+    from app.tasks.document_tasks import ChunkStreamSpec, produce_document_chunks
+
+    source = tmp_path / "a.txt"
+    source.write_text("正文内容" * 1000, encoding="utf-8")
+
+    kb = KnowledgeBase(user_id=test_user.id, name="kb")
+    db.add(kb)
+    db.commit()
+    document = Document(
+        knowledge_base_id=kb.id,
+        filename="a.txt",
+        file_path=str(source),
+        file_size=source.stat().st_size,
+        file_type="txt",
+    )
+    db.add(document)
+    db.commit()
+
+    produce_document_chunks(
+        ChunkStreamSpec(
+            file_path=str(source),
+            file_type="txt",
+            document_id=document.id,
+            knowledge_base_id=kb.id,
+            filename="a.txt",
+            chunk_size=1000,
+            chunk_overlap=0,
+            batch_size=1000,
+            artifact_path=artifact_path_for(str(source)),
+        ),
+        queue.Queue(),
+        threading.Event(),
+    )
+
+    def _no_parse(*args, **kwargs):
+        raise AssertionError("preview should not re-parse the source file")
+
+    monkeypatch.setattr(DocumentLoaderFactory, "get_document_preview_with_length", _no_parse)
+
+    preview, total = RAGService(db).get_document_preview_with_length(
+        document.id, test_user.id, max_chars=10
+    )
+    assert preview == "正文内容正文内容正文"
+    assert total == 4000
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+
+
+def _stage_count(stage):
+    return REGISTRY.get_sample_value("pipeline_stage_duration_seconds_count", {"stage": stage}) or 0
+
+
+def test_trace_stage_records_histogram_and_current_trace():
+    from app.core.tracing import start_trace, trace_stage
+
+    before = _stage_count("test.block")
+    trace = start_trace("req-1", expose=True)
+
+    with trace_stage("test.block"):
+        pass
+    with pytest.raises(ValueError):
+        with trace_stage("test.block"):
+            raise ValueError("boom")
+
+    assert _stage_count("test.block") == before + 2
+    assert list(trace.stages()) == ["test.block"]
+    assert "test.block=" in trace.header_value()
+    assert "x2" in trace.summary()
+
+    event = trace.to_dict()
+    assert event["type"] == "timing"
+    assert event["request_id"] == "req-1"
+
+
+@pytest.mark.asyncio
+async def test_trace_follows_to_thread_and_child_tasks():
+    from app.core.tracing import record_stage, start_trace
+
+    trace = start_trace("req-2")
+
+    await asyncio.to_thread(record_stage, "test.thread", 0.01)
+    await asyncio.gather(
+        asyncio.create_task(asyncio.to_thread(record_stage, "test.task", 0.02)),
+        asyncio.create_task(asyncio.to_thread(record_stage, "test.task", 0.03)),
+    )
+
+    stages = trace.stages()
+    assert stages["test.thread"] == 10.0
+    assert stages["test.task"] == 50.0
+
+
+def test_traced_restores_outer_trace():
+    from app.core.tracing import get_current_trace, record_stage, start_trace, traced
+
+    outer = start_trace("req-3")
+    with traced("document-1") as inner:
+        record_stage("document.ingest", 0.5)
+        assert get_current_trace() is inner
+
+    assert get_current_trace() is outer
+    assert inner.stages() == {"document.ingest": 500.0}
+    assert outer.stages() == {}
+
+
+def test_timing_requested_requires_setting(monkeypatch):
+    from app.config import settings
+    from app.core.tracing import timing_requested
+
+    monkeypatch.setattr(settings.monitoring, "stage_timing_debug_enabled", False)
+    assert timing_requested("1") is False
+
+    monkeypatch.setattr(settings.monitoring, "stage_timing_debug_enabled", True)
+    assert timing_requested("1") is True
+    assert timing_requested("true") is True
+    assert timing_requested("0") is False
+    assert timing_requested(None) is False
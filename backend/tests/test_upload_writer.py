@@ -0,0 +1,150 @@
+import hashlib
+import tempfile
+from io import BytesIO
+
+import pytest
+from fastapi import BackgroundTasks, UploadFile
+
+
+class _CountingFile(BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.max_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.max_read = max(self.max_read, len(chunk))
+        return chunk
+
+
+@pytest.mark.asyncio
+async def test_stream_upload_writes_in_chunks_and_hashes(tmp_path):
+    from app.utils.upload_writer import stream_upload_to_file
+
+    data = b"0123456789" * 1000
+    raw = _CountingFile(data)
+    dest = tmp_path / "out.bin"
+
+    saved = await stream_upload_to_file(
+        UploadFile(file=raw, filename="a.txt"), str(dest), max_size=len(data), chunk_size=1024
+    )
+
+    assert saved.size == len(data)
+    assert saved.sha256 == hashlib.sha256(data).hexdigest()
+    assert dest.read_bytes() == data
+    assert raw.max_read == 1024
+
+
+@pytest.mark.asyncio
+async def test_stream_upload_aborts_early_and_removes_partial_file(tmp_path):
+    from app.utils.upload_writer import UploadTooLargeError, stream_upload_to_file
+
+    raw = _CountingFile(b"x" * 10_000)
+    dest = tmp_path / "out.bin"
+
+    with pytest.raises(UploadTooLargeError):
+        await stream_upload_to_file(
+            UploadFile(file=raw, filename="a.txt"), str(dest), max_size=3000, chunk_size=1024
+        )
+
+    assert not dest.exists()
+    assert raw.tell() == 3072
+
+
+@pytest.mark.asyncio
+async def test_batch_upload_saves_concurrently_and_reports_errors(db, test_user, monkeypatch):
+    from app.config import settings
+    from app.services.rag_service import RAGService
+
+    upload_dir = tempfile.mkdtemp(prefix="uploads_")
+    monkeypatch.setattr(settings.file_storage, "upload_dir", upload_dir)
+    monkeypatch.setattr(settings.file_storage, "max_upload_size_mb", 1)
+    monkeypatch.setattr(settings.document_queue, "document_queue_enabled", True)
+
+    service = RAGService(db)
+    kb = service.create_knowledge_base(user_id=test_user.id, name="kb", description="d")
+
+    files = [
+        UploadFile(file=BytesIO(b"hello"), filename="a.txt"),
+        UploadFile(file=BytesIO(b"x" * (1024 * 1024 + 1)), filename="big.txt"),
+        UploadFile(file=BytesIO(b"data"), filename="c.exe"),
+        UploadFile(file=BytesIO(b"# md"), filename="d.md"),
+    ]
+    documents, errors = await service.upload_documents_batch(
+        kb_id=kb.id, user_id=test_user.id, files=files, background_tasks=BackgroundTasks()
+    )
+
+    assert [d.filename for d in documents] == ["a.txt", "d.md"]
+    assert documents[0].content_hash == hashlib.sha256(b"hello").hexdigest()
+    assert documents[0].file_size == 5
+    assert sorted(e["filename"] for e in errors) == ["big.txt", "c.exe"]
+
+
+def _batch_service(db, test_user, monkeypatch):
+    import os
+
+    from app.config import settings
+    from app.services.rag_service import RAGService
+
+    upload_dir = tempfile.mkdtemp(prefix="uploads_")
+    monkeypatch.setattr(settings.file_storage, "upload_dir", upload_dir)
+    monkeypatch.setattr(settings.document_queue, "document_queue_enabled", True)
+
+    service = RAGService(db)
+    kb = service.create_knowledge_base(user_id=test_user.id, name="kb", description="d")
+    kb_dir = os.path.join(upload_dir, f"kb_{kb.id}")
+    return service, kb, kb_dir
+
+
+@pytest.mark.asyncio
+async def test_batch_upload_rolls_back_failed_insert_and_continues(db, test_user, monkeypatch):
+    import os
+
+    from sqlalchemy.exc import OperationalError
+
+    service, kb, kb_dir = _batch_service(db, test_user, monkeypatch)
+    create = service.doc_repo.create
+    calls = {"n": 0}
+
+    def _flaky_create(**kwargs):
+        calls["n"] += 1
+        if calls["n"] == 2:
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        return create(**kwargs)
+
+    monkeypatch.setattr(service.doc_repo, "create", _flaky_create)
+    files = [UploadFile(file=BytesIO(b"x"), filename=f"{name}.txt") for name in "abc"]
+
+    documents, errors = await service.upload_documents_batch(
+        kb_id=kb.id, user_id=test_user.id, files=files, background_tasks=BackgroundTasks()
+    )
+
+    assert [d.filename for d in documents] == ["a.txt", "c.txt"]
+    assert [e["filename"] for e in errors] == ["b.txt"]
+    assert sorted(os.listdir(kb_dir)) == sorted(os.path.basename(d.file_path) for d in documents)
+
+
+@pytest.mark.asyncio
+async def test_batch_upload_abort_removes_unpersisted_files(db, test_user, monkeypatch):
+    import asyncio
+    import os
+
+    service, kb, kb_dir = _batch_service(db, test_user, monkeypatch)
+    create = service.doc_repo.create
+    calls = {"n": 0}
+
+    def _aborting_create(**kwargs):
+        calls["n"] += 1
+        if calls["n"] == 2:
+            raise asyncio.CancelledError()
+        return create(**kwargs)
+
+    monkeypatch.setattr(service.doc_repo, "create", _aborting_create)
+    files = [UploadFile(file=BytesIO(b"x"), filename=f"{name}.txt") for name in "abc"]
+
+    with pytest.raises(asyncio.CancelledError):
+        await service.upload_documents_batch(
+            kb_id=kb.id, user_id=test_user.id, files=files, background_tasks=BackgroundTasks()
+        )
+
+    assert len(os.listdir(kb_dir)) == 1
@@ -0,0 +1,111 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models.knowledge_base import KnowledgeBase
+from app.models.user import User
+
+
+def test_purge_removes_upload_directory_and_outside_files(tmp_path, monkeypatch):
+    from app.config import settings
+    from app.core.chunk_embedding_store import ChunkEmbeddingStore
+    from app.tasks.cleanup_tasks import purge_knowledge_base_data
+
+    monkeypatch.setattr(settings.file_storage, "upload_dir", str(tmp_path / "uploads"))
+    kb_dir = tmp_path / "uploads" / "kb_7"
+    kb_dir.mkdir(parents=True)
+    inside = [kb_dir / f"{i}.txt" for i in range(5)]
+    outside = [tmp_path / f"legacy_{i}.txt" for i in range(3)]
+    for path in inside + outside:
+        path.write_text("x")
+    (tmp_path / "legacy_0.txt.txtz").write_text("x")
+
+    store = ChunkEmbeddingStore(str(tmp_path / "chunks.sqlite3"))
+    store.put_many("m", [("a", [1.0]), ("b", [2.0])], knowledge_base_id=7, document_id=1)
+    store.put_many("m", [("b", [2.0])], knowledge_base_id=8, document_id=2)
+
+    manager = MagicMock()
+    manager.delete_collection.return_value = True
+    with patch("app.core.vector_store.get_vector_store_manager", return_value=manager), patch(
+        "app.core.chunk_embedding_store.get_chunk_embedding_store", return_value=store
+    ):
+        result = asyncio.run(
+            purge_knowledge_base_data(7, [str(p) for p in inside + outside], batch_size=2)
+        )
+
+    manager.delete_collection.assert_called_once_with(7)
+    assert result["success"] and result["directory_deleted"]
+    assert result["chunk_embeddings_deleted"] == 1
+    assert store.get_many("m", ["a", "b"]) == {"b": [2.0]}
+    store.close()
+    assert result["deleted_files"] == 3
+    assert not kb_dir.exists()
+    assert not any(p.exists() for p in outside)
+    assert not (tmp_path / "legacy_0.txt.txtz").exists()
+
+
+def test_purge_reports_failed_collection_delete_and_removes_sparse_index(tmp_path, monkeypatch):
+    from app.config import settings
+    from app.core.sparse_index import SparseIndexStore
+    from app.tasks.cleanup_tasks import purge_knowledge_base_data
+
+    monkeypatch.setattr(settings.file_storage, "upload_dir", str(tmp_path / "uploads"))
+    sparse_store = SparseIndexStore(str(tmp_path / "sparse"))
+    sparse_store.get(7)
+    assert sparse_store.exists(7)
+
+    manager = MagicMock()
+    manager.delete_collection.return_value = False
+    with patch("app.core.vector_store.get_vector_store_manager", return_value=manager), patch(
+        "app.core.chunk_embedding_store.get_chunk_embedding_store", return_value=None
+    ), patch("app.core.sparse_index.get_sparse_index_store", return_value=sparse_store):
+        result = asyncio.run(purge_knowledge_base_data(7))
+
+    assert result["success"] is False and result["vector_deleted"] is False
+    assert result["sparse_index_deleted"] is True
+    assert not sparse_store.exists(7)
+
+
+def test_compaction_task_drops_orphans_and_compacts(db: Session, test_user: User, tmp_path, monkeypatch):
+    from app.config import settings
+    from app.core.numpy_index import NumpyVectorBackend
+    from app.core.vector_store import VectorStoreManager
+    from app.tasks.cleanup_tasks import compact_vector_collections
+
+    kb = KnowledgeBase(user_id=test_user.id, name="压缩测试", description="")
+    db.add(kb)
+    db.commit()
+    orphan_id = kb.id + 1000
+
+    monkeypatch.setattr(settings.file_storage, "upload_dir", str(tmp_path / "uploads"))
+    (tmp_path / "uploads" / f"kb_{kb.id}").mkdir(parents=True)
+    (tmp_path / "uploads" / f"kb_{orphan_id}").mkdir()
+
+    manager = VectorStoreManager(
+        persist_directory=str(tmp_path / "chroma"),
+        api_key="DUMMY_DASHSCOPE_API_KEY",
+        backend=NumpyVectorBackend(str(tmp_path / "chroma"), ivf_threshold=10**9),
+    )
+    vectors = np.random.default_rng(0).normal(size=(50, 4)).astype(np.float32)
+    for kb_id in (kb.id, orphan_id):
+        manager.client.get_or_create_collection(f"kb_{kb_id}").upsert(
+            ids=[str(i) for i in range(50)],
+            embeddings=vectors,
+            metadatas=[{"document_id": i % 2} for i in range(50)],
+        )
+    manager.client.get_collection(f"kb_{kb.id}").delete(where={"document_id": 0})
+
+    with patch("app.tasks.cleanup_tasks.SessionLocal", return_value=db), patch(
+        "app.core.vector_store.get_vector_store_manager", return_value=manager
+    ):
+        result = compact_vector_collections(min_tombstone_ratio=0.1, min_tombstones=1)
+
+    assert result["success"] is True
+    assert result["orphaned_collections"] == [orphan_id]
+    assert result["orphaned_directories"] == [orphan_id]
+    assert result["compacted"] == 1 and result["reclaimed_rows"] == 25
+    assert manager.list_knowledge_base_ids() == [kb.id]
+    assert (tmp_path / "uploads" / f"kb_{kb.id}").exists()
+    manager.close()
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+
+def _clustered(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n // 50), dim)) * 3
+    return (centers[rng.integers(0, len(centers), n)] + rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def _exact(vectors, query, k):
+    return [str(i) for i in np.argsort(((vectors - query) ** 2).sum(axis=1))[:k]]
+
+
+def _collection(tmp_path, quantization, **kwargs):
+    from app.core.numpy_index import NumpyIndexCollection
+
+    kwargs.setdefault("ivf_threshold", 10**9)
+    return NumpyIndexCollection(
+        "kb_1", str(tmp_path / quantization), quantization=quantization, **kwargs
+    )
+
+
+def test_int8_codes_approximate_distances():
+    from app.core.vector_quantization import (int8_distances, quantize_int8,
+                                              squared_norms)
+
+    vectors = _clustered(500, 64)
+    query = vectors[3] + 0.1
+    codes, scales = quantize_int8(vectors)
+
+    assert codes.dtype == np.int8
+    assert np.abs(codes * scales[:, None] - vectors).max() <= scales.max() / 2 + 1e-6
+    approx = int8_distances(codes, scales, squared_norms(vectors), query, float(query @ query))
+    exact = ((vectors - query) ** 2).sum(axis=1)
+    assert np.corrcoef(approx, exact)[0, 1] > 0.99
+
+
+def test_pq_codes_approximate_distances():
+    from app.core.vector_quantization import (pq_distances, pq_encode,
+                                              pq_subvector_count,
+                                              train_pq_codebooks)
+
+    vectors = _clustered(2000, 32)
+    assert pq_subvector_count(32, 8) == 4
+    assert pq_subvector_count(30, 8) == 5
+
+    codebooks = train_pq_codebooks(vectors, 4, iterations=5)
+    codes = pq_encode(codebooks, vectors)
+    assert codes.shape == (2000, 4) and codes.dtype == np.uint8
+
+    query = vectors[0]
+    approx = pq_distances(codebooks, codes, query)
+    exact = ((vectors - query) ** 2).sum(axis=1)
+    assert np.corrcoef(approx, exact)[0, 1] > 0.9
+
+
+@pytest.mark.parametrize("quantization", ["int8", "pq"])
+def test_quantized_collection_rescores_with_full_precision(tmp_path, monkeypatch, quantization):
+    import app.core.numpy_index as numpy_index
+
+    monkeypatch.setattr(numpy_index, "_PQ_TRAIN_MIN_ROWS", 1000)
+    vectors = _clustered(3000, 32, seed=1)
+    collection = _collection(tmp_path, quantization, pq_subvector_dim=4, rescore_factor=8)
+    for start in range(0, len(vectors), 1000):
+        collection.upsert(
+            ids=[str(i) for i in range(start, start + 1000)],
+            embeddings=vectors[start : start + 1000],
+        )
+
+    stats = collection.stats()
+    assert stats["quantization"] == quantization
+    assert stats["encoded_rows"] == 3000
+    assert stats["resident_bytes"] < vectors.nbytes / 2
+    # 量化不替代float32矩阵：磁盘上两者都保留
+    assert stats["vector_disk_bytes"] == vectors.nbytes
+    assert 0 < stats["quantized_disk_bytes"] < vectors.nbytes / 2
+    assert stats["disk_bytes"] > stats["vector_disk_bytes"] + stats["quantized_disk_bytes"]
+
+    rng = np.random.default_rng(2)
+    hits = 0
+    for _ in range(20):
+        query = vectors[rng.integers(0, len(vectors))] + rng.normal(size=32).astype(np.float32) * 0.1
+        result = collection.query(query_embeddings=[query], n_results=10)
+        hits += len(set(result["ids"][0]) & set(_exact(vectors, query, 10)))
+        # 返回的是float32精确重排后的距离
+        found = vectors[[int(i) for i in result["ids"][0]]]
+        assert np.allclose(result["distances"][0], ((found - query) ** 2).sum(axis=1), rtol=1e-3)
+    assert hits / 200 >= 0.9
+
+
+def test_existing_collection_keeps_its_quantization(tmp_path):
+    from app.core.numpy_index import NumpyIndexCollection
+
+    collection = _collection(tmp_path, "int8")
+    collection.upsert(ids=["a"], embeddings=[[1.0, 2.0]])
+    collection.close()
+
+    reopened = NumpyIndexCollection("kb_1", str(tmp_path / "int8"), quantization="none")
+    assert reopened.quantization == "int8"
+    reopened.upsert(ids=["b"], embeddings=[[2.0, 1.0]])
+    assert reopened.stats()["encoded_rows"] == 2
+    assert reopened.query(query_embeddings=[[2.0, 1.0]], n_results=1)["ids"] == [["b"]]
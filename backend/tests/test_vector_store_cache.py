@@ -0,0 +1,92 @@
+import threading
+
+from prometheus_client import REGISTRY
+
+
+class _FakeVectorStore:
+    def __init__(self, client, knowledge_base_id):
+        self.client = client
+        self.knowledge_base_id = knowledge_base_id
+
+
+def _make_manager(tmp_path, monkeypatch, cache_size=2):
+    from app.core.vector_store import VectorStoreManager
+
+    m = VectorStoreManager(
+        persist_directory=str(tmp_path / "chroma"),
+        api_key="DUMMY_DASHSCOPE_API_KEY",
+        collection_cache_size=cache_size,
+    )
+    created = []
+
+    def _create(knowledge_base_id, collection_name=None):
+        created.append(knowledge_base_id)
+        return _FakeVectorStore(m.client, knowledge_base_id)
+
+    monkeypatch.setattr(m, "_create_vector_store", _create)
+    return m, created
+
+
+def _event_count(event):
+    return (
+        REGISTRY.get_sample_value(
+            "vector_store_collection_cache_events_total", {"event": event}
+        )
+        or 0
+    )
+
+
+def test_collection_handles_share_one_client_and_evict_lru(tmp_path, monkeypatch):
+    m, created = _make_manager(tmp_path, monkeypatch)
+    evictions = _event_count("evict")
+
+    first = m.get_vector_store(1)
+    m.get_vector_store(2)
+    assert m.get_vector_store(1) is first
+    m.get_vector_store(3)
+
+    assert created == [1, 2, 3]
+    assert m.open_collections() == 2
+    assert REGISTRY.get_sample_value("vector_store_open_collections") == 2
+    assert _event_count("evict") == evictions + 1
+    assert {m.get_vector_store(kb).client for kb in (1, 3)} == {m.client}
+    assert created == [1, 2, 3]
+
+    # 被淘汰的知识库再次访问时重新创建
+    m.get_vector_store(2)
+    assert created == [1, 2, 3, 2]
+
+
+def test_concurrent_first_access_creates_one_handle(tmp_path, monkeypatch):
+    m, created = _make_manager(tmp_path, monkeypatch, cache_size=8)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def _access():
+        barrier.wait()
+        results.append(m.get_vector_store(7))
+
+    threads = [threading.Thread(target=_access) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert created == [7]
+    assert all(result is results[0] for result in results)
+
+
+def test_evict_and_close_release_handles(tmp_path, monkeypatch):
+    m, _ = _make_manager(tmp_path, monkeypatch)
+    m.get_vector_store(1)
+    m.get_vector_store(2)
+    client = m.client
+
+    assert m.evict(1) is True
+    assert m.evict(1) is False
+    assert m.open_collections() == 1
+
+    m.close()
+    assert m.open_collections() == 0
+    assert m._client is None
+    assert client is not None
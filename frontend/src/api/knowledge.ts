@@ -57,7 +57,7 @@ export const knowledgeApi = {
     return request.get(`/documents/${docId}/status`)
   },
 
-  getDocumentPreview(docId: number, maxChars = 1000): Promise<{ document_id: number, filename: string, content: string, total_length: number }> {
+  getDocumentPreview(docId: number, maxChars = 1000): Promise<{ document_id: number, filename: string, content: string, total_length: number | null, truncated: boolean }> {
     return request.get(`/documents/${docId}/preview`, { params: { max_chars: maxChars } })
   },
 